@@ -4,6 +4,7 @@ import time
 import logging
 from typing import List, Dict, Any, AsyncGenerator
 from api.base_client import APIClient
+from api.client_registry import get_http_client
 from config import ANTHROPIC_API_KEY
 from utils.translations import get_text
 
@@ -14,10 +15,9 @@ class AnthropicClient(APIClient):
     
     def __init__(self, api_key: str = ANTHROPIC_API_KEY, max_retries: int = 3, retry_delay: float = 1.0):
         super().__init__(max_retries, retry_delay)
-        from httpx import AsyncClient
         from anthropic import AsyncAnthropic
         
-        self.client = AsyncAnthropic(api_key=api_key)
+        self.client = AsyncAnthropic(api_key=api_key, http_client=get_http_client("anthropic"))
         logger.info(f"Klient Anthropic zainicjalizowany z kluczem API: {'ważny' if api_key else 'brak'}")
     
     async def chat_completion(self, messages: List[Dict[str, str]], model: str = "claude-3-7-sonnet-20250219", stream: bool = False, **kwargs) -> Any:
@@ -160,5 +160,4 @@ class AnthropicClient(APIClient):
                     yield chunk.content_block.text
         except Exception as e:
             logger.error(f"Błąd w chat_completion_stream: {e}", exc_info=True)
-            error_msg = get_text("stream_error", language, error=str(e), default=f"Wystąpił błąd podczas generowania odpowiedzi: {str(e)}")
-            yield error_msg
\ No newline at end of file
+            raise
\ No newline at end of file
@@ -2,6 +2,7 @@
 import logging
 import time
 import asyncio
+import inspect
 from typing import Any, Dict, Optional, Callable
 
 logger = logging.getLogger(__name__)
@@ -20,12 +21,12 @@ class APIClient:
         
         while retries < self.max_retries:
             try:
-                # Rozróżnienie między funkcjami sync i async
-                if asyncio.iscoroutinefunction(request_func):
-                    return await request_func(*args, **kwargs)
-                else:
-                    # Dla funkcji synchronicznych nie używamy await
-                    return request_func(*args, **kwargs)
+                # Metody SDK bywają opakowane dekoratorami (iscoroutinefunction zwraca
+                # wtedy False) - czekamy na wynik, jeśli jest awaitable
+                result = request_func(*args, **kwargs)
+                if inspect.isawaitable(result):
+                    result = await result
+                return result
             except Exception as e:
                 retries += 1
                 last_error = e
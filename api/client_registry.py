@@ -0,0 +1,56 @@
+# api/client_registry.py
+import logging
+from typing import Dict
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Limity puli połączeń dla dostawców LLM - połączenia TLS są utrzymywane
+# między wiadomościami zamiast nawiązywane od nowa przy każdym zapytaniu
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY = 60.0
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = 600.0  # Strumieniowe odpowiedzi mogą trwać długo
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_http_clients: Dict[str, httpx.AsyncClient] = {}
+
+def get_http_client(provider: str) -> httpx.AsyncClient:
+    """
+    Zwraca współdzielonego klienta HTTP dla danego dostawcy (jeden na proces)
+
+    Args:
+        provider: Nazwa dostawcy (np. 'openai', 'anthropic')
+
+    Returns:
+        httpx.AsyncClient: Klient z pulą połączeń keep-alive
+    """
+    client = _http_clients.get(provider)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+        )
+        _http_clients[provider] = client
+        logger.info(f"Utworzono współdzielonego klienta HTTP dla {provider} (HTTP/2: {HTTP2_AVAILABLE})")
+    return client
+
+async def close_http_clients():
+    """Zamyka wszystkie współdzielone klienty HTTP"""
+    for provider, client in list(_http_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Błąd zamykania klienta HTTP dla {provider}: {e}")
+    _http_clients.clear()
@@ -6,6 +6,7 @@ import logging
 from typing import List, Dict, Any, AsyncGenerator
 from openai import AsyncOpenAI
 from api.base_client import APIClient
+from api.client_registry import get_http_client
 from config import OPENAI_API_KEY, DEFAULT_MODEL, DALL_E_MODEL
 
 logger = logging.getLogger(__name__)
@@ -15,9 +16,7 @@ class OpenAIClient(APIClient):
     
     def __init__(self, api_key: str = OPENAI_API_KEY, max_retries: int = 3, retry_delay: float = 1.0):
         super().__init__(max_retries, retry_delay)
-        from httpx import AsyncClient
-        http_client = AsyncClient()
-        self.client = AsyncOpenAI(api_key=api_key, http_client=http_client)
+        self.client = AsyncOpenAI(api_key=api_key, http_client=get_http_client("openai"))
         logger.info(f"Klient OpenAI zainicjalizowany z kluczem API: {'ważny' if api_key else 'brak'}")
         
         # Mapowanie modeli na identyfikatory API
@@ -1,24 +1,55 @@
 # api/supabase_client.py
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+import httpx
 from supabase import create_client
 from api.base_client import APIClient
 
 logger = logging.getLogger(__name__)
 
+# Operatory porównania obsługiwane w range_filters (składnia PostgREST);
+# dla "in" wartością jest lista
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte", "neq", "in")
+
+# Domyślna liczba wierszy w jednym zapytaniu insert_many/upsert_many
+BULK_CHUNK_SIZE = 500
+
 class SupabaseClient(APIClient):
     """Klient API Supabase z obsługą błędów i ponawianiem"""
-    
-    def __init__(self, url: str, key: str, max_retries: int = 3, retry_delay: float = 1.0):
+
+    def __init__(self, url: str, key: str, max_retries: int = 3, retry_delay: float = 1.0,
+                 max_connections: int = 50, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0, timeout: float = 10.0):
         super().__init__(max_retries, retry_delay)
-        
+
+        # Synchroniczny klient supabase-py - tylko dla starszego kodu korzystającego z .table()
         try:
             self.client = create_client(url, key)
             logger.info("Pomyślnie zainicjalizowano klienta Supabase")
         except Exception as e:
             logger.error(f"Błąd inicjalizacji klienta Supabase: {e}")
             self.client = self._create_dummy_client()
-    
+
+        # Asynchroniczny klient PostgREST ze współdzieloną pulą połączeń (keep-alive)
+        self.http = None
+        if url and key:
+            self.http = httpx.AsyncClient(
+                base_url=f"{url.rstrip('/')}/rest/v1",
+                headers={
+                    "apikey": key,
+                    "Authorization": f"Bearer {key}",
+                    "Content-Type": "application/json"
+                },
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive_connections,
+                    keepalive_expiry=keepalive_expiry
+                ),
+                timeout=timeout
+            )
+        else:
+            logger.warning("Brak SUPABASE_URL lub SUPABASE_KEY - zapytania asynchroniczne będą zwracać puste wyniki")
+
     def _create_dummy_client(self) -> Any:
         """Tworzy zastępczy klient dla płynnej degradacji"""
         class DummyClient:
@@ -33,50 +64,231 @@ class SupabaseClient(APIClient):
             def execute(self, *args, **kwargs):
                 logger.warning("Używam zastępczego klienta Supabase - brak połączenia z bazą danych")
                 return type('obj', (object,), {'data': []})
-        
+
         return DummyClient()
-    
-    async def query(self, table: str, query_type: str = "select", 
+
+    @staticmethod
+    def _format_value(value: Any) -> str:
+        """Formatuje wartość filtra zgodnie ze składnią PostgREST"""
+        if value is None:
+            return "is.null"
+        if isinstance(value, bool):
+            return f"eq.{str(value).lower()}"
+        return f"eq.{value}"
+
+    @staticmethod
+    def quote_value(value: Any) -> str:
+        """Otacza wartość cudzysłowami do użycia w filtrze or=(...) - daty zawierają znaki ':' i '+'"""
+        return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+    async def query(self, table: str, query_type: str = "select",
                    columns: str = "*", filters: Optional[Dict] = None,
                    data: Optional[Dict] = None, order_by: Optional[str] = None,
-                   limit: Optional[int] = None) -> List:
-        """Wykonuje zapytanie do Supabase"""
-        query = self.client.table(table)
-        
+                   limit: Optional[int] = None,
+                   range_filters: Optional[List[Tuple[str, str, Any]]] = None,
+                   or_filter: Optional[str] = None) -> List:
+        """
+        Wykonuje zapytanie do Supabase
+
+        Args:
+            order_by: Pole sortowania ('-' na początku = malejąco); kilka pól
+                rozdzielonych przecinkami, np. "created_at,id"
+            range_filters: Lista (kolumna, operator, wartość), np.
+                [("created_at", "gte", start), ("created_at", "lt", end)] lub
+                [("id", "in", [1, 2, 3])] - filtrowanie odbywa się po stronie bazy danych
+            or_filter: Surowe wyrażenie PostgREST or=(...), np. dla paginacji kluczem
+        """
+        if self.http is None:
+            logger.warning("Używam zastępczego klienta Supabase - brak połączenia z bazą danych")
+            return []
+
+        params = []
+        headers = {}
+
         # Budowanie zapytania
         if query_type == "select":
-            query = query.select(columns)
+            method = "GET"
+            params.append(("select", columns))
         elif query_type == "insert" and data:
-            query = query.insert(data)
+            method = "POST"
+            headers["Prefer"] = "return=representation"
         elif query_type == "update" and data:
-            query = query.update(data)
+            method = "PATCH"
+            headers["Prefer"] = "return=representation"
         elif query_type == "delete":
-            query = query.delete()
-        
+            method = "DELETE"
+            headers["Prefer"] = "return=representation"
+        else:
+            logger.error(f"Nieobsługiwany typ zapytania Supabase: {query_type}")
+            return []
+
         # Stosowanie filtrów
         if filters:
             for key, value in filters.items():
-                query = query.eq(key, value)
-        
+                params.append((key, self._format_value(value)))
+
+        # Stosowanie filtrów zakresowych
+        if range_filters:
+            for column, operator, value in range_filters:
+                if operator not in RANGE_OPERATORS:
+                    logger.error(f"Nieobsługiwany operator filtra Supabase: {operator}")
+                    return []
+                if operator == "in":
+                    value = "(" + ",".join(str(item) for item in value) + ")"
+                params.append((column, f"{operator}.{value}"))
+
+        if or_filter:
+            params.append(("or", or_filter))
+
         # Stosowanie sortowania
         if order_by:
-            desc = order_by.startswith("-")
-            field = order_by[1:] if desc else order_by
-            query = query.order(field, desc=desc)
-        
+            order_parts = []
+            for part in order_by.split(","):
+                part = part.strip()
+                desc = part.startswith("-")
+                field = part[1:] if desc else part
+                order_parts.append(f"{field}.{'desc' if desc else 'asc'}")
+            params.append(("order", ",".join(order_parts)))
+
         # Stosowanie limitu
         if limit:
-            query = query.limit(limit)
-        
+            params.append(("limit", str(limit)))
+
         try:
-            # Poprawione: używamy _execute_query_sync zamiast _execute_query
-            response = await self._request_with_retry(self._execute_query_sync, query)
-            return response.data
+            return await self._request_with_retry(
+                self._execute_query, method, table, params, headers,
+                data if method in ("POST", "PATCH") else None
+            )
         except Exception as e:
             logger.error(f"Błąd zapytania Supabase: {e}")
             return []
-    
-    # Nowa metoda, która wykonuje zapytanie synchronicznie (bez await)
-    def _execute_query_sync(self, query):
-        """Wykonuje zapytanie synchronicznie - bez użycia await"""
-        return query.execute()
\ No newline at end of file
+
+    async def insert_many(self, table: str, rows: List[Dict], chunk_size: int = BULK_CHUNK_SIZE,
+                          retry: bool = False) -> List:
+        """
+        Wstawia wiele wierszy - jedno zapytanie na paczkę chunk_size wierszy
+
+        Args:
+            table: Nazwa tabeli
+            rows: Wiersze do wstawienia (brakujące kolumny przyjmują wartości domyślne)
+            chunk_size: Maksymalna liczba wierszy w jednym zapytaniu
+            retry: Czy ponawiać zapytanie po błędzie - domyślnie wyłączone,
+                bo ponowienie po utraconej odpowiedzi może zduplikować wiersze
+
+        Returns:
+            List: Wstawione wiersze (przy błędzie - wiersze z paczek wstawionych przed błędem)
+        """
+        return await self._bulk_write(table, rows, chunk_size, "return=representation,missing=default", [], retry)
+
+    async def insert_rows(self, table: str, rows: List[Dict], on_conflict: Optional[str] = None) -> List:
+        """
+        Wstawia paczkę wierszy jednym zapytaniem bez ponawiania i bez przechwytywania błędów
+
+        Błędy (httpx.HTTPStatusError, httpx.TransportError) trafiają do wywołującego,
+        który może odróżnić odrzucenie danych (4xx) od błędu przejściowego.
+
+        Args:
+            table: Nazwa tabeli
+            rows: Wiersze do wstawienia
+            on_conflict: Kolumny unikalne - wiersze już istniejące są pomijane
+                (ON CONFLICT DO NOTHING), więc ponowienie nie duplikuje danych
+
+        Returns:
+            List: Wstawione wiersze (bez pominiętych duplikatów)
+        """
+        if self.http is None:
+            raise RuntimeError("Brak połączenia z bazą danych (SUPABASE_URL/SUPABASE_KEY)")
+
+        prefer = "return=representation,missing=default"
+        params = [("columns", ",".join(dict.fromkeys(key for row in rows for key in row)))]
+        if on_conflict:
+            prefer = f"resolution=ignore-duplicates,{prefer}"
+            params.append(("on_conflict", on_conflict))
+        return await self._execute_query("POST", table, params, {"Prefer": prefer}, rows) or []
+
+    async def upsert_many(self, table: str, rows: List[Dict], on_conflict: str = "id",
+                          chunk_size: int = BULK_CHUNK_SIZE) -> List:
+        """
+        Wstawia lub aktualizuje wiele wierszy (INSERT ... ON CONFLICT DO UPDATE)
+
+        Args:
+            table: Nazwa tabeli
+            rows: Wiersze do zapisania
+            on_conflict: Kolumny unikalne rozstrzygające konflikt (rozdzielone przecinkami)
+            chunk_size: Maksymalna liczba wierszy w jednym zapytaniu
+
+        Returns:
+            List: Zapisane wiersze (przy błędzie - wiersze z paczek zapisanych przed błędem)
+        """
+        return await self._bulk_write(
+            table, rows, chunk_size, "resolution=merge-duplicates,return=representation,missing=default",
+            [("on_conflict", on_conflict)], retry=True
+        )
+
+    async def _bulk_write(self, table: str, rows: List[Dict], chunk_size: int, prefer: str,
+                          params: List, retry: bool) -> List:
+        """Wysyła wiersze paczkami jako tablice JSON (jedno zapytanie POST na paczkę)"""
+        if self.http is None:
+            logger.warning("Używam zastępczego klienta Supabase - brak połączenia z bazą danych")
+            return []
+
+        headers = {"Prefer": prefer}
+        if rows:
+            # PostgREST przyjmuje kolumny z pierwszego wiersza - podajemy wszystkie
+            columns = list(dict.fromkeys(key for row in rows for key in row))
+            params = params + [("columns", ",".join(columns))]
+
+        saved = []
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                if retry:
+                    result = await self._request_with_retry(self._execute_query, "POST", table, params, headers, chunk)
+                else:
+                    result = await self._execute_query("POST", table, params, headers, chunk)
+            except Exception as e:
+                logger.error(f"Błąd zapisu {len(chunk)} wierszy do {table} (zapisano {len(saved)} z {len(rows)}): {e}")
+                break
+            saved.extend(result or [])
+        return saved
+
+    async def rpc(self, function: str, params: Optional[Dict] = None, retry: bool = True) -> Any:
+        """
+        Wywołuje funkcję Postgres przez PostgREST (/rpc/<function>)
+
+        Args:
+            function: Nazwa funkcji w schemacie public
+            params: Argumenty funkcji
+            retry: Czy ponawiać wywołanie po błędzie - wyłącz dla funkcji
+                nieidempotentnych (np. zmieniających saldo kredytów)
+
+        Returns:
+            Any: Wynik funkcji (wartość skalarna lub lista wierszy), None w przypadku błędu
+        """
+        if self.http is None:
+            logger.warning("Używam zastępczego klienta Supabase - brak połączenia z bazą danych")
+            return None
+
+        try:
+            if not retry:
+                return await self._execute_query("POST", f"rpc/{function}", [], {}, params or {})
+            return await self._request_with_retry(
+                self._execute_query, "POST", f"rpc/{function}", [], {}, params or {}
+            )
+        except Exception as e:
+            logger.error(f"Błąd wywołania funkcji Supabase {function}: {e}")
+            return None
+
+    async def _execute_query(self, method: str, table: str, params: List, headers: Dict, data: Optional[Any]) -> Any:
+        """Wykonuje zapytanie HTTP do PostgREST bez blokowania pętli zdarzeń"""
+        response = await self.http.request(method, f"/{table}", params=params, headers=headers, json=data)
+        response.raise_for_status()
+
+        if not response.content:
+            return []
+        return response.json()
+
+    async def close(self):
+        """Zamyka pulę połączeń HTTP"""
+        if self.http is not None:
+            await self.http.aclose()
\ No newline at end of file
@@ -13,6 +13,50 @@ BOT_VERSION = "1.0.0"
 # Konfiguracja Telegram
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 
+# Tryb odbierania aktualizacji: "polling" (domyślny) lub "webhook"
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+
+# Konfiguracja webhooka - kilka procesów bota może działać za jednym load balancerem
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # Publiczny adres, np. https://bot.example.com/telegram
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN')  # Wymagany w trybie webhook (ten sam we wszystkich procesach)
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_SET_ON_START = os.getenv('WEBHOOK_SET_ON_START', 'true').lower() == 'true'
+WEBHOOK_DRAIN_TIMEOUT = 30  # Czas (w sekundach) na dokończenie obsługi aktualizacji przy zatrzymaniu
+
+# Trwały stan rozmów (tryb, model, język, menu...): "sqlite", "redis" lub "memory"
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'sqlite')
+STATE_SQLITE_PATH = os.getenv('STATE_SQLITE_PATH', 'bot_state.sqlite3')
+STATE_REDIS_URL = os.getenv('STATE_REDIS_URL', 'redis://localhost:6379/0')
+STATE_FLUSH_INTERVAL = float(os.getenv('STATE_FLUSH_INTERVAL', '10'))  # Co ile sekund zapisywać zmiany
+STATE_SHARED = os.getenv('STATE_SHARED', 'false').lower() == 'true'  # Kilka procesów bota na wspólnym magazynie
+
+# Kolejka zapisów w tle (logi wiadomości, liczniki) - zapisy zbiorcze poza ścieżką odpowiedzi
+WRITE_QUEUE_SPOOL_PATH = os.getenv('WRITE_QUEUE_SPOOL_PATH', 'write_queue.spool')  # Dziennik niezapisanych operacji
+WRITE_QUEUE_BATCH_SIZE = 500  # Maksymalna liczba wierszy w jednym zapisie zbiorczym
+WRITE_QUEUE_FLUSH_INTERVAL = float(os.getenv('WRITE_QUEUE_FLUSH_INTERVAL', '1'))  # Co ile sekund zapisywać kolejkę
+WRITE_QUEUE_MAX_BACKOFF = 60.0  # Maksymalna przerwa między ponowieniami po błędzie bazy
+
+# Wykresy analityki kredytów - renderowane w osobnych procesach, poza pętlą zdarzeń
+CHART_RENDER_WORKERS = int(os.getenv('CHART_RENDER_WORKERS', '2'))  # 0 = renderowanie w wątku
+CHART_CACHE_TTL = 3600.0  # Czas życia gotowego wykresu w cache (sekundy)
+
+# Eksport konwersacji do PDF - budowany w osobnych procesach, z wiadomościami
+# buforowanymi w pliku tymczasowym zamiast w pamięci
+PDF_EXPORT_WORKERS = int(os.getenv('PDF_EXPORT_WORKERS', '1'))  # 0 = budowanie w wątku
+
+# Prognoza zużycia kredytów, rekomendacje pakietów i przypomnienia o niskim saldzie -
+# przeliczane okresowo w tle z dziennych agregatów (credit_usage_daily)
+FORECAST_REFRESH_INTERVAL = float(os.getenv('FORECAST_REFRESH_INTERVAL', '3600'))  # Co ile sekund przeliczać
+FORECAST_HISTORY_DAYS = 56  # Historia wczytywana przy pierwszym przeliczeniu (8 tygodni)
+FORECAST_HALFLIFE_DAYS = 7.0  # Okres półtrwania średniej wykładniczej dziennego zużycia
+FORECAST_SEASON_HALFLIFE_WEEKS = 4.0  # Okres półtrwania profilu dni tygodnia
+FORECAST_HORIZON_DAYS = 365  # Najdłuższy okres prognozy wyczerpania kredytów
+FORECAST_LOW_BALANCE_DAYS = 3  # Przypomnienie, gdy kredyty skończą się w ciągu tylu dni
+LOW_CREDITS_THRESHOLD = 10  # Przypomnienie, gdy saldo spadnie do tej wartości
+CRITICAL_CREDITS_THRESHOLD = 3
+
 # Konfiguracja OpenAI
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 DEFAULT_MODEL = "gpt-4o"  # Domyślny model OpenAI
@@ -71,6 +115,21 @@ CREDIT_COSTS = {
     "photo": 8
 }
 
+# Kategorie operacji zapisywane przy pobraniu kredytów (credit_transactions.category)
+# wraz z kluczem tłumaczenia i domyślną nazwą wyświetlaną
+CREDIT_CATEGORIES = {
+    "message": ("messages_category", "Wiadomości"),
+    "image": ("images_category", "Obrazy"),
+    "document": ("documents_category", "Dokumenty"),
+    "photo": ("photos_category", "Zdjęcia"),
+    "other": ("other_category", "Inne")
+}
+# Kategoria agregatów dziennych dla doładowań (zakupy, bonusy, subskrypcje)
+CREDIT_CATEGORY_PURCHASE = "purchase"
+
+# Czas ważności rezerwacji kredytów (w sekundach) - po tym czasie obciążenie jest ostateczne
+CREDIT_HOLD_TTL_SECONDS = 300
+
 # Pakiety kredytów
 CREDIT_PACKAGES = [
     {"id": 1, "name": "Starter", "credits": 100, "price": 4.99},
@@ -221,6 +280,33 @@ MESSAGE_PLANS = {
 # Maksymalna długość kontekstu (historia konwersacji)
 MAX_CONTEXT_MESSAGES = 20
 
+# Budżet tokenów historii konwersacji wysyłanej do modelu - historia jest
+# przycinana od najstarszych wiadomości, a nie do stałej liczby wiadomości
+HISTORY_TOKEN_BUDGETS = {
+    "gpt-3.5-turbo": 8000,
+    "gpt-4": 4000,
+    "gpt-4o": 16000,
+    "o1": 16000,
+    "o3-mini": 16000,
+    
+    "claude-3-7-sonnet-20250219": 16000,
+    "claude-3-5-haiku-20241022": 16000,
+    "claude-3-opus-20240229": 16000,
+    "claude-3-5-sonnet-20241022": 16000,
+    "claude-3-5-sonnet-20240620": 16000,
+    "claude-3-haiku-20240307": 16000,
+    
+    "default": 4000
+}
+# Górny limit liczby wiadomości historii niezależnie od budżetu tokenów
+HISTORY_MAX_MESSAGES = 200
+
+# Podsumowanie starszych wiadomości konwersacji - gdy historia nie mieści się
+# w budżecie modelu, starsze tury są streszczane tańszym modelem
+SUMMARY_MODEL = os.getenv('SUMMARY_MODEL') or ("claude-3-5-haiku-20241022" if ANTHROPIC_API_KEY else "gpt-4o-mini")
+SUMMARY_MAX_TOKENS = 600  # Maksymalna długość podsumowania
+SUMMARY_KEEP_RATIO = 0.5  # Część budżetu historii zachowywana dosłownie po podsumowaniu
+
 # Program referencyjny
 REFERRAL_CREDITS = 50  # Kredyty za zaproszenie nowego użytkownika
 REFERRAL_BONUS = 25    # Bonus dla zaproszonego użytkownika
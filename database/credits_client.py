@@ -1,44 +1,43 @@
 # database/credits_client.py
-from services.api_service import APIService
-from services.repository_service import RepositoryService
+from services.api_service import get_api_service
+from services.repository_service import get_repository_service
 import logging
 
 logger = logging.getLogger(__name__)
 
 # Utworzenie globalnych instancji
-api_service = APIService()
-repository_service = RepositoryService(api_service.supabase)
+api_service = get_api_service()
+repository_service = get_repository_service()
 
 # Funkcje dla kompatybilności wstecznej
-def get_user_credits(user_id):
-    """Funkcja dla kompatybilności wstecznej - bez async/await"""
-    try:
-        # Bezpośrednie zapytanie do Supabase
-        response = api_service.supabase.client.table('user_credits').select('credits_amount').eq('user_id', user_id).execute()
-        
-        if response.data:
-            return response.data[0].get('credits_amount', 100)  # Domyślnie 100 kredytów
-        
-        # Inicjalizacja nowego użytkownika
-        api_service.supabase.client.table('user_credits').insert({
-            'user_id': user_id,
-            'credits_amount': 100,  # Każdy nowy użytkownik dostaje 100 kredytów
-            'total_credits_purchased': 0,
-            'total_spent': 0
-        }).execute()
-        
-        return 100  # Początkowa liczba kredytów
-    except Exception as e:
-        logger.error(f"Błąd przy pobieraniu kredytów: {e}")
-        return 100  # W razie błędu również zwróć 100
+async def get_user_credits(user_id):
+    """Funkcja dla kompatybilności wstecznej - saldo z cache lub bazy danych"""
+    # Każdy nowy użytkownik dostaje 100 kredytów
+    return await repository_service.credit_repository.get_user_credits(user_id, initial_credits=100)
+
+def invalidate_user_credits(user_id):
+    """Unieważnia saldo użytkownika w cache (np. po płatności Stripe)"""
+    repository_service.credit_repository.invalidate_user_credits(user_id)
 
 async def add_user_credits(user_id, amount, description=None):
     """Funkcja dla kompatybilności wstecznej"""
     return await repository_service.credit_repository.add_user_credits(user_id, amount, description)
 
-async def deduct_user_credits(user_id, amount, description=None):
+async def deduct_user_credits(user_id, amount, description=None, category=None):
     """Funkcja dla kompatybilności wstecznej"""
-    return await repository_service.credit_repository.deduct_user_credits(user_id, amount, description)
+    return await repository_service.credit_repository.deduct_user_credits(user_id, amount, description, category)
+
+async def reserve_credits(user_id, amount, description=None, category=None):
+    """Rezerwuje kredyty na czas operacji (zwraca CreditHold lub None)"""
+    return await repository_service.credit_repository.reserve_credits(user_id, amount, description, category=category)
+
+async def settle_credits(hold, actual_amount=None):
+    """Rozlicza rezerwację kredytów"""
+    return await repository_service.credit_repository.settle_credits(hold, actual_amount)
+
+async def release_credits(hold):
+    """Zwalnia rezerwację kredytów"""
+    return await repository_service.credit_repository.release_credits(hold)
 
 async def check_user_credits(user_id, amount_needed):
     """Funkcja dla kompatybilności wstecznej"""
@@ -52,6 +51,10 @@ async def get_package_by_id(package_id):
     """Funkcja dla kompatybilności wstecznej"""
     return await repository_service.credit_repository.get_package_by_id(package_id)
 
+def invalidate_credit_packages():
+    """Unieważnia katalog pakietów kredytów w cache (po zmianach administratora)"""
+    repository_service.credit_repository.invalidate_credit_packages()
+
 async def purchase_credits(user_id, package_id):
     """Funkcja dla kompatybilności wstecznej"""
     return await repository_service.credit_repository.purchase_credits(user_id, package_id)
@@ -68,6 +71,14 @@ async def get_credit_usage_by_type(user_id, days=30):
     """Funkcja dla kompatybilności wstecznej"""
     return await repository_service.credit_repository.get_usage_by_type(user_id, days)
 
+async def get_daily_credit_usage(user_id, days=30):
+    """Pobiera dzienne agregaty zużycia kredytów (user_id, day, category)"""
+    return await repository_service.credit_repository.get_daily_usage(user_id, days)
+
+async def has_credit_transaction(user_id, description):
+    """Sprawdza, czy użytkownik ma transakcję o podanym opisie"""
+    return await repository_service.credit_repository.has_transaction(user_id, description)
+
 async def add_stars_payment_option(stars_count, credits_amount):
     """Funkcja dla kompatybilności wstecznej"""
     # Ta funkcja może nie mieć bezpośredniego odpowiednika w repository
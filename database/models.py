@@ -69,6 +69,8 @@ class Conversation:
     user_id: int = 0
     created_at: Optional[datetime] = None
     last_message_at: Optional[datetime] = None
+    summary: Optional[str] = None
+    summary_message_id: Optional[int] = None
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Conversation':
@@ -76,7 +78,7 @@ class Conversation:
         # Usuń niewspierane pola (jak theme_id) przed utworzeniem obiektu
         filtered_data = {}
         for key, value in data.items():
-            if key in ['id', 'user_id', 'created_at', 'last_message_at']:
+            if key in ['id', 'user_id', 'created_at', 'last_message_at', 'summary', 'summary_message_id']:
                 filtered_data[key] = value
         
         # Konwersja pól datetime z ISO string
@@ -99,6 +101,7 @@ class Message:
     is_from_user: bool = True
     model_used: Optional[str] = None
     created_at: Optional[datetime] = None
+    client_id: Optional[str] = None  # Klucz nadany przez kolejkę zapisów (bezpieczne ponowienia)
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Message':
@@ -132,4 +135,22 @@ class PromptTemplate:
                     data['created_at'].replace('Z', '+00:00')
                 )
         
-        return cls(**data)
\ No newline at end of file
+        return cls(**data)
+
+@dataclass
+class CreditHold:
+    """Model rezerwacji kredytów"""
+    id: int
+    user_id: int
+    amount: int
+    credits_after: int = 0
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CreditHold':
+        """Tworzy obiekt CreditHold z wyniku funkcji reserve_credits"""
+        return cls(
+            id=data['hold_id'],
+            user_id=data['user_id'],
+            amount=data['amount'],
+            credits_after=data.get('credits_after', 0)
+        )
\ No newline at end of file
@@ -1,12 +1,14 @@
 """
 Moduł do zarządzania płatnościami - adapter dla Supabase
 """
+import asyncio
 import logging
 import os
-import json
-import requests
+import httpx
 from typing import Dict, List, Optional, Any, Tuple
-from datetime import datetime, timedelta
+from datetime import datetime
+from api.base_client import APIClient
+from utils.cache import catalog_cache
 
 logger = logging.getLogger(__name__)
 
@@ -15,284 +17,326 @@ SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 TELEGRAM_BOT_USERNAME = os.getenv('TELEGRAM_BOT_USERNAME', 'mypremium_bot')
 
-def get_available_payment_methods(user_language: str) -> List[Dict[str, Any]]:
-    """
-    Pobiera dostępne metody płatności dla określonego języka użytkownika
-    
-    Args:
-        user_language (str): Język użytkownika (pl, en, ru)
-    
-    Returns:
-        List[Dict]: Lista metod płatności dostępnych dla użytkownika
-    """
-    try:
-        # Określ, które metody są dostępne na podstawie języka
-        language_filter = ''
-        if user_language == 'pl':
-            language_filter = 'is_available_pl'
-        elif user_language == 'en':
-            language_filter = 'is_available_en'
-        elif user_language == 'ru':
-            language_filter = 'is_available_ru'
-        else:
-            language_filter = 'is_available_pl'  # domyślnie pl
-            
-        # Pobierz metody płatności z Supabase
-        response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/payment_methods?select=*&{language_filter}=eq.true&is_active=eq.true",
-            headers={
-                "apikey": SUPABASE_KEY,
-                "Authorization": f"Bearer {SUPABASE_KEY}"
-            }
-        )
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            logger.error(f"Błąd podczas pobierania metod płatności: {response.text}")
-            return []
-    except Exception as e:
-        logger.error(f"Wyjątek podczas pobierania metod płatności: {e}")
-        return []
-
-def create_payment_url(
-    user_id: int, 
-    package_id: int, 
-    payment_method_code: str, 
-    is_subscription: bool = False
-) -> Tuple[bool, str]:
+# Limity puli połączeń i czasy oczekiwania - użytkownik czeka na odpowiedź w menu,
+# więc zapytanie nie może wisieć dłużej niż kilka sekund
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY = 30.0
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 15.0
+
+# Ponawianie odczytów po błędach połączenia, przekroczeniu czasu i błędach 5xx
+# (wywołania Edge Functions tworzą sesje płatności i nie są ponawiane)
+MAX_RETRIES = 3
+RETRY_DELAY = 0.5
+
+# Klucz katalogu metod płatności w cache
+PAYMENT_METHODS_TABLE = "payment_methods"
+
+# Kolumna dostępności metody płatności dla języka użytkownika
+LANGUAGE_FILTERS = {
+    'pl': 'is_available_pl',
+    'en': 'is_available_en',
+    'ru': 'is_available_ru'
+}
+
+class PaymentClient(APIClient):
     """
-    Tworzy URL do płatności dla określonej metody płatności
+    Asynchroniczny klient płatności (PostgREST i Edge Functions Supabase)
+    ze współdzieloną pulą połączeń keep-alive
+
+    Adres bazowy i transport można podać wprost, np. lokalny serwer testowy
+    albo httpx.MockTransport.
     """
-    try:
-        # Obsługa różnych metod płatności
-        if payment_method_code == 'stripe':
-            return create_stripe_payment(user_id, package_id, is_subscription=False)
-        elif payment_method_code == 'stripe_subscription':
-            result = create_stripe_payment(user_id, package_id, is_subscription=True)
-            logger.info(f"Wynik tworzenia subskrypcji Stripe: {result}")
-            return result
-        elif payment_method_code in ['allegro', 'russia_payment']:
-            # Dla metod zewnętrznych pobierz URL z bazy danych
-            response = requests.get(
-                f"{SUPABASE_URL}/rest/v1/payment_methods?code=eq.{payment_method_code}",
+
+    def __init__(self, url: Optional[str], key: Optional[str], bot_username: str = TELEGRAM_BOT_USERNAME,
+                 timeout: httpx.Timeout = httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                 transport: Optional[httpx.AsyncBaseTransport] = None,
+                 max_retries: int = MAX_RETRIES, retry_delay: float = RETRY_DELAY):
+        super().__init__(max_retries, retry_delay)
+        self.bot_username = bot_username
+        self.http = None
+        self._catalog_lock = asyncio.Lock()
+        if url:
+            self.http = httpx.AsyncClient(
+                base_url=url.rstrip('/'),
                 headers={
-                    "apikey": SUPABASE_KEY,
-                    "Authorization": f"Bearer {SUPABASE_KEY}"
-                }
+                    "apikey": key or "",
+                    "Authorization": f"Bearer {key or ''}"
+                },
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=KEEPALIVE_EXPIRY
+                ),
+                timeout=timeout,
+                transport=transport
             )
-            
-            if response.status_code == 200 and response.json():
-                payment_method = response.json()[0]
-                if payment_method['external_url']:
-                    return True, payment_method['external_url']
-                else:
-                    return False, "Brak URL dla tej metody płatności."
-            else:
-                return False, "Nie znaleziono metody płatności."
         else:
-            # Domyślna obsługa nieznanych metod
-            logger.warning(f"Nieobsługiwana metoda płatności: {payment_method_code}")
-            return False, "Nieobsługiwana metoda płatności."
-    except Exception as e:
-        logger.error(f"Wyjątek podczas tworzenia URL płatności: {e}")
-        return False, f"Wystąpił błąd: {str(e)}"
-
-def create_stripe_payment(user_id: int, package_id: int, is_subscription: bool = False) -> Tuple[bool, str]:
-    """
-    Tworzy sesję płatności Stripe
-    
-    Args:
-        user_id (int): ID użytkownika
-        package_id (int): ID pakietu kredytów
-        is_subscription (bool): Czy to jest subskrypcja
-    
-    Returns:
-        Tuple[bool, str]: (Czy operacja się powiodła, URL do płatności lub komunikat błędu)
-    """
-    try:
-        # Definiujemy URL sukcesu i anulowania
-        base_url = f"https://t.me/{TELEGRAM_BOT_USERNAME}?start="
-        success_url = f"{base_url}payment_success_{user_id}"
-        cancel_url = f"{base_url}payment_cancel_{user_id}"
-        
-        # Wybierz odpowiednią Edge Function w zależności od typu płatności
-        function_name = "stripe-subscription" if is_subscription else "stripe-payment"
-        
-        # Wywołaj Edge Function
-        response = requests.post(
-            f"{SUPABASE_URL}/functions/v1/{function_name}",
-            json={
+            logger.warning("Brak SUPABASE_URL - operacje płatności będą zwracać puste wyniki")
+
+    async def _get(self, path: str, params: Dict[str, Any]) -> httpx.Response:
+        """Wykonuje GET; błędy serwera (5xx) są zgłaszane jako wyjątki, aby odczyt został ponowiony"""
+        response = await self.http.get(path, params=params)
+        if response.status_code >= 500:
+            response.raise_for_status()
+        return response
+
+    async def select(self, table: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Pobiera wiersze tabeli (params w składni PostgREST); zwraca pustą listę przy błędzie"""
+        if self.http is None:
+            return []
+        try:
+            response = await self._request_with_retry(self._get, f"/rest/v1/{table}", params)
+        except httpx.HTTPError as e:
+            logger.error(f"Błąd połączenia podczas pobierania {table}: {e!r}")
+            return []
+        if response.status_code != 200:
+            logger.error(f"Błąd podczas pobierania {table}: {response.text}")
+            return []
+        return response.json()
+
+    async def call_function(self, name: str, payload: Dict[str, Any]) -> httpx.Response:
+        """Wywołuje Edge Function Supabase (błędy połączenia są zgłaszane jako wyjątki)"""
+        if self.http is None:
+            raise RuntimeError("Brak konfiguracji Supabase")
+        return await self.http.post(f"/functions/v1/{name}", json=payload)
+
+    async def get_payment_method_catalog(self) -> Dict[int, Dict[str, Any]]:
+        """
+        Zwraca wszystkie metody płatności (id -> metoda) z cache lub bazy danych
+
+        Zwrócone słowniki są współdzielone przez cache i nie mogą być modyfikowane.
+        """
+        catalog = catalog_cache.get(PAYMENT_METHODS_TABLE)
+        if catalog is not None:
+            return catalog
+
+        # Jedno zapytanie do bazy nawet przy wielu równoczesnych chybieniach
+        async with self._catalog_lock:
+            catalog = catalog_cache.get(PAYMENT_METHODS_TABLE)
+            if catalog is None:
+                methods = await self.select(PAYMENT_METHODS_TABLE, {"select": "*", "order": "id"})
+                catalog = {method['id']: method for method in methods}
+                # Pusty wynik może oznaczać błąd bazy - nie zapamiętujemy go
+                if catalog:
+                    catalog_cache.set(PAYMENT_METHODS_TABLE, catalog)
+            return catalog
+
+    async def get_available_payment_methods(self, user_language: str) -> List[Dict[str, Any]]:
+        """
+        Pobiera dostępne metody płatności dla określonego języka użytkownika
+
+        Args:
+            user_language (str): Język użytkownika (pl, en, ru)
+
+        Returns:
+            List[Dict]: Lista metod płatności dostępnych dla użytkownika
+        """
+        language_filter = LANGUAGE_FILTERS.get(user_language, 'is_available_pl')  # domyślnie pl
+        catalog = await self.get_payment_method_catalog()
+        return [
+            method for method in catalog.values()
+            if method.get(language_filter) and method.get('is_active')
+        ]
+
+    async def create_payment_url(self, user_id: int, package_id: int, payment_method_code: str,
+                                 is_subscription: bool = False) -> Tuple[bool, str]:
+        """Tworzy URL do płatności dla określonej metody płatności"""
+        try:
+            # Obsługa różnych metod płatności
+            if payment_method_code == 'stripe':
+                return await self.create_stripe_payment(user_id, package_id, is_subscription=False)
+            elif payment_method_code == 'stripe_subscription':
+                result = await self.create_stripe_payment(user_id, package_id, is_subscription=True)
+                logger.info(f"Wynik tworzenia subskrypcji Stripe: {result}")
+                return result
+            elif payment_method_code in ['allegro', 'russia_payment']:
+                # Dla metod zewnętrznych URL pochodzi z katalogu metod płatności
+                catalog = await self.get_payment_method_catalog()
+                method = next((m for m in catalog.values() if m.get('code') == payment_method_code), None)
+                if method is None:
+                    return False, "Nie znaleziono metody płatności."
+                if method.get('external_url'):
+                    return True, method['external_url']
+                return False, "Brak URL dla tej metody płatności."
+            else:
+                # Domyślna obsługa nieznanych metod
+                logger.warning(f"Nieobsługiwana metoda płatności: {payment_method_code}")
+                return False, "Nieobsługiwana metoda płatności."
+        except Exception as e:
+            logger.error(f"Wyjątek podczas tworzenia URL płatności: {e}")
+            return False, f"Wystąpił błąd: {str(e)}"
+
+    async def create_stripe_payment(self, user_id: int, package_id: int,
+                                    is_subscription: bool = False) -> Tuple[bool, str]:
+        """
+        Tworzy sesję płatności Stripe
+
+        Args:
+            user_id (int): ID użytkownika
+            package_id (int): ID pakietu kredytów
+            is_subscription (bool): Czy to jest subskrypcja
+
+        Returns:
+            Tuple[bool, str]: (Czy operacja się powiodła, URL do płatności lub komunikat błędu)
+        """
+        try:
+            # Definiujemy URL sukcesu i anulowania
+            base_url = f"https://t.me/{self.bot_username}?start="
+
+            # Wybierz odpowiednią Edge Function w zależności od typu płatności
+            function_name = "stripe-subscription" if is_subscription else "stripe-payment"
+
+            response = await self.call_function(function_name, {
                 "user_id": user_id,
                 "package_id": package_id,
-                "success_url": success_url,
-                "cancel_url": cancel_url
-            },
-            headers={
-                "Authorization": f"Bearer {SUPABASE_KEY}",
-                "Content-Type": "application/json"
-            }
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            if 'url' in data:
-                return True, data['url']
-            else:
+                "success_url": f"{base_url}payment_success_{user_id}",
+                "cancel_url": f"{base_url}payment_cancel_{user_id}"
+            })
+
+            if response.status_code == 200:
+                data = response.json()
+                if 'url' in data:
+                    return True, data['url']
                 return False, "Błąd: brak URL w odpowiedzi."
-        else:
             return False, f"Błąd podczas tworzenia sesji płatności: {response.text}"
-    except Exception as e:
-        logger.error(f"Wyjątek podczas tworzenia sesji płatności Stripe: {e}")
-        return False, f"Wystąpił błąd: {str(e)}"
+        except Exception as e:
+            logger.error(f"Wyjątek podczas tworzenia sesji płatności Stripe: {e}")
+            return False, f"Wystąpił błąd: {str(e)}"
 
-def get_user_subscriptions(user_id: int) -> List[Dict[str, Any]]:
-    """
-    Pobiera aktywne subskrypcje użytkownika
-    
-    Args:
-        user_id (int): ID użytkownika
-    
-    Returns:
-        List[Dict]: Lista aktywnych subskrypcji
-    """
-    try:
-        response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/subscriptions?user_id=eq.{user_id}&status=eq.active",
-            headers={
-                "apikey": SUPABASE_KEY,
-                "Authorization": f"Bearer {SUPABASE_KEY}"
-            }
-        )
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            logger.error(f"Błąd podczas pobierania subskrypcji: {response.text}")
-            return []
-    except Exception as e:
-        logger.error(f"Wyjątek podczas pobierania subskrypcji: {e}")
-        return []
+    async def get_user_subscriptions(self, user_id: int) -> List[Dict[str, Any]]:
+        """Pobiera aktywne subskrypcje użytkownika"""
+        return await self.select("subscriptions", {"user_id": f"eq.{user_id}", "status": "eq.active"})
 
-def cancel_subscription(subscription_id: int) -> bool:
-    """
-    Anuluje subskrypcję użytkownika
-    
-    Args:
-        subscription_id (int): ID subskrypcji w bazie danych
-    
-    Returns:
-        bool: Czy udało się anulować subskrypcję
-    """
-    try:
-        # Pobierz dane subskrypcji
-        response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/subscriptions?id=eq.{subscription_id}",
-            headers={
-                "apikey": SUPABASE_KEY,
-                "Authorization": f"Bearer {SUPABASE_KEY}"
-            }
-        )
-        
-        if response.status_code != 200 or not response.json():
-            logger.error(f"Nie znaleziono subskrypcji o ID {subscription_id}")
-            return False
-        
-        subscription = response.json()[0]
-        external_subscription_id = subscription['external_subscription_id']
-        
-        # Anuluj subskrypcję w Stripe
-        if subscription['payment_method_id'] in [1, 2]:  # Stripe lub Stripe Subskrypcja
-            # Wywołaj Edge Function do anulowania subskrypcji
-            cancel_response = requests.post(
-                f"{SUPABASE_URL}/functions/v1/stripe-cancel-subscription",
-                json={"subscription_id": external_subscription_id},
-                headers={
-                    "Authorization": f"Bearer {SUPABASE_KEY}",
-                    "Content-Type": "application/json"
-                }
-            )
-            
-            if cancel_response.status_code != 200:
-                logger.error(f"Błąd podczas anulowania subskrypcji w Stripe: {cancel_response.text}")
+    async def cancel_subscription(self, subscription_id: int) -> bool:
+        """
+        Anuluje subskrypcję użytkownika
+
+        Args:
+            subscription_id (int): ID subskrypcji w bazie danych
+
+        Returns:
+            bool: Czy udało się anulować subskrypcję
+        """
+        try:
+            subscriptions = await self.select("subscriptions", {"id": f"eq.{subscription_id}"})
+            if not subscriptions:
+                logger.error(f"Nie znaleziono subskrypcji o ID {subscription_id}")
                 return False
-        
-        # Aktualizuj status subskrypcji w bazie danych
-        update_response = requests.patch(
-            f"{SUPABASE_URL}/rest/v1/subscriptions?id=eq.{subscription_id}",
-            json={
-                "status": "cancelled",
-                "end_date": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat()
-            },
-            headers={
-                "apikey": SUPABASE_KEY,
-                "Authorization": f"Bearer {SUPABASE_KEY}",
-                "Content-Type": "application/json",
-                "Prefer": "return=minimal"
-            }
-        )
-        
-        return update_response.status_code == 204
-    except Exception as e:
-        logger.error(f"Wyjątek podczas anulowania subskrypcji: {e}")
-        return False
 
-def get_payment_transactions(user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-    """
-    Pobiera historię transakcji płatności użytkownika
-    
-    Args:
-        user_id (int): ID użytkownika
-        limit (int): Maksymalna liczba transakcji do pobrania
-    
-    Returns:
-        List[Dict]: Lista transakcji
-    """
-    try:
-        # Pobierz transakcje z Supabase
-        response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/payment_transactions?user_id=eq.{user_id}&order=created_at.desc&limit={limit}",
-            headers={
-                "apikey": SUPABASE_KEY,
-                "Authorization": f"Bearer {SUPABASE_KEY}"
-            }
-        )
-        
-        if response.status_code == 200:
-            transactions = response.json()
-            
-            # Pobierz dane pakietów i metod płatności
-            packages_response = requests.get(
-                f"{SUPABASE_URL}/rest/v1/credit_packages",
-                headers={
-                    "apikey": SUPABASE_KEY,
-                    "Authorization": f"Bearer {SUPABASE_KEY}"
-                }
-            )
-            
-            methods_response = requests.get(
-                f"{SUPABASE_URL}/rest/v1/payment_methods",
-                headers={
-                    "apikey": SUPABASE_KEY,
-                    "Authorization": f"Bearer {SUPABASE_KEY}"
-                }
+            subscription = subscriptions[0]
+
+            # Anuluj subskrypcję w Stripe
+            if subscription['payment_method_id'] in [1, 2]:  # Stripe lub Stripe Subskrypcja
+                cancel_response = await self.call_function(
+                    "stripe-cancel-subscription",
+                    {"subscription_id": subscription['external_subscription_id']}
+                )
+                if cancel_response.status_code != 200:
+                    logger.error(f"Błąd podczas anulowania subskrypcji w Stripe: {cancel_response.text}")
+                    return False
+
+            # Aktualizuj status subskrypcji w bazie danych
+            now = datetime.now().isoformat()
+            update_response = await self.http.patch(
+                "/rest/v1/subscriptions",
+                params={"id": f"eq.{subscription_id}"},
+                json={"status": "cancelled", "end_date": now, "updated_at": now},
+                headers={"Prefer": "return=minimal"}
             )
-            
-            packages = {p['id']: p for p in packages_response.json()} if packages_response.status_code == 200 else {}
-            methods = {m['id']: m for m in methods_response.json()} if methods_response.status_code == 200 else {}
-            
-            # Wzbogać dane transakcji
-            for t in transactions:
-                t['package_name'] = packages.get(t['credit_package_id'], {}).get('name', 'Nieznany pakiet')
-                t['package_credits'] = packages.get(t['credit_package_id'], {}).get('credits', 0)
-                t['payment_method_name'] = methods.get(t['payment_method_id'], {}).get('name', 'Nieznana metoda')
-                t['payment_method_code'] = methods.get(t['payment_method_id'], {}).get('code', '')
-            
-            return transactions
-        else:
-            logger.error(f"Błąd podczas pobierania transakcji: {response.text}")
-            return []
-    except Exception as e:
-        logger.error(f"Wyjątek podczas pobierania transakcji: {e}")
-        return []
\ No newline at end of file
+            return update_response.status_code == 204
+        except Exception as e:
+            logger.error(f"Wyjątek podczas anulowania subskrypcji: {e}")
+            return False
+
+    async def get_payment_transactions(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Pobiera historię transakcji płatności użytkownika
+
+        Nazwy pakietów i metod płatności pochodzą z katalogów w cache,
+        a przy ich braku są pobierane równolegle z transakcjami.
+
+        Args:
+            user_id (int): ID użytkownika
+            limit (int): Maksymalna liczba transakcji do pobrania
+
+        Returns:
+            List[Dict]: Lista transakcji
+        """
+        from services.repository_service import get_repository_service
+
+        transactions, packages, methods = await asyncio.gather(
+            self.select("payment_transactions", {
+                "user_id": f"eq.{user_id}", "order": "created_at.desc", "limit": limit
+            }),
+            get_repository_service().credit_repository.get_package_catalog(),
+            self.get_payment_method_catalog()
+        )
+
+        # Wzbogać dane transakcji
+        for t in transactions:
+            package = packages.get(t.get('credit_package_id'), {})
+            method = methods.get(t.get('payment_method_id'), {})
+            t['package_name'] = package.get('name', 'Nieznany pakiet')
+            t['package_credits'] = package.get('credits', 0)
+            t['payment_method_name'] = method.get('name', 'Nieznana metoda')
+            t['payment_method_code'] = method.get('code', '')
+
+        return transactions
+
+    async def close(self):
+        """Zamyka pulę połączeń HTTP"""
+        if self.http is not None:
+            await self.http.aclose()
+
+_payment_client = None
+
+def get_payment_client() -> PaymentClient:
+    """Zwraca współdzielonego klienta płatności (jeden na proces)"""
+    global _payment_client
+    if _payment_client is None or (_payment_client.http is not None and _payment_client.http.is_closed):
+        _payment_client = PaymentClient(SUPABASE_URL, SUPABASE_KEY)
+    return _payment_client
+
+async def close_payment_client():
+    """Zamyka współdzielonego klienta płatności"""
+    global _payment_client
+    if _payment_client is not None:
+        await _payment_client.close()
+        _payment_client = None
+
+def invalidate_payment_methods():
+    """Unieważnia katalog metod płatności w cache (po zmianie metod w bazie)"""
+    catalog_cache.invalidate(PAYMENT_METHODS_TABLE)
+
+# Funkcje dla kompatybilności wstecznej
+
+async def get_available_payment_methods(user_language: str) -> List[Dict[str, Any]]:
+    """Pobiera dostępne metody płatności dla określonego języka użytkownika"""
+    return await get_payment_client().get_available_payment_methods(user_language)
+
+async def create_payment_url(
+    user_id: int,
+    package_id: int,
+    payment_method_code: str,
+    is_subscription: bool = False
+) -> Tuple[bool, str]:
+    """Tworzy URL do płatności dla określonej metody płatności"""
+    return await get_payment_client().create_payment_url(user_id, package_id, payment_method_code, is_subscription)
+
+async def create_stripe_payment(user_id: int, package_id: int, is_subscription: bool = False) -> Tuple[bool, str]:
+    """Tworzy sesję płatności Stripe"""
+    return await get_payment_client().create_stripe_payment(user_id, package_id, is_subscription)
+
+async def get_user_subscriptions(user_id: int) -> List[Dict[str, Any]]:
+    """Pobiera aktywne subskrypcje użytkownika"""
+    return await get_payment_client().get_user_subscriptions(user_id)
+
+async def cancel_subscription(subscription_id: int) -> bool:
+    """Anuluje subskrypcję użytkownika"""
+    return await get_payment_client().cancel_subscription(subscription_id)
+
+async def get_payment_transactions(user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+    """Pobiera historię transakcji płatności użytkownika"""
+    return await get_payment_client().get_payment_transactions(user_id, limit)
\ No newline at end of file
@@ -1,16 +1,18 @@
 # database/supabase_client.py
-from services.api_service import APIService
-from services.repository_service import RepositoryService
+from services.api_service import get_api_service
+from services.repository_service import get_repository_service
 from database.models import Conversation, Message
 import logging
 from database.credits_client import get_user_credits
+from utils.tokens import get_history_token_budget
 
 # Utworzenie globalnych instancji
-api_service = APIService()
-repository_service = RepositoryService(api_service.supabase)
+api_service = get_api_service()
+repository_service = get_repository_service()
 
 # Zmienne dla kompatybilności wstecznej
 supabase = api_service.supabase.client  # Dla bezpośredniego dostępu, jeśli potrzebne
+supabase_api = api_service.supabase  # Asynchroniczny klient (query) - nie blokuje pętli zdarzeń
 logger = logging.getLogger(__name__)
 
 # Funkcje dla kompatybilności wstecznej
@@ -26,6 +28,10 @@ async def create_new_conversation(user_id):
     """Funkcja dla kompatybilności wstecznej"""
     return await repository_service.conversation_repository.create_new_conversation(user_id)
 
+async def purge_conversation_history(user_id, keep_conversation_id=None):
+    """Usuwa historię rozmów użytkownika (poza wskazaną konwersacją) i zwraca liczbę usuniętych wierszy"""
+    return await repository_service.conversation_repository.purge_history(user_id, keep_conversation_id)
+
 async def save_message(conversation_id, user_id, content, is_from_user=True, model_used=None):
     """Funkcja dla kompatybilności wstecznej"""
     return await repository_service.message_repository.save_message(conversation_id, user_id, content, is_from_user, model_used)
@@ -34,10 +40,34 @@ async def get_conversation_history(conversation_id, limit=20):
     """Funkcja dla kompatybilności wstecznej"""
     return await repository_service.message_repository.get_conversation_history(conversation_id, limit)
 
+def iter_conversation_messages(conversation_id):
+    """Zwraca kolejne strony wszystkich wiadomości konwersacji chronologicznie (eksport)"""
+    return repository_service.message_repository.iter_messages(conversation_id)
+
+async def queue_message(conversation_id, user_id, content, is_from_user=True, model_used=None):
+    """Zapisuje wiadomość w tle, bez czekania na bazę danych (kolejka zapisów)"""
+    return await repository_service.message_repository.queue_message(conversation_id, user_id, content, is_from_user, model_used)
+
+async def get_recent_history(conversation_id, model=None):
+    """Pobiera najnowsze wiadomości konwersacji mieszczące się w budżecie tokenów modelu"""
+    return await repository_service.message_repository.get_recent_history(
+        conversation_id, token_budget=get_history_token_budget(model)
+    )
+
+async def get_context_messages(conversation_id, model=None):
+    """Zwraca historię konwersacji jako wiadomości dla API modelu (z okna kontekstu w pamięci)"""
+    return await repository_service.message_repository.get_context_messages(
+        conversation_id, token_budget=get_history_token_budget(model)
+    )
+
 async def increment_messages_used(user_id):
     """Funkcja dla kompatybilności wstecznej"""
     return await repository_service.user_repository.increment_messages_used(user_id)
 
+async def queue_increment_messages_used(user_id):
+    """Zwiększa licznik wykorzystanych wiadomości w tle (kolejka zapisów)"""
+    return await repository_service.user_repository.queue_messages_used_increment(user_id)
+
 async def update_user_language(user_id, language):
     """Funkcja dla kompatybilności wstecznej"""
     return await repository_service.user_repository.update_language(user_id, language)
@@ -66,6 +96,14 @@ async def get_credit_usage_by_type(user_id, days=30):
     """Funkcja dla kompatybilności wstecznej"""
     return await repository_service.credit_repository.get_usage_by_type(user_id, days)
 
+async def get_daily_credit_usage(user_id, days=30):
+    """Pobiera dzienne agregaty zużycia kredytów (user_id, day, category)"""
+    return await repository_service.credit_repository.get_daily_usage(user_id, days)
+
+async def get_last_credit_transaction_id(user_id):
+    """Zwraca ID ostatniej transakcji kredytowej użytkownika"""
+    return await repository_service.credit_repository.get_last_transaction_id(user_id)
+
 # Wycofane funkcje związane z tematami - zastąpione prostymi implementacjami
 async def create_conversation_theme(user_id, theme_name):
     """Wycofana funkcja - zwraca None"""
@@ -9,6 +9,31 @@ from utils.user_utils import get_user_language
 # Lista ID administratorów bota - tutaj należy dodać swoje ID
 from config import ADMIN_USER_IDS  # Zastąp swoim ID użytkownika Telegram
 
+async def cache_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Wyświetla statystyki trafień cache (saldo kredytów, język)
+    Tylko dla administratorów
+    Użycie: /cachestats
+    """
+    user_id = update.effective_user.id
+    language = get_user_language(context, user_id)
+    
+    # Sprawdź, czy użytkownik jest administratorem
+    if user_id not in ADMIN_USER_IDS:
+        await update.message.reply_text(get_text("no_permission", language, default="Nie masz uprawnień do tej komendy."))
+        return
+    
+    from utils.cache import get_cache_stats
+    
+    lines = ["*Cache:*"]
+    for stats in get_cache_stats():
+        lines.append(
+            f"`{stats['name']}`: {stats['hit_rate']:.1%} "
+            f"({stats['hits']}/{stats['hits'] + stats['misses']}), {stats['size']} wpisów"
+        )
+    
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+
 async def get_user_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Pobiera informacje o użytkowniku
@@ -35,15 +60,15 @@ async def get_user_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Pobierz informacje o użytkowniku
-    from database.supabase_client import supabase
+    from database.supabase_client import supabase_api
     
-    response = supabase.table('users').select('*').eq('id', target_user_id).execute()
+    result = await supabase_api.query('users', filters={'id': target_user_id})
     
-    if not response.data:
+    if not result:
         await update.message.reply_text(get_text("user_not_exists", language, default="Użytkownik nie istnieje w bazie danych."))
         return
     
-    user_data = response.data[0]
+    user_data = result[0]
     
     # Formatuj dane
     subscription_end = user_data.get('subscription_end_date', get_text("no_subscription", language, default="Brak subskrypcji"))
@@ -5,6 +5,7 @@ from telegram.constants import ParseMode
 from config import ADMIN_USER_IDS, CREDIT_PACKAGES
 from utils.translations import get_text
 from utils.user_utils import get_user_language
+from database.credits_client import invalidate_credit_packages
 
 async def add_package(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -85,6 +86,9 @@ async def add_package(update: Update, context: ContextTypes.DEFAULT_TYPE):
             }).execute()
             message = get_text("package_added", language, name=name, default=f"✅ Dodano nowy pakiet: *{name}*")
         
+        # Menu zakupu pobierają pakiety z cache - wymuś odświeżenie
+        invalidate_credit_packages()
+        
         # Potwierdź operację
         await update.message.reply_text(
             f"{message}\n\n" +
@@ -182,6 +186,7 @@ async def toggle_package(update: Update, context: ContextTypes.DEFAULT_TYPE):
         supabase.table('credit_packages').update({
             'is_active': new_status
         }).eq('id', package_id).execute()
+        invalidate_credit_packages()
         
         status_text = get_text("status_active", language, default="aktywny") if new_status else get_text("status_inactive", language, default="nieaktywny")
         await update.message.reply_text(
@@ -210,34 +215,34 @@ async def add_default_packages(update: Update, context: ContextTypes.DEFAULT_TYP
         # Pobierz pakiety z config.py
         packages = CREDIT_PACKAGES
         
-        # Dodaj każdy pakiet do bazy danych
-        from database.supabase_client import supabase
-        added_count = 0
-        updated_count = 0
-        
-        for package in packages:
-            # Sprawdź czy pakiet już istnieje
-            response = supabase.table('credit_packages').select('*').eq('id', package['id']).execute()
-            
-            if response.data:
-                # Aktualizuj istniejący pakiet
-                supabase.table('credit_packages').update({
-                    'name': package['name'],
-                    'credits': package['credits'],
-                    'price': package['price'],
-                    'is_active': True
-                }).eq('id', package['id']).execute()
-                updated_count += 1
-            else:
-                # Dodaj nowy pakiet
-                supabase.table('credit_packages').insert({
-                    'id': package['id'],
-                    'name': package['name'],
-                    'credits': package['credits'],
-                    'price': package['price'],
-                    'is_active': True
-                }).execute()
-                added_count += 1
+        # Dodaj wszystkie pakiety do bazy danych - jedno zapytanie o istniejące
+        # pakiety i jeden zbiorczy zapis (insert lub update po id)
+        from database.supabase_client import supabase_api
+        package_ids = [package['id'] for package in packages]
+        
+        existing = await supabase_api.query(
+            'credit_packages',
+            columns='id',
+            range_filters=[('id', 'in', package_ids)]
+        )
+        existing_ids = {row['id'] for row in existing}
+        
+        saved = await supabase_api.upsert_many('credit_packages', [
+            {
+                'id': package['id'],
+                'name': package['name'],
+                'credits': package['credits'],
+                'price': package['price'],
+                'is_active': True
+            }
+            for package in packages
+        ])
+        invalidate_credit_packages()
+        if len(saved) < len(packages):
+            raise Exception(f"zapisano {len(saved)} z {len(packages)} pakietów")
+        
+        updated_count = len(existing_ids)
+        added_count = len(packages) - updated_count
         
         await update.message.reply_text(
             get_text("default_packages_added", language, added=added_count, updated=updated_count, 
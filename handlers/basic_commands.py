@@ -151,7 +151,7 @@ async def check_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     language = get_user_language(context, user_id)
     
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     
     from config import CHAT_MODES, BOT_NAME
     current_mode = get_text("no_mode", language)
@@ -550,7 +550,7 @@ async def handle_help_callbacks(update: Update, context: ContextTypes.DEFAULT_TY
         
     elif query.data == "help_credits":
         # Informacje o kredytach
-        credits = get_user_credits(user_id)
+        credits = await get_user_credits(user_id)
         
         credits_text = f"""
 *{get_text("credits_info_title", language, default="Informacje o systemie kredytów:")}*
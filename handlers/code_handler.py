@@ -7,30 +7,10 @@ from telegram.constants import ParseMode
 from utils.translations import get_text
 from database.credits_client import get_user_credits
 from utils.user_utils import get_user_language
+from utils.activation_codes import create_multiple_codes, activate_code
 
-# Prosta tymczasowa implementacja funkcji activate_code
-def activate_code(user_id, code):
-    """
-    Aktywuje kod dla użytkownika (tymczasowa implementacja)
-    
-    Args:
-        user_id (int): ID użytkownika
-        code (str): Kod aktywacyjny
-        
-    Returns:
-        tuple: (Czy aktywacja się powiodła, liczba kredytów)
-    """
-    # Obsługa przykładowych kodów dla demonstracji
-    if code == "DEMO100":
-        from database.credits_client import add_user_credits
-        add_user_credits(user_id, 100, f"Aktywacja kodu {code}")
-        return True, 100
-    elif code == "DEMO500":
-        from database.credits_client import add_user_credits
-        add_user_credits(user_id, 500, f"Aktywacja kodu {code}")
-        return True, 500
-        
-    return False, 0
+# Maksymalna liczba kodów generowanych jednym poleceniem /gencode
+MAX_GENERATED_CODES = 500
 
 async def code_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -50,12 +30,12 @@ async def code_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     code = context.args[0].upper()  # Konwertuj na wielkie litery dla spójności
     
-    # Aktywuj kod
-    success, credits = activate_code(user_id, code)
+    # Aktywuj kod (kod z /gencode, wykorzystywany atomowo w bazie)
+    success, credits = await activate_code(user_id, code)
     
     if success:
         # Pobierz aktualny stan kredytów
-        total_credits = get_user_credits(user_id)
+        total_credits = await get_user_credits(user_id)
         
         await update.message.reply_text(
             get_text("activation_code_success", language, 
@@ -101,22 +81,15 @@ async def admin_generate_code(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text(get_text("gencode_invalid_args", language, default="Nieprawidłowe argumenty. Użyj liczb, np. /gencode 100 5"))
         return
     
-    # Ogranicz liczbę kodów do 20 na raz, aby uniknąć spamu
-    if count > 20:
-        count = 20
-    
-    # Generuj demonstracyjne kody (w rzeczywistej implementacji użylibyśmy funkcji z utils/activation_codes.py)
-    import random
-    import string
-    
-    def generate_code():
-        prefix = "DEMO"
-        suffix = ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(6))
-        return f"{prefix}{suffix}"
+    # Ogranicz liczbę kodów na raz - większe liczby są wysyłane jako plik
+    if count > MAX_GENERATED_CODES:
+        count = MAX_GENERATED_CODES
     
-    codes = [generate_code() for _ in range(count)]
+    # Generuj kody i zapisz je w bazie jednym zapisem zbiorczym
+    codes = await create_multiple_codes(credits, count)
     
     if codes:
+        count = len(codes)
         codes_text = "\n".join(codes)
         message = get_text("generated_codes", language, count=count, credits=credits, default=f"Wygenerowane kody ({count} x {credits} kredytów):\n\n{codes_text}")
         
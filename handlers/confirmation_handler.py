@@ -6,12 +6,12 @@ from utils.user_utils import get_user_language
 from utils.menu import update_menu
 from utils.translations import get_text
 from utils.credit_warnings import format_credit_usage_report
-from utils.tips import get_random_tip, should_show_tip
-from database.credits_client import get_user_credits, check_user_credits, deduct_user_credits
-from database.supabase_client import save_message, get_active_conversation, get_conversation_history, increment_messages_used
-from utils.openai_client import generate_image_dall_e, analyze_document, analyze_image, chat_completion_stream, prepare_messages_from_history
-from config import CREDIT_COSTS, MAX_CONTEXT_MESSAGES, CHAT_MODES
-import datetime
+from utils.tips import get_random_tip, should_show_tip, get_contextual_tip
+from database.credits_client import get_user_credits, reserve_credits, settle_credits, release_credits
+from database.supabase_client import queue_message, get_active_conversation, queue_increment_messages_used
+from utils.openai_client import generate_image_dall_e, analyze_document, analyze_image, chat_completion_stream, prepare_messages_from_history, build_context_messages
+from utils.streaming_editor import StreamingEditor
+from config import CREDIT_COSTS, CHAT_MODES, DEFAULT_MODEL
 
 async def _process_operation(update, context, operation_type, operation_func, user_id, credit_cost, 
                              process_args, success_handler, error_handler=None):
@@ -19,9 +19,12 @@ async def _process_operation(update, context, operation_type, operation_func, us
     language = get_user_language(context, user_id)
     query = update.callback_query
     
-    # Check user credits
-    credits = get_user_credits(user_id)
-    if not check_user_credits(user_id, credit_cost):
+    # Reserve user credits for the duration of the operation
+    credits = await get_user_credits(user_id)
+    operation_desc = get_text(f"{operation_type}_operation", language, default=operation_type)
+    category = operation_type.split('_')[0]  # image_generation -> image, photo_translate -> photo
+    hold = await reserve_credits(user_id, credit_cost, operation_desc, category) if credits >= credit_cost else None
+    if hold is None:
         error_msg = create_header(get_text("insufficient_funds", language, default="Brak wystarczających kredytów"), "error") + \
                     get_text("credits_changed_message", language, default="W międzyczasie twój stan kredytów zmienił się i nie masz już wystarczającej liczby kredytów.")
         await update_menu(query, error_msg, InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ " + get_text("back", language), callback_data="menu_back_main")]]),
@@ -32,13 +35,15 @@ async def _process_operation(update, context, operation_type, operation_func, us
     
     try:
         # Call the operation function with its arguments
-        result = await operation_func(**process_args)
-        
-        # Deduct credits
-        operation_desc = get_text(f"{operation_type}_operation", language, default=operation_type)
-        deduct_user_credits(user_id, credit_cost, operation_desc)
+        try:
+            result = await operation_func(**process_args)
+        except Exception:
+            # Operation failed - return the reserved credits
+            await release_credits(hold)
+            raise
         
-        credits_after = get_user_credits(user_id)
+        await settle_credits(hold)
+        credits_after = hold.credits_after
         
         # Generate usage report
         usage_report = format_credit_usage_report(operation_type, credit_cost, credits_before, credits_after)
@@ -304,7 +309,7 @@ async def handle_message_confirmation(update: Update, context: ContextTypes.DEFA
                 credit_cost = CHAT_MODES[current_mode]["credit_cost"]
         
         try:
-            conversation = get_active_conversation(user_id)
+            conversation = await get_active_conversation(user_id)
             conversation_id = conversation['id']
         except Exception as e:
             await status_message.edit_text(
@@ -314,16 +319,6 @@ async def handle_message_confirmation(update: Update, context: ContextTypes.DEFA
             )
             return
         
-        try:
-            save_message(conversation_id, user_id, user_message, is_from_user=True)
-        except Exception as e:
-            pass
-        
-        try:
-            history = get_conversation_history(conversation_id, limit=MAX_CONTEXT_MESSAGES)
-        except Exception as e:
-            history = []
-        
         model_to_use = CHAT_MODES[current_mode].get("model", DEFAULT_MODEL)
         
         if 'user_data' in context.chat_data and user_id in context.chat_data['user_data']:
@@ -334,53 +329,49 @@ async def handle_message_confirmation(update: Update, context: ContextTypes.DEFA
         
         system_prompt = CHAT_MODES[current_mode]["prompt"]
         
-        messages = prepare_messages_from_history(history, user_message, system_prompt)
+        try:
+            messages = await build_context_messages(conversation_id, user_message, system_prompt, model=model_to_use)
+        except Exception as e:
+            messages = prepare_messages_from_history([], user_message, system_prompt)
         
-        credits_before = get_user_credits(user_id)
+        try:
+            await queue_message(conversation_id, user_id, user_message, is_from_user=True)
+        except Exception as e:
+            pass
         
-        full_response = ""
-        buffer = ""
-        last_update = datetime.datetime.now().timestamp()
+        credits_before = await get_user_credits(user_id)
         
-        try:
-            response_message = await status_message.edit_text(
-                create_header(get_text("ai_response", language, default="Odpowiedź AI"), "chat"),
+        hold = await reserve_credits(
+            user_id, credit_cost,
+            get_text("message_model", language, model=model_to_use, default=f"Wiadomość ({model_to_use})"),
+            category="message"
+        )
+        if hold is None:
+            await status_message.edit_text(
+                create_header(get_text("insufficient_funds", language, default="Brak wystarczających kredytów"), "error") +
+                get_text("credits_changed_message", language, default="W międzyczasie twój stan kredytów zmienił się i nie masz już wystarczającej liczby kredytów."),
                 parse_mode=ParseMode.MARKDOWN
             )
+            return
+        
+        hold_settled = False
+        
+        try:
+            header = create_header(get_text("ai_response", language, default="Odpowiedź AI"), "chat")
+            response_message = await status_message.edit_text(header, parse_mode=ParseMode.MARKDOWN)
             
+            editor = StreamingEditor(response_message, header=header)
             async for chunk in chat_completion_stream(messages, model=model_to_use):
-                full_response += chunk
-                buffer += chunk
-                
-                current_time = datetime.datetime.now().timestamp()
-                if current_time - last_update >= 1.0 or len(buffer) > 100:
-                    try:
-                        await response_message.edit_text(
-                            create_header(get_text("ai_response", language, default="Odpowiedź AI"), "chat") + full_response + "▌",
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                        buffer = ""
-                        last_update = current_time
-                    except Exception as e:
-                        pass
+                await editor.append(chunk)
             
-            try:
-                await response_message.edit_text(
-                    create_header(get_text("ai_response", language, default="Odpowiedź AI"), "chat") + full_response,
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            except Exception as e:
-                await response_message.edit_text(
-                    create_header(get_text("ai_response", language, default="Odpowiedź AI"), "chat") + full_response,
-                    parse_mode=None
-                )
+            full_response = await editor.finish()
             
-            save_message(conversation_id, user_id, full_response, is_from_user=False, model_used=model_to_use)
+            await settle_credits(hold)
+            hold_settled = True
             
-            deduct_user_credits(user_id, credit_cost, 
-                               get_text("message_model", language, model=model_to_use, default=f"Wiadomość ({model_to_use})"))
+            await queue_message(conversation_id, user_id, full_response, is_from_user=False, model_used=model_to_use)
             
-            credits_after = get_user_credits(user_id)
+            credits_after = hold.credits_after
             
             usage_report = format_credit_usage_report(
                 get_text("ai_message", language, default="Wiadomość AI"), 
@@ -418,9 +409,11 @@ async def handle_message_confirmation(update: Update, context: ContextTypes.DEFA
                     parse_mode=ParseMode.MARKDOWN
                 )
             
-            increment_messages_used(user_id)
+            await queue_increment_messages_used(user_id)
             
         except Exception as e:
+            if not hold_settled:
+                await release_credits(hold)
             await status_message.edit_text(
                 create_header(get_text("response_error_header", language, default="Błąd odpowiedzi"), "error") +
                 get_text("response_error", language, error=str(e)),
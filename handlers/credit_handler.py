@@ -5,35 +5,43 @@ from utils.ui_elements import credit_status_bar, info_card, section_divider, fea
 from utils.message_formatter_enhanced import format_credit_info, format_transaction_report
 from utils.visual_styles import style_message, create_header, create_section, create_status_indicator
 from utils.tips import get_random_tip, should_show_tip
-from utils.credit_warnings import get_low_credits_notification, get_credit_recommendation
+from utils.credit_warnings import get_low_credits_notification, get_credit_recommendation, get_credit_nudge
 from config import BOT_NAME
 from utils.user_utils import get_user_language
 from utils.translations import get_text
 from database.credits_client import (
     get_user_credits, add_user_credits, deduct_user_credits, 
     get_credit_packages, get_package_by_id, purchase_credits,
-    get_user_credit_stats
+    get_user_credit_stats, invalidate_user_credits, has_credit_transaction
 )
 from utils.credit_analytics import (
     generate_credit_usage_chart, generate_usage_breakdown_chart, 
     get_credit_usage_breakdown, predict_credit_depletion
 )
-import matplotlib
-matplotlib.use('Agg')
+import asyncio
 
 from database.credits_client import add_stars_payment_option, get_stars_conversion_rate
 
+# Typy transakcji dodających kredyty (zwroty rezerwacji - "refund" - mają osobną etykietę)
+CREDIT_TRANSACTION_TYPES = ("add", "purchase", "subscription", "subscription_renewal")
+
+def _current_model(context, user_id):
+    """Model wybrany przez użytkownika (koszt wiadomości w prognozie zużycia)"""
+    return context.chat_data.get('user_data', {}).get(user_id, {}).get('current_model')
+
 async def credits_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /credits command with enhanced visual presentation"""
     user_id = update.effective_user.id
     language = get_user_language(context, user_id)
-    credits = get_user_credits(user_id)
+    # Saldo mogło zmienić się poza botem (webhook Stripe) - pobierz je świeże z bazy
+    invalidate_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     message = f"*{get_text('credit_status_title', language, default='Stan kredytów')}*\n\n"
     message += f"{get_text('available_credits', language)}: *{credits}*\n\n"
     
     try:
         from database.credits_client import get_user_credit_stats
-        stats = get_user_credit_stats(user_id)
+        stats = await get_user_credit_stats(user_id)
         
         if stats:
             message += f"*{get_text('statistics', language, default='Statystyki')}:*\n"
@@ -45,6 +53,11 @@ async def credits_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         print(f"{get_text('stats_error', language, default='Błąd przy pobieraniu statystyk')}: {e}")
     
+    # Przypomnienie o niskim saldzie przeliczone w tle z prognozy zużycia
+    nudge = get_credit_nudge(user_id, credits, language)
+    if nudge:
+        message += f"\n{nudge}\n"
+    
     message += f"\n*{get_text('operation_costs', language)}:*\n"
     message += f"▪️ {get_text('standard_message', language)} (GPT-3.5): 1 {get_text('credit', language)}\n"
     message += f"▪️ {get_text('premium_message', language)} (GPT-4o): 3 {get_text('credits', language)}\n"
@@ -127,8 +140,8 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
     await query.answer()
     
     if query.data == "credits_check" or query.data == "menu_credits_check":
-        credits = get_user_credits(user_id)
-        credit_stats = get_user_credit_stats(user_id)
+        credits = await get_user_credits(user_id)
+        credit_stats = await get_user_credit_stats(user_id)
         
         message = f"""
 *{get_text('credits_management', language)}*
@@ -145,7 +158,9 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
         if credit_stats.get('usage_history'):
             for i, transaction in enumerate(credit_stats['usage_history'], 1):
                 date = transaction['date'].split('T')[0]
-                if transaction['type'] in ["add", "purchase", "subscription", "subscription_renewal"]:
+                if transaction['type'] == "refund":
+                    message += f"\n{i}. ↩️ +{transaction['amount']} {get_text('credits', language)} ({date}, {get_text('credit_refund', language)})"
+                elif transaction['type'] in CREDIT_TRANSACTION_TYPES:
                     message += f"\n{i}. ➕ +{transaction['amount']} {get_text('credits', language)} ({date})"
                 else:
                     message += f"\n{i}. ➖ -{transaction['amount']} {get_text('credits', language)} ({date})"
@@ -237,7 +252,7 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
         
         days = 30
         
-        depletion_info = predict_credit_depletion(user_id, days)
+        depletion_info = await predict_credit_depletion(user_id, days, language, _current_model(context, user_id))
         
         if not depletion_info:
             if hasattr(query.message, 'caption'):
@@ -260,7 +275,7 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
         else:
             message += f"{get_text('not_enough_data', language)}.\n\n"
         
-        usage_breakdown = get_credit_usage_breakdown(user_id, days)
+        usage_breakdown = await get_credit_usage_breakdown(user_id, days, language)
         
         if usage_breakdown:
             message += f"*{get_text('usage_breakdown', language)}:*\n"
@@ -279,7 +294,11 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
                 parse_mode=ParseMode.MARKDOWN
             )
         
-        usage_chart = generate_credit_usage_chart(user_id, days)
+        # Oba wykresy są renderowane równolegle poza pętlą zdarzeń
+        usage_chart, breakdown_chart = await asyncio.gather(
+            generate_credit_usage_chart(user_id, days, language),
+            generate_usage_breakdown_chart(user_id, days, language)
+        )
         if usage_chart:
             await context.bot.send_photo(
                 chat_id=query.message.chat_id,
@@ -287,7 +306,6 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
                 caption=f"📈 {get_text('usage_history_chart', language, days=days)}"
             )
         
-        breakdown_chart = generate_usage_breakdown_chart(user_id, days)
         if breakdown_chart:
             await context.bot.send_photo(
                 chat_id=query.message.chat_id,
@@ -320,7 +338,7 @@ async def credit_stats_command(update: Update, context: ContextTypes.DEFAULT_TYP
     )
     
     try:
-        credits = get_user_credits(user_id)
+        credits = await get_user_credits(user_id)
         
         message = f"*{get_text('credit_analytics', language, default='Analiza kredytów')}*\n\n"
         message += f"{get_text('current_balance', language)}: *{credits}*\n\n"
@@ -356,7 +374,9 @@ async def credit_stats_command(update: Update, context: ContextTypes.DEFAULT_TYP
                         amount = transaction.get('amount', 0)
                         description = transaction.get('description', '')
                         
-                        if transaction_type in ["add", "purchase", "subscription", "subscription_renewal"]:
+                        if transaction_type == "refund":
+                            message += f"↩️ +{amount} {get_text('credits_short', language, default='kr.')} ({date}, {get_text('credit_refund', language)})"
+                        elif transaction_type in CREDIT_TRANSACTION_TYPES:
                             message += f"🟢 +{amount} {get_text('credits_short', language, default='kr.')} ({date})"
                         else:
                             message += f"🔴 -{amount} {get_text('credits_short', language, default='kr.')} ({date})"
@@ -386,16 +406,17 @@ async def credit_stats_command(update: Update, context: ContextTypes.DEFAULT_TYP
         try:
             from utils.credit_analytics import generate_credit_usage_chart, generate_usage_breakdown_chart
             
-            # Dodane await przed wywołaniem funkcji asynchronicznej
-            chart = await generate_credit_usage_chart(user_id)
+            # Oba wykresy są renderowane równolegle poza pętlą zdarzeń
+            chart, breakdown_chart = await asyncio.gather(
+                generate_credit_usage_chart(user_id, language=language),
+                generate_usage_breakdown_chart(user_id, language=language)
+            )
             if chart:
                 await update.message.reply_photo(
                     photo=chart,
                     caption=get_text("usage_history_chart", language, days=30, default="Historia wykorzystania kredytów")
                 )
                 
-            # Dodane await przed wywołaniem funkcji asynchronicznej
-            breakdown_chart = await generate_usage_breakdown_chart(user_id)
             if breakdown_chart:
                 await update.message.reply_photo(
                     photo=breakdown_chart,
@@ -426,17 +447,13 @@ async def freecredits_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     language = get_user_language(context, user_id)
     
     # Sprawdzamy czy użytkownik już miał wcześniej darmowe kredyty
-    # używając get_user_credit_stats zamiast get_credit_transactions
-    stats = await get_user_credit_stats(user_id)
-    
-    if stats and stats.get('usage_history'):
-        for transaction in stats.get('usage_history', []):
-            if transaction.get('description') == "Free credits promotion":
-                message = create_header("Promocja wykorzystana", "info")
-                message += get_text("free_credits_already_used", language, 
-                                  default="Już wykorzystałeś promocję darmowych kredytów.")
-                await update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN)
-                return
+    # (pojedyncze zapytanie o transakcję promocji zamiast przeglądania historii)
+    if await has_credit_transaction(user_id, "Free credits promotion"):
+        message = create_header("Promocja wykorzystana", "info")
+        message += get_text("free_credits_already_used", language, 
+                          default="Już wykorzystałeś promocję darmowych kredytów.")
+        await update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN)
+        return
     
     # Jeśli użytkownik nie wykorzystał jeszcze promocji, dodaj kredyty
     credits_added = 100
@@ -444,7 +461,7 @@ async def freecredits_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     if success:
         # Pobierz aktualny stan kredytów
-        credits = get_user_credits(user_id)
+        credits = await get_user_credits(user_id)
         
         message = create_header("Darmowe kredyty dodane!", "success")
         message += get_text("free_credits_added", language, 
@@ -478,7 +495,7 @@ async def credit_analytics_command(update: Update, context: ContextTypes.DEFAULT
         get_text("analyzing_credit_usage", language)
     )
     
-    depletion_info = predict_credit_depletion(user_id, days)
+    depletion_info = await predict_credit_depletion(user_id, days, language, _current_model(context, user_id))
     
     if not depletion_info:
         await status_message.edit_text(
@@ -497,7 +514,7 @@ async def credit_analytics_command(update: Update, context: ContextTypes.DEFAULT
     else:
         message += f"{get_text('not_enough_data', language)}.\n\n"
     
-    usage_breakdown = get_credit_usage_breakdown(user_id, days)
+    usage_breakdown = await get_credit_usage_breakdown(user_id, days, language)
     
     if usage_breakdown and sum(usage_breakdown.values()) > 0:
         for category, amount in usage_breakdown.items():
@@ -511,7 +528,11 @@ async def credit_analytics_command(update: Update, context: ContextTypes.DEFAULT
         parse_mode=ParseMode.MARKDOWN
     )
     
-    usage_chart = generate_credit_usage_chart(user_id, days)
+    # Oba wykresy są renderowane równolegle poza pętlą zdarzeń
+    usage_chart, breakdown_chart = await asyncio.gather(
+        generate_credit_usage_chart(user_id, days, language),
+        generate_usage_breakdown_chart(user_id, days, language)
+    )
     
     if usage_chart:
         await context.bot.send_photo(
@@ -520,8 +541,6 @@ async def credit_analytics_command(update: Update, context: ContextTypes.DEFAULT
             caption=f"📈 {get_text('usage_history_chart', language, days=days)}"
         )
     
-    breakdown_chart = generate_usage_breakdown_chart(user_id, days)
-    
     if breakdown_chart:
         await context.bot.send_photo(
             chat_id=update.effective_chat.id,
@@ -2,20 +2,33 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode, ChatAction
-from database.supabase_client import get_active_conversation, get_conversation_history, get_or_create_user
-from utils.pdf_generator import generate_conversation_pdf
+from database.supabase_client import get_active_conversation, iter_conversation_messages, get_or_create_user
+from utils.pdf_generator import export_conversation_pdf
+from services.export_service import get_export_service, parse_formats
 from config import BOT_NAME
 from utils.translations import get_text
 from utils.user_utils import get_user_language
-import io
+import os
 
 async def export_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Eksportuje aktualną konwersację użytkownika do PDF"""
+    """
+    Eksportuje aktualną konwersację użytkownika do PDF
+    
+    /export md html - archiwum ZIP z wybranymi formatami (pdf, md, html, jsonl),
+    /export all - archiwum ze wszystkimi formatami
+    """
     user_id = update.effective_user.id
     language = get_user_language(context, user_id)
     
+    formats = None
+    if context.args:
+        formats = parse_formats(context.args)
+        if not formats:
+            await update.message.reply_text(get_text("export_formats_usage", language))
+            return
+    
     status_message = await update.message.reply_text(
-        get_text("export_generating", language)
+        get_text("export_archive_generating" if formats else "export_generating", language)
     )
     
     await update.message.chat.send_action(action=ChatAction.UPLOAD_DOCUMENT)
@@ -28,36 +41,45 @@ async def export_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE
             await status_message.edit_text(get_text("conversation_error", language))
             return
         
-        # Dodane await
-        history = await get_conversation_history(conversation['id'])
-        
-        if not history:
-            await status_message.edit_text(get_text("export_empty", language))
-            return
-        
         # Naprawiony sposób pobrania danych użytkownika
         user_info = {}
         try:
-            from database.supabase_client import supabase
-            response = supabase.table('users').select('*').eq('id', user_id).execute()
-            if response.data:
-                user_info = response.data[0]
+            from database.supabase_client import supabase_api
+            result = await supabase_api.query('users', filters={'id': user_id})
+            if result:
+                user_info = result[0]
         except Exception as e:
             print(f"{get_text('user_data_error', language, default='Błąd pobierania danych użytkownika')}: {e}")
         
-        # Generuj PDF
-        pdf_buffer = generate_conversation_pdf(history, user_info, BOT_NAME)
-        
         from datetime import datetime
         current_date = datetime.now().strftime("%Y-%m-%d")
-        file_name = f"{get_text('conversation_with', language, bot_name=BOT_NAME, default='Konwersacja')}_{current_date}.pdf"
+        file_stem = f"{get_text('conversation_with', language, bot_name=BOT_NAME, default='Konwersacja')}_{current_date}"
         
-        await context.bot.send_document(
-            chat_id=update.effective_chat.id,
-            document=pdf_buffer,
-            filename=file_name,
-            caption=get_text("export_file_caption", language)
-        )
+        if formats:
+            # Archiwum ZIP - każdy format zapisywany strumieniowo z kolejnych stron wiadomości
+            export_path = await get_export_service().export_archive(conversation['id'], formats, user_info, BOT_NAME, file_stem)
+            file_name = f"{file_stem}.zip"
+            caption = get_text("export_archive_caption", language, formats=", ".join(formats))
+        else:
+            # Generuj PDF z całej konwersacji (strony wiadomości, budowanie w puli procesów)
+            export_path = await export_conversation_pdf(iter_conversation_messages(conversation['id']), user_info, BOT_NAME)
+            file_name = f"{file_stem}.pdf"
+            caption = get_text("export_file_caption", language)
+        
+        if not export_path:
+            await status_message.edit_text(get_text("export_empty", language))
+            return
+        
+        try:
+            with open(export_path, 'rb') as export_file:
+                await context.bot.send_document(
+                    chat_id=update.effective_chat.id,
+                    document=export_file,
+                    filename=file_name,
+                    caption=caption
+                )
+        finally:
+            os.remove(export_path)
         
         await status_message.delete()
         
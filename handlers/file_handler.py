@@ -40,9 +40,9 @@ async def _check_file_prerequisites(update, context, file_type, file_size_limit=
     
     # Check credits
     credit_cost = CREDIT_COSTS[file_type]
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     
-    if not check_user_credits(user_id, credit_cost):
+    if not await check_user_credits(user_id, credit_cost):
         warning_message = create_header(get_text("insufficient_credits", language, default="Brak wystarczających kredytów"), "warning") + \
                          get_text("insufficient_credits_detailed", language, default="Nie masz wystarczającej liczby kredytów.") + "\n\n" + \
                          f"▪️ {get_text('operation_cost', language, default='Koszt operacji')}: *{credit_cost}* {get_text('credits', language)}\n" + \
@@ -71,7 +71,7 @@ async def _handle_file_analysis(update, context, file_id, file_name, file_type,
     
     await update.message.chat.send_action(action=ChatAction.TYPING)
     
-    credits_before = get_user_credits(user_id)
+    credits_before = await get_user_credits(user_id)
     
     try:
         file = await context.bot.get_file(file_id)
@@ -82,9 +82,9 @@ async def _handle_file_analysis(update, context, file_id, file_name, file_type,
         else:  # photo
             result = await analyze_image(file_bytes, f"photo_{file_id}.jpg", mode, target_language)
         
-        deduct_user_credits(user_id, credit_cost, f"{get_text(operation_name, language, default=operation_name)}: {file_name if file_type == 'document' else ''}")
+        await deduct_user_credits(user_id, credit_cost, f"{get_text(operation_name, language, default=operation_name)}: {file_name if file_type == 'document' else ''}", category=file_type)
         
-        credits_after = get_user_credits(user_id)
+        credits_after = await get_user_credits(user_id)
         
         # Prepare result message with appropriate header
         if mode == "translate":
@@ -140,7 +140,7 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
     document = update.message.document
     file_name = document.file_name
     credit_cost = CREDIT_COSTS["document"]
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     
     caption = update.message.caption or ""
     caption_lower = caption.lower()
@@ -219,7 +219,7 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     language = get_user_language(context, user_id)
     
     credit_cost = CREDIT_COSTS["photo"]
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     
     photo = update.message.photo[-1]
     
@@ -17,7 +17,7 @@ async def generate_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
     language = get_user_language(context, user_id)
     quality = "standard"
     credit_cost = CREDIT_COSTS["image"][quality]
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     
     if not await check_user_credits(user_id, credit_cost):
         warning_message = create_header(get_text("insufficient_credits_title", language, default="Niewystarczające kredyty"), "warning") + \
@@ -84,8 +84,8 @@ async def generate_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
     credits_before = credits
     image_url = await generate_image_dall_e(prompt)
     
-    await deduct_user_credits(user_id, credit_cost, get_text("image_generation", language, default="Generowanie obrazu"))
-    credits_after = get_user_credits(user_id)
+    await deduct_user_credits(user_id, credit_cost, get_text("image_generation", language, default="Generowanie obrazu"), category="image")
+    credits_after = await get_user_credits(user_id)
     
     if image_url:
         await message.delete()
@@ -135,7 +135,7 @@ async def handle_image_confirmation(update: Update, context: ContextTypes.DEFAUL
         )
         
         credit_cost = CREDIT_COSTS["image"]["standard"]
-        credits = get_user_credits(user_id)
+        credits = await get_user_credits(user_id)
         
         if not await check_user_credits(user_id, credit_cost):
             await update_menu(
@@ -149,8 +149,8 @@ async def handle_image_confirmation(update: Update, context: ContextTypes.DEFAUL
         
         credits_before = credits
         image_url = await generate_image_dall_e(prompt)
-        await deduct_user_credits(user_id, credit_cost, get_text("image_generation", language, default="Generowanie obrazu"))
-        credits_after = get_user_credits(user_id)
+        await deduct_user_credits(user_id, credit_cost, get_text("image_generation", language, default="Generowanie obrazu"), category="image")
+        credits_after = await get_user_credits(user_id)
         
         if image_url:
             caption = create_header(get_text("generated_image", language, default="Wygenerowany obraz"), "image") + \
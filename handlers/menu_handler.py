@@ -129,8 +129,7 @@ async def handle_credits_section(update, context, navigation_path=""):
     user_id = query.from_user.id
     language = get_user_language(context, user_id)
     
-    # Usuwamy await
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     
     message_text = f"*{navigation_path or get_navigation_path('credits', language)}*\n\n"
     message_text += f"*{get_text('credit_status', language)}*\n\n{get_text('available_credits', language)}: *{credits}*\n\n*{get_text('operation_costs', language)}:*\n"
@@ -428,7 +427,7 @@ async def handle_help_callbacks(update: Update, context: ContextTypes.DEFAULT_TY
         
     elif query.data == "help_credits":
         # Informacje o kredytach
-        credits = get_user_credits(user_id)
+        credits = await get_user_credits(user_id)
         
         credits_text = get_text("help_credits_info", language, credits=credits, default=f"""
 *Informacje o systemie kredytów:*
@@ -488,13 +487,17 @@ async def handle_history_callbacks(update: Update, context: ContextTypes.DEFAULT
     
     if query.data == "history_view":
         try:
-            # Próba bezpośredniego dostępu do bazy danych
-            from database.supabase_client import supabase
+            # Asynchroniczny dostęp do bazy danych
+            from database.supabase_client import supabase_api
             
             # Najpierw spróbuj znaleźć aktywną konwersację
             try:
-                response = supabase.table('conversations').select('*').eq('user_id', user_id).order('last_message_at', desc=True).limit(1).execute()
-                conversations = response.data
+                conversations = await supabase_api.query(
+                    'conversations',
+                    filters={'user_id': user_id},
+                    order_by='-last_message_at',
+                    limit=1
+                )
                 
                 if not conversations:
                     message_text = get_text("history_no_conversation", language, default="Brak aktywnej konwersacji.")
@@ -505,8 +508,11 @@ async def handle_history_callbacks(update: Update, context: ContextTypes.DEFAULT
                 conversation_id = conversation['id']
                 
                 # Pobierz wiadomości dla tej konwersacji
-                messages_response = supabase.table('messages').select('*').eq('conversation_id', conversation_id).order('created_at').execute()
-                messages = messages_response.data
+                messages = await supabase_api.query(
+                    'messages',
+                    filters={'conversation_id': conversation_id},
+                    order_by='created_at'
+                )
                 
                 if not messages:
                     message_text = get_text("history_empty", language, default="Historia jest pusta.")
@@ -544,7 +550,7 @@ async def handle_history_callbacks(update: Update, context: ContextTypes.DEFAULT
     elif query.data == "history_new":
         try:
             # Bezpośrednie tworzenie konwersacji
-            from database.supabase_client import supabase
+            from database.supabase_client import supabase_api
             from datetime import datetime
             import pytz
             
@@ -552,11 +558,15 @@ async def handle_history_callbacks(update: Update, context: ContextTypes.DEFAULT
             
             # Utwórz nową konwersację
             try:
-                response = supabase.table('conversations').insert({
-                    'user_id': user_id,
-                    'created_at': now,
-                    'last_message_at': now
-                }).execute()
+                await supabase_api.query(
+                    'conversations',
+                    query_type="insert",
+                    data={
+                        'user_id': user_id,
+                        'created_at': now,
+                        'last_message_at': now
+                    }
+                )
                 
                 # Oznacz czat jako zainicjowany
                 mark_chat_initialized(context, user_id)
@@ -585,7 +595,7 @@ async def handle_history_callbacks(update: Update, context: ContextTypes.DEFAULT
     elif query.data == "history_confirm_delete":
         try:
             # Najpierw utwórz nową konwersację, a następnie usuń stare
-            from database.supabase_client import supabase
+            from database.supabase_client import supabase_api, purge_conversation_history
             from datetime import datetime
             import pytz
             
@@ -593,28 +603,28 @@ async def handle_history_callbacks(update: Update, context: ContextTypes.DEFAULT
             
             # Utwórz nową konwersację
             try:
-                supabase.table('conversations').insert({
-                    'user_id': user_id,
-                    'created_at': now,
-                    'last_message_at': now
-                }).execute()
-                
-                # Pobierz stare konwersacje
-                response = supabase.table('conversations').select('id').eq('user_id', user_id).order('last_message_at', desc=True).limit(100).execute()
+                created = await supabase_api.query(
+                    'conversations',
+                    query_type="insert",
+                    data={
+                        'user_id': user_id,
+                        'created_at': now,
+                        'last_message_at': now
+                    }
+                )
+                if not created:
+                    raise Exception("nie udało się utworzyć nowej konwersacji")
                 
-                if response.data and len(response.data) > 1:
-                    # Pobierz wszystkie ID konwersacji poza najnowszą
-                    conversation_ids = [conv['id'] for conv in response.data[1:]]
-                    
-                    # Usuń wiadomości ze starych konwersacji
-                    for conv_id in conversation_ids:
-                        supabase.table('messages').delete().eq('conversation_id', conv_id).execute()
-                    
-                    # Usuń stare konwersacje
-                    for conv_id in conversation_ids:
-                        supabase.table('conversations').delete().eq('id', conv_id).execute()
+                # Usuń pozostałe konwersacje i ich wiadomości jedną operacją w bazie
+                purged = await purge_conversation_history(user_id, keep_conversation_id=created[0]['id'])
+                if purged is None:
+                    raise Exception("nie udało się usunąć starych konwersacji")
                 
-                message_text = "✅ Historia została pomyślnie usunięta."
+                message_text = (
+                    "✅ Historia została pomyślnie usunięta.\n\n"
+                    f"Usunięte konwersacje: {purged.get('conversations', 0)}\n"
+                    f"Usunięte wiadomości: {purged.get('messages', 0)}"
+                )
                 await update_menu(query, message_text, InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Powrót", callback_data="menu_section_history")]]))
             except Exception as e:
                 logger.error(f"Error deleting history: {e}")
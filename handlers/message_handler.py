@@ -1,22 +1,28 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode, ChatAction
-from config import CHAT_MODES, DEFAULT_MODEL, MAX_CONTEXT_MESSAGES, CREDIT_COSTS
+from config import CHAT_MODES, DEFAULT_MODEL, CREDIT_COSTS
 from utils.translations import get_text
 from utils.user_utils import get_user_language, is_chat_initialized, mark_chat_initialized
 from database.supabase_client import (
-    get_active_conversation, save_message, get_conversation_history, increment_messages_used, create_new_conversation
+    get_active_conversation, queue_message, queue_increment_messages_used, create_new_conversation
 )
-from database.credits_client import get_user_credits, check_user_credits, deduct_user_credits
-from utils.openai_client import chat_completion_stream, prepare_messages_from_history
+from database.credits_client import get_user_credits, reserve_credits, settle_credits, release_credits
+from utils.openai_client import chat_completion_stream, prepare_messages_from_history, build_context_messages
 from utils.visual_styles import create_header, create_status_indicator
 from utils.credit_warnings import check_operation_cost, format_credit_usage_report
 from utils.tips import get_contextual_tip, get_random_tip, should_show_tip
-import datetime
+from utils.streaming_editor import StreamingEditor
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _conversation_id(conversation):
+    """ID konwersacji - repozytorium zwraca słownik (istniejąca) lub obiekt Conversation (nowo utworzona)"""
+    if isinstance(conversation, dict):
+        return conversation.get('id')
+    return getattr(conversation, 'id', None)
+
 async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Obsługa wiadomości tekstowych od użytkownika ze strumieniowaniem odpowiedzi i ulepszonym formatowaniem"""
     user_id = update.effective_user.id
@@ -56,11 +62,22 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             current_mode = user_data['current_mode']
             credit_cost = CHAT_MODES[current_mode]["credit_cost"]
     
+    # Określ model do użycia - domyślny lub z trybu czatu
+    model_to_use = CHAT_MODES[current_mode].get("model", DEFAULT_MODEL)
+    
+    # Jeśli użytkownik wybrał konkretny model, użyj go
+    if 'user_data' in context.chat_data and user_id in context.chat_data['user_data']:
+        user_data = context.chat_data['user_data'][user_id]
+        if 'current_model' in user_data:
+            model_to_use = user_data['current_model']
+            # Aktualizuj koszt kredytów na podstawie modelu
+            credit_cost = CREDIT_COSTS["message"].get(model_to_use, CREDIT_COSTS["message"]["default"])
+    
     # Get current credits
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     
     # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
-    if not await check_user_credits(user_id, credit_cost):
+    if credits < credit_cost:
         warning_message = create_header(get_text("insufficient_credits_title", language, default="Niewystarczające kredyty"), "warning")
         warning_message += get_text("insufficient_credits_detailed", language, 
             cost=credit_cost, credits=credits, credits_needed=credit_cost-credits, 
@@ -137,8 +154,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Pobierz lub utwórz aktywną konwersację
     try:
         conversation = await get_active_conversation(user_id)
-        # Używamy notacji z kropką zamiast nawiasów
-        conversation_id = conversation.id if hasattr(conversation, 'id') else None
+        conversation_id = _conversation_id(conversation)
         
         # Jeśli nie mamy ID, rzuć wyjątek aby przejść do tworzenia nowej konwersacji
         if conversation_id is None:
@@ -149,14 +165,10 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Bezpośrednia próba utworzenia nowej konwersacji z obsługą błędów
         try:
             conversation = await create_new_conversation(user_id)
-            conversation_id = conversation.id if hasattr(conversation, 'id') else None
+            conversation_id = _conversation_id(conversation)
             
             if conversation_id is None:
-                # Jeśli nadal nie mamy ID, spróbujmy wykorzystać słownik
-                if isinstance(conversation, dict) and 'id' in conversation:
-                    conversation_id = conversation['id']
-                else:
-                    raise ValueError(get_text("cannot_get_conversation_id", language, default="Nie można uzyskać ID konwersacji"))
+                raise ValueError(get_text("cannot_get_conversation_id", language, default="Nie można uzyskać ID konwersacji"))
                     
             logger.info(f"Utworzono nową konwersację po błędzie: {conversation_id}")
         except Exception as e2:
@@ -166,90 +178,72 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
     
-    # Zapisz wiadomość użytkownika do bazy danych
-    try:
-        await save_message(conversation_id, user_id, user_message, is_from_user=True)
-    except Exception as e:
-        logger.warning(f"Nie udało się zapisać wiadomości użytkownika: {e}")
-    
-    # Wyślij informację, że bot pisze
-    await update.message.chat.send_action(action=ChatAction.TYPING)
+    # Przygotuj system prompt z wybranego trybu
+    system_prompt = CHAT_MODES[current_mode]["prompt"]
     
-    # Pobierz historię konwersacji
+    # Przygotuj wiadomości dla API - historia w budżecie tokenów modelu, pobrana
+    # przed zapisaniem bieżącej wiadomości (jest dodawana osobno)
     try:
-        history = await get_conversation_history(conversation_id, limit=MAX_CONTEXT_MESSAGES)
+        messages = await build_context_messages(conversation_id, user_message, system_prompt, model=model_to_use)
     except Exception as e:
         logger.warning(f"Nie udało się pobrać historii konwersacji: {e}")
-        history = []
-    
-    # Określ model do użycia - domyślny lub z trybu czatu
-    model_to_use = CHAT_MODES[current_mode].get("model", DEFAULT_MODEL)
+        messages = prepare_messages_from_history([], user_message, system_prompt)
     
-    # Jeśli użytkownik wybrał konkretny model, użyj go
-    if 'user_data' in context.chat_data and user_id in context.chat_data['user_data']:
-        user_data = context.chat_data['user_data'][user_id]
-        if 'current_model' in user_data:
-            model_to_use = user_data['current_model']
-            # Aktualizuj koszt kredytów na podstawie modelu
-            credit_cost = CREDIT_COSTS["message"].get(model_to_use, CREDIT_COSTS["message"]["default"])
+    # Zapisz wiadomość użytkownika do bazy danych (w tle)
+    try:
+        await queue_message(conversation_id, user_id, user_message, is_from_user=True)
+    except Exception as e:
+        logger.warning(f"Nie udało się zapisać wiadomości użytkownika: {e}")
     
-    # Przygotuj system prompt z wybranego trybu
-    system_prompt = CHAT_MODES[current_mode]["prompt"]
+    # Wyślij informację, że bot pisze
+    await update.message.chat.send_action(action=ChatAction.TYPING)
     
-    # Przygotuj wiadomości dla API OpenAI
-    messages = prepare_messages_from_history(history, user_message, system_prompt)
+    # Zarezerwuj kredyty przed wywołaniem API - jedno atomowe pobranie zamiast sprawdzenia i odjęcia
+    hold = await reserve_credits(
+        user_id, credit_cost,
+        get_text("message_model", language, model=model_to_use, default=f"Wiadomość ({model_to_use})"),
+        category="message"
+    )
+    if hold is None:
+        await update.message.reply_text(
+            get_text("credits_changed_message", language, default="W międzyczasie twój stan kredytów zmienił się i nie masz już wystarczającej liczby kredytów."),
+            parse_mode=ParseMode.MARKDOWN
+        )
+        return
     
     # Wyślij początkową pustą wiadomość, którą będziemy aktualizować
     response_message = await update.message.reply_text(get_text("generating_response", language, default="Generowanie odpowiedzi..."))
     
-    # Zainicjuj pełną odpowiedź
-    full_response = ""
-    buffer = ""
-    last_update = datetime.datetime.now().timestamp()
+    # Edytor łączy aktualizacje i pilnuje limitów Telegrama
+    editor = StreamingEditor(response_message)
     
     # Spróbuj wygenerować odpowiedź
     try:
         # Generuj odpowiedź strumieniowo
         async for chunk in chat_completion_stream(messages, model=model_to_use):
-            full_response += chunk
-            buffer += chunk
-            
-            # Aktualizuj wiadomość co 1 sekundę lub gdy bufor jest wystarczająco duży
-            current_time = datetime.datetime.now().timestamp()
-            if current_time - last_update >= 1.0 or len(buffer) > 100:
-                try:
-                    # Dodaj migający kursor na końcu wiadomości
-                    await response_message.edit_text(full_response + "▌", parse_mode=ParseMode.MARKDOWN)
-                    buffer = ""
-                    last_update = current_time
-                except Exception as e:
-                    logger.debug(f"Nieistotny błąd przy aktualizacji: {e}")
+            await editor.append(chunk)
         
         # Aktualizuj wiadomość z pełną odpowiedzią bez kursora
-        try:
-            await response_message.edit_text(full_response, parse_mode=ParseMode.MARKDOWN)
-        except Exception as e:
-            await response_message.edit_text(full_response)
+        full_response = await editor.finish()
         
-        # Zapisz odpowiedź do bazy danych
-        try:
-            await save_message(conversation_id, user_id, full_response, is_from_user=False, model_used=model_to_use)
-        except Exception as e:
-            logger.warning(f"Nie udało się zapisać odpowiedzi do bazy: {e}")
+        # Rozlicz rezerwację kredytów
+        await settle_credits(hold)
         
-        # Odejmij kredyty
+        # Zapisz odpowiedź do bazy danych (w tle)
         try:
-            await deduct_user_credits(user_id, credit_cost, get_text("message_model", language, model=model_to_use, default=f"Wiadomość ({model_to_use})"))
+            await queue_message(conversation_id, user_id, full_response, is_from_user=False, model_used=model_to_use)
         except Exception as e:
-            logger.warning(f"Nie udało się odjąć kredytów: {e}")
+            logger.warning(f"Nie udało się zapisać odpowiedzi do bazy: {e}")
     except Exception as e:
         logger.error(f"Błąd generowania odpowiedzi: {e}")
-        await response_message.edit_text(get_text("response_error", language, error=str(e), default=f"Wystąpił błąd podczas generowania odpowiedzi: {str(e)}"))
+        # Zwróć zarezerwowane kredyty - odpowiedź nie została wygenerowana
+        await release_credits(hold)
+        await editor.message.edit_text(get_text("response_error", language, error=str(e), default=f"Wystąpił błąd podczas generowania odpowiedzi: {str(e)}"))
         return
     
-    # Sprawdź aktualny stan kredytów
+    # Sprawdź aktualny stan kredytów (saldo po rezerwacji - bez dodatkowego zapytania)
     try:
-        credits = get_user_credits(user_id)
+        credits = hold.credits_after
         if credits < 5:
             # Dodaj przycisk doładowania kredytów
             keyboard = [[InlineKeyboardButton(get_text("buy_credits_btn_with_icon", language, default="🛒 Kup kredyty"), callback_data="menu_credits_buy")]]
@@ -263,8 +257,8 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.warning(f"Nie udało się sprawdzić stanu kredytów: {e}")
     
-    # Zwiększ licznik wykorzystanych wiadomości
+    # Zwiększ licznik wykorzystanych wiadomości (w tle)
     try:
-        await increment_messages_used(user_id)
+        await queue_increment_messages_used(user_id)
     except Exception as e:
         logger.warning(f"Nie udało się zwiększyć licznika wiadomości: {e}")
\ No newline at end of file
@@ -3,7 +3,7 @@ from telegram.ext import ContextTypes
 from utils.menu import update_menu, store_menu_state  # Poprawione importy
 from telegram.constants import ParseMode
 from database.credits_client import (
-    get_user_credits, get_credit_packages
+    get_user_credits, get_credit_packages, invalidate_user_credits
 )
 from database.payment_client import (
     get_available_payment_methods, create_payment_url, 
@@ -12,6 +12,7 @@ from database.payment_client import (
 )
 from utils.user_utils import get_user_language
 from utils.translations import get_text
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,7 +26,7 @@ async def payment_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     language = get_user_language(context, user_id)
     
     # Pobierz dostępne metody płatności
-    payment_methods = get_available_payment_methods(language)
+    payment_methods = await get_available_payment_methods(language)
     
     if not payment_methods:
         await update.message.reply_text(
@@ -67,8 +68,10 @@ async def subscription_command(update: Update, context: ContextTypes.DEFAULT_TYP
     user_id = update.effective_user.id
     language = get_user_language(context, user_id)
     
-    # Pobierz aktywne subskrypcje
-    subscriptions = get_user_subscriptions(user_id)
+    # Pobierz aktywne subskrypcje i dane pakietów równolegle
+    subscriptions, credit_packages = await asyncio.gather(
+        get_user_subscriptions(user_id), get_credit_packages()
+    )
     
     if not subscriptions:
         await update.message.reply_text(
@@ -79,8 +82,7 @@ async def subscription_command(update: Update, context: ContextTypes.DEFAULT_TYP
     # Utwórz listę aktywnych subskrypcji
     message = get_text("active_subscriptions", language)
     
-    # Pobierz dane pakietów
-    packages = {p['id']: p for p in get_credit_packages()}
+    packages = {p['id']: p for p in credit_packages}
     
     # Dodaj informacje o każdej subskrypcji
     for i, sub in enumerate(subscriptions, 1):
@@ -152,8 +154,9 @@ async def handle_payment_callback(update: Update, context: ContextTypes.DEFAULT_
             
             reply_markup = InlineKeyboardMarkup(keyboard)
             
-            # Pobierz aktualny stan kredytów
-            credits = get_user_credits(user_id)
+            # Pobierz aktualny stan kredytów (po powrocie z płatności saldo mogło się zmienić)
+            invalidate_user_credits(user_id)
+            credits = await get_user_credits(user_id)
             
             message = f"*{get_text('credit_status', language, default='Stan kredytów')}*\n\n"
             message += f"{get_text('available_credits', language)}: *{credits}*\n\n"
@@ -223,7 +226,7 @@ async def handle_payment_callback(update: Update, context: ContextTypes.DEFAULT_
     # Obsługa komendy płatności
     if query.data == "payment_command":
         # Pobierz dostępne metody płatności
-        payment_methods = get_available_payment_methods(language)
+        payment_methods = await get_available_payment_methods(language)
         
         if not payment_methods:
             # Użycie centralnego systemu menu
@@ -348,11 +351,14 @@ async def handle_payment_callback(update: Update, context: ContextTypes.DEFAULT_
         is_subscription = payment_method_code == "stripe_subscription"
         
         # Utwórz URL płatności
-        success, payment_url = create_payment_url(
+        success, payment_url = await create_payment_url(
             user_id, package_id, payment_method_code, is_subscription
         )
         
         if success and payment_url:
+            # Webhook Stripe zmieni saldo poza botem - nie ufaj wartości z cache
+            invalidate_user_credits(user_id)
+            
             # Utwórz przycisk do przejścia do płatności
             keyboard = [[
                 InlineKeyboardButton(
@@ -403,8 +409,10 @@ async def handle_payment_callback(update: Update, context: ContextTypes.DEFAULT_
     
     # Obsługa komendy subskrypcji
     elif query.data == "subscription_command":
-        # Pobierz aktywne subskrypcje
-        subscriptions = get_user_subscriptions(user_id)
+        # Pobierz aktywne subskrypcje i dane pakietów równolegle
+        subscriptions, credit_packages = await asyncio.gather(
+            get_user_subscriptions(user_id), get_credit_packages()
+        )
         
         if not subscriptions:
             # Użycie centralnego systemu menu
@@ -419,8 +427,7 @@ async def handle_payment_callback(update: Update, context: ContextTypes.DEFAULT_
         # Utwórz listę aktywnych subskrypcji
         message = get_text("active_subscriptions", language)
         
-        # Pobierz dane pakietów
-        packages = {p['id']: p for p in get_credit_packages()}
+        packages = {p['id']: p for p in credit_packages}
         
         # Dodaj informacje o każdej subskrypcji
         for i, sub in enumerate(subscriptions, 1):
@@ -503,7 +510,7 @@ async def handle_payment_callback(update: Update, context: ContextTypes.DEFAULT_
         subscription_id = int(query.data.split("_")[3])
         
         # Anuluj subskrypcję
-        success = cancel_subscription(subscription_id)
+        success = await cancel_subscription(subscription_id)
         
         if success:
             # Użycie centralnego systemu menu
@@ -526,7 +533,7 @@ async def handle_payment_callback(update: Update, context: ContextTypes.DEFAULT_
     # Obsługa transakcji
     elif query.data == "transactions_command":
         # Pobierz historię transakcji
-        transactions = get_payment_transactions(user_id)
+        transactions = await get_payment_transactions(user_id)
         
         if not transactions:
             # Użycie centralnego systemu menu
@@ -584,7 +591,7 @@ async def transactions_command(update: Update, context: ContextTypes.DEFAULT_TYP
     language = get_user_language(context, user_id)
     
     # Pobierz historię transakcji
-    transactions = get_payment_transactions(user_id)
+    transactions = await get_payment_transactions(user_id)
     
     if not transactions:
         await update.message.reply_text(
@@ -15,7 +15,7 @@ async def handle_pdf_translation(update: Update, context: ContextTypes.DEFAULT_T
     
     # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
     credit_cost = 8  # Ustalamy koszt operacji tłumaczenia PDF na 8 kredytów
-    if not check_user_credits(user_id, credit_cost):
+    if not await check_user_credits(user_id, credit_cost):
         await update.message.reply_text(get_text("subscription_expired", language))
         return
     
@@ -46,7 +46,7 @@ async def handle_pdf_translation(update: Update, context: ContextTypes.DEFAULT_T
     result = await translate_pdf_first_paragraph(file_bytes)
     
     # Odejmij kredyty
-    deduct_user_credits(user_id, credit_cost, get_text("pdf_translation_operation", language, file_name=file_name, default=f"Tłumaczenie pliku PDF: {file_name}"))
+    await deduct_user_credits(user_id, credit_cost, get_text("pdf_translation_operation", language, file_name=file_name, default=f"Tłumaczenie pliku PDF: {file_name}"), category="document")
     
     # Przygotuj odpowiedź
     if result["success"]:
@@ -63,7 +63,7 @@ async def handle_pdf_translation(update: Update, context: ContextTypes.DEFAULT_T
     )
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     if credits < 5:
         await update.message.reply_text(
             f"*{get_text('low_credits_warning', language)}* {get_text('low_credits_message', language, credits=credits)}",
@@ -57,9 +57,9 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Sprawdź też w bazie danych, czy użytkownik ma już ustawiony język
         has_language_in_db = False
         try:
-            from database.supabase_client import supabase
-            response = supabase.table('users').select('language').eq('id', user_id).execute()
-            if response.data and response.data[0].get('language'):
+            from database.supabase_client import supabase_api
+            result = await supabase_api.query('users', columns='language', filters={'id': user_id})
+            if result and result[0].get('language'):
                 has_language_in_db = True
         except Exception:
             pass  # Ignoruj błędy przy sprawdzaniu bazy
@@ -138,7 +138,7 @@ async def handle_language_selection(update: Update, context: ContextTypes.DEFAUL
         # Zapisz język w bazie danych
         try:
             from database.supabase_client import update_user_language
-            update_user_language(user_id, language)
+            await update_user_language(user_id, language)
         except Exception as e:
             print(f"{get_text('language_save_error', language, default='Błąd zapisywania języka')}: {e}")
         
@@ -234,7 +234,7 @@ async def show_welcome_message(update: Update, context: ContextTypes.DEFAULT_TYP
         context.chat_data['user_data'][user_id]['language'] = language
         
         # Pobierz stan kredytów
-        credits = get_user_credits(user_id)
+        credits = await get_user_credits(user_id)
         
         # Link do zdjęcia bannera
         banner_url = "https://i.imgur.com/YPubLDE.png?v-1123"
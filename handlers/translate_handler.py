@@ -62,7 +62,7 @@ async def translate_photo(update: Update, context: ContextTypes.DEFAULT_TYPE, ph
     
     # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
     credit_cost = 8  # Koszt tłumaczenia zdjęcia
-    if not check_user_credits(user_id, credit_cost):
+    if not await check_user_credits(user_id, credit_cost):
         await update.message.reply_text(get_text("subscription_expired", language))
         return
     
@@ -82,7 +82,7 @@ async def translate_photo(update: Update, context: ContextTypes.DEFAULT_TYPE, ph
     result = await analyze_image(file_bytes, f"photo_{photo.file_unique_id}.jpg", mode="translate", target_language=target_lang)
     
     # Odejmij kredyty
-    deduct_user_credits(user_id, credit_cost, get_text("photo_translation_operation", language, target_lang=target_lang, default=f"Tłumaczenie tekstu ze zdjęcia na język {target_lang}"))
+    await deduct_user_credits(user_id, credit_cost, get_text("photo_translation_operation", language, target_lang=target_lang, default=f"Tłumaczenie tekstu ze zdjęcia na język {target_lang}"), category="photo")
     
     # Wyślij tłumaczenie
     await message.edit_text(
@@ -91,7 +91,7 @@ async def translate_photo(update: Update, context: ContextTypes.DEFAULT_TYPE, ph
     )
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     if credits < 5:
         await update.message.reply_text(
             f"{get_text('low_credits_warning', language)} {get_text('low_credits_message', language, credits=credits)}",
@@ -105,7 +105,7 @@ async def translate_document(update: Update, context: ContextTypes.DEFAULT_TYPE,
     
     # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
     credit_cost = 8  # Koszt tłumaczenia dokumentu
-    if not check_user_credits(user_id, credit_cost):
+    if not await check_user_credits(user_id, credit_cost):
         await update.message.reply_text(get_text("subscription_expired", language))
         return
     
@@ -132,7 +132,7 @@ async def translate_document(update: Update, context: ContextTypes.DEFAULT_TYPE,
     result = await analyze_document(file_bytes, file_name, mode="translate", target_language=target_lang)
     
     # Odejmij kredyty
-    deduct_user_credits(user_id, credit_cost, get_text("document_translation_operation", language, file_name=file_name, target_lang=target_lang, default=f"Tłumaczenie dokumentu na język {target_lang}: {file_name}"))
+    await deduct_user_credits(user_id, credit_cost, get_text("document_translation_operation", language, file_name=file_name, target_lang=target_lang, default=f"Tłumaczenie dokumentu na język {target_lang}: {file_name}"), category="document")
     
     # Wyślij tłumaczenie
     await message.edit_text(
@@ -141,7 +141,7 @@ async def translate_document(update: Update, context: ContextTypes.DEFAULT_TYPE,
     )
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     if credits < 5:
         await update.message.reply_text(
             f"{get_text('low_credits_warning', language)} {get_text('low_credits_message', language, credits=credits)}",
@@ -155,7 +155,7 @@ async def translate_text(update: Update, context: ContextTypes.DEFAULT_TYPE, tex
     
     # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
     credit_cost = 3  # Koszt tłumaczenia tekstu
-    if not check_user_credits(user_id, credit_cost):
+    if not await check_user_credits(user_id, credit_cost):
         await update.message.reply_text(get_text("subscription_expired", language))
         return
     
@@ -183,7 +183,7 @@ async def translate_text(update: Update, context: ContextTypes.DEFAULT_TYPE, tex
     translation = await chat_completion(messages, model="gpt-3.5-turbo")
     
     # Odejmij kredyty
-    deduct_user_credits(user_id, credit_cost, get_text("text_translation_operation", language, target_lang=target_lang, default=f"Tłumaczenie tekstu na język {target_lang}"))
+    await deduct_user_credits(user_id, credit_cost, get_text("text_translation_operation", language, target_lang=target_lang, default=f"Tłumaczenie tekstu na język {target_lang}"), category="message")
     
     # Wyślij tłumaczenie
     source_lang_name = get_language_name(language)
@@ -195,7 +195,7 @@ async def translate_text(update: Update, context: ContextTypes.DEFAULT_TYPE, tex
     )
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     if credits < 5:
         await update.message.reply_text(
             f"{get_text('low_credits_warning', language)} {get_text('low_credits_message', language, credits=credits)}",
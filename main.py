@@ -14,7 +14,7 @@ import logging
 logging.basicConfig(level=logging.INFO)
 
 # Sprawdź klucze API po załadowaniu dotenv
-from config import TELEGRAM_TOKEN, OPENAI_API_KEY, ANTHROPIC_API_KEY
+from config import TELEGRAM_TOKEN, OPENAI_API_KEY, ANTHROPIC_API_KEY, BOT_MODE
 
 # Logowanie informacji o dostępności kluczy API
 if not OPENAI_API_KEY:
@@ -23,10 +23,10 @@ if not ANTHROPIC_API_KEY:
     logging.warning("Brak klucza API Anthropic - funkcje Claude będą niedostępne")
 
 # Inicjalizacja serwisu API zawczasu
-from services.api_service import APIService
-api_service = APIService()
+from services.api_service import get_api_service
+api_service = get_api_service()
 
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, TypeHandler, filters
 from telegram import Update
 from telegram.ext import ContextTypes
 
@@ -57,7 +57,7 @@ from handlers.code_handler import code_command, admin_generate_code
 from handlers.image_handler import generate_image
 from handlers.translate_handler import translate_command
 from handlers.payment_handler import payment_command, subscription_command, transactions_command
-from handlers.admin_handler import get_user_info
+from handlers.admin_handler import get_user_info, cache_stats_command
 from handlers.admin_package_handler import add_package, list_packages, toggle_package, add_default_packages
 from handlers.onboarding_handler import onboarding_command
 
@@ -65,11 +65,54 @@ from handlers.onboarding_handler import onboarding_command
 from handlers.message_handler import message_handler
 from handlers.file_handler import handle_document, handle_photo
 
+from utils.user_utils import preload_user_language
+
 # Import centralnego routera callbacków
 from handlers.callback_router import route_callback
 
 # Inicjalizacja aplikacji
-application = Application.builder().token(TELEGRAM_TOKEN).build()
+async def start_background_tasks(application):
+    """Uruchamia kolejkę zapisów w tle (wczytuje niezapisane operacje z dziennika) i przeliczanie prognoz kredytów"""
+    from services.write_queue import get_write_queue
+    from services.forecast_service import get_forecast_service
+    await get_write_queue().start()
+    await get_forecast_service().start()
+
+async def stop_background_tasks(application):
+    """Zatrzymuje przeliczanie prognoz i zapisuje oczekujące operacje kolejki przed zamknięciem połączeń"""
+    from services.write_queue import get_write_queue
+    from services.forecast_service import get_forecast_service
+    await get_forecast_service().stop()
+    await get_write_queue().stop()
+
+async def close_api_clients(application):
+    """Zamyka współdzielone pule połączeń i procesów przy zatrzymaniu bota"""
+    from utils.chart_renderer import shutdown_chart_pool
+    from utils.pdf_generator import shutdown_pdf_pool
+    shutdown_chart_pool()
+    shutdown_pdf_pool()
+    await api_service.close()
+
+# concurrent_updates - wszystkie aktualizacje są obsługiwane równolegle, bo warstwa danych
+# nie blokuje już pętli zdarzeń. Dotyczy to także kolejnych aktualizacji tego samego
+# użytkownika (np. dwie wiadomości wysłane jedna po drugiej), dlatego operacje na kredytach
+# są pojedynczymi, atomowymi wywołaniami funkcji w bazie (reserve/settle/deduct)
+# Stan rozmów (context.chat_data) jest przechowywany w trwałym magazynie i przetrwa restart
+from services.persistence import StatePersistence, create_backend
+
+application = (
+    Application.builder()
+    .token(TELEGRAM_TOKEN)
+    .concurrent_updates(True)
+    .persistence(StatePersistence(create_backend()))
+    .post_init(start_background_tasks)
+    .post_stop(stop_background_tasks)
+    .post_shutdown(close_api_clients)
+    .build()
+)
+
+# Wczytanie języka użytkownika przed pozostałymi handlerami (bez blokowania pętli zdarzeń)
+application.add_handler(TypeHandler(Update, preload_user_language), group=-1)
 
 # Rejestracja handlerów komend
 application.add_handler(CommandHandler("start", start_command))
@@ -100,6 +143,7 @@ application.add_handler(CommandHandler("togglepackage", toggle_package))
 application.add_handler(CommandHandler("adddefaultpackages", add_default_packages))
 application.add_handler(CommandHandler("gencode", admin_generate_code))
 application.add_handler(CommandHandler("userinfo", get_user_info))
+application.add_handler(CommandHandler("cachestats", cache_stats_command))
 
 # Centralny handler wszystkich callbacków
 application.add_handler(CallbackQueryHandler(route_callback))
@@ -114,4 +158,9 @@ application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
 # Uruchomienie bota
 if __name__ == "__main__":
     print("Bot uruchomiony z obsługą modeli OpenAI i Claude. Naciśnij Ctrl+C, aby zatrzymać.")
-    application.run_polling()
\ No newline at end of file
+    if BOT_MODE == "webhook":
+        import asyncio
+        from services.webhook_server import run_webhook
+        asyncio.run(run_webhook(application))
+    else:
+        application.run_polling()
\ No newline at end of file
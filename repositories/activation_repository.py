@@ -0,0 +1,44 @@
+# repositories/activation_repository.py
+import logging
+from typing import Tuple
+from api.supabase_client import SupabaseClient
+from utils.cache import credits_cache
+
+logger = logging.getLogger(__name__)
+
+class ActivationRepository:
+    """Repozytorium dla kodów aktywacyjnych (tabela activation_codes)"""
+
+    def __init__(self, client: SupabaseClient):
+        self.client = client
+        self.table = "activation_codes"
+
+    async def use_code(self, user_id: int, code: str) -> Tuple[bool, int]:
+        """
+        Wykorzystuje kod aktywacyjny i dodaje jego kredyty użytkownikowi
+
+        Oznaczenie kodu i dodanie kredytów to jedno wywołanie funkcji
+        redeem_activation_code, więc kod nie może zostać użyty dwa razy.
+
+        Returns:
+            Tuple[bool, int]: (Czy kod został wykorzystany, liczba dodanych kredytów)
+        """
+        try:
+            result = await self.client.rpc(
+                "redeem_activation_code",
+                {'p_user_id': user_id, 'p_code': code},
+                retry=False
+            )
+        except Exception as e:
+            logger.error(f"Błąd wykorzystania kodu aktywacyjnego przez użytkownika {user_id}: {e}")
+            result = None
+
+        if not result:
+            return False, 0
+
+        credits_after = result.get('credits_after')
+        if isinstance(credits_after, int):
+            credits_cache.set(user_id, credits_after)
+        else:
+            credits_cache.invalidate(user_id)
+        return True, result.get('credits', 0)
@@ -1,14 +1,19 @@
 # repositories/conversation_repository.py
 import logging
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 import pytz
 from database.models import Conversation
 from repositories.base_repository import BaseRepository
 from api.supabase_client import SupabaseClient
+from utils.cache import TTLCache
+from utils.context_cache import context_cache
 
 logger = logging.getLogger(__name__)
 
+# Podsumowania konwersacji (conversation_id -> (podsumowanie, ID ostatniej podsumowanej wiadomości))
+summary_cache = TTLCache("conversation_summary", maxsize=10000, ttl=1800.0)
+
 class ConversationRepository(BaseRepository[Conversation]):
     """Repozytorium dla operacji na konwersacjach"""
     
@@ -101,6 +106,80 @@ class ConversationRepository(BaseRepository[Conversation]):
             logger.error(f"Błąd usuwania konwersacji {id}: {e}")
             return False
     
+    async def get_summary(self, conversation_id: int) -> Tuple[Optional[str], Optional[int]]:
+        """
+        Pobiera podsumowanie starszych wiadomości konwersacji
+        
+        Returns:
+            Tuple[Optional[str], Optional[int]]: (podsumowanie, ID ostatniej
+                podsumowanej wiadomości) lub (None, None)
+        """
+        cached = summary_cache.get(conversation_id)
+        if cached is not None:
+            return cached
+        
+        try:
+            result = await self.client.query(
+                self.table,
+                query_type="select",
+                columns="summary,summary_message_id",
+                filters={"id": conversation_id}
+            )
+        except Exception as e:
+            logger.error(f"Błąd pobierania podsumowania konwersacji {conversation_id}: {e}")
+            return None, None
+        
+        summary = (None, None)
+        if result and result[0].get('summary'):
+            summary = (result[0]['summary'], result[0].get('summary_message_id'))
+        summary_cache.set(conversation_id, summary)
+        return summary
+    
+    async def save_summary(self, conversation_id: int, summary: str, message_id: int) -> bool:
+        """Zapisuje podsumowanie wiadomości konwersacji do wiadomości message_id włącznie"""
+        try:
+            result = await self.client.query(
+                self.table,
+                query_type="update",
+                filters={"id": conversation_id},
+                data={
+                    "summary": summary,
+                    "summary_message_id": message_id,
+                    "summary_updated_at": datetime.now(pytz.UTC).isoformat()
+                }
+            )
+        except Exception as e:
+            logger.error(f"Błąd zapisywania podsumowania konwersacji {conversation_id}: {e}")
+            return False
+        
+        summary_cache.set(conversation_id, (summary, message_id))
+        return bool(result)
+    
+    async def purge_history(self, user_id: int, keep_conversation_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Usuwa wszystkie konwersacje użytkownika (poza keep_conversation_id) wraz
+        z wiadomościami - jedno wywołanie funkcji purge_user_history w bazie
+        
+        Returns:
+            Optional[Dict[str, Any]]: {"conversations": ..., "messages": ...,
+                "conversation_ids": [...]} lub None w przypadku błędu
+        """
+        result = await self.client.rpc(
+            "purge_user_history",
+            {"p_user_id": user_id, "p_keep_conversation_id": keep_conversation_id},
+            retry=False
+        )
+        if result is None:
+            logger.error(f"Błąd usuwania historii użytkownika {user_id}")
+            return None
+        
+        # Okna kontekstu i podsumowania usuniętych konwersacji nie są już potrzebne
+        for conversation_id in result.get("conversation_ids") or []:
+            context_cache.invalidate(conversation_id)
+            summary_cache.invalidate(conversation_id)
+        
+        return result
+    
     async def get_active_conversation(self, user_id: int):
         """Pobiera aktywną konwersację dla użytkownika w formie słownika"""
         try:
@@ -1,12 +1,26 @@
 # repositories/credit_repository.py
+import asyncio
 import logging
-from typing import List, Dict, Optional, Tuple, Any
+from typing import List, Dict, Optional, Tuple, Any, AsyncIterator
 from datetime import datetime, timedelta
 import pytz
 from api.supabase_client import SupabaseClient
+from database.models import CreditHold
+from config import CREDIT_HOLD_TTL_SECONDS, CREDIT_CATEGORIES
+from utils.cache import credits_cache, catalog_cache
+from utils.usage_analytics import analyze_usage
 
 logger = logging.getLogger(__name__)
 
+# Rozmiar strony przy pobieraniu historii transakcji
+TRANSACTIONS_PAGE_SIZE = 1000
+
+# Liczba ostatnich transakcji zwracanych w statystykach użytkownika
+USAGE_HISTORY_LIMIT = 10
+
+# Okno (w dniach) średniego dziennego zużycia w statystykach użytkownika
+USAGE_STATS_DAYS = 90
+
 class CreditRepository:
     """Repozytorium dla operacji na kredytach użytkownika"""
     
@@ -15,9 +29,26 @@ class CreditRepository:
         self.credits_table = "user_credits"
         self.transactions_table = "credit_transactions"
         self.packages_table = "credit_packages"
+        self.daily_usage_table = "credit_usage_daily"
+        self._catalog_lock = asyncio.Lock()
+    
+    def _cache_balance(self, user_id: int, new_balance: Optional[int]):
+        """Aktualizuje saldo w cache po zapisie (write-through) lub unieważnia je, gdy jest nieznane"""
+        if new_balance is None:
+            credits_cache.invalidate(user_id)
+        else:
+            credits_cache.set(user_id, new_balance)
+    
+    def invalidate_user_credits(self, user_id: int):
+        """Unieważnia saldo w cache (np. po płatności obsłużonej poza botem)"""
+        credits_cache.invalidate(user_id)
     
-    async def get_user_credits(self, user_id: int) -> int:
-        """Pobiera bieżący stan kredytów użytkownika"""
+    async def get_user_credits(self, user_id: int, initial_credits: int = 0) -> int:
+        """Pobiera bieżący stan kredytów użytkownika (z cache, jeśli to możliwe)"""
+        cached = credits_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
         try:
             result = await self.client.query(
                 self.credits_table, 
@@ -27,20 +58,23 @@ class CreditRepository:
             )
             
             if result:
-                return result[0].get('credits_amount', 0)
+                credits = result[0].get('credits_amount', 0)
+                credits_cache.set(user_id, credits)
+                return credits
             
-            await self.init_user_credits(user_id)
-            return 0
+            if await self.init_user_credits(user_id, initial_credits):
+                credits_cache.set(user_id, initial_credits)
+            return initial_credits
         except Exception as e:
             logger.error(f"Błąd pobierania kredytów dla użytkownika {user_id}: {e}")
             return 0
     
-    async def init_user_credits(self, user_id: int) -> bool:
-        """Inicjalizuje kredyty użytkownika z wartością 0"""
+    async def init_user_credits(self, user_id: int, initial_credits: int = 0) -> bool:
+        """Inicjalizuje kredyty użytkownika (domyślnie z wartością 0)"""
         try:
             credit_data = {
                 'user_id': user_id,
-                'credits_amount': 0,
+                'credits_amount': initial_credits,
                 'total_credits_purchased': 0,
                 'total_spent': 0
             }
@@ -56,153 +90,202 @@ class CreditRepository:
             logger.error(f"Błąd inicjalizacji kredytów użytkownika {user_id}: {e}")
             return False
     
+    async def _rpc_add_credits(self, user_id: int, amount: int, description: Optional[str] = None,
+                               transaction_type: str = 'add', price: float = 0) -> Optional[int]:
+        """Atomowo dodaje kredyty i zapisuje transakcję (funkcja add_credits), zwraca nowe saldo"""
+        new_balance = await self.client.rpc(
+            "add_credits",
+            {
+                'p_user_id': user_id,
+                'p_amount': amount,
+                'p_description': description,
+                'p_transaction_type': transaction_type,
+                'p_price': price
+            },
+            retry=False
+        )
+        new_balance = new_balance if isinstance(new_balance, int) else None
+        self._cache_balance(user_id, new_balance)
+        return new_balance
+    
+    async def _rpc_deduct_credits(self, user_id: int, amount: int, description: Optional[str] = None,
+                                  category: Optional[str] = None) -> Optional[int]:
+        """Atomowo odejmuje kredyty i zapisuje transakcję (funkcja deduct_credits), zwraca nowe saldo"""
+        new_balance = await self.client.rpc(
+            "deduct_credits",
+            {
+                'p_user_id': user_id,
+                'p_amount': amount,
+                'p_description': description,
+                'p_category': self._normalize_category(category)
+            },
+            retry=False
+        )
+        new_balance = new_balance if isinstance(new_balance, int) else None
+        self._cache_balance(user_id, new_balance)
+        return new_balance
+    
+    @staticmethod
+    def _normalize_category(category: Optional[str]) -> str:
+        """Zwraca znaną kategorię operacji (nieznane trafiają do 'other')"""
+        return category if category in CREDIT_CATEGORIES else "other"
+    
     async def add_user_credits(self, user_id: int, amount: int, description: Optional[str] = None) -> bool:
         """Dodaje kredyty użytkownikowi"""
         try:
-            now = datetime.now(pytz.UTC).isoformat()
-            
-            # Pobierz aktualną liczbę kredytów
-            result = await self.client.query(
-                self.credits_table,
-                query_type="select", 
-                columns="credits_amount",
-                filters={"user_id": user_id}
-            )
-            
-            if result:
-                current_credits = result[0].get('credits_amount', 0)
-                
-                # Aktualizuj istniejący rekord
-                await self.client.query(
-                    self.credits_table,
-                    query_type="update",
-                    filters={"user_id": user_id},
-                    data={
-                        'credits_amount': current_credits + amount,
-                        'total_credits_purchased': self.client.client.raw(f'total_credits_purchased + {amount}'),
-                        'last_purchase_date': now
-                    }
-                )
-            else:
-                # Utwórz nowy rekord
-                current_credits = 0
-                await self.init_user_credits(user_id)
-                await self.client.query(
-                    self.credits_table,
-                    query_type="update",
-                    filters={"user_id": user_id},
-                    data={
-                        'credits_amount': amount,
-                        'total_credits_purchased': amount,
-                        'last_purchase_date': now
-                    }
-                )
-            
-            # Zapisz transakcję
-            if amount != 0:
-                await self.client.query(
-                    self.transactions_table,
-                    query_type="insert",
-                    data={
-                        'user_id': user_id,
-                        'transaction_type': 'add',
-                        'amount': amount,
-                        'credits_before': current_credits,
-                        'credits_after': current_credits + amount,
-                        'description': description,
-                        'created_at': now
-                    }
-                )
-            
-            return True
+            new_balance = await self._rpc_add_credits(user_id, amount, description)
+            return new_balance is not None
         except Exception as e:
             logger.error(f"Błąd dodawania kredytów użytkownikowi {user_id}: {e}")
             return False
     
-    async def deduct_user_credits(self, user_id: int, amount: int, description: Optional[str] = None) -> bool:
-        """Odejmuje kredyty użytkownikowi"""
+    async def deduct_user_credits(self, user_id: int, amount: int, description: Optional[str] = None,
+                                  category: Optional[str] = None) -> bool:
+        """Odejmuje kredyty użytkownikowi (False, jeśli saldo jest niewystarczające)"""
         try:
-            # Pobierz aktualną liczbę kredytów
-            result = await self.client.query(
-                self.credits_table,
-                query_type="select", 
-                columns="credits_amount",
-                filters={"user_id": user_id}
+            new_balance = await self._rpc_deduct_credits(user_id, amount, description, category)
+            return new_balance is not None
+        except Exception as e:
+            logger.error(f"Błąd odejmowania kredytów użytkownikowi {user_id}: {e}")
+            return False
+    
+    async def reserve_credits(self, user_id: int, amount: int, description: Optional[str] = None,
+                              ttl_seconds: int = CREDIT_HOLD_TTL_SECONDS,
+                              category: Optional[str] = None) -> Optional[CreditHold]:
+        """
+        Rezerwuje (pobiera z góry) kredyty na czas operacji - jeden zapis do bazy
+        
+        Rezerwację należy rozliczyć (settle_credits) lub zwolnić (release_credits).
+        Rezerwacja nierozliczona w ciągu ttl_seconds (np. po awarii procesu
+        w trakcie odpowiedzi) jest zwalniana, a kredyty wracają do użytkownika
+        (release_expired_holds).
+        
+        Returns:
+            Optional[CreditHold]: Rezerwacja lub None, jeśli saldo jest niewystarczające
+        """
+        try:
+            result = await self.client.rpc(
+                "reserve_credits",
+                {
+                    'p_user_id': user_id,
+                    'p_amount': amount,
+                    'p_description': description,
+                    'p_ttl_seconds': ttl_seconds,
+                    'p_category': self._normalize_category(category)
+                },
+                retry=False
             )
             
             if not result:
-                return False
-            
-            current_credits = result[0].get('credits_amount', 0)
-            
-            # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
-            if current_credits < amount:
-                return False
-            
-            # Odejmij kredyty
-            await self.client.query(
-                self.credits_table,
-                query_type="update",
-                filters={"user_id": user_id},
-                data={'credits_amount': current_credits - amount}
+                credits_cache.invalidate(user_id)
+                return None
+            hold = CreditHold.from_dict({**result, 'user_id': user_id, 'amount': amount})
+            credits_cache.set(user_id, hold.credits_after)
+            return hold
+        except Exception as e:
+            logger.error(f"Błąd rezerwacji kredytów użytkownika {user_id}: {e}")
+            return None
+    
+    async def settle_credits(self, hold: CreditHold, actual_amount: Optional[int] = None) -> bool:
+        """
+        Rozlicza rezerwację kredytów
+        
+        Rozliczenie jest zawsze zapisywane - nierozliczona rezerwacja po
+        wygaśnięciu zostałaby zwrócona. Przy niższym koszcie różnica jest zwracana.
+        """
+        if actual_amount is None or actual_amount > hold.amount:
+            actual_amount = hold.amount
+        
+        try:
+            new_balance = await self.client.rpc(
+                "settle_credit_hold",
+                {'p_hold_id': hold.id, 'p_amount': actual_amount},
+                retry=False
             )
-            
-            # Zapisz transakcję
-            now = datetime.now(pytz.UTC).isoformat()
-            await self.client.query(
-                self.transactions_table,
-                query_type="insert",
-                data={
-                    'user_id': user_id,
-                    'transaction_type': 'deduct',
-                    'amount': amount,
-                    'credits_before': current_credits,
-                    'credits_after': current_credits - amount,
-                    'description': description,
-                    'created_at': now
-                }
+            self._cache_balance(hold.user_id, new_balance if isinstance(new_balance, int) else None)
+            return new_balance is not None
+        except Exception as e:
+            logger.error(f"Błąd rozliczania rezerwacji {hold.id}: {e}")
+            return False
+    
+    async def release_credits(self, hold: CreditHold) -> bool:
+        """Zwalnia rezerwację i zwraca kredyty użytkownikowi (np. po błędzie strumienia)"""
+        try:
+            new_balance = await self.client.rpc(
+                "settle_credit_hold",
+                {'p_hold_id': hold.id, 'p_amount': 0},
+                retry=False
             )
-            
-            return True
+            self._cache_balance(hold.user_id, new_balance if isinstance(new_balance, int) else None)
+            return new_balance is not None
         except Exception as e:
-            logger.error(f"Błąd odejmowania kredytów użytkownikowi {user_id}: {e}")
+            logger.error(f"Błąd zwalniania rezerwacji {hold.id}: {e}")
             return False
     
+    async def release_expired_holds(self) -> int:
+        """Zwraca kredyty z wygasłych, nierozliczonych rezerwacji wszystkich użytkowników"""
+        try:
+            released = await self.client.rpc("release_expired_credit_holds", {})
+        except Exception as e:
+            logger.error(f"Błąd zwalniania wygasłych rezerwacji kredytów: {e}")
+            return 0
+        if released:
+            # Salda użytkowników zmieniły się poza bieżącymi żądaniami
+            credits_cache.clear()
+        return released if isinstance(released, int) else 0
+    
     async def check_user_credits(self, user_id: int, amount_needed: int) -> bool:
         """Sprawdza, czy użytkownik ma wystarczającą liczbę kredytów"""
         current_credits = await self.get_user_credits(user_id)
         return current_credits >= amount_needed
     
+    async def get_package_catalog(self) -> Dict[int, Dict[str, Any]]:
+        """
+        Zwraca wszystkie pakiety kredytów (id -> pakiet, według liczby kredytów)
+        z cache lub bazy danych
+
+        Zwrócone słowniki są współdzielone przez cache i nie mogą być modyfikowane.
+        """
+        catalog = catalog_cache.get(self.packages_table)
+        if catalog is not None:
+            return catalog
+
+        # Jedno zapytanie do bazy nawet przy wielu równoczesnych chybieniach
+        async with self._catalog_lock:
+            catalog = catalog_cache.get(self.packages_table)
+            if catalog is not None:
+                return catalog
+            try:
+                result = await self.client.query(
+                    self.packages_table,
+                    query_type="select",
+                    order_by="credits"
+                )
+            except Exception as e:
+                logger.error(f"Błąd pobierania pakietów kredytów: {e}")
+                result = []
+
+            catalog = {package['id']: package for package in result}
+            # Pusty wynik może oznaczać błąd bazy - nie zapamiętujemy go
+            if catalog:
+                catalog_cache.set(self.packages_table, catalog)
+            return catalog
+    
+    def invalidate_credit_packages(self):
+        """Unieważnia katalog pakietów w cache (po zmianie pakietów przez administratora)"""
+        catalog_cache.invalidate(self.packages_table)
+    
     async def get_credit_packages(self) -> List[Dict[str, Any]]:
         """Pobiera dostępne pakiety kredytów"""
-        try:
-            result = await self.client.query(
-                self.packages_table,
-                query_type="select",
-                filters={"is_active": True},
-                order_by="credits"
-            )
-            
-            return result
-        except Exception as e:
-            logger.error(f"Błąd pobierania pakietów kredytów: {e}")
-            return []
+        catalog = await self.get_package_catalog()
+        return [package for package in catalog.values() if package.get('is_active')]
     
     async def get_package_by_id(self, package_id: int) -> Optional[Dict[str, Any]]:
         """Pobiera informacje o pakiecie kredytów"""
-        try:
-            result = await self.client.query(
-                self.packages_table,
-                query_type="select",
-                filters={"id": package_id, "is_active": True}
-            )
-            
-            if result:
-                return result[0]
-            return None
-        except Exception as e:
-            logger.error(f"Błąd pobierania pakietu kredytów {package_id}: {e}")
-            return None
+        package = (await self.get_package_catalog()).get(package_id)
+        if package and package.get('is_active'):
+            return package
+        return None
     
     async def purchase_credits(self, user_id: int, package_id: int) -> Tuple[bool, Optional[Dict[str, Any]]]:
         """Dokonuje zakupu kredytów"""
@@ -212,129 +295,176 @@ class CreditRepository:
             if not package:
                 return False, None
             
-            # Dodaj kredyty użytkownikowi
-            now = datetime.now(pytz.UTC).isoformat()
             description = f"Zakup pakietu {package['name']}"
-            
-            # Pobierz aktualny stan kredytów
-            result = await self.client.query(
-                self.credits_table,
-                query_type="select", 
-                columns="credits_amount",
-                filters={"user_id": user_id}
-            )
-            
-            if result:
-                current_credits = result[0].get('credits_amount', 0)
-                
-                # Aktualizuj rekord użytkownika
-                await self.client.query(
-                    self.credits_table,
-                    query_type="update",
-                    filters={"user_id": user_id},
-                    data={
-                        'credits_amount': current_credits + package['credits'],
-                        'total_credits_purchased': self.client.client.raw(f'total_credits_purchased + {package["credits"]}'),
-                        'last_purchase_date': now,
-                        'total_spent': self.client.client.raw(f'total_spent + {package["price"]}')
-                    }
-                )
-            else:
-                # Jeśli rekord nie istnieje, utwórz go
-                current_credits = 0
-                await self.init_user_credits(user_id)
-                await self.client.query(
-                    self.credits_table,
-                    query_type="update",
-                    filters={"user_id": user_id},
-                    data={
-                        'credits_amount': package['credits'],
-                        'total_credits_purchased': package['credits'],
-                        'last_purchase_date': now,
-                        'total_spent': package['price']
-                    }
-                )
-            
-            # Zapisz transakcję
-            await self.client.query(
-                self.transactions_table,
-                query_type="insert",
-                data={
-                    'user_id': user_id,
-                    'transaction_type': 'purchase',
-                    'amount': package['credits'],
-                    'credits_before': current_credits,
-                    'credits_after': current_credits + package['credits'],
-                    'description': description,
-                    'created_at': now
-                }
+            new_balance = await self._rpc_add_credits(
+                user_id,
+                package['credits'],
+                description,
+                transaction_type='purchase',
+                price=package['price']
             )
             
+            if new_balance is None:
+                return False, None
             return True, package
         except Exception as e:
             logger.error(f"Błąd zakupu kredytów: {e}")
             return False, None
             
-    async def get_transactions(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
-        """Pobiera historię transakcji kredytowych użytkownika z ostatnich dni"""
-        try:
-            # Oblicz datę początkową
-            start_date = (datetime.now(pytz.UTC) - timedelta(days=days)).isoformat()
-            
-            # Pobierz transakcje z określonego okresu
-            result = await self.client.query(
+    async def iter_transactions(self, user_id: int, start: Optional[datetime] = None,
+                                end: Optional[datetime] = None, transaction_type: Optional[str] = None,
+                                page_size: int = TRANSACTIONS_PAGE_SIZE) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Zwraca kolejne strony transakcji użytkownika z okresu [start, end)
+        
+        Zakres dat jest filtrowany po stronie bazy (indeks (user_id, created_at, id)),
+        a strony pobierane są paginacją kluczem (created_at, id) zamiast OFFSET,
+        więc koszt każdej strony nie rośnie wraz z historią użytkownika.
+        """
+        filters = {"user_id": user_id}
+        if transaction_type:
+            filters["transaction_type"] = transaction_type
+        
+        range_filters = []
+        if start is not None:
+            range_filters.append(("created_at", "gte", start.isoformat()))
+        if end is not None:
+            range_filters.append(("created_at", "lt", end.isoformat()))
+        
+        or_filter = None
+        while True:
+            page = await self.client.query(
                 self.transactions_table,
                 query_type="select",
-                filters={"user_id": user_id},
-                order_by="created_at"
+                filters=filters,
+                range_filters=range_filters,
+                or_filter=or_filter,
+                order_by="created_at,id",
+                limit=page_size
             )
+            if not page:
+                return
             
-            # Filtruj transakcje po dacie
-            filtered_transactions = [t for t in result if t.get('created_at', '') >= start_date]
+            yield page
             
-            return filtered_transactions
-        except Exception as e:
-            logger.error(f"Błąd pobierania transakcji użytkownika {user_id}: {e}")
-            return []
+            if len(page) < page_size:
+                return
             
-    async def get_usage_by_type(self, user_id: int, days: int = 30) -> Dict[str, int]:
-        """Pobiera rozkład zużycia kredytów według rodzaju operacji"""
+            # Kursor: ostatni (created_at, id) z bieżącej strony
+            last = page[-1]
+            created_at = self.client.quote_value(last.get('created_at'))
+            or_filter = f"(created_at.gt.{created_at},and(created_at.eq.{created_at},id.gt.{last.get('id')}))"
+    
+    async def get_transactions(self, user_id: int, days: int = 30,
+                               transaction_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Pobiera historię transakcji kredytowych użytkownika z ostatnich dni"""
         try:
-            # Pobierz transakcje
-            transactions = await self.get_transactions(user_id, days)
+            # Oblicz datę początkową
+            start_date = datetime.now(pytz.UTC) - timedelta(days=days)
             
-            # Wyfiltruj tylko transakcje typu 'deduct'
-            deduct_transactions = [t for t in transactions if t.get('transaction_type') == 'deduct']
+            # Pobierz tylko transakcje z określonego okresu (filtr po stronie bazy)
+            transactions = []
+            async for page in self.iter_transactions(user_id, start=start_date, transaction_type=transaction_type):
+                transactions.extend(page)
             
-            # Przygotuj kategorie
-            usage_by_type = {}
+            return transactions
+        except Exception as e:
+            logger.error(f"Błąd pobierania transakcji użytkownika {user_id}: {e}")
+            return []
             
-            # Analizuj opisy transakcji, aby określić kategorie
-            for transaction in deduct_transactions:
-                description = transaction.get('description', '').lower()
-                amount = transaction.get('amount', 0)
-                
-                # Określ kategorię na podstawie opisu
-                if any(term in description for term in ['wiadomość', 'message', 'chat', 'gpt']):
-                    category = "Wiadomości"
-                elif any(term in description for term in ['obraz', 'dall-e', 'image', 'dall']):
-                    category = "Obrazy"
-                elif any(term in description for term in ['dokument', 'document', 'pdf', 'plik']):
-                    category = "Dokumenty"
-                elif any(term in description for term in ['zdjęci', 'zdjęc', 'photo', 'foto']):
-                    category = "Zdjęcia"
-                else:
-                    category = "Inne"
-                
-                # Dodaj do odpowiedniej kategorii
-                if category not in usage_by_type:
-                    usage_by_type[category] = 0
-                usage_by_type[category] += amount
+    async def get_last_transaction_id(self, user_id: int) -> Optional[int]:
+        """Zwraca ID ostatniej transakcji użytkownika (wersja danych dla cache analityki)"""
+        result = await self.client.query(
+            self.transactions_table,
+            query_type="select",
+            columns="id",
+            filters={"user_id": user_id},
+            order_by="-created_at,-id",
+            limit=1
+        )
+        return result[0]['id'] if result else None
+    
+    async def get_daily_usage(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
+        """
+        Pobiera dzienne agregaty zużycia kredytów z ostatnich dni
+        
+        Wiersze (day, category, amount, operations, credits_after, last_at) są
+        utrzymywane przez trigger na credit_transactions - jeden wiersz na dzień
+        i kategorię zamiast całej historii transakcji.
+        """
+        try:
+            start_day = (datetime.now(pytz.UTC) - timedelta(days=days)).date().isoformat()
             
-            return usage_by_type
+            return await self.client.query(
+                self.daily_usage_table,
+                query_type="select",
+                filters={"user_id": user_id},
+                range_filters=[("day", "gte", start_day)],
+                order_by="day"
+            )
+        except Exception as e:
+            logger.error(f"Błąd pobierania dziennego zużycia kredytów użytkownika {user_id}: {e}")
+            return []
+    
+    async def iter_daily_usage_since(self, since_day: str,
+                                     page_size: int = TRANSACTIONS_PAGE_SIZE) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Zwraca kolejne strony agregatów dziennych wszystkich użytkowników od dnia since_day
+        
+        Strony są pobierane paginacją kluczem (day, user_id, category) - indeks
+        credit_usage_daily_day_idx - więc przeliczanie prognoz czyta tylko wiersze
+        dni, które zmieniły się od poprzedniego przeliczenia.
+        """
+        or_filter = None
+        while True:
+            page = await self.client.query(
+                self.daily_usage_table,
+                query_type="select",
+                range_filters=[("day", "gte", since_day)],
+                or_filter=or_filter,
+                order_by="day,user_id,category",
+                limit=page_size
+            )
+            if not page:
+                return
+            
+            yield page
+            
+            if len(page) < page_size:
+                return
+            
+            # Kursor: ostatni (day, user_id, category) z bieżącej strony
+            last = page[-1]
+            day = self.client.quote_value(last.get('day'))
+            category = self.client.quote_value(last.get('category'))
+            user_id = last.get('user_id')
+            or_filter = (
+                f"(day.gt.{day},and(day.eq.{day},user_id.gt.{user_id}),"
+                f"and(day.eq.{day},user_id.eq.{user_id},category.gt.{category}))"
+            )
+    
+    async def get_usage_by_type(self, user_id: int, days: int = 30) -> Dict[str, int]:
+        """Pobiera rozkład zużycia kredytów według kategorii operacji (klucze z CREDIT_CATEGORIES)"""
+        try:
+            return analyze_usage(await self.get_daily_usage(user_id, days), days).by_category
         except Exception as e:
             logger.error(f"Błąd pobierania rozkładu zużycia kredytów: {e}")
             return {"Błąd analizy": 1}
+    
+    async def has_transaction(self, user_id: int, description: str) -> bool:
+        """Sprawdza, czy użytkownik ma transakcję o podanym opisie (np. wykorzystana promocja)"""
+        try:
+            result = await self.client.query(
+                self.transactions_table,
+                query_type="select",
+                columns="id",
+                filters={"user_id": user_id, "description": description},
+                limit=1
+            )
+            return bool(result)
+        except Exception as e:
+            logger.error(f"Błąd sprawdzania transakcji użytkownika {user_id}: {e}")
+            return False
 
     async def get_user_stats(self, user_id: int) -> Dict[str, Any]:
         """Pobiera statystyki użytkownika dotyczące kredytów"""
@@ -350,33 +480,44 @@ class CreditRepository:
                 return {}
             
             user_credits = credits_result[0]
+            credits_cache.set(user_id, user_credits.get('credits_amount', 0))
             
-            # Pobierz historię transakcji
-            transactions = await self.get_transactions(user_id, days=90)
+            # Średnie dzienne zużycie z agregatów dziennych - suma wydatków na dzień
+            # od pierwszej aktywności w oknie (nie na liczbę operacji)
+            analysis = analyze_usage(await self.get_daily_usage(user_id, days=USAGE_STATS_DAYS), USAGE_STATS_DAYS)
+            avg_daily_usage = analysis.avg_daily_usage
             
-            # Oblicz średnie dzienne zużycie
-            deduct_transactions = [t for t in transactions if t.get('transaction_type') == 'deduct']
-            total_usage = sum(t.get('amount', 0) for t in deduct_transactions)
-            days_analyzed = min(90, len(deduct_transactions))
-            avg_daily_usage = total_usage / max(1, days_analyzed) if deduct_transactions else 0
-            
-            # Znajdź najdroższą operację
+            # Znajdź najdroższą operację (jedno zapytanie z limitem zamiast skanowania historii)
+            start_date = (datetime.now(pytz.UTC) - timedelta(days=USAGE_STATS_DAYS)).isoformat()
+            most_expensive = await self.client.query(
+                self.transactions_table,
+                query_type="select",
+                columns="description,amount",
+                filters={"user_id": user_id, "transaction_type": "deduct"},
+                range_filters=[("created_at", "gte", start_date)],
+                order_by="-amount",
+                limit=1
+            )
             most_expensive_operation = None
-            max_amount = 0
-            for t in deduct_transactions:
-                amount = t.get('amount', 0)
-                if amount > max_amount:
-                    max_amount = amount
-                    most_expensive_operation = t.get('description', 'Nieznana operacja')
+            if most_expensive and most_expensive[0].get('amount', 0) > 0:
+                most_expensive_operation = most_expensive[0].get('description') or 'Nieznana operacja'
             
-            # Przygotuj historię transakcji do zwrotu
+            # Przygotuj ostatnie transakcje do zwrotu
+            recent_transactions = await self.client.query(
+                self.transactions_table,
+                query_type="select",
+                filters={"user_id": user_id},
+                order_by="-created_at,-id",
+                limit=USAGE_HISTORY_LIMIT
+            )
             usage_history = []
-            for t in transactions:
+            for t in recent_transactions:
                 usage_history.append({
                     'type': t.get('transaction_type', ''),
                     'amount': t.get('amount', 0),
                     'date': t.get('created_at', ''),
-                    'description': t.get('description', '')
+                    'description': t.get('description', ''),
+                    'category': t.get('category')
                 })
             
             # Zwróć zebrane statystyki
@@ -1,19 +1,32 @@
 # repositories/message_repository.py
 import logging
-from typing import List, Optional, Dict, Any
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional, Dict, Any
 from datetime import datetime
 import pytz
 from database.models import Message
 from repositories.base_repository import BaseRepository
 from api.supabase_client import SupabaseClient
+from utils.tokens import count_tokens
+from utils.context_cache import ContextWindow, context_cache, WINDOW_MAX_TOKENS, WINDOW_MAX_MESSAGES
+from config import HISTORY_MAX_MESSAGES, STATE_SHARED
+
+if TYPE_CHECKING:
+    from services.write_queue import WriteQueue
 
 logger = logging.getLogger(__name__)
 
+# Liczba wiadomości pobieranych w jednym zapytaniu o historię
+HISTORY_PAGE_SIZE = 20
+
+# Liczba wiadomości pobieranych w jednym zapytaniu przy eksporcie konwersacji
+EXPORT_PAGE_SIZE = 200
+
 class MessageRepository(BaseRepository[Message]):
     """Repozytorium dla operacji na wiadomościach"""
     
-    def __init__(self, client: SupabaseClient):
+    def __init__(self, client: SupabaseClient, write_queue: Optional['WriteQueue'] = None):
         self.client = client
+        self.write_queue = write_queue
         self.table = "messages"
     
     async def get_by_id(self, id: int) -> Optional[Message]:
@@ -107,21 +120,166 @@ class MessageRepository(BaseRepository[Message]):
             logger.error(f"Błąd usuwania wiadomości {id}: {e}")
             return False
     
-    async def get_conversation_history(self, conversation_id: int, limit: int = 20) -> List[Message]:
-        """Pobiera historię wiadomości dla konwersacji"""
-        try:
-            result = await self.client.query(
-                self.table, 
+    async def iter_recent_messages(self, conversation_id: int,
+                                   page_size: int = HISTORY_PAGE_SIZE) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Zwraca kolejne strony wiadomości konwersacji od najnowszych
+        
+        Strony są pobierane paginacją kluczem (created_at, id) malejąco - indeks
+        (conversation_id, created_at desc, id desc) obsługuje filtr, sortowanie
+        i kursor, więc koszt nie rośnie z długością konwersacji.
+        """
+        or_filter = None
+        while True:
+            page = await self.client.query(
+                self.table,
                 query_type="select",
                 filters={"conversation_id": conversation_id},
-                order_by="created_at", 
-                limit=limit
+                or_filter=or_filter,
+                order_by="-created_at,-id",
+                limit=page_size
             )
+            if not page:
+                return
             
-            return [Message.from_dict(data) for data in result]
+            yield page
+            
+            if len(page) < page_size:
+                return
+            
+            # Kursor: najstarszy (created_at, id) z bieżącej strony
+            last = page[-1]
+            created_at = self.client.quote_value(last.get('created_at'))
+            or_filter = f"(created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{last.get('id')}))"
+    
+    async def iter_messages(self, conversation_id: int,
+                            page_size: int = EXPORT_PAGE_SIZE) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Zwraca kolejne strony wszystkich wiadomości konwersacji chronologicznie
+        
+        Paginacja kluczem (created_at, id) rosnąco - ten sam indeks co przy
+        iter_recent_messages (przeglądany w odwrotnym kierunku), więc eksport
+        długiej konwersacji nie wczytuje jej naraz do pamięci.
+        """
+        or_filter = None
+        while True:
+            page = await self.client.query(
+                self.table,
+                query_type="select",
+                filters={"conversation_id": conversation_id},
+                or_filter=or_filter,
+                order_by="created_at,id",
+                limit=page_size
+            )
+            if not page:
+                return
+            
+            yield page
+            
+            if len(page) < page_size:
+                return
+            
+            # Kursor: najnowszy (created_at, id) z bieżącej strony
+            last = page[-1]
+            created_at = self.client.quote_value(last.get('created_at'))
+            or_filter = f"(created_at.gt.{created_at},and(created_at.eq.{created_at},id.gt.{last.get('id')}))"
+    
+    async def _load_recent_rows(self, conversation_id: int, token_budget: Optional[int],
+                                max_messages: int) -> List[Dict[str, Any]]:
+        """
+        Pobiera najnowsze wiadomości mieszczące się w budżecie (od najnowszej)
+
+        Jedno zapytanie z limitem max_messages - budżet tokenów jest
+        przycinany w pamięci, więc nawet pełne okno kontekstu to jeden odczyt.
+        """
+        page = await self.client.query(
+            self.table,
+            query_type="select",
+            filters={"conversation_id": conversation_id},
+            order_by="-created_at,-id",
+            limit=max_messages
+        )
+        if token_budget is None:
+            return page
+        
+        rows = []
+        used_tokens = 0
+        for data in page:
+            used_tokens += count_tokens(data.get('content'))
+            if used_tokens > token_budget:
+                break
+            rows.append(data)
+        return rows
+    
+    async def _latest_message_id(self, conversation_id: int) -> Optional[int]:
+        """Zwraca ID najnowszej zapisanej wiadomości konwersacji (None, gdy brak)"""
+        result = await self.client.query(
+            self.table,
+            query_type="select",
+            columns="id",
+            filters={"conversation_id": conversation_id},
+            order_by="-created_at,-id",
+            limit=1
+        )
+        return result[0].get('id') if result else None
+    
+    async def get_recent_history(self, conversation_id: int, token_budget: Optional[int] = None,
+                                 max_messages: int = HISTORY_MAX_MESSAGES) -> List[Message]:
+        """
+        Pobiera najnowsze wiadomości konwersacji w kolejności chronologicznej
+        
+        Args:
+            conversation_id: ID konwersacji
+            token_budget: Budżet tokenów historii - wiadomości są dobierane od
+                najnowszej, dopóki mieszczą się w budżecie (None = bez limitu)
+            max_messages: Maksymalna liczba wiadomości
+        """
+        try:
+            rows = await self._load_recent_rows(conversation_id, token_budget, max_messages)
         except Exception as e:
             logger.error(f"Błąd pobierania historii konwersacji {conversation_id}: {e}")
             return []
+        
+        return [Message.from_dict(data) for data in reversed(rows)]
+    
+    async def get_context_window(self, conversation_id: int) -> ContextWindow:
+        """
+        Zwraca okno kontekstu konwersacji (najnowsze wiadomości w formacie API modelu)
+        
+        Okno jest trzymane w pamięci (context_cache) i uzupełniane przy zapisie
+        wiadomości - baza jest odczytywana tylko przy braku okna w cache (np. po
+        restarcie). W trybie STATE_SHARED kolejne wiadomości mogą trafiać do
+        różnych procesów, więc okno z cache jest używane tylko wtedy, gdy jego
+        najnowsza wiadomość jest też najnowszą w bazie (jedno zapytanie o ID);
+        w przeciwnym razie okno jest wczytywane ponownie.
+        """
+        cached = context_cache.get(conversation_id)
+        if cached is not None:
+            if not STATE_SHARED:
+                return cached
+            if await self._latest_message_id(conversation_id) == cached.last_message_id():
+                return cached
+        
+        window = ContextWindow()
+        try:
+            rows = await self._load_recent_rows(conversation_id, WINDOW_MAX_TOKENS, WINDOW_MAX_MESSAGES)
+        except Exception as e:
+            logger.error(f"Błąd pobierania historii konwersacji {conversation_id}: {e}")
+            return cached if cached is not None else window
+        
+        for data in reversed(rows):
+            window.append("user" if data.get('is_from_user') else "assistant", data.get('content') or "", data.get('id'))
+        context_cache.set(conversation_id, window)
+        return window
+    
+    async def get_context_messages(self, conversation_id: int, token_budget: Optional[int] = None) -> List[Dict[str, str]]:
+        """Zwraca najnowsze wiadomości konwersacji w budżecie tokenów jako gotowe wiadomości dla API modelu"""
+        window = await self.get_context_window(conversation_id)
+        return window.messages(token_budget)
+    
+    async def get_conversation_history(self, conversation_id: int, limit: int = 20) -> List[Message]:
+        """Pobiera ostatnie wiadomości konwersacji (najnowsze limit wiadomości, chronologicznie)"""
+        return await self.get_recent_history(conversation_id, max_messages=limit)
     
     async def save_message(self, conversation_id: int, user_id: int, content: str, 
                          is_from_user: bool, model_used: Optional[str] = None) -> Optional[Message]:
@@ -135,7 +293,42 @@ class MessageRepository(BaseRepository[Message]):
                 model_used=model_used
             )
             
-            return await self.create(message)
+            saved = await self.create(message)
+            
+            # Dopisz wiadomość do okna kontekstu konwersacji (jeśli jest w cache)
+            window = context_cache.get(conversation_id)
+            if window is not None:
+                window.append("user" if is_from_user else "assistant", content, saved.id)
+            
+            return saved
         except Exception as e:
             logger.error(f"Błąd zapisywania wiadomości: {e}")
-            return None
\ No newline at end of file
+            return None
+    
+    async def queue_message(self, conversation_id: int, user_id: int, content: str,
+                            is_from_user: bool, model_used: Optional[str] = None):
+        """
+        Zapisuje wiadomość w tle (kolejka zapisów) bez czekania na bazę danych
+        
+        Wiadomość trafia od razu do okna kontekstu konwersacji, a jej ID jest
+        uzupełniane po zapisaniu. Bez kolejki wiadomość jest zapisywana od razu.
+        """
+        if self.write_queue is None:
+            await self.save_message(conversation_id, user_id, content, is_from_user, model_used)
+            return
+        
+        window = context_cache.get(conversation_id)
+        message = window.append("user" if is_from_user else "assistant", content) if window is not None else None
+        
+        def on_saved(saved: Dict[str, Any]):
+            if message is not None:
+                window.set_message_id(message, saved.get('id'))
+        
+        self.write_queue.insert(self.table, {
+            "conversation_id": conversation_id,
+            "user_id": user_id,
+            "content": content,
+            "is_from_user": is_from_user,
+            "model_used": model_used,
+            "created_at": datetime.now(pytz.UTC).isoformat()
+        }, on_saved=on_saved)
\ No newline at end of file
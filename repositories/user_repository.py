@@ -1,17 +1,22 @@
 # repositories/user_repository.py
 import logging
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 from database.models import User
 from repositories.base_repository import BaseRepository
 from api.supabase_client import SupabaseClient
+from utils.cache import language_cache
+
+if TYPE_CHECKING:
+    from services.write_queue import WriteQueue
 
 logger = logging.getLogger(__name__)
 
 class UserRepository(BaseRepository[User]):
     """Repozytorium dla operacji na użytkownikach"""
     
-    def __init__(self, client: SupabaseClient):
+    def __init__(self, client: SupabaseClient, write_queue: Optional['WriteQueue'] = None):
         self.client = client
+        self.write_queue = write_queue
         self.table = "users"
     
     async def get_by_id(self, id: int) -> Optional[User]:
@@ -57,6 +62,23 @@ class UserRepository(BaseRepository[User]):
             logger.error(f"Błąd tworzenia użytkownika: {e}")
             raise
 
+    async def update_language(self, user_id: int, language: str) -> bool:
+        """Zapisuje wybrany język użytkownika"""
+        try:
+            result = await self.client.query(
+                self.table,
+                query_type="update",
+                filters={"id": user_id},
+                data={"language": language}
+            )
+            
+            language_cache.set(user_id, language)
+            return bool(result)
+        except Exception as e:
+            logger.error(f"Błąd zapisywania języka użytkownika {user_id}: {e}")
+            language_cache.invalidate(user_id)
+            return False
+
     async def increment_messages_used(self, user_id: int) -> bool:
         """Zwiększa licznik wykorzystanych wiadomości dla użytkownika"""
         try:
@@ -81,6 +103,13 @@ class UserRepository(BaseRepository[User]):
             logger.error(f"Błąd podczas zwiększania licznika wiadomości: {e}")
             return False
             
+    async def queue_messages_used_increment(self, user_id: int):
+        """Zwiększa licznik wykorzystanych wiadomości w tle (zbiorczo, kolejka zapisów)"""
+        if self.write_queue is None:
+            await self.increment_messages_used(user_id)
+            return
+        self.write_queue.increment("messages_used", user_id)
+    
     async def get_message_status(self, user_id: int) -> dict:
         """
         Pobiera status wiadomości dla użytkownika
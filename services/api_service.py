@@ -33,6 +33,14 @@ class APIService:
         logger.info("Serwis API zainicjalizowany")
         logger.info(f"Zarejestrowane modele Claude: {self.claude_models}")
     
+    async def close(self):
+        """Zamyka pule połączeń wszystkich klientów API"""
+        from api.client_registry import close_http_clients
+        from database.payment_client import close_payment_client
+        await close_http_clients()
+        await close_payment_client()
+        await self.supabase.close()
+    
     async def chat_completion_text(self, messages: List[Dict[str, str]], model: str = DEFAULT_MODEL) -> str:
         """Generuje odpowiedź czatu i zwraca tekst"""
         if model in self.claude_models:
@@ -60,4 +68,13 @@ class APIService:
     
     async def generate_image(self, prompt: str) -> str:
         """Generuje obraz za pomocą DALL-E"""
-        return await self.openai.generate_image(prompt)
\ No newline at end of file
+        return await self.openai.generate_image(prompt)
+
+_api_service = None
+
+def get_api_service() -> APIService:
+    """Zwraca współdzieloną instancję serwisu API (jedna na proces)"""
+    global _api_service
+    if _api_service is None:
+        _api_service = APIService()
+    return _api_service
\ No newline at end of file
@@ -0,0 +1,124 @@
+# services/context_builder.py
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+from utils.context_cache import ContextEntry, trim_entries
+from utils.tokens import count_tokens, get_history_token_budget
+from config import SUMMARY_MODEL, SUMMARY_MAX_TOKENS, SUMMARY_KEEP_RATIO, HISTORY_MAX_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "Streszczasz rozmowę użytkownika z asystentem AI. Zachowaj fakty, ustalenia, "
+    "preferencje użytkownika, nazwy, liczby i otwarte wątki. Pisz zwięźle, w języku "
+    "rozmowy, w punktach. Nie dodawaj komentarzy od siebie."
+)
+
+SUMMARY_CONTEXT_HEADER = "Podsumowanie wcześniejszej części rozmowy:"
+
+def _is_reasoning_model(model: str) -> bool:
+    """Modele serii o (o1, o3-mini...) przyjmują max_completion_tokens i nie obsługują temperature"""
+    return len(model) > 1 and model[0] == "o" and model[1].isdigit()
+
+class ContextBuilder:
+    """
+    Buduje listę wiadomości dla modelu w budżecie tokenów
+
+    - historia pochodzi z okna kontekstu konwersacji (MessageRepository.get_context_window)
+      i jest przycinana od najstarszych wiadomości do budżetu modelu
+    - gdy niepodsumowana historia przekracza budżet (tokenów lub HISTORY_MAX_MESSAGES
+      wiadomości), starsze tury są streszczane
+      tańszym modelem (SUMMARY_MODEL) w tle; podsumowanie jest zapisywane przy
+      konwersacji i dołączane do promptu systemowego w kolejnych turach
+    """
+
+    def __init__(self, api_service, repository_service):
+        self.api_service = api_service
+        self.message_repository = repository_service.message_repository
+        self.conversation_repository = repository_service.conversation_repository
+        self._summarizing: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def build(self, conversation_id: int, model: str, system_prompt: str,
+                    user_message: str) -> List[Dict[str, str]]:
+        """Zwraca wiadomości dla API modelu: prompt systemowy (z podsumowaniem), historię i bieżącą wiadomość"""
+        budget = get_history_token_budget(model)
+        window = await self.message_repository.get_context_window(conversation_id)
+        summary, summary_message_id = await self.conversation_repository.get_summary(conversation_id)
+
+        entries = window.entries(after_id=summary_message_id)
+        if sum(entry[1] for entry in entries) > budget or len(entries) > HISTORY_MAX_MESSAGES:
+            self._schedule_summary(conversation_id, summary, entries, budget)
+
+        if summary:
+            system_prompt = f"{system_prompt}\n\n{SUMMARY_CONTEXT_HEADER}\n{summary}"
+            budget = max(0, budget - count_tokens(summary, model))
+
+        messages = [{"role": "system", "content": system_prompt}]
+        messages.extend(message for message, _, _ in trim_entries(entries, budget))
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def _schedule_summary(self, conversation_id: int, summary: Optional[str],
+                          entries: List[ContextEntry], budget: int):
+        """Uruchamia streszczanie starszych tur w tle (co najwyżej jedno na konwersację)"""
+        if conversation_id in self._summarizing:
+            return
+
+        keep = trim_entries(entries, int(budget * SUMMARY_KEEP_RATIO), int(HISTORY_MAX_MESSAGES * SUMMARY_KEEP_RATIO))
+        older = entries[:len(entries) - len(keep)]
+        if not older or older[-1][2] is None:
+            return
+
+        self._summarizing.add(conversation_id)
+        task = asyncio.create_task(self._summarize(conversation_id, summary, older))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, conversation_id: int, summary: Optional[str], older: List[ContextEntry]):
+        """Rozszerza podsumowanie konwersacji o starsze tury i zapisuje je"""
+        try:
+            transcript = "\n\n".join(
+                f"{'Użytkownik' if message['role'] == 'user' else 'Asystent'}: {message['content']}"
+                for message, _, _ in older
+            )
+            prompt = f"Dotychczasowe podsumowanie:\n{summary}\n\n" if summary else ""
+            prompt += f"Dalsza część rozmowy:\n{transcript}\n\nNapisz zaktualizowane podsumowanie całej rozmowy."
+
+            new_summary = await self._complete([
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ])
+            if new_summary:
+                await self.conversation_repository.save_summary(conversation_id, new_summary.strip(), older[-1][2])
+                logger.info(f"Zaktualizowano podsumowanie konwersacji {conversation_id} ({len(older)} wiadomości)")
+        except Exception as e:
+            logger.warning(f"Nie udało się podsumować konwersacji {conversation_id}: {e}")
+        finally:
+            self._summarizing.discard(conversation_id)
+
+    async def _complete(self, messages: List[Dict[str, str]]) -> str:
+        """Generuje podsumowanie modelem SUMMARY_MODEL (błędy są zgłaszane jako wyjątki)"""
+        if SUMMARY_MODEL in self.api_service.claude_models:
+            response = await self.api_service.anthropic.chat_completion(
+                messages, SUMMARY_MODEL, max_tokens=SUMMARY_MAX_TOKENS, temperature=0.2
+            )
+            return response.content[0].text
+        if _is_reasoning_model(SUMMARY_MODEL):
+            # Limit obejmuje też tokeny rozumowania - z zapasem, żeby zostało miejsce na podsumowanie
+            params = {"max_completion_tokens": SUMMARY_MAX_TOKENS * 4}
+        else:
+            params = {"max_tokens": SUMMARY_MAX_TOKENS, "temperature": 0.2}
+        response = await self.api_service.openai.chat_completion(messages, SUMMARY_MODEL, **params)
+        return response.choices[0].message.content
+
+_context_builder = None
+
+def get_context_builder() -> ContextBuilder:
+    """Zwraca współdzieloną instancję budowania kontekstu (jedna na proces)"""
+    global _context_builder
+    if _context_builder is None:
+        from services.api_service import get_api_service
+        from services.repository_service import get_repository_service
+        _context_builder = ContextBuilder(get_api_service(), get_repository_service())
+    return _context_builder
@@ -0,0 +1,86 @@
+# services/export_service.py
+import datetime
+import logging
+import os
+import tempfile
+import zipfile
+from typing import Iterable, List, Optional
+from utils.export_writers import EXPORT_WRITERS, ExportMeta
+
+logger = logging.getLogger(__name__)
+
+def parse_formats(args: Iterable[str]) -> Optional[List[str]]:
+    """
+    Zamienia argumenty komendy na listę formatów eksportu ("all" = wszystkie)
+
+    Returns:
+        list: Formaty w kolejności rejestracji lub None, gdy któryś format jest nieznany
+    """
+    requested = {arg.lower().lstrip('.') for arg in args}
+    if "all" in requested:
+        return list(EXPORT_WRITERS)
+    if not requested or not requested <= set(EXPORT_WRITERS):
+        return None
+    return [name for name in EXPORT_WRITERS if name in requested]
+
+class ExportService:
+    """
+    Eksport konwersacji do archiwum ZIP w wielu formatach
+
+    Każdy format czyta wiadomości własnym kursorem stron z MessageRepository
+    i zapisuje je od razu do swojej pozycji archiwum (ZIP pozwala pisać tylko
+    jedną pozycję naraz), a archiwum jest tworzone w pliku tymczasowym.
+    """
+
+    def __init__(self, message_repository):
+        self.message_repository = message_repository
+
+    async def export_archive(self, conversation_id: int, formats: List[str], user_info,
+                             bot_name: str, file_stem: str = "conversation") -> Optional[str]:
+        """
+        Eksportuje konwersację do archiwum ZIP
+
+        Args:
+            conversation_id: ID konwersacji
+            formats: Klucze formatów z EXPORT_WRITERS
+            user_info: Informacje o użytkowniku
+            bot_name: Nazwa bota
+            file_stem: Nazwa plików w archiwum (bez rozszerzenia)
+
+        Returns:
+            str: Ścieżka archiwum (usuwa je wywołujący) lub None, gdy konwersacja jest pusta
+        """
+        username = user_info.get('username') if isinstance(user_info, dict) else getattr(user_info, 'username', None)
+        meta = ExportMeta(conversation_id, bot_name, username, datetime.datetime.now())
+
+        fd, archive_path = tempfile.mkstemp(prefix="export_", suffix=".zip")
+        count = 0
+        try:
+            with os.fdopen(fd, 'wb') as archive_file, zipfile.ZipFile(archive_file, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for name in formats:
+                    writer = EXPORT_WRITERS[name](meta)
+                    count = await writer.write(
+                        archive, f"{file_stem}.{writer.extension}",
+                        self.message_repository.iter_messages(conversation_id)
+                    )
+                    if not count:
+                        break
+                    logger.info(f"Eksport konwersacji {conversation_id}: {name}, {count} wiadomości")
+            if not count:
+                os.remove(archive_path)
+                return None
+            return archive_path
+        except BaseException:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+            raise
+
+_export_service = None
+
+def get_export_service() -> ExportService:
+    """Zwraca współdzielony serwis eksportu konwersacji"""
+    global _export_service
+    if _export_service is None:
+        from services.repository_service import get_repository_service
+        _export_service = ExportService(get_repository_service().message_repository)
+    return _export_service
@@ -0,0 +1,190 @@
+# services/forecast_service.py
+import asyncio
+import datetime
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from utils.usage_forecast import UsageForecastState, CreditForecast, MIN_DAILY_USAGE, utc_today
+from config import (
+    FORECAST_REFRESH_INTERVAL, FORECAST_HISTORY_DAYS, FORECAST_LOW_BALANCE_DAYS,
+    LOW_CREDITS_THRESHOLD, CRITICAL_CREDITS_THRESHOLD, CREDIT_COSTS
+)
+
+logger = logging.getLogger(__name__)
+
+def get_message_cost(model: Optional[str]) -> Optional[float]:
+    """Zwraca koszt wiadomości w kredytach dla modelu (None, gdy model nie jest znany)"""
+    if not model:
+        return None
+    return CREDIT_COSTS["message"].get(model, CREDIT_COSTS["message"]["default"])
+
+@dataclass
+class CreditOutlook:
+    """Przeliczona w tle prognoza, rekomendacja pakietu i przypomnienie dla użytkownika"""
+    balance: Optional[int]
+    forecast: CreditForecast
+    recommendation: Optional[Dict[str, Any]]
+    nudge: Optional[str]  # None, "low" lub "critical"
+
+def recommend_package(daily_usage: float, packages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Wybiera najmniejszy pakiet pokrywający prognozowane miesięczne zużycie"""
+    if daily_usage < MIN_DAILY_USAGE:
+        return None
+    candidates = [package for package in packages if package['credits'] >= daily_usage * 30]
+    if not candidates:
+        return None
+    package = min(candidates, key=lambda p: p['credits'])
+    return {
+        'package_id': package['id'],
+        'package_name': package['name'],
+        'credits': package['credits'],
+        'price': package['price'],
+        'days_coverage': int(package['credits'] / daily_usage),
+        'daily_usage': daily_usage
+    }
+
+def get_nudge_level(balance: Optional[int], forecast: CreditForecast) -> Optional[str]:
+    """Poziom przypomnienia o niskim saldzie: saldo poniżej progu lub bliskie wyczerpanie"""
+    if balance is None:
+        return None
+    if balance <= CRITICAL_CREDITS_THRESHOLD:
+        return "critical"
+    if balance <= LOW_CREDITS_THRESHOLD or (
+        forecast.days_left is not None and forecast.days_left < FORECAST_LOW_BALANCE_DAYS
+    ):
+        return "low"
+    return None
+
+class ForecastService:
+    """
+    Okresowe przeliczanie prognoz zużycia kredytów, rekomendacji pakietów
+    i przypomnień o niskim saldzie
+
+    - przy pierwszym przeliczeniu wczytywane są agregaty dzienne z ostatnich
+      FORECAST_HISTORY_DAYS dni, a później tylko wiersze dni nowszych niż
+      ostatnio dołożony dzień (stany użytkowników są aktualizowane przyrostowo)
+    - wyniki są trzymane w pamięci, więc handlery odczytują je bez zapytań do bazy
+    - stany użytkowników bez aktywności dłużej niż FORECAST_HISTORY_DAYS są usuwane
+    """
+
+    def __init__(self, credit_repository, interval: float = FORECAST_REFRESH_INTERVAL):
+        self.credit_repository = credit_repository
+        self.interval = interval
+        self._states: Dict[int, UsageForecastState] = {}
+        self._outlooks: Dict[int, CreditOutlook] = {}
+        self._watermark: Optional[datetime.date] = None  # Ostatni dzień dołożony do stanów
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_lock = asyncio.Lock()
+
+    def get_outlook(self, user_id: int) -> Optional[CreditOutlook]:
+        """Zwraca przeliczoną prognozę użytkownika (None przed pierwszym przeliczeniem)"""
+        return self._outlooks.get(user_id)
+
+    def _fold_until(self, today: datetime.date) -> datetime.date:
+        """
+        Dzień, do którego stany mogą dokładać dni bez zużycia
+
+        Dni po ostatnim pobranym (znak wodny) zostaną dopiero pobrane - dołożone
+        wcześniej jako puste, pominęłyby później swoje wiersze agregatów.
+        """
+        if self._watermark is None:
+            return today
+        return min(today, self._watermark + datetime.timedelta(days=1))
+
+    async def get_state(self, user_id: int) -> UsageForecastState:
+        """Zwraca stan prognozy użytkownika; brakujący jest wczytywany z agregatów dziennych"""
+        today = utc_today()
+        state = self._states.get(user_id)
+        if state is not None:
+            state.advance_to(self._fold_until(today))
+            return state
+
+        rows = await self.credit_repository.get_daily_usage(user_id, FORECAST_HISTORY_DAYS)
+        state = UsageForecastState.from_rows(rows, today)
+        if rows:
+            self._states[user_id] = state
+        return state
+
+    async def refresh(self):
+        """Dokłada nowe agregaty dzienne i przelicza prognozy wszystkich aktywnych użytkowników"""
+        async with self._refresh_lock:
+            # Zwroty z wygasłych rezerwacji zmieniają salda i dzienne zużycie
+            await self.credit_repository.release_expired_holds()
+            today = utc_today()
+            if self._watermark is None:
+                since = today - datetime.timedelta(days=FORECAST_HISTORY_DAYS)
+            else:
+                since = self._watermark + datetime.timedelta(days=1)
+
+            rows_by_user: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+            fetched = 0
+            async for page in self.credit_repository.iter_daily_usage_since(since.isoformat()):
+                for row in page:
+                    rows_by_user[row['user_id']].append(row)
+                fetched += len(page)
+
+            for user_id, rows in rows_by_user.items():
+                state = self._states.get(user_id)
+                if state is None:
+                    state = self._states[user_id] = UsageForecastState()
+                state.update(rows, today)
+
+            expire_before = today - datetime.timedelta(days=FORECAST_HISTORY_DAYS)
+            for user_id, state in list(self._states.items()):
+                if state.last_activity is None or state.last_activity < expire_before:
+                    del self._states[user_id]
+                    self._outlooks.pop(user_id, None)
+
+            # Pusty wynik może oznaczać błąd bazy - wtedy te same dni zostaną pobrane ponownie
+            if fetched or not self._states:
+                self._watermark = today - datetime.timedelta(days=1)
+
+            packages = await self.credit_repository.get_credit_packages()
+            fold_until = self._fold_until(today)
+            for user_id, state in self._states.items():
+                state.advance_to(fold_until)
+                forecast = state.forecast(today=today)
+                self._outlooks[user_id] = CreditOutlook(
+                    balance=state.balance,
+                    forecast=forecast,
+                    recommendation=recommend_package(forecast.daily_usage, packages),
+                    nudge=get_nudge_level(state.balance, forecast)
+                )
+
+            logger.info(f"Przeliczono prognozy kredytów {len(self._outlooks)} użytkowników ({fetched} nowych wierszy agregatów)")
+
+    # Cykl życia
+
+    async def start(self):
+        """Uruchamia okresowe przeliczanie w tle"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Zatrzymuje przeliczanie w tle"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Błąd przeliczania prognoz kredytów: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+_forecast_service = None
+
+def get_forecast_service() -> ForecastService:
+    """Zwraca współdzielony serwis prognoz kredytów (jeden na proces)"""
+    global _forecast_service
+    if _forecast_service is None:
+        from services.repository_service import get_repository_service
+        _forecast_service = ForecastService(get_repository_service().credit_repository)
+    return _forecast_service
@@ -0,0 +1,265 @@
+# services/persistence.py
+import asyncio
+import pickle
+import sqlite3
+import time
+import logging
+from typing import Any, Dict, Optional
+from telegram.ext import BasePersistence, PersistenceInput
+from config import (
+    STATE_BACKEND, STATE_SQLITE_PATH, STATE_REDIS_URL, STATE_FLUSH_INTERVAL, STATE_SHARED
+)
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    aioredis = None
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+class StateBackend:
+    """Magazyn klucz-wartość dla stanu rozmów (wartości to bajty)"""
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set_many(self, items: Dict[str, bytes]):
+        """Zapisuje wiele kluczy w jednej operacji"""
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class MemoryBackend(StateBackend):
+    """Magazyn w pamięci procesu - do testów i pracy lokalnej (stan ginie przy restarcie)"""
+
+    def __init__(self):
+        self.data: Dict[str, bytes] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self.data.get(key)
+
+    async def set_many(self, items: Dict[str, bytes]):
+        self.data.update(items)
+
+    async def delete(self, key: str):
+        self.data.pop(key, None)
+
+class SQLiteBackend(StateBackend):
+    """
+    Magazyn w pliku SQLite (tryb WAL - kilka procesów na jednym hoście może
+    współdzielić plik). Zapytania są wykonywane w wątku, poza pętlą zdarzeń.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bot_state ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = asyncio.Lock()
+
+    def _get(self, key: str) -> Optional[bytes]:
+        row = self._conn.execute("SELECT value FROM bot_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_many(self, items: Dict[str, bytes]):
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO bot_state (key, value, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                [(key, value, now) for key, value in items.items()]
+            )
+
+    def _delete(self, key: str):
+        with self._conn:
+            self._conn.execute("DELETE FROM bot_state WHERE key = ?", (key,))
+
+    async def get(self, key: str) -> Optional[bytes]:
+        async with self._lock:
+            return await asyncio.to_thread(self._get, key)
+
+    async def set_many(self, items: Dict[str, bytes]):
+        async with self._lock:
+            await asyncio.to_thread(self._set_many, items)
+
+    async def delete(self, key: str):
+        async with self._lock:
+            await asyncio.to_thread(self._delete, key)
+
+    async def close(self):
+        self._conn.close()
+
+class RedisBackend(StateBackend):
+    """Magazyn w Redis (lub zgodnym serwerze) - współdzielony przez procesy na wielu hostach"""
+
+    def __init__(self, url: str, prefix: str = "telegramapi:"):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("Brak pakietu redis - zainstaluj go, aby używać STATE_BACKEND=redis")
+        self.prefix = prefix
+        self._redis = aioredis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis.get(self.prefix + key)
+
+    async def set_many(self, items: Dict[str, bytes]):
+        await self._redis.mset({self.prefix + key: value for key, value in items.items()})
+
+    async def delete(self, key: str):
+        await self._redis.delete(self.prefix + key)
+
+    async def close(self):
+        await self._redis.aclose()
+
+def create_backend(name: str = STATE_BACKEND) -> StateBackend:
+    """Tworzy magazyn stanu na podstawie konfiguracji (memory, sqlite, redis)"""
+    if name == "redis":
+        return RedisBackend(STATE_REDIS_URL)
+    if name == "sqlite":
+        return SQLiteBackend(STATE_SQLITE_PATH)
+    if name != "memory":
+        logger.warning(f"Nieznany magazyn stanu '{name}' - używam pamięci procesu")
+    return MemoryBackend()
+
+class StatePersistence(BasePersistence):
+    """
+    Trwały stan rozmów (context.chat_data) dla python-telegram-bot
+
+    - dane czatu są wczytywane leniwie, przy pierwszej aktualizacji z danego
+      czatu, zamiast w całości przy starcie
+    - zmiany są zapisywane zbiorczo co update_interval sekund (jedna operacja
+      set_many dla wszystkich zmienionych czatów) oraz przy zatrzymaniu
+    - w trybie shared (kilka procesów bota) dane czatu są odświeżane z magazynu
+      przed każdą aktualizacją; niezapisane lokalne zmiany są wtedy zapisywane
+      od razu zamiast nadpisywane
+    """
+
+    def __init__(self, backend: StateBackend, update_interval: float = STATE_FLUSH_INTERVAL,
+                 shared: bool = STATE_SHARED):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=False, callback_data=False),
+            update_interval=update_interval
+        )
+        self.backend = backend
+        self.shared = shared
+        self._synced: Dict[int, bytes] = {}   # Ostatnio zapisany/wczytany stan czatu
+        self._dirty: Dict[int, bytes] = {}
+        self._flush_lock = asyncio.Lock()
+
+    @staticmethod
+    def _key(chat_id: int) -> str:
+        return f"chat_data:{chat_id}"
+
+    @staticmethod
+    def _dumps(data: Any) -> bytes:
+        # pickle zachowuje klucze int (user_id) w chat_data['user_data']
+        return pickle.dumps(dict(data), protocol=pickle.HIGHEST_PROTOCOL)
+
+    async def _flush_dirty(self):
+        """Zapisuje wszystkie zmienione czaty jedną operacją"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+            try:
+                await self.backend.set_many({self._key(chat_id): value for chat_id, value in dirty.items()})
+                self._synced.update(dirty)
+            except Exception as e:
+                logger.error(f"Błąd zapisu stanu {len(dirty)} czatów: {e}")
+                # Spróbujemy ponownie przy następnym zapisie
+                for chat_id, value in dirty.items():
+                    self._dirty.setdefault(chat_id, value)
+
+    # Dane czatów
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        # Dane są wczytywane leniwie w refresh_chat_data
+        return {}
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Any):
+        if chat_id in self._synced and not self.shared:
+            return
+
+        if chat_id in self._synced:
+            current = self._dumps(chat_data)
+            if current != self._synced[chat_id]:
+                # Lokalne, jeszcze niezapisane zmiany - zapisz je, zamiast nadpisywać
+                self._dirty[chat_id] = current
+                await self._flush_dirty()
+                return
+
+        try:
+            stored = await self.backend.get(self._key(chat_id))
+        except Exception as e:
+            logger.error(f"Błąd odczytu stanu czatu {chat_id}: {e}")
+            return
+
+        if stored is None:
+            self._synced[chat_id] = self._dumps(chat_data)
+            return
+
+        if stored != self._synced.get(chat_id):
+            chat_data.clear()
+            chat_data.update(pickle.loads(stored))
+        self._synced[chat_id] = stored
+
+    async def update_chat_data(self, chat_id: int, data: Any):
+        current = self._dumps(data)
+        if current == self._synced.get(chat_id):
+            return
+        self._dirty[chat_id] = current
+        await self._flush_dirty()
+
+    async def drop_chat_data(self, chat_id: int):
+        self._synced.pop(chat_id, None)
+        self._dirty.pop(chat_id, None)
+        await self.backend.delete(self._key(chat_id))
+
+    async def flush(self):
+        await self._flush_dirty()
+        await self.backend.close()
+
+    # Pozostałe dane nie są przechowywane (store_data wyłącza je w Application)
+
+    async def get_user_data(self) -> Dict[int, Any]:
+        return {}
+
+    async def get_bot_data(self) -> Any:
+        return {}
+
+    async def get_callback_data(self) -> Optional[Any]:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    async def update_conversation(self, name: str, key: Any, new_state: Optional[object]):
+        pass
+
+    async def update_user_data(self, user_id: int, data: Any):
+        pass
+
+    async def update_bot_data(self, data: Any):
+        pass
+
+    async def update_callback_data(self, data: Any):
+        pass
+
+    async def drop_user_data(self, user_id: int):
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: Any):
+        pass
+
+    async def refresh_bot_data(self, bot_data: Any):
+        pass
@@ -5,6 +5,8 @@ from repositories.user_repository import UserRepository
 from repositories.conversation_repository import ConversationRepository
 from repositories.message_repository import MessageRepository
 from repositories.credit_repository import CreditRepository
+from repositories.activation_repository import ActivationRepository
+from services.write_queue import WriteQueue
 
 logger = logging.getLogger(__name__)
 
@@ -12,9 +14,23 @@ class RepositoryService:
     """Centralny serwis zapewniający dostęp do wszystkich repozytoriów"""
     
     def __init__(self, supabase_client: SupabaseClient):
-        self.user_repository = UserRepository(supabase_client)
+        # Kolejka zapisów w tle - uruchamiana w post_init aplikacji (main.py)
+        self.write_queue = WriteQueue(supabase_client)
+        
+        self.user_repository = UserRepository(supabase_client, self.write_queue)
         self.conversation_repository = ConversationRepository(supabase_client)
-        self.message_repository = MessageRepository(supabase_client)
+        self.message_repository = MessageRepository(supabase_client, self.write_queue)
         self.credit_repository = CreditRepository(supabase_client)
+        self.activation_repository = ActivationRepository(supabase_client)
         
-        logger.info("Serwis Repozytorium zainicjalizowany")
\ No newline at end of file
+        logger.info("Serwis Repozytorium zainicjalizowany")
+
+_repository_service = None
+
+def get_repository_service() -> RepositoryService:
+    """Zwraca współdzieloną instancję serwisu repozytoriów (jedna na proces)"""
+    global _repository_service
+    if _repository_service is None:
+        from services.api_service import get_api_service
+        _repository_service = RepositoryService(get_api_service().supabase)
+    return _repository_service
\ No newline at end of file
@@ -0,0 +1,172 @@
+# services/webhook_server.py
+import asyncio
+import hmac
+import re
+import signal
+import logging
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+from utils.cache import TTLCache
+from config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN, WEBHOOK_LISTEN, WEBHOOK_PORT,
+    WEBHOOK_SET_ON_START, WEBHOOK_DRAIN_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Format tokenu akceptowany przez setWebhook
+SECRET_TOKEN_RE = re.compile(r"[A-Za-z0-9_-]{1,256}")
+
+# Ostatnio obsłużone update_id w tym procesie - szybka ścieżka przed zapytaniem do bazy
+seen_updates = TTLCache("telegram_updates", maxsize=10000, ttl=3600.0)
+
+class WebhookServer:
+    """
+    Serwer aiohttp przyjmujący aktualizacje Telegram przez webhook
+
+    - sprawdza nagłówek X-Telegram-Bot-Api-Secret-Token (token jest wymagany -
+      bez niego każdy, kto zna adres, mógłby wysyłać sfałszowane aktualizacje)
+    - pomija powtórzone aktualizacje (update_id) - lokalnie i przez bazę danych,
+      więc kilka procesów bota może działać za jednym load balancerem
+    - udostępnia /health dla load balancera
+    - przy zatrzymaniu przestaje przyjmować aktualizacje (503) i czeka
+      na obsłużenie już przyjętych
+    """
+
+    def __init__(self, application: Application, path: str = WEBHOOK_PATH,
+                 secret_token: str = WEBHOOK_SECRET_TOKEN):
+        if not secret_token or not SECRET_TOKEN_RE.fullmatch(secret_token):
+            raise ValueError(
+                "Tryb webhook wymaga WEBHOOK_SECRET_TOKEN (1-256 znaków: A-Z, a-z, 0-9, _ i -) - "
+                "ten sam token musi być ustawiony we wszystkich procesach bota"
+            )
+        self.application = application
+        self.path = path
+        self.secret_token = secret_token
+        self.draining = False
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_post(path, self.handle_update)
+        self.app.router.add_get("/health", self.handle_health)
+
+    async def _claim_update(self, update_id: int) -> bool:
+        """Zwraca True, jeśli aktualizacja nie była jeszcze obsłużona przez żaden proces"""
+        if seen_updates.get(update_id):
+            return False
+        seen_updates.set(update_id, True)
+
+        from services.api_service import get_api_service
+        claimed = await get_api_service().supabase.rpc(
+            "claim_telegram_update", {"p_update_id": update_id}, retry=False
+        )
+        # Przy błędzie bazy obsługujemy aktualizację - lepiej niż ją zgubić
+        return claimed is not False
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """Przyjmuje aktualizację od Telegrama i przekazuje ją do kolejki aplikacji"""
+        received = request.headers.get(SECRET_TOKEN_HEADER, "")
+        if not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+            logger.warning(f"Odrzucono żądanie webhooka z nieprawidłowym tokenem od {request.remote}")
+            return web.Response(status=403)
+
+        if self.draining:
+            # Telegram ponowi aktualizację - trafi do innego procesu
+            return web.Response(status=503)
+
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            logger.warning(f"Nieprawidłowa aktualizacja w webhooku: {e}")
+            return web.Response(status=400)
+
+        if update is None:
+            return web.Response(status=400)
+
+        if not await self._claim_update(update.update_id):
+            logger.debug(f"Pominięto powtórzoną aktualizację {update.update_id}")
+            return web.Response()
+
+        await self.application.update_queue.put(update)
+        return web.Response()
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """Stan procesu dla load balancera (503 podczas zatrzymywania)"""
+        return web.json_response(
+            {
+                "status": "draining" if self.draining else "ok",
+                "pending_updates": self.application.update_queue.qsize()
+            },
+            status=503 if self.draining else 200
+        )
+
+    async def start(self, host: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT):
+        """Uruchamia serwer HTTP"""
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Serwer webhooka nasłuchuje na {host}:{port}{self.path}")
+
+    async def drain(self, timeout: float = WEBHOOK_DRAIN_TIMEOUT):
+        """Przestaje przyjmować aktualizacje i czeka na obsłużenie przyjętych"""
+        self.draining = True
+        logger.info(f"Zatrzymywanie - oczekiwanie na {self.application.update_queue.qsize()} aktualizacji w kolejce")
+        try:
+            # Application.stop() kończy po obsłużeniu aktualizacji z kolejki i trwających zadań
+            await asyncio.wait_for(self.application.stop(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Nie obsłużono wszystkich aktualizacji w ciągu {timeout}s")
+
+    async def stop(self):
+        """Zamyka serwer HTTP"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+async def run_webhook(application: Application):
+    """Uruchamia bota w trybie webhook i działa do otrzymania SIGINT/SIGTERM"""
+    server = WebhookServer(application)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+
+    if WEBHOOK_SET_ON_START:
+        if WEBHOOK_URL:
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL,
+                secret_token=server.secret_token,
+                allowed_updates=Update.ALL_TYPES
+            )
+            logger.info(f"Zarejestrowano webhook: {WEBHOOK_URL}")
+        else:
+            logger.warning("Brak WEBHOOK_URL - webhook nie został zarejestrowany w Telegramie")
+
+    await application.start()
+    await server.start()
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows - Ctrl+C przerwie asyncio.run()
+            pass
+
+    try:
+        await stop_event.wait()
+    finally:
+        await server.drain()
+        await server.stop()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1,312 @@
+# services/write_queue.py
+import asyncio
+import json
+import logging
+import os
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import httpx
+from api.supabase_client import SupabaseClient
+from config import (
+    WRITE_QUEUE_SPOOL_PATH, WRITE_QUEUE_BATCH_SIZE, WRITE_QUEUE_FLUSH_INTERVAL, WRITE_QUEUE_MAX_BACKOFF
+)
+
+logger = logging.getLogger(__name__)
+
+# Liczniki obsługiwane przez kolejkę -> funkcja Postgres przyjmująca {klucz: przyrost}
+COUNTER_FUNCTIONS = {
+    "messages_used": "increment_messages_used_batch"
+}
+
+# Tabele z kluczem nadawanym przez kolejkę -> kolumna klucza (unikalna); wiersze
+# wczytane ponownie z dziennika są wstawiane z pominięciem już zapisanych
+IDEMPOTENT_INSERTS = {
+    "messages": "client_id"
+}
+
+# Kody 4xx oznaczające problem z połączeniem lub konfiguracją, a nie z danymi
+RETRYABLE_CLIENT_ERRORS = (401, 403, 404, 408, 429)
+
+def _is_permanent_error(error: Exception) -> bool:
+    """Czy baza odrzuciła dane (np. naruszenie klucza obcego) - ponowienie nic nie zmieni"""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return 400 <= status < 500 and status not in RETRYABLE_CLIENT_ERRORS
+    return False
+
+# Wiersz do wstawienia i funkcja wywoływana z zapisanym wierszem (np. z nadanym ID)
+PendingInsert = Tuple[Dict[str, Any], Optional[Callable[[Dict[str, Any]], None]]]
+
+class WriteQueue:
+    """
+    Kolejka zapisów w tle dla operacji, na które użytkownik nie musi czekać
+    (logi wiadomości, liczniki)
+
+    - wiersze są wstawiane zbiorczo (jedno zapytanie na tabelę i paczkę
+      WRITE_QUEUE_BATCH_SIZE wierszy), a przyrosty liczników sumowane i wysyłane
+      jednym wywołaniem funkcji Postgres
+    - każda operacja jest dopisywana do dziennika na dysku (spool); po każdym
+      zapisie dziennik jest przepisywany tak, by zawierał tylko operacje wciąż
+      oczekujące, a po restarcie są one wczytywane ponownie
+    - wiersze tabel z IDEMPOTENT_INSERTS dostają klucz nadany przez kolejkę,
+      więc ponowne wstawienie wiersza zapisanego przed awarią jest pomijane
+      (liczniki są dostarczane co najmniej raz)
+    - po błędzie przejściowym (5xx, przekroczenie czasu) operacje zostają
+      w kolejce, a kolejne próby następują z rosnącą przerwą (do
+      WRITE_QUEUE_MAX_BACKOFF sekund); paczka odrzucona przez bazę (4xx) jest
+      dzielona, a wiersze odrzucone pojedynczo są logowane i pomijane
+    """
+
+    def __init__(self, client: SupabaseClient, spool_path: Optional[str] = WRITE_QUEUE_SPOOL_PATH,
+                 batch_size: int = WRITE_QUEUE_BATCH_SIZE, flush_interval: float = WRITE_QUEUE_FLUSH_INTERVAL):
+        self.client = client
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._inserts: Dict[str, List[PendingInsert]] = defaultdict(list)
+        self._counters: Dict[str, Dict[Any, int]] = defaultdict(lambda: defaultdict(int))
+        self._spool = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._backoff = 0.0
+        self.dropped = 0  # Liczba wierszy odrzuconych przez bazę i pominiętych
+
+    def __len__(self) -> int:
+        """Liczba oczekujących operacji"""
+        return sum(len(items) for items in self._inserts.values()) + sum(
+            len(counts) for counts in self._counters.values()
+        )
+
+    # Dodawanie operacji
+
+    def insert(self, table: str, row: Dict[str, Any], on_saved: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        Dodaje wiersz do zapisania w tle
+
+        Args:
+            table: Nazwa tabeli
+            row: Dane wiersza (wiersze jednej tabeli powinny mieć te same kolumny)
+            on_saved: Funkcja wywoływana z zapisanym wierszem (nie jest zachowywana w dzienniku)
+        """
+        key = IDEMPOTENT_INSERTS.get(table)
+        if key:
+            row.setdefault(key, str(uuid.uuid4()))
+        self._journal({"op": "insert", "table": table, "row": row})
+        self._inserts[table].append((row, on_saved))
+        if len(self._inserts[table]) >= self.batch_size:
+            self._wakeup.set()
+
+    def increment(self, counter: str, key: Any, amount: int = 1):
+        """Zwiększa licznik (np. messages_used użytkownika key) w tle"""
+        if counter not in COUNTER_FUNCTIONS:
+            raise ValueError(f"Nieobsługiwany licznik: {counter}")
+        self._journal({"op": "increment", "counter": counter, "key": key, "amount": amount})
+        self._counters[counter][key] += amount
+
+    # Dziennik na dysku
+
+    def _journal(self, item: Dict[str, Any]):
+        if self._spool is None:
+            return
+        try:
+            self._spool.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+            self._spool.flush()
+        except OSError as e:
+            logger.error(f"Błąd zapisu dziennika kolejki zapisów: {e}")
+
+    def _replay_spool(self):
+        """Wczytuje operacje niezapisane przed poprzednim zatrzymaniem"""
+        try:
+            with open(self.spool_path, "r", encoding="utf-8") as spool:
+                lines = spool.readlines()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.error(f"Błąd odczytu dziennika kolejki zapisów: {e}")
+            return
+
+        restored = 0
+        for line in lines:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                # Niedokończona linia po nagłym zatrzymaniu procesu
+                continue
+            if item.get("op") == "insert":
+                self._inserts[item["table"]].append((item["row"], None))
+            elif item.get("op") == "increment" and item.get("counter") in COUNTER_FUNCTIONS:
+                self._counters[item["counter"]][item["key"]] += item.get("amount", 1)
+            else:
+                continue
+            restored += 1
+
+        if restored:
+            logger.info(f"Wczytano {restored} niezapisanych operacji z dziennika kolejki zapisów")
+
+    def _compact_spool(self):
+        """
+        Przepisuje dziennik tak, by zawierał tylko oczekujące operacje
+
+        Nowy dziennik jest zapisywany obok i podmieniany atomowo - bez awaitów,
+        więc żadna operacja dodana w międzyczasie nie zostanie pominięta.
+        """
+        if self._spool is None:
+            return
+        tmp_path = f"{self.spool_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as spool:
+                for table, items in self._inserts.items():
+                    for row, _ in items:
+                        spool.write(json.dumps({"op": "insert", "table": table, "row": row},
+                                               ensure_ascii=False, default=str) + "\n")
+                for counter, counts in self._counters.items():
+                    for key, amount in counts.items():
+                        spool.write(json.dumps({"op": "increment", "counter": counter, "key": key, "amount": amount},
+                                               ensure_ascii=False, default=str) + "\n")
+                spool.flush()
+                os.fsync(spool.fileno())
+            self._spool.close()
+            os.replace(tmp_path, self.spool_path)
+        except OSError as e:
+            logger.error(f"Błąd przepisywania dziennika kolejki zapisów: {e}")
+        finally:
+            if self._spool.closed:
+                self._spool = open(self.spool_path, "a", encoding="utf-8")
+
+    # Cykl życia
+
+    async def start(self):
+        """Wczytuje dziennik i uruchamia zapisywanie w tle"""
+        if self._task is not None:
+            return
+        if self.spool_path:
+            self._replay_spool()
+            try:
+                self._spool = open(self.spool_path, "a", encoding="utf-8")
+            except OSError as e:
+                logger.error(f"Nie można otworzyć dziennika kolejki zapisów {self.spool_path}: {e}")
+        self._task = asyncio.create_task(self._run())
+        if len(self):
+            self._wakeup.set()
+
+    async def stop(self):
+        """Zatrzymuje zapisywanie w tle i zapisuje oczekujące operacje"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if not await self.flush() and len(self):
+            logger.warning(f"{len(self)} operacji pozostaje w dzienniku kolejki zapisów do następnego uruchomienia")
+
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval + self._backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Nieoczekiwany błąd kolejki zapisów: {e}", exc_info=True)
+
+    # Zapis do bazy
+
+    async def flush(self) -> bool:
+        """Zapisuje oczekujące operacje; zwraca False, jeśli część z nich nie została zapisana"""
+        async with self._flush_lock:
+            if not len(self):
+                return True
+
+            inserts, self._inserts = self._inserts, defaultdict(list)
+            counters, self._counters = self._counters, defaultdict(lambda: defaultdict(int))
+            ok = True
+
+            for table, items in inserts.items():
+                failed: List[PendingInsert] = []
+                for start in range(0, len(items), self.batch_size):
+                    failed = await self._insert_chunk(table, items[start:start + self.batch_size])
+                    if failed:
+                        # Błąd przejściowy - kolejne paczki czekają na ponowienie (zachowana kolejność)
+                        failed.extend(items[start + self.batch_size:])
+                        break
+                if failed:
+                    ok = False
+                    # Niezapisane wiersze wracają przed dodane w międzyczasie
+                    self._inserts[table] = failed + self._inserts[table]
+
+            for counter, counts in counters.items():
+                result = await self.client.rpc(
+                    COUNTER_FUNCTIONS[counter], {"p_counts": {str(key): amount for key, amount in counts.items()}},
+                    retry=False
+                )
+                if result is None:
+                    ok = False
+                    for key, amount in counts.items():
+                        self._counters[counter][key] += amount
+
+            self._compact_spool()
+            if ok:
+                self._backoff = 0.0
+            else:
+                self._backoff = min(max(1.0, self._backoff * 2), WRITE_QUEUE_MAX_BACKOFF)
+                logger.warning(f"Nie zapisano {len(self)} operacji kolejki - ponowienie za {self.flush_interval + self._backoff:.0f}s")
+            return ok
+
+    async def _insert_chunk(self, table: str, chunk: List[PendingInsert]) -> List[PendingInsert]:
+        """
+        Wstawia paczkę wierszy; zwraca wiersze do ponowienia (pusta lista = paczka obsłużona)
+
+        Paczka odrzucona przez bazę jest dzielona na pół, aż do wydzielenia
+        odrzuconych wierszy - te są logowane i pomijane, a pozostałe zapisywane.
+        """
+        key = IDEMPOTENT_INSERTS.get(table)
+        rows = [row for row, _ in chunk]
+        try:
+            result = await self.client.insert_rows(table, rows, on_conflict=key)
+        except Exception as e:
+            if not _is_permanent_error(e):
+                logger.warning(f"Błąd zapisu {len(rows)} wierszy do {table} - zostaną ponowione: {e}")
+                return chunk
+            if len(chunk) == 1:
+                self.dropped += 1
+                detail = e.response.text[:500] if isinstance(e, httpx.HTTPStatusError) else ""
+                logger.error(f"Baza odrzuciła wiersz {table} - pominięto go: {e} {detail} "
+                             f"{json.dumps(rows[0], ensure_ascii=False, default=str)[:500]}")
+                return []
+            middle = len(chunk) // 2
+            failed = await self._insert_chunk(table, chunk[:middle])
+            if failed:
+                return failed + chunk[middle:]
+            return await self._insert_chunk(table, chunk[middle:])
+
+        if key:
+            # Duplikaty pominięte przy ponowieniu nie wracają w odpowiedzi
+            saved_by_key = {saved.get(key): saved for saved in result}
+            pairs = [(on_saved, saved_by_key.get(row[key])) for row, on_saved in chunk]
+        else:
+            pairs = [(on_saved, saved) for (_, on_saved), saved in zip(chunk, result)]
+
+        for on_saved, saved in pairs:
+            if on_saved is not None and saved is not None:
+                try:
+                    on_saved(saved)
+                except Exception as e:
+                    logger.warning(f"Błąd obsługi zapisanego wiersza {table}: {e}")
+        return []
+
+def get_write_queue() -> WriteQueue:
+    """Zwraca współdzieloną kolejkę zapisów (jedna na proces, należy do serwisu repozytoriów)"""
+    from services.repository_service import get_repository_service
+    return get_repository_service().write_queue
@@ -0,0 +1,77 @@
+-- Atomowe operacje na kredytach użytkownika.
+-- Każda funkcja zmienia saldo w user_credits i dopisuje wiersz do
+-- credit_transactions w jednej transakcji, zwracając nowe saldo.
+-- Blokada wiersza nałożona przez UPDATE serializuje równoległe żądania
+-- tego samego użytkownika, więc nie ma utraconych aktualizacji.
+
+create unique index if not exists user_credits_user_id_key
+    on public.user_credits (user_id);
+
+-- Odejmuje kredyty, jeśli saldo jest wystarczające.
+-- Zwraca nowe saldo albo NULL, gdy kredytów jest za mało.
+create or replace function public.deduct_credits(
+    p_user_id bigint,
+    p_amount integer,
+    p_description text default null
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_after integer;
+begin
+    update public.user_credits
+       set credits_amount = credits_amount - p_amount
+     where user_id = p_user_id
+       and credits_amount >= p_amount
+    returning credits_amount into v_after;
+
+    if not found then
+        return null;
+    end if;
+
+    insert into public.credit_transactions
+        (user_id, transaction_type, amount, credits_before, credits_after, description, created_at)
+    values
+        (p_user_id, 'deduct', p_amount, v_after + p_amount, v_after, p_description, now());
+
+    return v_after;
+end;
+$$;
+
+-- Dodaje kredyty (bonus, kod aktywacyjny lub zakup pakietu).
+-- Tworzy rekord user_credits, jeśli jeszcze nie istnieje. Zwraca nowe saldo.
+create or replace function public.add_credits(
+    p_user_id bigint,
+    p_amount integer,
+    p_description text default null,
+    p_transaction_type text default 'add',
+    p_price numeric default 0
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_after integer;
+begin
+    insert into public.user_credits
+        (user_id, credits_amount, total_credits_purchased, total_spent, last_purchase_date)
+    values
+        (p_user_id, p_amount, p_amount, p_price, now())
+    on conflict (user_id) do update
+       set credits_amount = public.user_credits.credits_amount + excluded.credits_amount,
+           total_credits_purchased = coalesce(public.user_credits.total_credits_purchased, 0) + excluded.total_credits_purchased,
+           total_spent = coalesce(public.user_credits.total_spent, 0) + excluded.total_spent,
+           last_purchase_date = excluded.last_purchase_date
+    returning credits_amount into v_after;
+
+    if p_amount <> 0 then
+        insert into public.credit_transactions
+            (user_id, transaction_type, amount, credits_before, credits_after, description, created_at)
+        values
+            (p_user_id, p_transaction_type, p_amount, v_after - p_amount, v_after, p_description, now());
+    end if;
+
+    return v_after;
+end;
+$$;
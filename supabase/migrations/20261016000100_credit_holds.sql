@@ -0,0 +1,107 @@
+-- Rezerwacje kredytów dla strumieniowanych odpowiedzi LLM.
+-- reserve_credits pobiera kredyty z góry (saldo + wiersz w credit_transactions
+-- + rezerwacja) w jednym wywołaniu. Rezerwację można zwolnić (zwrot kredytów)
+-- lub rozliczyć niższą kwotą do chwili wygaśnięcia; po expires_at obciążenie
+-- staje się ostateczne bez żadnego dodatkowego zapisu.
+
+create table if not exists public.credit_holds (
+    id bigserial primary key,
+    user_id bigint not null,
+    amount integer not null,
+    description text,
+    status text not null default 'held',  -- held | settled | released
+    created_at timestamptz not null default now(),
+    expires_at timestamptz not null
+);
+
+create index if not exists credit_holds_user_id_expires_at_idx
+    on public.credit_holds (user_id, expires_at);
+
+-- Rezerwuje kredyty. Zwraca {hold_id, credits_after} albo NULL, gdy saldo
+-- jest niewystarczające.
+create or replace function public.reserve_credits(
+    p_user_id bigint,
+    p_amount integer,
+    p_description text default null,
+    p_ttl_seconds integer default 300
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_after integer;
+    v_hold_id bigint;
+begin
+    update public.user_credits
+       set credits_amount = credits_amount - p_amount
+     where user_id = p_user_id
+       and credits_amount >= p_amount
+    returning credits_amount into v_after;
+
+    if not found then
+        return null;
+    end if;
+
+    insert into public.credit_transactions
+        (user_id, transaction_type, amount, credits_before, credits_after, description, created_at)
+    values
+        (p_user_id, 'deduct', p_amount, v_after + p_amount, v_after, p_description, now());
+
+    -- Wygasłe rezerwacje nie są już potrzebne - sprzątamy je przy okazji
+    delete from public.credit_holds
+     where user_id = p_user_id
+       and expires_at < now() - interval '1 day';
+
+    insert into public.credit_holds (user_id, amount, description, expires_at)
+    values (p_user_id, p_amount, p_description, now() + make_interval(secs => p_ttl_seconds))
+    returning id into v_hold_id;
+
+    return jsonb_build_object('hold_id', v_hold_id, 'credits_after', v_after);
+end;
+$$;
+
+-- Zwraca różnicę między kwotą zarezerwowaną a faktyczną (p_amount) i zamyka
+-- rezerwację. p_amount = 0 oznacza pełne zwolnienie. Zwraca nowe saldo albo
+-- NULL, gdy rezerwacja nie istnieje, jest już zamknięta lub wygasła.
+create or replace function public.settle_credit_hold(
+    p_hold_id bigint,
+    p_amount integer default 0
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_user_id bigint;
+    v_reserved integer;
+    v_description text;
+    v_refund integer;
+    v_after integer;
+begin
+    update public.credit_holds
+       set status = case when p_amount > 0 then 'settled' else 'released' end
+     where id = p_hold_id
+       and status = 'held'
+       and expires_at > now()
+    returning user_id, amount, description into v_user_id, v_reserved, v_description;
+
+    if not found then
+        return null;
+    end if;
+
+    v_refund := v_reserved - least(greatest(p_amount, 0), v_reserved);
+
+    update public.user_credits
+       set credits_amount = credits_amount + v_refund
+     where user_id = v_user_id
+    returning credits_amount into v_after;
+
+    if v_refund > 0 then
+        insert into public.credit_transactions
+            (user_id, transaction_type, amount, credits_before, credits_after, description, created_at)
+        values
+            (v_user_id, 'refund', v_refund, v_after - v_refund, v_after, v_description, now());
+    end if;
+
+    return v_after;
+end;
+$$;
@@ -0,0 +1,7 @@
+-- Indeks pod zapytania o historię transakcji użytkownika w oknie czasowym.
+-- CreditRepository.iter_transactions filtruje po user_id i zakresie created_at,
+-- sortuje po (created_at, id) i stronicuje kluczem (created_at, id) - ten indeks
+-- obsługuje filtr, sortowanie i kursor bez skanowania całej historii użytkownika.
+
+create index if not exists credit_transactions_user_id_created_at_idx
+    on public.credit_transactions (user_id, created_at, id);
@@ -0,0 +1,237 @@
+-- Kategoria operacji zapisywana przy pobraniu kredytów oraz dzienne agregaty
+-- zużycia (user_id, day, category) utrzymywane przyrostowo przez trigger.
+-- Statystyki, wykres zużycia i prognoza wyczerpania kredytów czytają kilkadziesiąt
+-- wierszy z credit_usage_daily zamiast całej historii credit_transactions.
+--
+-- Kategorie: message | image | document | photo | other dla pobrań (deduct)
+-- i zwrotów (refund) oraz purchase dla wszystkich doładowań.
+
+alter table public.credit_transactions
+    add column if not exists category text;
+
+alter table public.credit_holds
+    add column if not exists category text;
+
+-- Jednorazowe uzupełnienie kategorii dla istniejących pobrań - ta sama
+-- klasyfikacja opisów, która wcześniej była wykonywana przy każdym odczycie
+update public.credit_transactions
+   set category = case
+           when description ilike any (array['%wiadomość%', '%message%', '%chat%', '%gpt%']) then 'message'
+           when description ilike any (array['%obraz%', '%dall-e%', '%image%', '%dall%']) then 'image'
+           when description ilike any (array['%dokument%', '%document%', '%pdf%', '%plik%']) then 'document'
+           when description ilike any (array['%zdjęci%', '%zdjęc%', '%photo%', '%foto%']) then 'photo'
+           else 'other'
+       end
+ where category is null
+   and transaction_type in ('deduct', 'refund');
+
+create table if not exists public.credit_usage_daily (
+    user_id bigint not null,
+    day date not null,
+    category text not null,
+    amount integer not null default 0,      -- suma pobrań pomniejszona o zwroty (lub suma doładowań)
+    operations integer not null default 0,  -- liczba pobrań (lub doładowań)
+    credits_after integer,                  -- saldo po ostatniej transakcji w tym wierszu
+    last_at timestamptz not null,
+    primary key (user_id, day, category)
+);
+
+-- Dolicza pojedynczą transakcję do agregatu dziennego
+create or replace function public.credit_usage_daily_apply()
+returns trigger
+language plpgsql
+as $$
+declare
+    v_category text;
+    v_amount integer;
+    v_operations integer;
+    v_at timestamptz := coalesce(new.created_at, now());
+begin
+    if new.transaction_type = 'deduct' then
+        v_category := coalesce(new.category, 'other');
+        v_amount := new.amount;
+        v_operations := 1;
+    elsif new.transaction_type = 'refund' then
+        v_category := coalesce(new.category, 'other');
+        v_amount := -new.amount;
+        v_operations := 0;
+    else
+        v_category := 'purchase';
+        v_amount := new.amount;
+        v_operations := 1;
+    end if;
+
+    insert into public.credit_usage_daily as d
+        (user_id, day, category, amount, operations, credits_after, last_at)
+    values
+        (new.user_id, (v_at at time zone 'utc')::date, v_category, v_amount, v_operations, new.credits_after, v_at)
+    on conflict (user_id, day, category) do update
+       set amount = d.amount + excluded.amount,
+           operations = d.operations + excluded.operations,
+           credits_after = case when excluded.last_at >= d.last_at then excluded.credits_after else d.credits_after end,
+           last_at = greatest(d.last_at, excluded.last_at);
+
+    return new;
+end;
+$$;
+
+-- Odbudowa agregatów z dotychczasowej historii (idempotentna)
+insert into public.credit_usage_daily
+    (user_id, day, category, amount, operations, credits_after, last_at)
+select user_id,
+       day,
+       category,
+       sum(signed_amount),
+       sum(is_operation),
+       (array_agg(credits_after order by at desc))[1],
+       max(at)
+  from (
+        select user_id,
+               (coalesce(created_at, now()) at time zone 'utc')::date as day,
+               case
+                   when transaction_type in ('deduct', 'refund') then coalesce(category, 'other')
+                   else 'purchase'
+               end as category,
+               case when transaction_type = 'refund' then -amount else amount end as signed_amount,
+               case when transaction_type = 'refund' then 0 else 1 end as is_operation,
+               credits_after,
+               coalesce(created_at, now()) as at
+          from public.credit_transactions
+       ) t
+ group by user_id, day, category
+on conflict (user_id, day, category) do update
+   set amount = excluded.amount,
+       operations = excluded.operations,
+       credits_after = excluded.credits_after,
+       last_at = excluded.last_at;
+
+drop trigger if exists credit_usage_daily_apply on public.credit_transactions;
+create trigger credit_usage_daily_apply
+    after insert on public.credit_transactions
+    for each row execute function public.credit_usage_daily_apply();
+
+-- Funkcje z poprzednich migracji przyjmują teraz kategorię operacji.
+-- Stare sygnatury są usuwane, aby PostgREST nie widział dwóch przeciążeń.
+drop function if exists public.deduct_credits(bigint, integer, text);
+drop function if exists public.reserve_credits(bigint, integer, text, integer);
+
+create or replace function public.deduct_credits(
+    p_user_id bigint,
+    p_amount integer,
+    p_description text default null,
+    p_category text default null
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_after integer;
+begin
+    update public.user_credits
+       set credits_amount = credits_amount - p_amount
+     where user_id = p_user_id
+       and credits_amount >= p_amount
+    returning credits_amount into v_after;
+
+    if not found then
+        return null;
+    end if;
+
+    insert into public.credit_transactions
+        (user_id, transaction_type, amount, credits_before, credits_after, description, category, created_at)
+    values
+        (p_user_id, 'deduct', p_amount, v_after + p_amount, v_after, p_description, coalesce(p_category, 'other'), now());
+
+    return v_after;
+end;
+$$;
+
+create or replace function public.reserve_credits(
+    p_user_id bigint,
+    p_amount integer,
+    p_description text default null,
+    p_ttl_seconds integer default 300,
+    p_category text default null
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_after integer;
+    v_hold_id bigint;
+    v_category text := coalesce(p_category, 'other');
+begin
+    update public.user_credits
+       set credits_amount = credits_amount - p_amount
+     where user_id = p_user_id
+       and credits_amount >= p_amount
+    returning credits_amount into v_after;
+
+    if not found then
+        return null;
+    end if;
+
+    insert into public.credit_transactions
+        (user_id, transaction_type, amount, credits_before, credits_after, description, category, created_at)
+    values
+        (p_user_id, 'deduct', p_amount, v_after + p_amount, v_after, p_description, v_category, now());
+
+    -- Wygasłe rezerwacje nie są już potrzebne - sprzątamy je przy okazji
+    delete from public.credit_holds
+     where user_id = p_user_id
+       and expires_at < now() - interval '1 day';
+
+    insert into public.credit_holds (user_id, amount, description, category, expires_at)
+    values (p_user_id, p_amount, p_description, v_category, now() + make_interval(secs => p_ttl_seconds))
+    returning id into v_hold_id;
+
+    return jsonb_build_object('hold_id', v_hold_id, 'credits_after', v_after);
+end;
+$$;
+
+-- Zwrot trafia do tej samej kategorii co rezerwacja, więc agregat dzienny
+-- pokazuje faktycznie pobraną kwotę
+create or replace function public.settle_credit_hold(
+    p_hold_id bigint,
+    p_amount integer default 0
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_user_id bigint;
+    v_reserved integer;
+    v_description text;
+    v_category text;
+    v_refund integer;
+    v_after integer;
+begin
+    update public.credit_holds
+       set status = case when p_amount > 0 then 'settled' else 'released' end
+     where id = p_hold_id
+       and status = 'held'
+       and expires_at > now()
+    returning user_id, amount, description, category
+         into v_user_id, v_reserved, v_description, v_category;
+
+    if not found then
+        return null;
+    end if;
+
+    v_refund := v_reserved - least(greatest(p_amount, 0), v_reserved);
+
+    update public.user_credits
+       set credits_amount = credits_amount + v_refund
+     where user_id = v_user_id
+    returning credits_amount into v_after;
+
+    if v_refund > 0 then
+        insert into public.credit_transactions
+            (user_id, transaction_type, amount, credits_before, credits_after, description, category, created_at)
+        values
+            (v_user_id, 'refund', v_refund, v_after - v_refund, v_after, v_description, v_category, now());
+    end if;
+
+    return v_after;
+end;
+$$;
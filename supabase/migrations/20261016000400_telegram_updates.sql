@@ -0,0 +1,38 @@
+-- Deduplikacja aktualizacji Telegram między procesami bota w trybie webhook.
+-- Telegram ponawia aktualizację, jeśli nie dostał odpowiedzi na czas, a load
+-- balancer może skierować ponowienie do innego procesu - pierwszy proces, który
+-- zarejestruje update_id, obsługuje aktualizację, pozostałe ją pomijają.
+
+create table if not exists public.telegram_updates (
+    update_id bigint primary key,
+    received_at timestamptz not null default now()
+);
+
+create index if not exists telegram_updates_received_at_idx
+    on public.telegram_updates (received_at);
+
+-- Zwraca true, jeśli aktualizacja nie była jeszcze obsłużona
+create or replace function public.claim_telegram_update(
+    p_update_id bigint
+)
+returns boolean
+language plpgsql
+as $$
+begin
+    insert into public.telegram_updates (update_id)
+    values (p_update_id)
+    on conflict (update_id) do nothing;
+
+    if not found then
+        return false;
+    end if;
+
+    -- Telegram nie ponawia aktualizacji starszych niż doba - sprzątamy co jakiś czas
+    if p_update_id % 1000 = 0 then
+        delete from public.telegram_updates
+         where received_at < now() - interval '1 day';
+    end if;
+
+    return true;
+end;
+$$;
@@ -0,0 +1,8 @@
+-- Indeks pod pobieranie najnowszych wiadomości konwersacji.
+-- MessageRepository.iter_recent_messages filtruje po conversation_id, sortuje
+-- malejąco po (created_at, id) i stronicuje kluczem (created_at, id) - ten
+-- indeks pozwala odczytać kilkanaście ostatnich wiadomości bez skanowania
+-- i sortowania całej konwersacji.
+
+create index if not exists messages_conversation_id_created_at_idx
+    on public.messages (conversation_id, created_at desc, id desc);
@@ -0,0 +1,9 @@
+-- Podsumowanie starszych wiadomości konwersacji (services/context_builder.py).
+-- Gdy historia nie mieści się w budżecie tokenów modelu, starsze tury są
+-- streszczane tańszym modelem; podsumowanie obejmuje wiadomości do
+-- summary_message_id włącznie i jest rozszerzane przy kolejnych streszczeniach.
+
+alter table public.conversations
+    add column if not exists summary text,
+    add column if not exists summary_message_id bigint,
+    add column if not exists summary_updated_at timestamptz;
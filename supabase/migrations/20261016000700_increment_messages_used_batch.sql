@@ -0,0 +1,21 @@
+-- Zbiorcze zwiększanie licznika wykorzystanych wiadomości (services/write_queue.py).
+-- Kolejka zapisów sumuje przyrosty licznika dla wielu użytkowników i wysyła je
+-- jednym wywołaniem; aktualizacja jest atomowa (zamiast odczytu i zapisu
+-- w aplikacji, które gubiły przyrosty przy równoległych wiadomościach).
+
+-- p_counts: {"<user_id>": <przyrost>, ...}; zwraca liczbę zaktualizowanych użytkowników
+create or replace function public.increment_messages_used_batch(
+    p_counts jsonb
+)
+returns integer
+language sql
+as $$
+    with updated as (
+        update public.users u
+           set messages_used = coalesce(u.messages_used, 0) + c.value::integer
+          from jsonb_each_text(p_counts) c
+         where u.id = c.key::bigint
+        returning 1
+    )
+    select count(*)::integer from updated;
+$$;
@@ -0,0 +1,11 @@
+-- Kody aktywacyjne generowane przez /gencode (utils/activation_codes.py).
+-- Kody są wstawiane zbiorczo (insert_many) - jedno zapytanie na paczkę kodów.
+
+create table if not exists public.activation_codes (
+    code text primary key,
+    credits integer not null check (credits > 0),
+    is_used boolean not null default false,
+    used_by bigint,
+    used_at timestamptz,
+    created_at timestamptz not null default now()
+);
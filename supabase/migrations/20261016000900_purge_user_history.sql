@@ -0,0 +1,36 @@
+-- Usuwanie historii rozmów użytkownika jedną operacją po stronie bazy
+-- (zamiast osobnych zapytań dla każdej konwersacji).
+-- Usuwa wszystkie konwersacje użytkownika poza p_keep_conversation_id wraz
+-- z ich wiadomościami i zwraca liczbę usuniętych wierszy.
+
+create or replace function public.purge_user_history(
+    p_user_id bigint,
+    p_keep_conversation_id bigint default null
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_conversation_ids bigint[];
+    v_messages integer;
+begin
+    select coalesce(array_agg(id), '{}')
+      into v_conversation_ids
+      from public.conversations
+     where user_id = p_user_id
+       and id is distinct from p_keep_conversation_id;
+
+    delete from public.messages
+     where conversation_id = any(v_conversation_ids);
+    get diagnostics v_messages = row_count;
+
+    delete from public.conversations
+     where id = any(v_conversation_ids);
+
+    return jsonb_build_object(
+        'conversations', coalesce(array_length(v_conversation_ids, 1), 0),
+        'messages', v_messages,
+        'conversation_ids', to_jsonb(v_conversation_ids)
+    );
+end;
+$$;
@@ -0,0 +1,6 @@
+-- Przeliczanie prognoz zużycia kredytów w tle czyta agregaty dzienne wszystkich
+-- użytkowników od ostatniego przeliczenia (filtr po day, paginacja kluczem
+-- (day, user_id, category)) - klucz główny (user_id, day, category) tego nie obsługuje.
+
+create index if not exists credit_usage_daily_day_idx
+    on public.credit_usage_daily (day, user_id, category);
@@ -0,0 +1,9 @@
+-- Klucz wiadomości nadawany przez kolejkę zapisów (services/write_queue.py).
+-- Wiadomości z dziennika kolejki wczytane po restarcie są wstawiane z
+-- on_conflict=client_id i ignorowaniem duplikatów, więc wiadomość zapisana
+-- już przed awarią nie zostanie wstawiona drugi raz.
+
+alter table public.messages add column if not exists client_id uuid;
+
+create unique index if not exists messages_client_id_key
+    on public.messages (client_id);
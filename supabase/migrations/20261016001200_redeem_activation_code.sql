@@ -0,0 +1,35 @@
+-- Wykorzystanie kodu aktywacyjnego (/code) w jednej transakcji.
+-- UPDATE oznacza kod jako użyty tylko wtedy, gdy nie był jeszcze użyty,
+-- więc dwa równoległe wywołania z tym samym kodem nie dodadzą kredytów
+-- dwa razy. Kredyty i wiersz credit_transactions dodaje add_credits.
+-- Zwraca {credits, credits_after} albo NULL, gdy kod nie istnieje lub
+-- został już wykorzystany.
+
+create or replace function public.redeem_activation_code(
+    p_user_id bigint,
+    p_code text
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_credits integer;
+    v_after integer;
+begin
+    update public.activation_codes
+       set is_used = true,
+           used_by = p_user_id,
+           used_at = now()
+     where code = p_code
+       and not is_used
+    returning credits into v_credits;
+
+    if not found then
+        return null;
+    end if;
+
+    v_after := public.add_credits(p_user_id, v_credits, 'Aktywacja kodu ' || p_code);
+
+    return jsonb_build_object('credits', v_credits, 'credits_after', v_after);
+end;
+$$;
@@ -0,0 +1,142 @@
+-- Rezerwacje, których nikt nie rozliczył (np. proces bota zakończył się w
+-- trakcie strumieniowania odpowiedzi), są po wygaśnięciu zwalniane - kredyty
+-- wracają do użytkownika zamiast stawać się ostatecznym obciążeniem.
+-- Udana odpowiedź zawsze rozlicza rezerwację (settle_credit_hold z pełną
+-- kwotą nie tworzy wiersza credit_transactions), także po wygaśnięciu,
+-- dopóki rezerwacja nie została zwolniona.
+
+-- Zwalnia wygasłe, nierozliczone rezerwacje (jednego użytkownika albo
+-- wszystkich, gdy p_user_id jest NULL). Zwraca liczbę zwolnionych rezerwacji.
+create or replace function public.release_expired_credit_holds(
+    p_user_id bigint default null
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_hold record;
+    v_after integer;
+    v_released integer := 0;
+begin
+    for v_hold in
+        select id, user_id, amount, description, category
+          from public.credit_holds
+         where status = 'held'
+           and expires_at <= now()
+           and (p_user_id is null or user_id = p_user_id)
+           for update skip locked
+    loop
+        update public.credit_holds
+           set status = 'released'
+         where id = v_hold.id;
+
+        update public.user_credits
+           set credits_amount = credits_amount + v_hold.amount
+         where user_id = v_hold.user_id
+        returning credits_amount into v_after;
+
+        insert into public.credit_transactions
+            (user_id, transaction_type, amount, credits_before, credits_after, description, category, created_at)
+        values
+            (v_hold.user_id, 'refund', v_hold.amount, v_after - v_hold.amount, v_after,
+             v_hold.description, v_hold.category, now());
+
+        v_released := v_released + 1;
+    end loop;
+
+    return v_released;
+end;
+$$;
+
+create or replace function public.reserve_credits(
+    p_user_id bigint,
+    p_amount integer,
+    p_description text default null,
+    p_ttl_seconds integer default 300,
+    p_category text default null
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_after integer;
+    v_hold_id bigint;
+    v_category text := coalesce(p_category, 'other');
+begin
+    -- Wygasłe rezerwacje użytkownika są zwracane przed sprawdzeniem salda
+    perform public.release_expired_credit_holds(p_user_id);
+
+    update public.user_credits
+       set credits_amount = credits_amount - p_amount
+     where user_id = p_user_id
+       and credits_amount >= p_amount
+    returning credits_amount into v_after;
+
+    if not found then
+        return null;
+    end if;
+
+    insert into public.credit_transactions
+        (user_id, transaction_type, amount, credits_before, credits_after, description, category, created_at)
+    values
+        (p_user_id, 'deduct', p_amount, v_after + p_amount, v_after, p_description, v_category, now());
+
+    -- Zamknięte rezerwacje nie są już potrzebne - sprzątamy je przy okazji
+    delete from public.credit_holds
+     where user_id = p_user_id
+       and status <> 'held'
+       and expires_at < now() - interval '1 day';
+
+    insert into public.credit_holds (user_id, amount, description, category, expires_at)
+    values (p_user_id, p_amount, p_description, v_category, now() + make_interval(secs => p_ttl_seconds))
+    returning id into v_hold_id;
+
+    return jsonb_build_object('hold_id', v_hold_id, 'credits_after', v_after);
+end;
+$$;
+
+-- Rozliczenie nie wymaga już expires_at > now(): wygasła rezerwacja, której
+-- nie zwolniono, może zostać rozliczona przez kończącą się odpowiedź
+create or replace function public.settle_credit_hold(
+    p_hold_id bigint,
+    p_amount integer default 0
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_user_id bigint;
+    v_reserved integer;
+    v_description text;
+    v_category text;
+    v_refund integer;
+    v_after integer;
+begin
+    update public.credit_holds
+       set status = case when p_amount > 0 then 'settled' else 'released' end
+     where id = p_hold_id
+       and status = 'held'
+    returning user_id, amount, description, category
+         into v_user_id, v_reserved, v_description, v_category;
+
+    if not found then
+        return null;
+    end if;
+
+    v_refund := v_reserved - least(greatest(p_amount, 0), v_reserved);
+
+    update public.user_credits
+       set credits_amount = credits_amount + v_refund
+     where user_id = v_user_id
+    returning credits_amount into v_after;
+
+    if v_refund > 0 then
+        insert into public.credit_transactions
+            (user_id, transaction_type, amount, credits_before, credits_after, description, category, created_at)
+        values
+            (v_user_id, 'refund', v_refund, v_after - v_refund, v_after, v_description, v_category, now());
+    end if;
+
+    return v_after;
+end;
+$$;
@@ -0,0 +1,134 @@
+-- Funkcje salda odrzucają nieprawidłowe kwoty. Ujemna kwota w deduct_credits
+-- lub reserve_credits dodawałaby kredyty (UPDATE ... credits_amount - p_amount
+-- przechodzi warunek credits_amount >= p_amount), a ujemna kwota w
+-- add_credits odejmowałaby je bez sprawdzenia salda.
+-- Błąd (invalid_parameter_value) trafia do klienta jako odpowiedź 400 PostgREST.
+
+create or replace function public.deduct_credits(
+    p_user_id bigint,
+    p_amount integer,
+    p_description text default null,
+    p_category text default null
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_after integer;
+begin
+    if p_amount is null or p_amount <= 0 then
+        raise exception 'deduct_credits: kwota musi być dodatnia (%)', p_amount
+            using errcode = 'invalid_parameter_value';
+    end if;
+
+    update public.user_credits
+       set credits_amount = credits_amount - p_amount
+     where user_id = p_user_id
+       and credits_amount >= p_amount
+    returning credits_amount into v_after;
+
+    if not found then
+        return null;
+    end if;
+
+    insert into public.credit_transactions
+        (user_id, transaction_type, amount, credits_before, credits_after, description, category, created_at)
+    values
+        (p_user_id, 'deduct', p_amount, v_after + p_amount, v_after, p_description, coalesce(p_category, 'other'), now());
+
+    return v_after;
+end;
+$$;
+
+create or replace function public.reserve_credits(
+    p_user_id bigint,
+    p_amount integer,
+    p_description text default null,
+    p_ttl_seconds integer default 300,
+    p_category text default null
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_after integer;
+    v_hold_id bigint;
+    v_category text := coalesce(p_category, 'other');
+begin
+    if p_amount is null or p_amount <= 0 then
+        raise exception 'reserve_credits: kwota musi być dodatnia (%)', p_amount
+            using errcode = 'invalid_parameter_value';
+    end if;
+
+    -- Wygasłe rezerwacje użytkownika są zwracane przed sprawdzeniem salda
+    perform public.release_expired_credit_holds(p_user_id);
+
+    update public.user_credits
+       set credits_amount = credits_amount - p_amount
+     where user_id = p_user_id
+       and credits_amount >= p_amount
+    returning credits_amount into v_after;
+
+    if not found then
+        return null;
+    end if;
+
+    insert into public.credit_transactions
+        (user_id, transaction_type, amount, credits_before, credits_after, description, category, created_at)
+    values
+        (p_user_id, 'deduct', p_amount, v_after + p_amount, v_after, p_description, v_category, now());
+
+    -- Zamknięte rezerwacje nie są już potrzebne - sprzątamy je przy okazji
+    delete from public.credit_holds
+     where user_id = p_user_id
+       and status <> 'held'
+       and expires_at < now() - interval '1 day';
+
+    insert into public.credit_holds (user_id, amount, description, category, expires_at)
+    values (p_user_id, p_amount, p_description, v_category, now() + make_interval(secs => p_ttl_seconds))
+    returning id into v_hold_id;
+
+    return jsonb_build_object('hold_id', v_hold_id, 'credits_after', v_after);
+end;
+$$;
+
+-- Zero jest nadal dozwolone (utworzenie wiersza user_credits bez wpisu w dzienniku)
+create or replace function public.add_credits(
+    p_user_id bigint,
+    p_amount integer,
+    p_description text default null,
+    p_transaction_type text default 'add',
+    p_price numeric default 0
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_after integer;
+begin
+    if p_amount is null or p_amount < 0 then
+        raise exception 'add_credits: kwota nie może być ujemna (%)', p_amount
+            using errcode = 'invalid_parameter_value';
+    end if;
+
+    insert into public.user_credits
+        (user_id, credits_amount, total_credits_purchased, total_spent, last_purchase_date)
+    values
+        (p_user_id, p_amount, p_amount, p_price, now())
+    on conflict (user_id) do update
+       set credits_amount = public.user_credits.credits_amount + excluded.credits_amount,
+           total_credits_purchased = coalesce(public.user_credits.total_credits_purchased, 0) + excluded.total_credits_purchased,
+           total_spent = coalesce(public.user_credits.total_spent, 0) + excluded.total_spent,
+           last_purchase_date = excluded.last_purchase_date
+    returning credits_amount into v_after;
+
+    if p_amount <> 0 then
+        insert into public.credit_transactions
+            (user_id, transaction_type, amount, credits_before, credits_after, description, created_at)
+        values
+            (p_user_id, p_transaction_type, p_amount, v_after - p_amount, v_after, p_description, now());
+    end if;
+
+    return v_after;
+end;
+$$;
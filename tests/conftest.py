@@ -0,0 +1,26 @@
+# tests/conftest.py
+"""
+Wspólna konfiguracja testów
+
+Testy oznaczone @pytest.mark.benchmark mierzą czas lub pamięć na dużych
+danych i są pomijane domyślnie - uruchamia je `pytest --run-benchmarks`
+(albo zmienna środowiskowa RUN_BENCHMARKS=1). Wyniki pomiarów są wypisywane
+na stdout, więc warto dodać `-s`.
+"""
+import os
+import pytest
+
+def pytest_addoption(parser):
+    parser.addoption("--run-benchmarks", action="store_true", default=False,
+                     help="uruchamia testy wydajnościowe oznaczone @pytest.mark.benchmark")
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: test wydajnościowy, uruchamiany z --run-benchmarks")
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-benchmarks") or os.getenv("RUN_BENCHMARKS") == "1":
+        return
+    skip = pytest.mark.skip(reason="test wydajnościowy - uruchom z --run-benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
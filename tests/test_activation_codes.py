@@ -0,0 +1,65 @@
+# tests/test_activation_codes.py
+import asyncio
+from types import SimpleNamespace
+from database.supabase_client import repository_service
+from handlers.code_handler import code_command
+from utils.cache import credits_cache
+
+USER_ID = 501
+
+class FakeCodesClient:
+    """Funkcja redeem_activation_code w pamięci - każdy kod można wykorzystać raz"""
+
+    def __init__(self, codes, balance=100):
+        self.codes = dict(codes)
+        self.balance = balance
+        self.calls = []
+
+    async def rpc(self, function, params=None, retry=True):
+        self.calls.append((function, params, retry))
+        await asyncio.sleep(0)
+        credits = self.codes.pop(params["p_code"], None)
+        if credits is None:
+            return None
+        self.balance += credits
+        return {"credits": credits, "credits_after": self.balance}
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, parse_mode=None):
+        self.replies.append(text)
+
+def _code_command(code):
+    message = FakeMessage()
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=USER_ID), message=message)
+    context = SimpleNamespace(args=[code], chat_data={})
+    asyncio.run(code_command(update, context))
+    return message.replies
+
+def test_generated_code_is_redeemed_once(monkeypatch):
+    client = FakeCodesClient({"AB12CD34": 250})
+    monkeypatch.setattr(repository_service.activation_repository, "client", client)
+    credits_cache.invalidate(USER_ID)
+
+    [reply] = _code_command("ab12cd34")
+    assert "*AB12CD34*" in reply and "*250*" in reply and "*350*" in reply
+    assert client.calls == [("redeem_activation_code", {"p_user_id": USER_ID, "p_code": "AB12CD34"}, False)]
+
+    [reply] = _code_command("AB12CD34")
+    assert "nieprawidłowy lub został już wykorzystany" in reply
+    assert client.balance == 350
+
+def test_parallel_redemptions_add_credits_once(monkeypatch):
+    client = FakeCodesClient({"XYZ98765": 500})
+    repository = repository_service.activation_repository
+    monkeypatch.setattr(repository, "client", client)
+
+    async def redeem_twice():
+        return await asyncio.gather(repository.use_code(USER_ID, "XYZ98765"),
+                                    repository.use_code(USER_ID + 1, "XYZ98765"))
+
+    results = asyncio.run(redeem_twice())
+    assert sorted(results) == [(False, 0), (True, 500)]
+    assert client.balance == 600
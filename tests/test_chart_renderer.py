@@ -0,0 +1,139 @@
+# tests/test_chart_renderer.py
+import asyncio
+import datetime
+import os
+import time
+import pytest
+import utils.chart_renderer as chart_renderer
+from utils.chart_renderer import render_chart, render_usage_chart, render_breakdown_chart
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+TEXTS = {
+    'date': "Data", 'credits': "Kredyty", 'balance_title': "Saldo", 'details_title': "Szczegóły",
+    'balance_label': "Saldo kredytów", 'usage_label': "Wydane kredyty", 'purchase_label': "Dodane kredyty"
+}
+
+def _usage_args(days, seed=0):
+    start = datetime.date(2026, 10, 16) - datetime.timedelta(days=days - 1)
+    dates = [(start + datetime.timedelta(days=n)).isoformat() for n in range(days)]
+    usage = [(n * 7 + seed) % 23 for n in range(days)]
+    purchases = [50 if n % 10 == 0 else 0 for n in range(days)]
+    balances = []
+    balance = 500
+    for spent, added in zip(usage, purchases):
+        balance += added - spent
+        balances.append(balance)
+    return dates, balances, usage, purchases, TEXTS
+
+def test_concurrent_renders_do_not_share_figures(monkeypatch):
+    # Renderowanie w wątkach - przy globalnym stanie pyplot wykresy mieszałyby się
+    monkeypatch.setattr(chart_renderer, "CHART_RENDER_WORKERS", 0)
+    charts = [_usage_args(30, seed) for seed in range(3)]
+
+    async def render_all():
+        return await asyncio.gather(*(render_chart(render_usage_chart, *args) for args in charts))
+
+    pngs = asyncio.run(render_all())
+    assert all(png.startswith(PNG_SIGNATURE) for png in pngs)
+    assert pngs == [render_usage_chart(*args) for args in charts]
+
+class LoopLag:
+    """Mierzy najdłuższe opóźnienie pętli zdarzeń (czas, przez który bot nie odpowiada)"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.max_lag = 0.0
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.max_lag = max(self.max_lag, time.perf_counter() - started - self.interval)
+
+@pytest.mark.benchmark
+def test_benchmark_creditstats_rendering(monkeypatch):
+    import utils.credit_analytics as credit_analytics
+
+    requests = 8
+    workers = max(2, min(4, os.cpu_count() or 1))
+    today = datetime.date(2026, 10, 16)
+
+    async def get_daily_credit_usage(user_id, days):
+        rows = []
+        for n in range(days):
+            day = (today - datetime.timedelta(days=n)).isoformat()
+            for category, amount in (("message", 5 + (n + user_id) % 9), ("image", (n * user_id) % 13)):
+                rows.append({"day": day, "category": category, "amount": amount, "operations": 1,
+                             "credits_after": 1000 - n, "last_at": f"{day}T12:00:00+00:00"})
+        return rows
+
+    async def get_last_credit_transaction_id(user_id):
+        return 1000 + user_id
+
+    monkeypatch.setattr(credit_analytics, "get_daily_credit_usage", get_daily_credit_usage)
+    monkeypatch.setattr(credit_analytics, "get_last_credit_transaction_id", get_last_credit_transaction_id)
+    monkeypatch.setattr(credit_analytics, "utc_today", lambda: today)
+
+    async def render_inline(render, *args):
+        return render(*args)
+
+    async def creditstats_burst():
+        """requests równoległych /creditstats: wykres salda i wykres kołowy każdego użytkownika"""
+        lag = LoopLag()
+        heartbeat = asyncio.ensure_future(lag.run())
+        await asyncio.sleep(0)
+        started = time.perf_counter()
+        charts = await asyncio.gather(*(chart for user_id in range(1, requests + 1) for chart in (
+            credit_analytics.generate_credit_usage_chart(user_id, 90),
+            credit_analytics.generate_usage_breakdown_chart(user_id, 90)
+        )))
+        elapsed = time.perf_counter() - started
+        # Pomiar zablokowanego taktu kończy się dopiero po odblokowaniu pętli
+        await asyncio.sleep(lag.interval * 2)
+        heartbeat.cancel()
+        assert all(chart.getvalue().startswith(PNG_SIGNATURE) for chart in charts)
+        return elapsed, lag.max_lag
+
+    def clear_caches():
+        credit_analytics.chart_cache.clear()
+        credit_analytics.analysis_cache.clear()
+
+    results = {}
+    with monkeypatch.context() as inline:
+        inline.setattr(credit_analytics, "render_chart", render_inline)
+        clear_caches()
+        results["inline"] = asyncio.run(creditstats_burst())
+
+    monkeypatch.setattr(chart_renderer, "CHART_RENDER_WORKERS", 0)
+    clear_caches()
+    results["wątek"] = asyncio.run(creditstats_burst())
+
+    monkeypatch.setattr(chart_renderer, "CHART_RENDER_WORKERS", workers)
+    monkeypatch.setattr(chart_renderer, "_executor", None)
+    try:
+        # Start procesów (spawn + import matplotlib) nie wlicza się do pomiaru
+        async def warm_up():
+            await asyncio.gather(*(render_chart(render_breakdown_chart, ["a"], [1], "x") for _ in range(workers)))
+        asyncio.run(warm_up())
+
+        clear_caches()
+        results[f"pula {workers} procesów"] = asyncio.run(creditstats_burst())
+        results["cache"] = asyncio.run(creditstats_burst())
+    finally:
+        chart_renderer.shutdown_chart_pool()
+
+    print(f"\n{requests} x /creditstats ({2 * requests} wykresów), {os.cpu_count()} CPU:")
+    for mode, (elapsed, max_lag) in results.items():
+        print(f"  {mode:>18}: {elapsed * 1000:7.0f} ms, {2 * requests / elapsed:6.1f} wykresów/s, "
+              f"najdłuższa blokada pętli {max_lag * 1000:6.1f} ms")
+
+    inline_elapsed, inline_lag = results["inline"]
+    pool_elapsed, pool_lag = results[f"pula {workers} procesów"]
+    cache_elapsed, _ = results["cache"]
+    # Pętla zdarzeń nie jest blokowana przez renderowanie w puli
+    assert pool_lag < inline_lag / 5
+    # Powtórzone /creditstats bez nowych transakcji nie renderuje wykresów
+    assert cache_elapsed < pool_elapsed / 10
+    if (os.cpu_count() or 1) >= workers:
+        assert pool_elapsed < inline_elapsed
@@ -0,0 +1,90 @@
+# tests/test_client_registry.py
+import asyncio
+import json
+import api.client_registry as client_registry
+from api.anthropic_client import AnthropicClient
+from api.client_registry import close_http_clients, get_http_client
+from api.openai_client import OpenAIClient
+
+MESSAGES = [{"role": "system", "content": "Jesteś pomocnym asystentem."}, {"role": "user", "content": "Cześć"}]
+
+OPENAI_COMPLETION = {
+    "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "odpowiedź openai"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+}
+
+ANTHROPIC_MESSAGE = {
+    "id": "msg_1", "type": "message", "role": "assistant", "model": "claude-3-5-haiku-20241022",
+    "content": [{"type": "text", "text": "odpowiedź anthropic"}],
+    "stop_reason": "end_turn", "stop_sequence": None, "usage": {"input_tokens": 1, "output_tokens": 1}
+}
+
+class LocalProviders:
+    """Lokalny serwer HTTP/1.1 z keep-alive udający API OpenAI i Anthropic, zliczający połączenia TCP"""
+
+    def __init__(self):
+        self.connections = 0
+        self.requests = []
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        connection = self.connections
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                headers = dict(line.split(": ", 1) for line in header_lines if ": " in line)
+                length = int({key.lower(): value for key, value in headers.items()}.get("content-length", 0))
+                await reader.readexactly(length)
+
+                path = request_line.split(" ")[1]
+                self.requests.append((connection, path))
+                result = ANTHROPIC_MESSAGE if path.endswith("/messages") else OPENAI_COMPLETION
+                body = json.dumps(result).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def run(self, scenario):
+        server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await scenario(f"http://127.0.0.1:{port}")
+        finally:
+            server.close()
+
+def test_sequential_provider_calls_reuse_one_connection_per_provider(monkeypatch):
+    monkeypatch.setattr(client_registry, "_http_clients", {})
+    server = LocalProviders()
+
+    async def scenario(url):
+        monkeypatch.setenv("OPENAI_BASE_URL", f"{url}/v1")
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", url)
+        # Osobne instancje klientów (np. po ponownym utworzeniu serwisu) korzystają z tej samej puli
+        openai_clients = [OpenAIClient(api_key="test"), OpenAIClient(api_key="test")]
+        anthropic = AnthropicClient(api_key="test")
+        assert openai_clients[0].client._client is openai_clients[1].client._client is get_http_client("openai")
+        try:
+            replies = []
+            for n in range(6):
+                replies.append(await openai_clients[n % 2].chat_completion_text(MESSAGES, model="o3-mini"))
+                replies.append(await anthropic.chat_completion_text(MESSAGES, model="claude-3-5-haiku-20241022"))
+            return replies
+        finally:
+            await close_http_clients()
+
+    replies = asyncio.run(server.run(scenario))
+    assert replies == ["odpowiedź openai", "odpowiedź anthropic"] * 6
+    # 12 zapytań, ale tylko jedno połączenie TCP na dostawcę
+    assert len(server.requests) == 12
+    assert server.connections == 2
+    openai_connections = {connection for connection, path in server.requests if path == "/v1/chat/completions"}
+    anthropic_connections = {connection for connection, path in server.requests if path == "/v1/messages"}
+    assert len(openai_connections) == len(anthropic_connections) == 1
+    assert openai_connections != anthropic_connections
+    assert client_registry._http_clients == {}
@@ -0,0 +1,124 @@
+# tests/test_concurrent_updates.py
+import asyncio
+import json
+import re
+import time
+from types import SimpleNamespace
+import httpx
+import pytest
+from openai import AsyncOpenAI
+import handlers.message_handler as message_handler
+from utils.openai_client import api_service
+from utils.streaming_editor import edit_bucket, GLOBAL_EDITS_BURST
+
+LATENCY = 0.3
+# Każda odpowiedź to dwie edycje (pierwsza klatka i końcowa treść) - wszystkie
+# mieszczą się w globalnym limicie edycji, więc nie czekają na tokeny
+USERS = GLOBAL_EDITS_BURST // 2
+
+def _completion_stream(text):
+    chunks = [{"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4o",
+               "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+              for word in re.findall(r"\S+\s*", text)]
+    return "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+
+class FakeOpenAI:
+    """Endpoint /chat/completions ze stałym opóźnieniem, zliczający równoległe zapytania"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.active = 0
+        self.max_active = 0
+
+    async def handle(self, request):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.active -= 1
+        return httpx.Response(200, headers={"content-type": "text/event-stream"},
+                              text=_completion_stream("Odpowiedź modelu na wiadomość"))
+
+class FakeMessage:
+    def __init__(self, user_id):
+        self.text = f"Pytanie użytkownika {user_id}"
+        self.chat = SimpleNamespace(send_action=self._noop)
+        self.edits = []
+
+    async def _noop(self, *args, **kwargs):
+        pass
+
+    async def reply_text(self, text, **kwargs):
+        return self
+
+    async def edit_text(self, text, parse_mode=None):
+        self.edits.append(text)
+
+def _update(user_id):
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=user_id), message=FakeMessage(user_id))
+    context = SimpleNamespace(chat_data={"user_data": {user_id: {
+        "chat_initialized": True, "language": "pl", "current_model": "gpt-4o"}}})
+    return update, context
+
+@pytest.fixture
+def offline_message_handler(monkeypatch):
+    """message_handler z warstwą danych w pamięci i OpenAI za httpx.MockTransport"""
+    backend = FakeOpenAI(LATENCY)
+    client = AsyncOpenAI(api_key="test", base_url="http://openai.test/v1", max_retries=0,
+                         http_client=httpx.AsyncClient(transport=httpx.MockTransport(backend.handle)))
+    monkeypatch.setattr(api_service.openai, "client", client)
+
+    async def get_user_credits(user_id):
+        return 1000
+
+    async def get_active_conversation(user_id):
+        return {"id": user_id}
+
+    async def build_context_messages(conversation_id, user_message, system_prompt, model=None):
+        return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_message}]
+
+    async def reserve_credits(user_id, amount, description=None, category=None):
+        return SimpleNamespace(amount=amount, credits_after=1000 - amount)
+
+    async def noop(*args, **kwargs):
+        return True
+
+    for name, fake in (("get_user_credits", get_user_credits), ("get_active_conversation", get_active_conversation),
+                       ("build_context_messages", build_context_messages), ("reserve_credits", reserve_credits),
+                       ("settle_credits", noop), ("release_credits", noop), ("queue_message", noop),
+                       ("queue_increment_messages_used", noop)):
+        monkeypatch.setattr(message_handler, name, fake)
+    return backend
+
+@pytest.mark.benchmark
+def test_benchmark_concurrent_message_handlers(offline_message_handler):
+    backend = offline_message_handler
+    updates = [_update(user_id) for user_id in range(1, USERS + 1)]
+
+    async def sequential():
+        # Tak obsługiwał aktualizacje Application bez concurrent_updates
+        for update, context in updates:
+            await message_handler.message_handler(update, context)
+
+    async def concurrent():
+        await asyncio.gather(*(message_handler.message_handler(update, context) for update, context in updates))
+
+    timings = {}
+    for mode, scenario in (("po kolei", sequential), ("równolegle", concurrent)):
+        # Pełny globalny limit edycji - końcowe edycje nie czekają na tokeny z poprzedniego przebiegu
+        edit_bucket._tokens = float(edit_bucket.capacity)
+        started = time.perf_counter()
+        asyncio.run(scenario())
+        timings[mode] = time.perf_counter() - started
+
+    print(f"\n{USERS} x message_handler, opóźnienie API {LATENCY * 1000:.0f} ms:")
+    for mode, elapsed in timings.items():
+        print(f"  {mode:>10}: {elapsed * 1000:7.0f} ms ({elapsed / LATENCY:4.1f} x opóźnienie)")
+
+    for update, _ in updates:
+        assert "Odpowiedź modelu na wiadomość" in update.message.edits[-1]
+    assert backend.max_active == USERS
+    assert timings["po kolei"] >= USERS * LATENCY
+    # Równoległe wiadomości trwają tyle, co jedna odpowiedź modelu, a nie USERS odpowiedzi
+    assert timings["równolegle"] < 2 * LATENCY
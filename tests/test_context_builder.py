@@ -0,0 +1,78 @@
+# tests/test_context_builder.py
+import asyncio
+from types import SimpleNamespace
+import services.context_builder as context_builder
+from services.context_builder import ContextBuilder
+from utils.context_cache import ContextWindow
+from utils.tokens import get_history_token_budget
+
+class FakeOpenAI:
+    def __init__(self):
+        self.calls = []
+
+    async def chat_completion(self, messages, model, **kwargs):
+        self.calls.append((model, kwargs))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="podsumowanie"))])
+
+class FakeConversations:
+    def __init__(self):
+        self.summary = (None, None)
+
+    async def get_summary(self, conversation_id):
+        return self.summary
+
+    async def save_summary(self, conversation_id, summary, message_id):
+        self.summary = (summary, message_id)
+
+def _builder(window):
+    openai = FakeOpenAI()
+    conversations = FakeConversations()
+
+    async def get_context_window(conversation_id):
+        return window
+
+    repositories = SimpleNamespace(
+        message_repository=SimpleNamespace(get_context_window=get_context_window),
+        conversation_repository=conversations
+    )
+    builder = ContextBuilder(SimpleNamespace(claude_models=[], openai=openai), repositories)
+    return builder, openai, conversations
+
+async def _build_and_wait(builder, model):
+    messages = await builder.build(1, model, "system", "pytanie")
+    await asyncio.gather(*builder._tasks)
+    return messages
+
+def test_history_over_the_largest_budget_is_summarized_before_eviction():
+    budget = get_history_token_budget("gpt-4o")
+    window = ContextWindow()
+    message_id = appended_tokens = 0
+    while appended_tokens <= budget * 1.2:
+        message_id += 1
+        window.append("user" if message_id % 2 else "assistant", "słowo " * 200, message_id)
+        appended_tokens += window.entries()[-1][1]
+
+    # Okno mieści historię przekraczającą budżet - nic nie zostało usunięte
+    assert len(window) == message_id
+
+    builder, openai, conversations = _builder(window)
+    asyncio.run(_build_and_wait(builder, "gpt-4o"))
+
+    summary, summarized_up_to = conversations.summary
+    assert summary == "podsumowanie"
+    assert 0 < summarized_up_to < message_id
+    assert len(openai.calls) == 1
+
+def test_reasoning_summary_model_gets_completion_token_limit(monkeypatch):
+    window = ContextWindow()
+    builder, openai, _ = _builder(window)
+
+    monkeypatch.setattr(context_builder, "SUMMARY_MODEL", "o3-mini")
+    asyncio.run(builder._complete([{"role": "user", "content": "x"}]))
+    monkeypatch.setattr(context_builder, "SUMMARY_MODEL", "gpt-4o-mini")
+    asyncio.run(builder._complete([{"role": "user", "content": "x"}]))
+
+    (_, reasoning_params), (_, chat_params) = openai.calls
+    assert "max_completion_tokens" in reasoning_params
+    assert "max_tokens" not in reasoning_params and "temperature" not in reasoning_params
+    assert chat_params["max_tokens"] and "temperature" in chat_params
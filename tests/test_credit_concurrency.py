@@ -0,0 +1,200 @@
+# tests/test_credit_concurrency.py
+"""
+Równoległe operacje na kredytach jednego użytkownika w CreditRepository
+
+Przy concurrent_updates(True) wiadomości, dokumenty i zakupy tego samego
+użytkownika są obsługiwane równolegle. Testy sprawdzają, że repozytorium
+zmienia saldo wyłącznie pojedynczymi wywołaniami funkcji RPC - powrót do
+odczytu i zapisu salda w Pythonie skończyłby się utraconymi aktualizacjami
+i wykrytym tu podwójnym wydaniem kredytów.
+
+To nie jest test samego SQL. FakePostgrest (httpx.MockTransport) sam
+implementuje blokadę wiersza i zakłada semantykę funkcji z
+supabase/migrations: UPDATE user_credits blokuje wiersz do końca transakcji,
+a zapytania do tabel (select/update) są osobnymi transakcjami bez blokady.
+Poprawność samych funkcji trzeba sprawdzać na prawdziwym Postgresie.
+"""
+import asyncio
+import json
+import random
+import httpx
+from api.supabase_client import SupabaseClient
+from repositories.credit_repository import CreditRepository
+from utils.cache import credits_cache
+
+USER_ID = 42
+
+class FakePostgrest:
+    """Saldo, dziennik transakcji i rezerwacje jednego użytkownika w pamięci (emulacja funkcji SQL)"""
+
+    def __init__(self, balance: int, seed: int = 0):
+        self.balance = balance
+        self.ledger = []
+        self.holds = {}
+        self.row_lock = asyncio.Lock()
+        self.rng = random.Random(seed)
+
+    async def _latency(self):
+        await asyncio.sleep(self.rng.random() / 1000)
+
+    def _log(self, transaction_type, amount, before, after):
+        self.ledger.append({"transaction_type": transaction_type, "amount": amount,
+                            "credits_before": before, "credits_after": after})
+
+    async def _update_balance(self, delta, minimum=None):
+        """UPDATE user_credits ... RETURNING - odczyt i zapis pod blokadą wiersza"""
+        async with self.row_lock:
+            before = self.balance
+            await asyncio.sleep(0)  # inne transakcje czekają na blokadę
+            if minimum is not None and before < minimum:
+                return None, before
+            self.balance = before + delta
+            return self.balance, before
+
+    async def deduct_credits(self, params):
+        after, before = await self._update_balance(-params["p_amount"], minimum=params["p_amount"])
+        if after is not None:
+            self._log("deduct", params["p_amount"], before, after)
+        return after
+
+    async def add_credits(self, params):
+        after, before = await self._update_balance(params["p_amount"])
+        self._log(params.get("p_transaction_type") or "add", params["p_amount"], before, after)
+        return after
+
+    async def reserve_credits(self, params):
+        after, before = await self._update_balance(-params["p_amount"], minimum=params["p_amount"])
+        if after is None:
+            return None
+        self._log("deduct", params["p_amount"], before, after)
+        hold_id = len(self.holds) + 1
+        self.holds[hold_id] = {"amount": params["p_amount"], "status": "held"}
+        return {"hold_id": hold_id, "credits_after": after}
+
+    async def settle_credit_hold(self, params):
+        hold = self.holds.get(params["p_hold_id"])
+        if hold is None or hold["status"] != "held":
+            return None
+        hold["status"] = "settled" if params["p_amount"] > 0 else "released"
+        refund = hold["amount"] - min(max(params["p_amount"], 0), hold["amount"])
+        after, before = await self._update_balance(refund)
+        if refund:
+            self._log("refund", refund, before, after)
+        return after
+
+    async def release_expired_credit_holds(self, params):
+        """Wszystkie nierozliczone rezerwacje traktowane są jak wygasłe"""
+        released = 0
+        for hold in self.holds.values():
+            if hold["status"] == "held":
+                hold["status"] = "released"
+                after, before = await self._update_balance(hold["amount"])
+                self._log("refund", hold["amount"], before, after)
+                released += 1
+        return released
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        await self._latency()
+        path = request.url.path.split("/rest/v1/", 1)[1]
+        if path.startswith("rpc/"):
+            result = await getattr(self, path[len("rpc/"):])(json.loads(request.content))
+        elif path == "user_credits" and request.method == "GET":
+            result = [{"credits_amount": self.balance}]
+        elif path == "user_credits" and request.method == "PATCH":
+            # Osobna transakcja PostgREST - bez blokady obejmującej wcześniejszy odczyt
+            self.balance = json.loads(request.content)["credits_amount"]
+            result = [{"credits_amount": self.balance}]
+        elif path == "credit_transactions" and request.method == "POST":
+            result = []
+        else:
+            return httpx.Response(404, json={"message": f"{request.method} {path}"})
+        await self._latency()
+        return httpx.Response(200, json=result)
+
+def _repository(backend: FakePostgrest) -> CreditRepository:
+    client = SupabaseClient("http://supabase.test", "key")
+    client.http = httpx.AsyncClient(base_url="http://supabase.test/rest/v1",
+                                    transport=httpx.MockTransport(backend.handle))
+    credits_cache.clear()
+    return CreditRepository(client)
+
+def _assert_ledger_consistent(backend: FakePostgrest, initial: int):
+    # Każdy wpis zaczyna się od salda, na którym skończył się poprzedni
+    balance = initial
+    for entry in backend.ledger:
+        assert entry["credits_before"] == balance
+        sign = -1 if entry["transaction_type"] == "deduct" else 1
+        balance = entry["credits_before"] + sign * entry["amount"]
+        assert entry["credits_after"] == balance >= 0
+    assert balance == backend.balance
+
+def test_parallel_deductions_never_double_spend():
+    backend = FakePostgrest(balance=100)
+    repository = _repository(backend)
+
+    async def burst():
+        return await asyncio.gather(*(repository.deduct_user_credits(USER_ID, 3, "wiadomość", "message")
+                                      for _ in range(200)))
+
+    results = asyncio.run(burst())
+    assert results.count(True) == 33
+    assert backend.balance == 1
+    _assert_ledger_consistent(backend, 100)
+
+def test_mixed_updates_for_one_user_keep_the_ledger_consistent():
+    initial = 500
+    backend = FakePostgrest(balance=initial, seed=3)
+    repository = _repository(backend)
+    rng = random.Random(7)
+
+    async def streamed_reply(cost):
+        hold = await repository.reserve_credits(USER_ID, cost, "wiadomość", category="message")
+        if hold is None:
+            return 0
+        await asyncio.sleep(rng.random() / 500)
+        if rng.random() < 0.3:
+            await repository.release_credits(hold)
+            return 0
+        await repository.settle_credits(hold, cost - 1)
+        return cost - 1
+
+    async def document(cost):
+        return cost if await repository.deduct_user_credits(USER_ID, cost, "dokument", "document") else 0
+
+    async def purchase(amount):
+        await repository.add_user_credits(USER_ID, amount, "kod aktywacyjny")
+        return -amount
+
+    async def burst():
+        operations = []
+        for i in range(300):
+            kind = i % 10
+            if kind == 0:
+                operations.append(purchase(rng.randint(5, 20)))
+            elif kind < 4:
+                operations.append(document(rng.randint(1, 15)))
+            else:
+                operations.append(streamed_reply(rng.randint(2, 12)))
+        return await asyncio.gather(*operations)
+
+    spent = sum(asyncio.run(burst()))
+    assert backend.balance == initial - spent
+    assert all(hold["status"] != "held" for hold in backend.holds.values())
+    _assert_ledger_consistent(backend, initial)
+
+def test_unsettled_holds_are_refunded_after_expiry():
+    backend = FakePostgrest(balance=100)
+    repository = _repository(backend)
+
+    async def scenario():
+        settled = await repository.reserve_credits(USER_ID, 10, "wiadomość", category="message")
+        # Pełny koszt też jest zapisywany - inaczej rezerwacja zostałaby zwrócona po wygaśnięciu
+        assert await repository.settle_credits(settled)
+        # Proces przerwany w trakcie odpowiedzi - rezerwacja nie zostaje rozliczona
+        await repository.reserve_credits(USER_ID, 20, "wiadomość", category="message")
+        return await repository.release_expired_holds()
+
+    assert asyncio.run(scenario()) == 1
+    assert [hold["status"] for hold in backend.holds.values()] == ["settled", "released"]
+    assert backend.balance == 90
+    _assert_ledger_consistent(backend, 100)
@@ -0,0 +1,153 @@
+# tests/test_credit_transactions_paging.py
+import asyncio
+import bisect
+import datetime
+import random
+import re
+import time
+import pytest
+from api.supabase_client import SupabaseClient
+from config import CREDIT_CATEGORY_PURCHASE
+from repositories.credit_repository import CreditRepository
+from utils.usage_analytics import analyze_usage
+
+USER_ID = 7
+
+# Kursor paginacji kluczem budowany przez CreditRepository.iter_transactions
+CURSOR_RE = re.compile(r'^\(created_at\.gt\.(".*?"),and\(created_at\.eq\.\1,id\.gt\.(\d+)\)\)$')
+
+class FakeTransactionsClient:
+    """
+    Stub klienta Supabase z historią credit_transactions jednego użytkownika
+
+    Wiersze są posortowane po (created_at, id) jak indeks
+    credit_transactions_user_created_idx - zakres dat i kursor są wyszukiwane
+    binarnie, a rows_read zlicza wiersze zwrócone przez "bazę".
+    """
+    quote_value = staticmethod(SupabaseClient.quote_value)
+
+    def __init__(self, transactions, daily_usage=()):
+        self.transactions = sorted(transactions, key=lambda row: (row["created_at"], row["id"]))
+        self.keys = [(row["created_at"], row["id"]) for row in self.transactions]
+        self.daily_usage = list(daily_usage)
+        self.requests = 0
+        self.rows_read = 0
+
+    async def query(self, table, query_type="select", columns="*", filters=None, data=None,
+                    order_by=None, limit=None, range_filters=None, or_filter=None):
+        self.requests += 1
+        if table == "credit_usage_daily":
+            start_day = dict((column, value) for column, _, value in range_filters or [])["day"]
+            rows = [row for row in self.daily_usage if row["day"] >= start_day]
+        else:
+            assert order_by in (None, "created_at,id")
+            lo, hi = 0, len(self.keys)
+            for column, operator, value in range_filters or []:
+                assert column == "created_at"
+                if operator == "gte":
+                    lo = max(lo, bisect.bisect_left(self.keys, (value,)))
+                elif operator == "lt":
+                    hi = min(hi, bisect.bisect_left(self.keys, (value,)))
+            if or_filter:
+                created_at, last_id = CURSOR_RE.match(or_filter).groups()
+                lo = max(lo, bisect.bisect_right(self.keys, (created_at[1:-1], int(last_id))))
+            rows = self.transactions[lo:hi if limit is None else min(hi, lo + limit)]
+        self.rows_read += len(rows)
+        return rows
+
+def _history(count, days, seed=0):
+    """count transakcji rozłożonych na ostatnie days dni, po kilka z tym samym created_at"""
+    rng = random.Random(seed)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    rows = []
+    for i in range(count):
+        created_at = now - datetime.timedelta(seconds=rng.randrange(days * 86400))
+        if i % 5:
+            created_at = created_at.replace(microsecond=0)
+        rows.append({"id": i + 1, "user_id": USER_ID, "transaction_type": "deduct",
+                     "category": rng.choice(["message", "image", "document"]),
+                     "amount": rng.randint(1, 20), "created_at": created_at.isoformat()})
+    # Transakcje z tą samą sekundą w jednej stronie i na granicy stron
+    for row in rows[:300]:
+        row["created_at"] = (now - datetime.timedelta(days=1)).replace(microsecond=0).isoformat()
+    return rows
+
+def _daily_rollup(transactions):
+    """Wiersze credit_usage_daily, które trigger utrzymuje dla podanych transakcji"""
+    rollup = {}
+    for row in sorted(transactions, key=lambda row: (row["created_at"], row["id"])):
+        key = (row["created_at"][:10], row["category"])
+        entry = rollup.setdefault(key, {"user_id": USER_ID, "day": key[0], "category": key[1],
+                                        "amount": 0, "operations": 0})
+        entry["amount"] += row["amount"]
+        entry["operations"] += 1
+        entry["credits_after"] = 0
+        entry["last_at"] = row["created_at"]
+    return sorted(rollup.values(), key=lambda row: (row["day"], row["category"]))
+
+async def _collect_pages(repository, **kwargs):
+    rows = []
+    async for page in repository.iter_transactions(USER_ID, **kwargs):
+        rows.extend(page)
+    return rows
+
+def test_keyset_pages_return_every_row_once_despite_equal_timestamps():
+    transactions = _history(2_500, days=10)
+    client = FakeTransactionsClient(transactions)
+    rows = asyncio.run(_collect_pages(CreditRepository(client), page_size=100))
+
+    assert [row["id"] for row in rows] == [row["id"] for row in client.transactions]
+    assert client.requests == 26  # 25 pełnych stron i jedna pusta
+    assert client.rows_read == len(transactions)
+
+def test_window_reads_only_rows_in_the_window():
+    transactions = _history(2_000, days=100)
+    client = FakeTransactionsClient(transactions)
+    rows = asyncio.run(CreditRepository(client).get_transactions(USER_ID, days=30))
+
+    start = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=30)).isoformat()
+    expected = sorted(row["id"] for row in transactions if row["created_at"] >= start)
+    assert sorted(row["id"] for row in rows) == expected
+    assert client.rows_read == len(expected)
+
+@pytest.mark.benchmark
+def test_benchmark_100k_transactions():
+    transactions = _history(100_000, days=365)
+    client = FakeTransactionsClient(transactions, _daily_rollup(transactions))
+    repository = CreditRepository(client)
+
+    # Pełna historia stronami po 1000 wierszy - liniowo, bez OFFSET
+    started = time.perf_counter()
+    rows = asyncio.run(_collect_pages(repository))
+    full_scan = time.perf_counter() - started
+    assert len(rows) == 100_000 and len({row["id"] for row in rows}) == 100_000
+    assert client.requests == 101 and client.rows_read == 100_000
+
+    # Okno 30 dni - czytane są tylko wiersze z okna
+    client.requests = client.rows_read = 0
+    started = time.perf_counter()
+    window = asyncio.run(repository.get_transactions(USER_ID, days=30))
+    window_time = time.perf_counter() - started
+    assert client.rows_read == len(window) < 100_000 * 0.1
+
+    # Statystyki z agregatów dziennych zamiast sumowania 100k transakcji
+    client.requests = client.rows_read = 0
+    started = time.perf_counter()
+    by_category = asyncio.run(repository.get_usage_by_type(USER_ID, days=90))
+    rollup_time = time.perf_counter() - started
+    assert client.requests == 1 and client.rows_read <= 91 * 3
+
+    started = time.perf_counter()
+    cutoff = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=90)).date().isoformat()
+    summed = {}
+    for row in transactions:
+        if row["created_at"][:10] >= cutoff and row["category"] != CREDIT_CATEGORY_PURCHASE:
+            summed[row["category"]] = summed.get(row["category"], 0) + row["amount"]
+    scan_time = time.perf_counter() - started
+    assert by_category == summed
+
+    print(f"\n100k transakcji: pełna historia {full_scan * 1000:.0f} ms (101 stron), "
+          f"okno 30 dni {window_time * 1000:.1f} ms ({len(window)} wierszy), "
+          f"rozkład 90 dni z agregatów {rollup_time * 1000:.2f} ms ({client.rows_read} wierszy) "
+          f"wobec {scan_time * 1000:.1f} ms sumowania transakcji")
+    assert rollup_time < scan_time
@@ -0,0 +1,93 @@
+# tests/test_export_service.py
+import asyncio
+import json
+import os
+import tempfile
+import zipfile
+import pytest
+import utils.pdf_generator as pdf_generator
+from services.export_service import ExportService, parse_formats
+from utils.export_writers import EXPORT_WRITERS
+
+CONVERSATION_ID = 31
+MESSAGES = 250
+PAGE_SIZE = 100
+SCRIPT = "<script>alert('x')</script>"
+
+class FakeMessageRepository:
+    """iter_messages zwracające wiadomości konwersacji stronami, jak MessageRepository"""
+
+    def __init__(self, count, fail_at_page=None):
+        self.count = count
+        self.fail_at_page = fail_at_page
+        self.cursors = 0
+
+    async def iter_messages(self, conversation_id, page_size=PAGE_SIZE):
+        assert conversation_id == CONVERSATION_ID
+        self.cursors += 1
+        for page, start in enumerate(range(0, self.count, page_size)):
+            if page == self.fail_at_page:
+                raise ConnectionError("utracono połączenie z bazą")
+            await asyncio.sleep(0)
+            yield [{"id": n + 1, "is_from_user": n % 2 == 0, "model_used": None if n % 2 == 0 else "gpt-4o",
+                    "content": f"Wiadomość {n + 1}: {SCRIPT}" if n == 0 else f"Wiadomość {n + 1}",
+                    "created_at": f"2026-10-16T10:{n // 60 % 60:02d}:{n % 60:02d}+00:00"}
+                   for n in range(start, min(start + page_size, self.count))]
+
+@pytest.fixture
+def export_dir(monkeypatch, tmp_path):
+    """Pliki tymczasowe eksportu w osobnym katalogu, PDF budowany w wątku"""
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    monkeypatch.setattr(pdf_generator, "PDF_EXPORT_WORKERS", 0)
+    return tmp_path
+
+def _export(repository, formats):
+    service = ExportService(repository)
+    return asyncio.run(service.export_archive(CONVERSATION_ID, formats, {"username": "tester"}, "AI Bot"))
+
+def test_all_formats_are_written_to_one_archive(export_dir):
+    repository = FakeMessageRepository(MESSAGES)
+    path = _export(repository, parse_formats(["all"]))
+    try:
+        assert os.listdir(export_dir) == [os.path.basename(path)]
+        with zipfile.ZipFile(path) as archive:
+            assert archive.namelist() == [f"conversation.{writer.extension}" for writer in EXPORT_WRITERS.values()]
+            assert archive.getinfo("conversation.pdf").compress_type == zipfile.ZIP_STORED
+            assert archive.read("conversation.pdf").startswith(b"%PDF")
+
+            lines = archive.read("conversation.jsonl").decode("utf-8").splitlines()
+            assert len(lines) == MESSAGES
+            assert [json.loads(line)["id"] for line in lines] == list(range(1, MESSAGES + 1))
+            assert json.loads(lines[0])["content"] == f"Wiadomość 1: {SCRIPT}"
+
+            page = archive.read("conversation.html").decode("utf-8")
+            assert "<script>" not in page
+            assert "&lt;script&gt;alert(&#x27;x&#x27;)&lt;/script&gt;" in page
+            assert page.count('<div class="msg') == MESSAGES
+            assert page.rstrip().endswith("</html>")
+
+            markdown = archive.read("conversation.md").decode("utf-8")
+            assert markdown.startswith("# Konwersacja z AI Bot")
+            assert markdown.count("\n### ") == MESSAGES
+    finally:
+        os.remove(path)
+    # Każdy format czyta wiadomości własnym kursorem
+    assert repository.cursors == len(EXPORT_WRITERS)
+
+def test_empty_conversation_returns_none_and_removes_the_archive(export_dir):
+    repository = FakeMessageRepository(0)
+    assert _export(repository, ["jsonl", "pdf"]) is None
+    assert os.listdir(export_dir) == []
+    # Pusty pierwszy format kończy eksport
+    assert repository.cursors == 1
+
+def test_failed_export_removes_the_archive(export_dir):
+    with pytest.raises(ConnectionError):
+        _export(FakeMessageRepository(MESSAGES, fail_at_page=2), ["html"])
+    assert os.listdir(export_dir) == []
+
+def test_parse_formats():
+    assert parse_formats(["all"]) == list(EXPORT_WRITERS)
+    assert parse_formats([".PDF", "jsonl"]) == ["jsonl", "pdf"]
+    assert parse_formats(["docx"]) is None
+    assert parse_formats([]) is None
@@ -0,0 +1,149 @@
+# tests/test_markdown_stream.py
+import random
+import re
+from html.parser import HTMLParser
+import pytest
+from telegram.constants import ParseMode
+from utils.markdown_stream import MarkdownStreamRenderer, render_markdown
+from utils.message_formatter import MARKDOWN_V2_SPECIAL_CHARS
+
+CURSOR = "▌"
+
+SAMPLE = (
+    "## Podsumowanie\n"
+    "**Ważne:** funkcja `parse_args()` zwraca *słownik* (dict) - patrz [docs]{x}.\n"
+    "Zmienna snake_case_name, __pogrubienie__ oraz _kursywa_ w zdaniu!\n"
+    "```python\nprint(a_b[0] * 2)  # komentarz `x` \\ koniec\n```\n"
+    "Wynik: 1.5! a-b (x) [y] {z} #tag > c = d | e ~ f + g\n"
+    "a < b && c > d, **<script>alert(1)</script>**\n"
+    "Niedomknięte *pogrubienie i _kursywa"
+)
+
+def _chunks(text, rng, max_size=8):
+    chunks, start = [], 0
+    while start < len(text):
+        size = rng.randint(1, max_size)
+        chunks.append(text[start:start + size])
+        start += size
+    return chunks
+
+def _stream(chunks, parse_mode):
+    """Klatki z kursorem po każdym fragmencie i ostateczny tekst"""
+    renderer = MarkdownStreamRenderer(parse_mode)
+    frames = []
+    for chunk in chunks:
+        renderer.feed(chunk)
+        frames.append(renderer.render(CURSOR))
+    return frames, renderer.finish()
+
+def _assert_balanced_v2(text):
+    """Każdy znak specjalny MarkdownV2 jest escapowany albo otwiera/zamyka encję"""
+    entities = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == "\\":
+            assert i + 1 < len(text) and text[i + 1] in MARKDOWN_V2_SPECIAL_CHARS, text
+            i += 2
+        elif c == "`":
+            fence = "```" if text.startswith("```", i) else "`"
+            i += len(fence)
+            # Wewnątrz kodu escapowane są tylko ` i \
+            while True:
+                assert i < len(text), f"niedomknięty kod: {text!r}"
+                if text[i] == "\\":
+                    assert text[i + 1] in "`\\", text
+                    i += 2
+                elif text[i] == "`":
+                    assert text.startswith(fence, i), text
+                    i += len(fence)
+                    break
+                else:
+                    i += 1
+        elif c in "*_":
+            if entities and entities[-1] == c:
+                entities.pop()
+            else:
+                assert c not in entities, f"przeplecione encje: {text!r}"
+                entities.append(c)
+            i += 1
+        else:
+            assert c not in MARKDOWN_V2_SPECIAL_CHARS, f"nieescapowany {c!r}: {text!r}"
+            i += 1
+    assert not entities, f"niedomknięte encje {entities}: {text!r}"
+
+class _TagBalance(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.open_tags = []
+
+    def handle_starttag(self, tag, attrs):
+        assert tag in ("b", "i", "code", "pre"), tag
+        self.open_tags.append(tag)
+
+    def handle_endtag(self, tag):
+        assert self.open_tags and self.open_tags.pop() == tag, tag
+
+def _assert_balanced_html(text):
+    assert re.fullmatch(r"([^&]|&(amp|lt|gt|quot);)*", text, re.S), text
+    parser = _TagBalance()
+    parser.feed(text)
+    parser.close()
+    assert not parser.open_tags, f"niedomknięte znaczniki {parser.open_tags}: {text!r}"
+
+BALANCED = {ParseMode.MARKDOWN_V2: _assert_balanced_v2, ParseMode.HTML: _assert_balanced_html}
+
+@pytest.mark.parametrize("parse_mode", [ParseMode.MARKDOWN_V2, ParseMode.HTML])
+@pytest.mark.parametrize("seed", range(25))
+def test_random_chunks_give_balanced_frames_and_the_full_render(parse_mode, seed):
+    frames, final = _stream(_chunks(SAMPLE, random.Random(seed)), parse_mode)
+
+    for frame in frames:
+        BALANCED[parse_mode](frame)
+    BALANCED[parse_mode](final)
+    assert final == render_markdown(SAMPLE, parse_mode)
+
+def test_delimiter_split_across_chunks():
+    chunks = ["Tekst *", "*pogrub", "ienie*", "* i `", "kod` ``", "`py", "thon\nx = 1\n``", "`"]
+    frames, final = _stream(chunks, ParseMode.MARKDOWN_V2)
+
+    # '*' na końcu fragmentu czeka na kolejny znak - może być początkiem '**'
+    assert frames[0] == "Tekst " + CURSOR
+    assert frames[1] == "Tekst *pogrub" + CURSOR + "*"
+    assert final == "Tekst *pogrubienie* i `kod` ```python\nx = 1\n```"
+    assert final == render_markdown("".join(chunks))
+
+def test_code_fence_with_language_header():
+    text = "Przykład:\n```python\nprint(a_b[0] * 2)\n```\nKoniec."
+    assert render_markdown(text) == "Przykład:\n```python\nprint(a_b[0] * 2)\n```\nKoniec\\."
+    assert render_markdown(text, ParseMode.HTML) == (
+        'Przykład:\n<pre><code class="language-python">print(a_b[0] * 2)\n</code></pre>\nKoniec.'
+    )
+
+    # Nagłówek niezakończony nową linią nie otwiera jeszcze bloku
+    frames, _ = _stream(["```pyt", "hon\nx"], ParseMode.MARKDOWN_V2)
+    assert frames == [CURSOR, "```python\nx" + CURSOR + "```"]
+
+def test_snake_case_is_not_italic():
+    text = "Zmienna snake_case_name i _kursywa_"
+    assert render_markdown(text) == "Zmienna snake\\_case\\_name i _kursywa_"
+    assert render_markdown(text, ParseMode.HTML) == "Zmienna snake_case_name i <i>kursywa</i>"
+
+def test_markdown_v2_special_characters_are_escaped():
+    text = "Wynik: 1.5! a-b (x) [y] {z} #tag > c = d"
+    assert render_markdown(text) == "Wynik: 1\\.5\\! a\\-b \\(x\\) \\[y\\] \\{z\\} \\#tag \\> c \\= d"
+
+def test_finish_turns_unmatched_delimiters_into_literals():
+    renderer = MarkdownStreamRenderer()
+    renderer.feed("*otwarte i _też")
+    # Klatka domyka otwarte znaczniki, a zakończenie wyświetla je dosłownie
+    assert renderer.render(CURSOR) == "*otwarte i _też" + CURSOR + "_*"
+    assert renderer.finish() == "\\*otwarte i \\_też"
+
+def test_html_mode_escapes_text_and_uses_tags():
+    text = "**<script>** & _x_ `a<b`"
+    assert render_markdown(text, ParseMode.HTML) == "<b>&lt;script&gt;</b> &amp; <i>x</i> <code>a&lt;b</code>"
+    frames, final = _stream(list(text), ParseMode.HTML)
+    for frame in frames:
+        _assert_balanced_html(frame)
+    assert final == render_markdown(text, ParseMode.HTML)
@@ -0,0 +1,64 @@
+# tests/test_menu_state.py
+import time
+import tracemalloc
+import pytest
+import utils.menu as menu
+from utils.menu import MenuState, MENU_STATE_MAX_USERS
+
+def test_least_recently_used_user_is_evicted():
+    state = MenuState(maxsize=3)
+    for user_id in (1, 2, 3):
+        state.set_state(user_id, f"menu_{user_id}")
+    state.get_state(1)
+    state.set_state(4, "menu_4")
+
+    assert len(state) == 3
+    assert state.get_state(2) == "main"
+    assert [state.get_state(user_id) for user_id in (1, 3, 4)] == ["menu_1", "menu_3", "menu_4"]
+
+def test_idle_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(menu.time, "monotonic", lambda: now[0])
+    state = MenuState(maxsize=10, idle_ttl=60)
+    state.set_state(1, "credits")
+    state.set_message_id(2, 99)
+
+    now[0] += 61
+    state.set_state(3, "settings")
+    assert len(state) == 1
+    assert state.get_state(1) == "main" and state.get_message_id(2) is None
+
+@pytest.mark.benchmark
+def test_memory_stays_bounded_with_1m_users():
+    users = 1_000_000
+    # Po dwóch pełnych obrotach LRU tablica słownika ma już docelowy rozmiar
+    warm_up = 2 * MENU_STATE_MAX_USERS
+    state = MenuState()
+
+    def visit(user_ids):
+        for user_id in user_ids:
+            state.set_state(user_id, "chat_modes")
+            state.set_message_id(user_id, user_id + 1)
+
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        visit(range(warm_up))
+        steady, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        visit(range(warm_up, users))
+        current, peak = tracemalloc.get_traced_memory()
+        elapsed = time.perf_counter() - started
+    finally:
+        tracemalloc.stop()
+
+    print(f"\n{users} użytkowników: {len(state)} wpisów, {steady / 2 ** 20:.1f} MiB po {warm_up} "
+          f"użytkownikach, {current / 2 ** 20:.1f} MiB na końcu (szczyt {peak / 2 ** 20:.1f} MiB, "
+          f"{current / len(state):.0f} B na wpis), {elapsed:.1f} s")
+    assert len(state) == MENU_STATE_MAX_USERS
+    assert state.get_state(0) == "main" and state.get_state(users - 1) == "chat_modes"
+    # Pamięć nie rośnie z liczbą użytkowników - szczyt to przebudowa tablicy słownika
+    assert current <= steady * 1.05
+    assert peak <= steady * 1.5
+    assert current / MENU_STATE_MAX_USERS < 512
@@ -0,0 +1,59 @@
+# tests/test_message_repository.py
+import asyncio
+import repositories.message_repository as message_repository
+from repositories.message_repository import MessageRepository
+from utils.context_cache import context_cache, WINDOW_MAX_MESSAGES
+
+CONVERSATION_ID = 77
+
+class FakeMessagesClient:
+    """Tabela messages jednej konwersacji w pamięci, zliczająca zapytania"""
+
+    def __init__(self, count):
+        self.rows = []
+        self.requests = []
+        for _ in range(count):
+            self.add("wiadomość")
+
+    def add(self, content):
+        message_id = len(self.rows) + 1
+        self.rows.append({"id": message_id, "conversation_id": CONVERSATION_ID, "is_from_user": message_id % 2 == 1,
+                          "content": content, "created_at": f"2026-10-16T10:{message_id // 60:02d}:{message_id % 60:02d}"})
+
+    async def query(self, table, query_type="select", columns="*", filters=None, data=None,
+                    order_by=None, limit=None, range_filters=None, or_filter=None):
+        assert order_by == "-created_at,-id" and or_filter is None
+        self.requests.append((columns, limit))
+        return [dict(row) for row in reversed(self.rows)][:limit]
+
+def _window(client):
+    return asyncio.run(MessageRepository(client).get_context_window(CONVERSATION_ID))
+
+def test_full_window_is_read_in_one_request():
+    context_cache.invalidate(CONVERSATION_ID)
+    client = FakeMessagesClient(WINDOW_MAX_MESSAGES + 100)
+
+    window = _window(client)
+    assert client.requests == [("*", WINDOW_MAX_MESSAGES)]
+    assert len(window) == WINDOW_MAX_MESSAGES
+    assert window.last_message_id() == WINDOW_MAX_MESSAGES + 100
+
+    # Kolejna wiadomość korzysta z okna w cache
+    assert _window(client) is window
+    assert len(client.requests) == 1
+
+def test_shared_mode_rereads_only_after_another_process_wrote(monkeypatch):
+    monkeypatch.setattr(message_repository, "STATE_SHARED", True)
+    context_cache.invalidate(CONVERSATION_ID)
+    client = FakeMessagesClient(30)
+
+    window = _window(client)
+    assert _window(client) is window
+    # Okno z cache jest aktualne - tylko zapytanie o ID najnowszej wiadomości
+    assert client.requests == [("*", WINDOW_MAX_MESSAGES), ("id", 1)]
+
+    # Inny proces dopisał wiadomość - okno jest wczytywane ponownie, jednym zapytaniem
+    client.add("odpowiedź z innego procesu")
+    refreshed = _window(client)
+    assert client.requests[2:] == [("id", 1), ("*", WINDOW_MAX_MESSAGES)]
+    assert refreshed.messages()[-1]["content"] == "odpowiedź z innego procesu"
@@ -0,0 +1,158 @@
+# tests/test_payment_client.py
+import asyncio
+import json
+import time
+import httpx
+import pytest
+from database.payment_client import PaymentClient, MAX_CONNECTIONS, MAX_KEEPALIVE_CONNECTIONS
+from utils.cache import catalog_cache
+
+METHODS = [
+    {"id": 1, "code": "stripe", "is_active": True, "is_available_pl": True, "is_available_en": True},
+    {"id": 3, "code": "allegro", "is_active": True, "is_available_pl": True, "is_available_en": False,
+     "external_url": "https://allegro.test/oferta"},
+]
+
+@pytest.fixture(autouse=True)
+def _empty_catalog_cache():
+    catalog_cache.clear()
+    yield
+    catalog_cache.clear()
+
+def _client(handler, **kwargs):
+    return PaymentClient("http://supabase.test", "key", transport=httpx.MockTransport(handler),
+                         retry_delay=0, **kwargs)
+
+def test_reads_are_retried_after_server_errors_and_timeouts():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.url.path)
+        if len(attempts) == 1:
+            return httpx.Response(503, text="upstream unavailable")
+        if len(attempts) == 2:
+            raise httpx.ReadTimeout("timed out", request=request)
+        return httpx.Response(200, json=METHODS)
+
+    methods = asyncio.run(_client(handler).get_available_payment_methods("en"))
+    assert [method["code"] for method in methods] == ["stripe"]
+    assert attempts == ["/rest/v1/payment_methods"] * 3
+
+def test_client_errors_are_not_retried():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        return httpx.Response(404, json={"message": "relation does not exist"})
+
+    assert asyncio.run(_client(handler).get_user_subscriptions(1)) == []
+    assert len(attempts) == 1
+
+def test_unreachable_backend_gives_empty_result_after_retries():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        raise httpx.ConnectError("connection refused", request=request)
+
+    assert asyncio.run(_client(handler, max_retries=2).get_available_payment_methods("pl")) == []
+    assert len(attempts) == 2
+    # Pusty wynik po błędzie nie trafia do cache
+    assert catalog_cache.get("payment_methods") is None
+
+def test_payment_session_is_created_once_even_on_timeout():
+    calls = []
+
+    def handler(request):
+        calls.append(json.loads(request.content))
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    ok, message = asyncio.run(_client(handler).create_payment_url(7, 2, "stripe"))
+    assert not ok and "timed out" in message
+    assert len(calls) == 1 and calls[0]["user_id"] == 7
+
+class LocalPostgrest:
+    """Lokalny serwer HTTP/1.1 z keep-alive, zliczający połączenia TCP"""
+
+    def __init__(self, delay=0.0, stall=False):
+        self.delay = delay
+        self.stall = stall
+        self.connections = 0
+        self.open_connections = 0
+        self.max_open_connections = 0
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        self.open_connections += 1
+        self.max_open_connections = max(self.max_open_connections, self.open_connections)
+        try:
+            while await reader.readuntil(b"\r\n\r\n"):
+                self.requests += 1
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                if self.stall:
+                    await asyncio.sleep(3600)
+                await asyncio.sleep(self.delay)
+                self.active -= 1
+                body = json.dumps(METHODS).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.open_connections -= 1
+            writer.close()
+
+    async def run(self, scenario):
+        server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await scenario(f"http://127.0.0.1:{port}")
+        finally:
+            server.close()
+
+def test_connections_are_pooled_and_bounded():
+    server = LocalPostgrest(delay=0.01)
+
+    async def scenario(url):
+        client = PaymentClient(url, "key", retry_delay=0)
+        try:
+            for _ in range(20):
+                assert await client.select("payment_methods", {"select": "*"})
+            sequential_connections = server.connections
+            results = await asyncio.gather(*(client.select("payment_methods", {"select": "*"})
+                                             for _ in range(MAX_CONNECTIONS * 3)))
+            await asyncio.sleep(0.05)
+            return sequential_connections, results, server.open_connections
+        finally:
+            await client.close()
+
+    sequential_connections, results, idle_connections = asyncio.run(server.run(scenario))
+    assert all(results)
+    # Kolejne zapytania korzystają z jednego połączenia keep-alive
+    assert sequential_connections == 1
+    # Równoległe zapytania nie otwierają więcej połączeń niż limit puli,
+    # a po szczycie w puli zostaje najwyżej MAX_KEEPALIVE_CONNECTIONS
+    assert 1 < server.max_active <= server.max_open_connections <= MAX_CONNECTIONS
+    assert idle_connections <= MAX_KEEPALIVE_CONNECTIONS
+
+def test_read_timeout_bounds_a_stalled_request():
+    server = LocalPostgrest(stall=True)
+
+    async def scenario(url):
+        client = PaymentClient(url, "key", timeout=httpx.Timeout(0.2, connect=0.2), max_retries=2, retry_delay=0)
+        try:
+            started = time.perf_counter()
+            result = await client.select("payment_methods", {"select": "*"})
+            return result, time.perf_counter() - started
+        finally:
+            await client.close()
+
+    result, elapsed = asyncio.run(server.run(scenario))
+    assert result == []
+    assert server.requests == 2
+    assert elapsed < 1.5
@@ -0,0 +1,83 @@
+# tests/test_pdf_generator.py
+import asyncio
+import os
+import re
+import tempfile
+import pytest
+from PyPDF2 import PdfReader
+import utils.pdf_generator as pdf_generator
+from utils.pdf_generator import export_conversation_pdf
+
+MESSAGES = 600
+PAGE_SIZE = 100
+
+@pytest.fixture
+def export_dir(monkeypatch, tmp_path):
+    """Pliki tymczasowe eksportu w osobnym katalogu, PDF budowany w wątku"""
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    monkeypatch.setattr(pdf_generator, "PDF_EXPORT_WORKERS", 0)
+    return tmp_path
+
+def _message(n):
+    return {"is_from_user": n % 2 == 0, "content": f"Wiadomość nr {n:04d} **ważna**",
+            "created_at": "2026-10-16T10:00:00+00:00"}
+
+async def _pages(count, fail_after=None):
+    for start in range(0, count, PAGE_SIZE):
+        if fail_after is not None and start >= fail_after:
+            raise ConnectionError("utracono połączenie z bazą")
+        yield [_message(n) for n in range(start, min(start + PAGE_SIZE, count))]
+
+def test_every_message_ends_up_in_the_pdf(export_dir):
+    path = asyncio.run(export_conversation_pdf(_pages(MESSAGES), {"username": "tester"}))
+    try:
+        assert os.listdir(export_dir) == [os.path.basename(path)]
+        text = "".join(page.extract_text() for page in PdfReader(path).pages)
+        numbers = [int(number) for number in re.findall(r"Wiadomosc nr (\d{4}) wazna", text)]
+        assert numbers == list(range(MESSAGES))
+        assert "tester" in text
+    finally:
+        os.remove(path)
+
+def test_empty_conversation_leaves_no_files(export_dir):
+    assert asyncio.run(export_conversation_pdf(_pages(0), {})) is None
+    assert os.listdir(export_dir) == []
+
+def test_failed_read_removes_the_spool(export_dir):
+    with pytest.raises(ConnectionError):
+        asyncio.run(export_conversation_pdf(_pages(MESSAGES, fail_after=300), {}))
+    assert os.listdir(export_dir) == []
+
+def test_failed_build_removes_the_spool_and_the_partial_pdf(export_dir, monkeypatch):
+    def failing_build(spool_path, output_path, username, bot_name):
+        with open(output_path, "wb") as output:
+            output.write(b"%PDF-1.4 niedokonczony")
+        raise MemoryError("brak pamięci w trakcie budowania")
+
+    monkeypatch.setattr(pdf_generator, "build_conversation_pdf_file", failing_build)
+    with pytest.raises(MemoryError):
+        asyncio.run(export_conversation_pdf(_pages(MESSAGES), {}))
+    assert os.listdir(export_dir) == []
+
+def test_flowables_are_fed_in_bounded_chunks(monkeypatch):
+    consumed = []
+    peak = []
+
+    def conversation():
+        for n in range(MESSAGES):
+            consumed.append(n)
+            yield _message(n)
+
+    class RecordingFeed(pdf_generator._FlowableFeed):
+        def __len__(self):
+            length = super().__len__()
+            peak.append(length)
+            return length
+
+    monkeypatch.setattr(pdf_generator, "_FlowableFeed", RecordingFeed)
+    buffer = pdf_generator.generate_conversation_pdf(conversation(), {})
+
+    assert buffer.getvalue().startswith(b"%PDF")
+    assert len(consumed) == MESSAGES
+    # Dokument nigdy nie trzyma więcej niż FLOWABLE_BUFFER akapitów naraz
+    assert max(peak) <= pdf_generator.FLOWABLE_BUFFER
@@ -0,0 +1,125 @@
+# tests/test_persistence.py
+import asyncio
+import pytest
+from services.persistence import StatePersistence, MemoryBackend, SQLiteBackend
+
+CHAT_ID = -100123
+USER_ID = 987654321
+
+class CountingBackend(MemoryBackend):
+    """MemoryBackend zapisujący każdą operację set_many (zapis trwa chwilę, jak w prawdziwym magazynie)"""
+
+    def __init__(self, failures=0):
+        super().__init__()
+        self.batches = []
+        self.reads = 0
+        self.failures = failures
+
+    async def get(self, key):
+        self.reads += 1
+        return await super().get(key)
+
+    async def set_many(self, items):
+        await asyncio.sleep(0.01)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("magazyn niedostępny")
+        self.batches.append(list(items))
+        await super().set_many(items)
+
+def test_two_processes_share_chat_data():
+    backend = CountingBackend()
+    first, second = StatePersistence(backend, shared=True), StatePersistence(backend, shared=True)
+
+    async def scenario():
+        # Proces 1 obsługuje pierwszą aktualizację czatu
+        chat_first = {}
+        await first.refresh_chat_data(CHAT_ID, chat_first)
+        chat_first["user_data"] = {USER_ID: {"language": "en", "chat_initialized": True}}
+        await first.update_chat_data(CHAT_ID, chat_first)
+
+        # Proces 2 wczytuje stan zapisany przez proces 1 i go zmienia
+        chat_second = {}
+        await second.refresh_chat_data(CHAT_ID, chat_second)
+        assert chat_second == chat_first
+        chat_second["user_data"][USER_ID]["current_mode"] = "coder"
+        await second.update_chat_data(CHAT_ID, chat_second)
+
+        # Proces 1 widzi zmianę - ten sam obiekt chat_data jest aktualizowany w miejscu
+        await first.refresh_chat_data(CHAT_ID, chat_first)
+        assert chat_first["user_data"][USER_ID]["current_mode"] == "coder"
+
+        # Niezapisana lokalna zmiana nie jest nadpisywana przy odświeżeniu, tylko zapisywana
+        chat_first["user_data"][USER_ID]["language"] = "pl"
+        await first.refresh_chat_data(CHAT_ID, chat_first)
+        assert chat_first["user_data"][USER_ID] == {"language": "pl", "chat_initialized": True,
+                                                    "current_mode": "coder"}
+        await second.refresh_chat_data(CHAT_ID, chat_second)
+        assert chat_second == chat_first
+
+    asyncio.run(scenario())
+    assert len(backend.batches) == 3
+
+def test_single_process_reads_each_chat_once():
+    backend = CountingBackend()
+    persistence = StatePersistence(backend, shared=False)
+
+    async def scenario():
+        chat_data = {}
+        for _ in range(5):
+            await persistence.refresh_chat_data(CHAT_ID, chat_data)
+
+    asyncio.run(scenario())
+    assert backend.reads == 1
+
+def test_concurrent_updates_are_flushed_in_batches():
+    backend = CountingBackend()
+    persistence = StatePersistence(backend, shared=False)
+    chats = {chat_id: {"user_data": {chat_id: {"language": "pl"}}} for chat_id in range(1, 11)}
+
+    async def update_all():
+        await asyncio.gather(*(persistence.update_chat_data(chat_id, data) for chat_id, data in chats.items()))
+
+    asyncio.run(update_all())
+    # Pierwszy zapis trwa - zmiany pozostałych czatów czekają i trafiają do jednej operacji
+    assert backend.batches == [["chat_data:1"], [f"chat_data:{chat_id}" for chat_id in range(2, 11)]]
+
+    # Niezmienione dane nie są zapisywane ponownie
+    asyncio.run(update_all())
+    assert len(backend.batches) == 2
+
+def test_failed_flush_is_retried_with_the_next_one():
+    backend = CountingBackend(failures=1)
+    persistence = StatePersistence(backend, shared=False)
+
+    async def scenario():
+        await persistence.update_chat_data(1, {"a": 1})
+        assert backend.data == {}
+        await persistence.update_chat_data(2, {"b": 2})
+
+    asyncio.run(scenario())
+    assert backend.batches == [["chat_data:1", "chat_data:2"]]
+
+@pytest.mark.parametrize("backend_name", ["memory", "sqlite"])
+def test_int_user_ids_survive_a_restart(backend_name, tmp_path):
+    def make_backend():
+        return MemoryBackend() if backend_name == "memory" else SQLiteBackend(str(tmp_path / "state.db"))
+
+    backend = make_backend()
+    chat_data = {"user_data": {USER_ID: {"language": "ru"}}, "conversation_id": 5}
+
+    async def save():
+        persistence = StatePersistence(backend)
+        await persistence.update_chat_data(CHAT_ID, chat_data)
+        if backend_name == "sqlite":
+            await persistence.flush()
+
+    async def load(restarted):
+        loaded = {}
+        await StatePersistence(restarted).refresh_chat_data(CHAT_ID, loaded)
+        return loaded
+
+    asyncio.run(save())
+    loaded = asyncio.run(load(backend if backend_name == "memory" else make_backend()))
+    assert loaded == chat_data
+    assert list(loaded["user_data"]) == [USER_ID]
@@ -0,0 +1,262 @@
+# tests/test_streaming_editor.py
+import asyncio
+from types import SimpleNamespace
+import pytest
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
+import utils.streaming_editor as streaming_editor
+from utils.streaming_editor import (
+    StreamingEditor, TokenBucket, MAX_MESSAGE_LENGTH, MIN_EDIT_INTERVAL, EDIT_INTERVAL_PER_1000_CHARS, CURSOR
+)
+
+_yield = asyncio.sleep
+
+class FakeBot:
+    def __init__(self, chat):
+        self.chat = chat
+
+    async def send_message(self, chat_id, text):
+        return FakeMessage(self.chat, text)
+
+class FakeMessage:
+    """Wiadomość Telegram zapisująca wszystkie wysłane klatki"""
+
+    def __init__(self, chat, text=""):
+        self.chat = chat
+        self.chat_id = 1
+        self.text = text
+        self.parse_mode = None
+        chat.append(self)
+
+    def get_bot(self):
+        return FakeBot(self.chat)
+
+    async def edit_text(self, text, parse_mode=None):
+        assert len(text) <= MAX_MESSAGE_LENGTH, f"klatka {len(text)} znaków"
+        self.text = text
+        self.parse_mode = parse_mode
+
+def _stream(parse_mode, text, chunk_size=40):
+    chat = []
+
+    async def run():
+        editor = StreamingEditor(FakeMessage(chat), header="*Odpowiedź*\n", parse_mode=parse_mode,
+                                 bucket=TokenBucket(1e9, 10 ** 9))
+        for start in range(0, len(text), chunk_size):
+            await editor.append(text[start:start + chunk_size])
+        return await editor.finish()
+
+    return chat, asyncio.run(run())
+
+def test_escaped_markdown_v2_reply_stays_within_limit():
+    # Kropki, myślniki i nawiasy podwajają długość po escapowaniu MarkdownV2
+    text = "1. Wynik (x-y) = z.\n" * 400
+    chat, full_text = _stream(ParseMode.MARKDOWN_V2, text)
+
+    assert full_text == text
+    assert len(chat) > 2
+    assert all(message.parse_mode == ParseMode.MARKDOWN_V2 for message in chat)
+    assert all(len(message.text) <= MAX_MESSAGE_LENGTH for message in chat)
+
+def test_html_entities_are_counted_after_rendering():
+    text = "a < b && c > d\n" * 600
+    chat, full_text = _stream(ParseMode.HTML, text)
+
+    assert full_text == text
+    assert all(message.parse_mode == ParseMode.HTML for message in chat)
+    assert all(len(message.text) <= MAX_MESSAGE_LENGTH for message in chat)
+
+class FakeClock:
+    """Zegar monotonic i asyncio.sleep edytora - czas płynie tylko w sleep() i advance()"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += max(delay, 0)
+        await _yield(0)
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(streaming_editor, "time", SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(streaming_editor, "asyncio", SimpleNamespace(sleep=clock.sleep))
+    return clock
+
+class RecordingMessage:
+    """Wiadomość zapisująca edycje (czas, tekst, tryb); kolejne edycje mogą rzucić błędy z errors"""
+
+    def __init__(self, clock, errors=()):
+        self.clock = clock
+        self.errors = list(errors)
+        self.edits = []
+        self.attempts = 0
+
+    async def edit_text(self, text, parse_mode=None):
+        self.attempts += 1
+        if self.errors:
+            error = self.errors.pop(0)
+            if error is not None:
+                raise error
+        self.edits.append((self.clock.now, text, parse_mode))
+
+def _editor(message, bucket=None):
+    return StreamingEditor(message, parse_mode=ParseMode.MARKDOWN_V2,
+                           bucket=bucket or TokenBucket(1e9, 10 ** 9))
+
+def test_token_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+    clock.advance(0.5)
+    assert [bucket.try_acquire() for _ in range(2)] == [True, False]
+
+    # Długa przerwa nie daje więcej niż capacity tokenów
+    clock.advance(60)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+    # acquire czeka dokładnie na brakujący token
+    asyncio.run(bucket.acquire())
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+def test_edits_are_coalesced_within_the_interval(clock):
+    message = RecordingMessage(clock)
+
+    async def scenario():
+        editor = _editor(message)
+        await editor.append("Ala")
+        for _ in range(4):
+            clock.advance(MIN_EDIT_INTERVAL / 4 - 0.01)
+            await editor.append(" ma")
+        clock.advance(0.1)
+        await editor.append(" kota")
+        return await editor.finish()
+
+    assert asyncio.run(scenario()) == "Ala ma ma ma ma kota"
+    assert [text for _, text, _ in message.edits] == [
+        "Ala" + CURSOR, "Ala ma ma ma ma kota" + CURSOR, "Ala ma ma ma ma kota"
+    ]
+
+def test_interval_grows_with_the_length_of_the_reply(clock):
+    message = RecordingMessage(clock)
+    long_text = "slowo " * 500  # 3000 znaków - odstęp 1 s + 1,5 s
+
+    async def scenario():
+        editor = _editor(message)
+        await editor.append(long_text)
+        started = clock.now
+        while len(message.edits) < 2:
+            clock.advance(0.1)
+            await editor.append("x")
+        return clock.now - started
+
+    elapsed = asyncio.run(scenario())
+    interval = MIN_EDIT_INTERVAL + len(long_text) / 1000 * EDIT_INTERVAL_PER_1000_CHARS
+    assert interval <= elapsed < interval + 0.2
+
+def test_unchanged_frames_are_not_sent_again(clock):
+    message = RecordingMessage(clock)
+
+    async def scenario():
+        editor = _editor(message)
+        await editor.append("Wynik")
+        clock.advance(MIN_EDIT_INTERVAL * 2)
+        # '*' na końcu fragmentu nie zmienia jeszcze klatki
+        await editor.append("*")
+        await editor.finish()
+        await editor.finish()
+
+    asyncio.run(scenario())
+    assert [text for _, text, _ in message.edits] == ["Wynik" + CURSOR, "Wynik\\*"]
+
+def test_not_modified_error_counts_as_sent(clock):
+    message = RecordingMessage(clock, errors=[BadRequest("Message is not modified")])
+
+    async def scenario():
+        editor = _editor(message)
+        await editor.append("Tekst")
+        clock.advance(MIN_EDIT_INTERVAL * 2)
+        await editor.append("*")
+        return await editor.finish()
+
+    assert asyncio.run(scenario()) == "Tekst*"
+    # Klatka odrzucona jako niezmieniona nie jest wysyłana ponownie
+    assert message.attempts == 2
+    assert [text for _, text, _ in message.edits] == ["Tekst\\*"]
+
+def test_retry_after_pauses_edits_and_backs_off(clock):
+    message = RecordingMessage(clock, errors=[None, RetryAfter(3)])
+
+    async def scenario():
+        editor = _editor(message)
+        await editor.append("a")                # edycja
+        clock.advance(MIN_EDIT_INTERVAL * 1.5)
+        await editor.append("b")                # RetryAfter - wstrzymanie na 3 s, odstęp x2
+        assert editor._backoff == 2.0
+        for _ in range(5):
+            clock.advance(0.5)
+            await editor.append("c")            # w trakcie wstrzymania - bez prób edycji
+        assert message.attempts == 2
+        clock.advance(0.6)
+        await editor.append("d")                # po wstrzymaniu, odstęp 2 s od ostatniej edycji minął
+        return editor
+
+    editor = asyncio.run(scenario())
+    assert message.attempts == 3
+    assert [text for _, text, _ in message.edits] == ["a" + CURSOR, "abcccccd" + CURSOR]
+    # Udana edycja stopniowo zmniejsza odstęp
+    assert editor._backoff == pytest.approx(1.8)
+
+def test_finish_waits_out_retry_after(clock):
+    message = RecordingMessage(clock, errors=[None, RetryAfter(4)])
+
+    async def scenario():
+        editor = _editor(message)
+        await editor.append("Pierwsza")
+        clock.advance(MIN_EDIT_INTERVAL * 1.5)
+        await editor.append(" i druga")
+        retry_at = clock.now
+        await editor.finish()
+        return retry_at
+
+    retry_at = asyncio.run(scenario())
+    final_at, final_text, _ = message.edits[-1]
+    assert final_text == "Pierwsza i druga"
+    assert final_at == pytest.approx(retry_at + 4)
+    assert clock.sleeps == [pytest.approx(4)]
+
+def test_final_edit_waits_for_the_global_limit(clock):
+    bucket = TokenBucket(rate=10.0, capacity=1)
+    message = RecordingMessage(clock)
+
+    async def scenario():
+        editor = _editor(message, bucket=bucket)
+        await editor.append("Odpowiedź")        # zużywa jedyny token
+        clock.advance(MIN_EDIT_INTERVAL)
+        assert bucket.try_acquire()             # token zużywa edycja w innym czacie
+        await editor.append(" dalej")           # brak tokenu - klatka pominięta
+        await editor.finish()                   # ostateczna treść czeka na token
+
+    asyncio.run(scenario())
+    assert [text for _, text, _ in message.edits] == ["Odpowiedź" + CURSOR, "Odpowiedź dalej"]
+    assert clock.sleeps == [pytest.approx(0.1)]
+
+def test_rejected_formatting_falls_back_to_plain_text(clock):
+    message = RecordingMessage(clock, errors=[BadRequest("Can't parse entities: unsupported start tag")])
+
+    async def scenario():
+        editor = _editor(message)
+        await editor.append("Wynik: 1.5!")
+        return await editor.finish()
+
+    asyncio.run(scenario())
+    assert message.edits[0][1:] == ("Wynik: 1.5!", None)
+    assert message.edits[-1][1:] == ("Wynik: 1\\.5\\!", ParseMode.MARKDOWN_V2)
@@ -0,0 +1,118 @@
+# tests/test_usage_analytics.py
+import datetime
+import random
+import timeit
+import pytest
+from config import CREDIT_CATEGORY_PURCHASE
+from utils.usage_analytics import analyze_usage, ROLLING_WINDOW_DAYS
+
+TODAY = datetime.date(2026, 10, 16)
+
+def _row(day, category, amount, credits_after=None, last_at=None, operations=1):
+    return {"day": day.isoformat(), "category": category, "amount": amount, "operations": operations,
+            "credits_after": credits_after, "last_at": last_at or f"{day.isoformat()}T12:00:00+00:00"}
+
+def _rollup(days, categories=("chat", "image", "document"), seed=1):
+    """Agregaty dzienne credit_usage_daily dla jednego użytkownika: kilka kategorii dziennie"""
+    rng = random.Random(seed)
+    rows = []
+    balance = 10_000
+    for offset in range(days, -1, -1):
+        day = TODAY - datetime.timedelta(days=offset)
+        if offset % 10 == 0:
+            balance += 500
+            rows.append(_row(day, CREDIT_CATEGORY_PURCHASE, 500, balance, f"{day.isoformat()}T08:00:00+00:00"))
+        for hour, category in enumerate(categories, start=9):
+            amount = rng.randint(1, 40)
+            balance -= amount
+            rows.append(_row(day, category, amount, balance, f"{day.isoformat()}T{hour:02d}:00:00+00:00",
+                             rng.randint(1, 5)))
+    rng.shuffle(rows)
+    return rows
+
+def test_days_without_transactions_carry_the_balance():
+    rows = [
+        _row(TODAY - datetime.timedelta(days=4), "chat", 10, 90, "2026-10-12T10:00:00+00:00"),
+        _row(TODAY - datetime.timedelta(days=4), "chat", 5, 85, "2026-10-12T18:00:00+00:00"),
+        _row(TODAY - datetime.timedelta(days=1), CREDIT_CATEGORY_PURCHASE, 100, 185),
+    ]
+    analysis = analyze_usage(rows, 30, today=TODAY)
+
+    assert [entry.day for entry in analysis.daily] == [TODAY - datetime.timedelta(days=n) for n in range(4, -1, -1)]
+    assert [entry.usage for entry in analysis.daily] == [15, 0, 0, 0, 0]
+    assert [entry.purchase for entry in analysis.daily] == [0, 0, 0, 100, 0]
+    # Saldo dnia z ostatniej transakcji, przenoszone na dni bez transakcji
+    assert [entry.balance for entry in analysis.daily] == [85, 85, 85, 185, 185]
+    assert analysis.daily[1].rolling_usage == pytest.approx(7.5)
+
+def test_average_is_per_day_and_purchases_are_not_spending():
+    rows = [
+        _row(TODAY - datetime.timedelta(days=9), "chat", 30, 70),
+        _row(TODAY - datetime.timedelta(days=9), "image", 10, 60),
+        _row(TODAY - datetime.timedelta(days=3), CREDIT_CATEGORY_PURCHASE, 500, 560),
+        _row(TODAY, "chat", 20, 540),
+    ]
+    analysis = analyze_usage(rows, 30, today=TODAY)
+
+    assert analysis.total_usage == 60
+    assert analysis.days_analyzed == 10
+    assert analysis.avg_daily_usage == pytest.approx(6.0)
+    assert analysis.by_category == {"chat": 50, "image": 10}
+    assert list(analysis.by_category) == ["chat", "image"]
+
+def test_empty_rollup():
+    analysis = analyze_usage([], 30, today=TODAY)
+    assert analysis.daily == [] and analysis.avg_daily_usage == 0.0 and analysis.by_category == {}
+
+def _analyze_with_pandas(rows, days, today):
+    """Poprzednia, wektorowa wersja analizy (pandas) - punkt odniesienia do porównania"""
+    import numpy as np
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(list(rows), columns=["day", "category", "amount", "operations",
+                                                           "credits_after", "last_at"])
+    frame["day"] = pd.to_datetime(frame["day"], errors="coerce")
+    frame = frame.assign(
+        category=frame["category"].fillna("").astype(str).astype("category"),
+        amount=pd.to_numeric(frame["amount"], errors="coerce").fillna(0).astype(np.int64),
+        operations=pd.to_numeric(frame["operations"], errors="coerce").fillna(0).astype(np.int64),
+        credits_after=pd.to_numeric(frame["credits_after"], errors="coerce").astype(np.float64),
+        last_at=frame["last_at"].fillna("").astype(str)
+    )
+    is_purchase = (frame["category"] == CREDIT_CATEGORY_PURCHASE).to_numpy()
+    amounts = frame["amount"].to_numpy()
+    frame = frame.assign(usage=np.where(is_purchase, 0, amounts), purchase=np.where(is_purchase, amounts, 0))
+
+    daily = frame.groupby("day")[["usage", "purchase"]].sum()
+    daily["balance"] = frame.sort_values(["day", "last_at"]).groupby("day")["credits_after"].last()
+    index = pd.date_range(daily.index.min(), max(pd.Timestamp(today), daily.index.max()), freq="D", name="day")
+    daily = daily.reindex(index)
+    daily[["usage", "purchase"]] = daily[["usage", "purchase"]].fillna(0).astype(np.int64)
+    daily["balance"] = daily["balance"].ffill().fillna(0)
+    daily["rolling_usage"] = daily["usage"].rolling(ROLLING_WINDOW_DAYS, min_periods=1).mean()
+
+    spending = frame[~is_purchase]
+    by_category = spending.groupby("category", observed=True)["amount"].sum()
+    by_category = by_category[by_category > 0].sort_values(ascending=False)
+    return daily, {str(category): int(amount) for category, amount in by_category.items()}
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("days", [30, 90, 365])
+def test_loops_are_faster_than_pandas(days):
+    pytest.importorskip("pandas")
+    rows = _rollup(days)
+
+    # Obie wersje liczą to samo
+    analysis = analyze_usage(rows, days, today=TODAY)
+    daily, by_category = _analyze_with_pandas(rows, days, TODAY)
+    assert analysis.by_category == by_category
+    assert [entry.usage for entry in analysis.daily] == daily["usage"].tolist()
+    assert [entry.purchase for entry in analysis.daily] == daily["purchase"].tolist()
+    assert [entry.balance for entry in analysis.daily] == daily["balance"].tolist()
+    assert [entry.rolling_usage for entry in analysis.daily] == pytest.approx(daily["rolling_usage"].tolist())
+
+    loops = min(timeit.repeat(lambda: analyze_usage(rows, days, today=TODAY), number=20, repeat=5)) / 20
+    frames = min(timeit.repeat(lambda: _analyze_with_pandas(rows, days, TODAY), number=20, repeat=5)) / 20
+    print(f"\n{len(rows)} wierszy ({days} dni): pętle {loops * 1000:.2f} ms, pandas {frames * 1000:.2f} ms "
+          f"({frames / loops:.1f}x)")
+    assert loops < frames
@@ -0,0 +1,219 @@
+# tests/test_usage_forecast.py
+import asyncio
+import datetime
+import random
+import pytest
+import services.forecast_service as forecast_service
+from config import CREDIT_CATEGORY_PURCHASE, FORECAST_HISTORY_DAYS
+from services.forecast_service import ForecastService
+from utils.usage_forecast import UsageForecastState, DAILY_ALPHA
+
+TODAY = datetime.date(2026, 10, 16)  # czwartek
+USER_ID = 7
+
+def _row(day, category, amount, operations=1, credits_after=None, user_id=USER_ID, hour=12):
+    return {"user_id": user_id, "day": day.isoformat(), "category": category, "amount": amount,
+            "operations": operations, "credits_after": credits_after,
+            "last_at": f"{day.isoformat()}T{hour:02d}:00:00+00:00" if credits_after is not None else None}
+
+def _history(days, seed=1):
+    rng = random.Random(seed)
+    rows = []
+    for offset in range(days, 0, -1):
+        day = TODAY - datetime.timedelta(days=offset)
+        if rng.random() < 0.2:
+            continue  # dzień bez zużycia
+        for category in ("message", "image"):
+            operations = rng.randint(0, 6)
+            rows.append(_row(day, category, operations * rng.randint(1, 3), operations))
+    return rows
+
+def _snapshot(state):
+    return (state.last_day, state.weight, state.spend, state.operations, state.season_usage, state.season_weight)
+
+def _assert_same_state(state, expected):
+    (last_day, weight, spend, operations, season_usage, season_weight) = _snapshot(expected)
+    assert state.last_day == last_day
+    assert state.weight == pytest.approx(weight)
+    assert state.spend == pytest.approx(spend)
+    assert state.operations == pytest.approx(operations)
+    assert state.season_usage == pytest.approx(season_usage)
+    assert state.season_weight == pytest.approx(season_weight)
+
+# UsageForecastState
+
+def test_bias_correction_gives_the_true_average_from_the_first_day():
+    state = UsageForecastState.from_rows([_row(TODAY - datetime.timedelta(days=1), "message", 12, 4)], TODAY)
+
+    # Średnia wykładnicza zaczyna od zera - bez podzielenia przez wagę byłoby 12 * DAILY_ALPHA
+    assert state.weight == pytest.approx(DAILY_ALPHA)
+    assert state.daily_usage() == pytest.approx(12)
+    # Koszt wiadomości w bieżącym modelu zastępuje średni koszt z historii
+    assert state.daily_usage(message_cost=5) == pytest.approx(20)
+
+def test_todays_partial_day_updates_only_the_balance():
+    rows = [
+        _row(TODAY - datetime.timedelta(days=1), "message", 10, credits_after=90),
+        _row(TODAY, "message", 50, credits_after=40),
+        _row(TODAY - datetime.timedelta(days=1), CREDIT_CATEGORY_PURCHASE, 100),
+    ]
+    state = UsageForecastState.from_rows(rows, TODAY)
+
+    assert state.last_day == TODAY - datetime.timedelta(days=1)
+    assert state.daily_usage() == pytest.approx(10)
+    assert CREDIT_CATEGORY_PURCHASE not in state.spend
+    assert state.balance == 40
+    assert state.last_activity == TODAY
+
+def test_advance_to_folds_empty_days_up_to_yesterday():
+    first_day = TODAY - datetime.timedelta(days=5)
+    state = UsageForecastState.from_rows([_row(first_day, "message", 10)], first_day + datetime.timedelta(days=1))
+
+    state.advance_to(TODAY)
+    keep = 1 - DAILY_ALPHA
+    assert state.last_day == TODAY - datetime.timedelta(days=1)
+    assert state.weight == pytest.approx(1 - keep ** 5)
+    assert state.daily_usage() == pytest.approx(10 * DAILY_ALPHA * keep ** 4 / (1 - keep ** 5))
+
+    # Kolejne wywołanie tego samego dnia nic nie zmienia
+    weight = state.weight
+    state.advance_to(TODAY)
+    assert state.weight == weight
+
+def test_incremental_folding_matches_from_rows():
+    rows = _history(FORECAST_HISTORY_DAYS)
+    expected = UsageForecastState.from_rows(rows, TODAY)
+
+    # Stan budowany dzień po dniu, tak jak przy cogodzinnych przeliczeniach
+    state = UsageForecastState()
+    for offset in range(FORECAST_HISTORY_DAYS, -1, -1):
+        today = TODAY - datetime.timedelta(days=offset)
+        yesterday = (today - datetime.timedelta(days=1)).isoformat()
+        state.update([row for row in rows if row["day"] == yesterday], today)
+        state.advance_to(today)
+
+    _assert_same_state(state, expected)
+    assert state.forecast(balance=500, today=TODAY) == expected.forecast(balance=500, today=TODAY)
+
+def test_weekday_profile_shifts_the_forecast_towards_busy_days():
+    rows = []
+    for offset in range(1, FORECAST_HISTORY_DAYS + 1):
+        day = TODAY - datetime.timedelta(days=offset)
+        rows.append(_row(day, "message", 40 if day.weekday() == 0 else 10))
+    state = UsageForecastState.from_rows(rows, TODAY)
+
+    factors = [state._season_factor(weekday) for weekday in range(7)]
+    assert factors[0] > 1.5
+    assert all(0.5 < factor < 1 for factor in factors[1:])
+    assert factors[1:] == pytest.approx([factors[1]] * 6)
+
+    # Dzień tygodnia bez obserwacji i równy profil nie korygują prognozy
+    assert UsageForecastState()._season_factor(0) == 1.0
+    flat = UsageForecastState.from_rows([_row(TODAY - datetime.timedelta(days=offset), "message", 10)
+                                         for offset in range(1, 15)], TODAY)
+    assert [flat._season_factor(weekday) for weekday in range(7)] == pytest.approx([1.0] * 7)
+
+def test_forecast_reports_the_depletion_day():
+    state = UsageForecastState.from_rows([_row(TODAY - datetime.timedelta(days=offset), "message", 10)
+                                          for offset in range(1, 15)], TODAY)
+
+    forecast = state.forecast(balance=35, today=TODAY)
+    assert forecast.daily_usage == pytest.approx(10)
+    assert forecast.days_left == 3
+    assert forecast.depletion_date == TODAY + datetime.timedelta(days=3)
+    assert UsageForecastState().forecast(balance=35, today=TODAY).days_left is None
+
+# ForecastService.refresh
+
+class FakeCreditRepository:
+    """Agregaty dzienne wszystkich użytkowników w pamięci"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.since_days = []
+        self.released = 0
+        self.unavailable = False
+
+    async def release_expired_holds(self):
+        self.released += 1
+        return 0
+
+    async def iter_daily_usage_since(self, since_day, page_size=3):
+        self.since_days.append(since_day)
+        if self.unavailable:
+            return  # błąd bazy - repozytorium zwraca pusty wynik
+        rows = sorted((row for row in self.rows if row["day"] >= since_day),
+                      key=lambda row: (row["day"], row["user_id"], row["category"]))
+        for start in range(0, len(rows), page_size):
+            yield rows[start:start + page_size]
+
+    async def get_credit_packages(self):
+        return [{"id": 1, "name": "Starter", "credits": 100, "price": 9.99},
+                {"id": 2, "name": "Pro", "credits": 1000, "price": 79.99}]
+
+def _refresh(service, monkeypatch, today):
+    monkeypatch.setattr(forecast_service, "utc_today", lambda: today)
+    asyncio.run(service.refresh())
+
+def test_repeated_refreshes_within_a_day_do_not_double_count(monkeypatch):
+    rows = _history(20) + [_row(TODAY, "message", 30, credits_after=70)]
+    repository = FakeCreditRepository(rows)
+    service = ForecastService(repository)
+
+    _refresh(service, monkeypatch, TODAY)
+    state = service._states[USER_ID]
+    first = _snapshot(state)
+    first_usage = state.daily_usage()
+
+    # Dzisiejsze zużycie rośnie, ale dzień nie jest jeszcze zakończony
+    repository.rows.append(_row(TODAY, "image", 20, credits_after=50, hour=18))
+    _refresh(service, monkeypatch, TODAY)
+    _refresh(service, monkeypatch, TODAY)
+
+    assert _snapshot(state) == first
+    assert state.daily_usage() == pytest.approx(first_usage)
+    assert service.get_outlook(USER_ID).balance == 50
+    assert repository.since_days == [(TODAY - datetime.timedelta(days=FORECAST_HISTORY_DAYS)).isoformat(),
+                                      TODAY.isoformat(), TODAY.isoformat()]
+    assert repository.released == 3
+
+    # Następnego dnia wczorajsze wiersze trafiają do średnich dokładnie raz
+    tomorrow = TODAY + datetime.timedelta(days=1)
+    _refresh(service, monkeypatch, tomorrow)
+    _refresh(service, monkeypatch, tomorrow)
+    _assert_same_state(state, UsageForecastState.from_rows(repository.rows, tomorrow))
+
+def test_empty_fetch_keeps_the_watermark_and_refetches(monkeypatch):
+    repository = FakeCreditRepository(_history(10))
+    service = ForecastService(repository)
+    _refresh(service, monkeypatch, TODAY)
+
+    tomorrow = TODAY + datetime.timedelta(days=1)
+    repository.rows.append(_row(TODAY, "message", 25))
+    repository.unavailable = True
+    _refresh(service, monkeypatch, tomorrow)
+    day_after = tomorrow + datetime.timedelta(days=1)
+    repository.unavailable = False
+    _refresh(service, monkeypatch, day_after)
+
+    # Pusty wynik mógł być błędem bazy - te same dni są pobierane ponownie i nie giną
+    assert repository.since_days[1:] == [TODAY.isoformat(), TODAY.isoformat()]
+    _assert_same_state(service._states[USER_ID], UsageForecastState.from_rows(repository.rows, day_after))
+
+def test_refresh_builds_outlooks_and_drops_inactive_users(monkeypatch):
+    inactive_day = TODAY - datetime.timedelta(days=FORECAST_HISTORY_DAYS + 10)
+    rows = [_row(TODAY - datetime.timedelta(days=offset), "message", 10, credits_after=100 - offset)
+            for offset in range(14, 0, -1)]
+    repository = FakeCreditRepository(rows)
+    service = ForecastService(repository)
+    service._states[USER_ID + 1] = UsageForecastState.from_rows([_row(inactive_day, "message", 5, user_id=USER_ID + 1)],
+                                                               inactive_day + datetime.timedelta(days=1))
+
+    _refresh(service, monkeypatch, TODAY)
+
+    outlook = service.get_outlook(USER_ID)
+    assert outlook.balance == 99
+    assert outlook.forecast.days_left == 9
+    assert outlook.recommendation["package_name"] == "Pro"
+    assert outlook.nudge is None
+    assert USER_ID + 1 not in service._states and service.get_outlook(USER_ID + 1) is None
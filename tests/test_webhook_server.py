@@ -0,0 +1,24 @@
+# tests/test_webhook_server.py
+import asyncio
+from types import SimpleNamespace
+import pytest
+from aiohttp.test_utils import make_mocked_request
+from services.webhook_server import WebhookServer, SECRET_TOKEN_HEADER
+
+def _server(secret_token):
+    return WebhookServer(SimpleNamespace(bot=None, update_queue=asyncio.Queue()), secret_token=secret_token)
+
+@pytest.mark.parametrize("secret_token", [None, "", "spacje są niedozwolone"])
+def test_webhook_requires_a_valid_secret_token(secret_token):
+    with pytest.raises(ValueError):
+        _server(secret_token)
+
+@pytest.mark.parametrize("headers", [{}, {SECRET_TOKEN_HEADER: "inny-token"}])
+def test_update_without_matching_secret_is_rejected(headers):
+    server = _server("tajny_token-1")
+    request = make_mocked_request("POST", "/telegram", headers=headers)
+
+    response = asyncio.run(server.handle_update(request))
+
+    assert response.status == 403
+    assert server.application.update_queue.empty()
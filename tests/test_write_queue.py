@@ -0,0 +1,123 @@
+# tests/test_write_queue.py
+import asyncio
+import json
+import httpx
+from services.write_queue import WriteQueue
+
+def _status_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://supabase.test/rest/v1/messages")
+    return httpx.HTTPStatusError(f"HTTP {status}", request=request, response=httpx.Response(status, request=request))
+
+class FakeClient:
+    """Klient PostgREST w pamięci - wiersze z content == "bad" naruszają klucz obcy"""
+
+    def __init__(self):
+        self.saved = []
+        self.requests = 0
+        self.unavailable = False
+        self.counts = {}
+
+    async def insert_rows(self, table, rows, on_conflict=None):
+        self.requests += 1
+        if self.unavailable:
+            raise _status_error(503)
+        if any(row.get("content") == "bad" for row in rows):
+            raise _status_error(409)
+        known = {row[on_conflict] for row in self.saved} if on_conflict else set()
+        inserted = []
+        for row in rows:
+            if on_conflict and row[on_conflict] in known:
+                continue
+            saved = dict(row, id=len(self.saved) + 1)
+            self.saved.append(saved)
+            inserted.append(saved)
+        return inserted
+
+    async def rpc(self, function, params=None, retry=True):
+        for key, amount in params["p_counts"].items():
+            self.counts[key] = self.counts.get(key, 0) + amount
+        return None if self.unavailable else True
+
+def _message(content):
+    return {"conversation_id": 1, "user_id": 1, "content": content, "is_from_user": True}
+
+def test_rejected_row_is_dropped_without_blocking_the_table():
+    client = FakeClient()
+    queue = WriteQueue(client, spool_path=None, batch_size=8)
+    saved_ids = []
+    for i in range(20):
+        queue.insert("messages", _message("bad" if i == 5 else f"m{i}"), on_saved=lambda row: saved_ids.append(row["id"]))
+
+    assert asyncio.run(queue.flush())
+    assert len(queue) == 0
+    assert queue.dropped == 1
+    assert [row["content"] for row in client.saved] == [f"m{i}" for i in range(20) if i != 5]
+    assert len(saved_ids) == 19
+
+def test_transient_error_keeps_rows_in_order():
+    client = FakeClient()
+    client.unavailable = True
+    queue = WriteQueue(client, spool_path=None, batch_size=4)
+    for i in range(10):
+        queue.insert("messages", _message(f"m{i}"))
+
+    assert not asyncio.run(queue.flush())
+    assert len(queue) == 10
+    assert client.requests == 1  # Kolejne paczki nie są wysyłane po błędzie przejściowym
+
+    client.unavailable = False
+    assert asyncio.run(queue.flush())
+    assert [row["content"] for row in client.saved] == [f"m{i}" for i in range(10)]
+
+def test_spool_keeps_only_pending_operations(tmp_path):
+    spool_path = tmp_path / "queue.spool"
+
+    async def scenario():
+        client = FakeClient()
+        queue = WriteQueue(client, spool_path=str(spool_path), batch_size=100, flush_interval=3600)
+        await queue.start()
+        queue.insert("messages", _message("first"))
+        queue.increment("messages_used", 1)
+
+        # Operacja dodana w trakcie zapisu zostaje w dzienniku, zapisane - nie
+        insert_rows = client.insert_rows
+
+        async def insert_during_flush(table, rows, on_conflict=None):
+            queue.insert("messages", _message("late"))
+            return await insert_rows(table, rows, on_conflict)
+
+        client.insert_rows = insert_during_flush
+        await queue.flush()
+        pending = [json.loads(line) for line in spool_path.read_text(encoding="utf-8").splitlines()]
+        await queue.stop()
+        return client, pending
+
+    client, pending = asyncio.run(scenario())
+    assert [item["row"]["content"] for item in pending] == ["late"]
+    assert client.counts == {"1": 1}
+
+def test_replayed_insert_is_not_duplicated(tmp_path):
+    spool_path = tmp_path / "queue.spool"
+    client = FakeClient()
+
+    async def crash_after_insert():
+        queue = WriteQueue(client, spool_path=str(spool_path), flush_interval=3600)
+        await queue.start()
+        queue.insert("messages", _message("once"))
+        # Wiersz trafia do bazy, ale proces kończy się przed przepisaniem dziennika
+        rows = [row for row, _ in queue._inserts["messages"]]
+        await client.insert_rows("messages", rows, on_conflict="client_id")
+        queue._task.cancel()
+        queue._spool.close()
+
+    async def restart():
+        queue = WriteQueue(client, spool_path=str(spool_path), flush_interval=3600)
+        await queue.start()
+        await queue.stop()
+        return queue
+
+    asyncio.run(crash_after_insert())
+    queue = asyncio.run(restart())
+    assert len(queue) == 0
+    assert [row["content"] for row in client.saved] == ["once"]
+    assert spool_path.read_text(encoding="utf-8") == ""
@@ -1,46 +1,64 @@
 """
 Moduł do zarządzania kodami aktywacyjnymi - adapter dla Supabase
 """
+import secrets
+import string
 import logging
+from datetime import datetime
+import pytz
 from database.supabase_client import (
-    create_activation_code as supabase_create_activation_code,
+    supabase_api,
     use_activation_code as supabase_use_activation_code
 )
 
 logger = logging.getLogger(__name__)
 
+# Tabela kodów aktywacyjnych i znaki używane w kodach
+ACTIVATION_CODES_TABLE = "activation_codes"
+CODE_ALPHABET = string.ascii_uppercase + string.digits
+
 def generate_activation_code(length=8):
-    """Funkcja pomocnicza do generowania kodu - zachowana dla kompatybilności"""
-    # Ta funkcja jest prawdopodobnie wywoływana wewnętrznie przez create_activation_code w Supabase
-    # Możemy zostawić implementację pustą, gdyż nie będzie używana
-    pass
+    """Generuje losowy kod aktywacyjny (wielkie litery i cyfry)"""
+    return ''.join(secrets.choice(CODE_ALPHABET) for _ in range(length))
+
+def _code_row(credits):
+    return {
+        "code": generate_activation_code(),
+        "credits": credits,
+        "is_used": False,
+        "created_at": datetime.now(pytz.UTC).isoformat()
+    }
 
-def create_activation_code(credits):
+async def create_activation_code(credits):
     """Tworzy nowy kod aktywacyjny dla określonej liczby kredytów"""
-    return supabase_create_activation_code(credits)
-
-def create_multiple_codes(credits, count=1):
-    """Tworzy wiele kodów aktywacyjnych"""
-    codes = []
-    for _ in range(count):
-        code = create_activation_code(credits)
-        if code:
-            codes.append(code)
-    return codes
-
-def activate_code(user_id, code):
+    codes = await create_multiple_codes(credits, 1)
+    return codes[0] if codes else None
+
+async def create_multiple_codes(credits, count=1):
+    """Tworzy wiele kodów aktywacyjnych (zbiorczo - jedno zapytanie na paczkę kodów)"""
+    rows = [_code_row(credits) for _ in range(count)]
+    saved = await supabase_api.insert_many(ACTIVATION_CODES_TABLE, rows)
+    if len(saved) < len(rows):
+        logger.error(f"Zapisano {len(saved)} z {len(rows)} kodów aktywacyjnych")
+    return [row["code"] for row in saved]
+
+async def activate_code(user_id, code):
     """Aktywuje kod dla użytkownika"""
-    return supabase_use_activation_code(user_id, code)
+    return await supabase_use_activation_code(user_id, code)
 
 def get_code_info(code):
     """Pobiera informacje o kodzie - funkcja może nie mieć odpowiednika w Supabase"""
     # Implementację możemy dodać później jeśli potrzebna
     pass
 
-def bulk_create_activation_codes(credits_values, count_per_value=10):
-    """Tworzy wiele kodów o różnych wartościach"""
-    result = {}
-    for credits in credits_values:
-        codes = create_multiple_codes(credits, count_per_value)
-        result[credits] = codes
+async def bulk_create_activation_codes(credits_values, count_per_value=10):
+    """Tworzy wiele kodów o różnych wartościach (wszystkie wartości w jednym zapisie zbiorczym)"""
+    rows = [_code_row(credits) for credits in credits_values for _ in range(count_per_value)]
+    saved = await supabase_api.insert_many(ACTIVATION_CODES_TABLE, rows)
+    if len(saved) < len(rows):
+        logger.error(f"Zapisano {len(saved)} z {len(rows)} kodów aktywacyjnych")
+    
+    result = {credits: [] for credits in credits_values}
+    for row in saved:
+        result.setdefault(row["credits"], []).append(row["code"])
     return result
\ No newline at end of file
@@ -0,0 +1,81 @@
+# utils/cache.py
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Hashable
+
+logger = logging.getLogger(__name__)
+
+# Wszystkie utworzone cache - dla statystyk trafień
+_caches: List['TTLCache'] = []
+
+class TTLCache:
+    """Ograniczony cache LRU z czasem życia wpisów i licznikami trafień"""
+
+    def __init__(self, name: str, maxsize: int = 10000, ttl: float = 60.0):
+        """
+        Args:
+            name: Nazwa cache (widoczna w statystykach)
+            maxsize: Maksymalna liczba wpisów - najdawniej używane są usuwane
+            ttl: Czas życia wpisu w sekundach
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        _caches.append(self)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Zwraca wartość z cache lub default, jeśli jej nie ma albo wygasła"""
+        entry = self._data.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any):
+        """Zapisuje wartość w cache (write-through)"""
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        """Usuwa wpis z cache"""
+        self._data.pop(key, None)
+
+    def clear(self):
+        """Czyści cały cache"""
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Zwraca statystyki cache"""
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+def get_cache_stats() -> List[Dict[str, Any]]:
+    """Zwraca statystyki wszystkich cache w procesie"""
+    return [cache.stats() for cache in _caches]
+
+# Cache salda kredytów użytkowników (user_id -> credits_amount)
+credits_cache = TTLCache("user_credits", maxsize=50000, ttl=60.0)
+
+# Cache języka użytkowników (user_id -> kod języka)
+language_cache = TTLCache("user_language", maxsize=50000, ttl=3600.0)
+
+# Katalog pakietów kredytów i metod płatności (nazwa tabeli -> {id: wiersz});
+# zmienia się tylko po komendach administratora, które go unieważniają
+catalog_cache = TTLCache("catalog", maxsize=16, ttl=600.0)
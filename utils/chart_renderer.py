@@ -0,0 +1,129 @@
+# utils/chart_renderer.py
+"""
+Renderowanie wykresów PNG poza pętlą zdarzeń
+
+Funkcje render_* przyjmują wyłącznie proste dane (teksty są już przetłumaczone),
+korzystają z obiektowego API matplotlib (Figure + Agg) bez globalnego stanu
+pyplot i zwracają bajty PNG - mogą więc działać równolegle w osobnych procesach.
+"""
+import asyncio
+import datetime
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Sequence, Tuple
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.dates import DateFormatter, date2num
+from config import CHART_RENDER_WORKERS
+
+logger = logging.getLogger(__name__)
+
+CHART_DPI = 100
+DATE_FORMAT = '%d-%m-%Y'
+PIE_COLORS = ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99', '#c2c2f0', '#ffb366', '#ff6666']
+
+def _to_png(fig: Figure) -> bytes:
+    """Renderuje figurę do PNG (płótno Agg przypisane tylko do tej figury)"""
+    FigureCanvasAgg(fig)
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=CHART_DPI)
+    return buf.getvalue()
+
+def render_message_chart(text: str, figsize: Tuple[float, float] = (10, 6),
+                         fontsize: int = 20, color: str = 'gray') -> bytes:
+    """Wykres informacyjny z samym tekstem (brak danych, błąd)"""
+    fig = Figure(figsize=figsize)
+    ax = fig.add_subplot()
+    ax.text(0.5, 0.5, text, horizontalalignment='center', verticalalignment='center',
+            fontsize=fontsize, color=color, transform=ax.transAxes)
+    ax.set_axis_off()
+    return _to_png(fig)
+
+def render_usage_chart(days: Sequence[str], balances: Sequence[int], usage: Sequence[int],
+                       purchases: Sequence[int], texts: Dict[str, str]) -> bytes:
+    """
+    Wykres salda kredytów i dziennych wydatków/doładowań
+
+    Args:
+        days: Dni w formacie ISO (rosnąco)
+        texts: Przetłumaczone etykiety: date, credits, balance_title, details_title,
+            balance_label, usage_label, purchase_label
+    """
+    dates = [datetime.date.fromisoformat(day[:10]) for day in days]
+    dates_num = date2num(dates)
+
+    fig = Figure(figsize=(10, 6))
+
+    # Wykres salda
+    ax = fig.add_subplot(2, 1, 1)
+    ax.plot(dates, balances, 'b-', label=texts['balance_label'])
+    ax.set_xlabel(texts['date'])
+    ax.set_ylabel(texts['credits'])
+    ax.set_title(texts['balance_title'])
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.xaxis.set_major_formatter(DateFormatter(DATE_FORMAT))
+    ax.legend()
+
+    # Wykres użycia/zakupów - szerokość słupków w jednostkach daty matplotlib
+    ax = fig.add_subplot(2, 1, 2)
+    width = min(1.0, (max(dates_num) - min(dates_num)) / len(dates_num) * 0.4) if len(dates_num) > 1 else 1.0
+    ax.bar(dates_num - width / 2, usage, width=width, color='r', alpha=0.6, label=texts['usage_label'])
+    ax.bar(dates_num + width / 2, purchases, width=width, color='g', alpha=0.6, label=texts['purchase_label'])
+    ax.xaxis.set_major_formatter(DateFormatter(DATE_FORMAT))
+    ax.set_xlabel(texts['date'])
+    ax.set_ylabel(texts['credits'])
+    ax.set_title(texts['details_title'])
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.legend()
+
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    return _to_png(fig)
+
+def render_breakdown_chart(labels: List[str], sizes: List[int], title: str) -> bytes:
+    """Wykres kołowy rozkładu zużycia kredytów według kategorii"""
+    fig = Figure(figsize=(8, 6))
+    ax = fig.add_subplot()
+    ax.pie(sizes, labels=labels, colors=PIE_COLORS, autopct='%1.1f%%', startangle=90, shadow=True)
+    ax.axis('equal')
+    ax.set_title(title)
+    return _to_png(fig)
+
+# Pula procesów renderujących (tworzona przy pierwszym wykresie)
+_executor = None
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # "spawn" - procesy potomne nie dziedziczą pętli zdarzeń ani wątków bota
+        _executor = ProcessPoolExecutor(
+            max_workers=CHART_RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        logger.info(f"Utworzono pulę {CHART_RENDER_WORKERS} procesów renderowania wykresów")
+    return _executor
+
+async def render_chart(render: Callable[..., bytes], *args) -> bytes:
+    """
+    Renderuje wykres funkcją render_* w puli procesów, nie blokując pętli zdarzeń
+
+    Przy CHART_RENDER_WORKERS = 0 lub awarii puli wykres jest renderowany w wątku.
+    """
+    global _executor
+    if CHART_RENDER_WORKERS > 0:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_get_executor(), render, *args)
+        except BrokenProcessPool:
+            logger.error("Pula procesów renderowania wykresów uległa awarii - zostanie utworzona ponownie")
+            _executor = None
+    return await asyncio.to_thread(render, *args)
+
+def shutdown_chart_pool():
+    """Zamyka pulę procesów renderowania wykresów"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
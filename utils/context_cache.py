@@ -0,0 +1,90 @@
+# utils/context_cache.py
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+from utils.cache import TTLCache
+from utils.tokens import count_tokens
+from config import HISTORY_TOKEN_BUDGETS, HISTORY_MAX_MESSAGES, SUMMARY_KEEP_RATIO
+
+# Największy budżet historii spośród modeli - okno w cache musi wystarczyć dla każdego modelu
+MAX_HISTORY_TOKENS = max(HISTORY_TOKEN_BUDGETS.values())
+
+# Pojemność okna ponad budżet historii - historia przekraczająca budżet zostaje
+# w oknie do czasu podsumowania (ContextBuilder streszcza ją do SUMMARY_KEEP_RATIO
+# budżetu), a zapas pokrywa wiadomości dopisane w trakcie streszczania
+WINDOW_MAX_TOKENS = int(MAX_HISTORY_TOKENS / SUMMARY_KEEP_RATIO) + MAX_HISTORY_TOKENS // 2
+WINDOW_MAX_MESSAGES = int(HISTORY_MAX_MESSAGES / SUMMARY_KEEP_RATIO) + HISTORY_MAX_MESSAGES // 2
+
+# Wpis okna: (wiadomość dla API, liczba tokenów, ID wiadomości w bazie)
+ContextEntry = Tuple[Dict[str, str], int, Optional[int]]
+
+class ContextWindow:
+    """
+    Bufor cykliczny ostatnich wiadomości konwersacji w formacie API modelu
+    ({"role": ..., "content": ...}), ograniczony liczbą tokenów i wiadomości
+    """
+    __slots__ = ("_entries", "tokens", "max_tokens")
+
+    def __init__(self, max_tokens: int = WINDOW_MAX_TOKENS, max_messages: int = WINDOW_MAX_MESSAGES):
+        self._entries: Deque[ContextEntry] = deque(maxlen=max_messages)
+        self.tokens = 0
+        self.max_tokens = max_tokens
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def append(self, role: str, content: str, message_id: Optional[int] = None) -> Dict[str, str]:
+        """Dopisuje wiadomość, usuwając najstarsze ponad limit tokenów; zwraca dodaną wiadomość"""
+        if len(self._entries) == self._entries.maxlen:
+            self.tokens -= self._entries[0][1]
+
+        message = {"role": role, "content": content}
+        tokens = count_tokens(content)
+        self._entries.append((message, tokens, message_id))
+        self.tokens += tokens
+
+        while self.tokens > self.max_tokens and self._entries:
+            _, dropped, _ = self._entries.popleft()
+            self.tokens -= dropped
+        return message
+
+    def set_message_id(self, message: Dict[str, str], message_id: Optional[int]):
+        """Uzupełnia ID wiadomości dodanej przed zapisem w bazie (kolejka zapisów w tle)"""
+        for index in range(len(self._entries) - 1, -1, -1):
+            entry = self._entries[index]
+            if entry[0] is message:
+                self._entries[index] = (message, entry[1], message_id)
+                return
+
+    def entries(self, after_id: Optional[int] = None) -> List[ContextEntry]:
+        """Zwraca wpisy okna (chronologicznie), opcjonalnie tylko nowsze niż wiadomość after_id"""
+        if after_id is None:
+            return list(self._entries)
+        return [entry for entry in self._entries if entry[2] is None or entry[2] > after_id]
+
+    def last_message_id(self) -> Optional[int]:
+        """ID najnowszej wiadomości okna zapisanej już w bazie (None, gdy brak)"""
+        for _, _, message_id in reversed(self._entries):
+            if message_id is not None:
+                return message_id
+        return None
+
+    def messages(self, token_budget: Optional[int] = None) -> List[Dict[str, str]]:
+        """Zwraca najnowsze wiadomości (najwyżej HISTORY_MAX_MESSAGES) mieszczące się w budżecie tokenów"""
+        if token_budget is None:
+            token_budget = self.tokens
+        return [message for message, _, _ in trim_entries(self._entries, token_budget)]
+
+def trim_entries(entries, token_budget: int, max_messages: int = HISTORY_MAX_MESSAGES) -> List[ContextEntry]:
+    """Wybiera najnowsze wpisy mieszczące się w budżecie tokenów i liczbie wiadomości (chronologicznie)"""
+    result = []
+    used_tokens = 0
+    for entry in reversed(entries):
+        used_tokens += entry[1]
+        if used_tokens > token_budget or len(result) >= max_messages:
+            break
+        result.append(entry)
+    result.reverse()
+    return result
+
+# Okna kontekstu aktywnych konwersacji (conversation_id -> ContextWindow)
+context_cache = TTLCache("conversation_context", maxsize=10000, ttl=1800.0)
@@ -2,203 +2,106 @@
 Ulepszony moduł do analizy wykorzystania kredytów
 """
 import io
-import matplotlib.pyplot as plt
-import numpy as np
-import datetime
-import pytz
 import logging
-from matplotlib.dates import DateFormatter
-from database.supabase_client import get_credit_transactions, get_user_credits
+from database.supabase_client import get_daily_credit_usage, get_user_credits, get_last_credit_transaction_id
+from utils.cache import TTLCache
+from utils.chart_renderer import render_chart, render_message_chart, render_usage_chart, render_breakdown_chart
 from utils.translations import get_text
-from utils.user_utils import get_user_language
+from utils.usage_analytics import analyze_usage
+from utils.usage_forecast import MIN_DAILY_USAGE, utc_today
+from config import CREDIT_CATEGORIES, CHART_CACHE_TTL
 
 # Dodaję loggera dla lepszej diagnostyki
 logger = logging.getLogger(__name__)
 
+# Gotowe wykresy PNG (rodzaj, user_id, dni, język, ostatnia transakcja, data) -> bajty
+chart_cache = TTLCache("credit_charts", maxsize=1000, ttl=CHART_CACHE_TTL)
+
+# Analizy zużycia (user_id, dni, ostatnia transakcja, data) -> UsageAnalysis
+analysis_cache = TTLCache("credit_usage_analysis", maxsize=1000, ttl=CHART_CACHE_TTL)
+
+async def get_usage_analysis(user_id, days=30):
+    """
+    Zwraca (wersja danych, analiza zużycia kredytów z ostatnich days dni)
+
+    Wersją jest (ID ostatniej transakcji, data) - analiza zmienia się tylko po nowej
+    transakcji użytkownika albo po zmianie dnia (przesuwa się okno analizy), więc
+    wykresy i prognoza jednej komendy korzystają z jednego odczytu agregatów.
+    """
+    version = (await get_last_credit_transaction_id(user_id), utc_today().isoformat())
+    key = (user_id, days) + version
+    analysis = analysis_cache.get(key)
+    if analysis is None:
+        # Dzienne agregaty zamiast pełnej historii transakcji
+        daily_rows = await get_daily_credit_usage(user_id, days)
+        analysis = analyze_usage(daily_rows, days)
+        # Pusty wynik może oznaczać chwilowy błąd bazy - nie zapamiętujemy go
+        if daily_rows:
+            analysis_cache.set(key, analysis)
+    return version, analysis
+
+async def _render_error_chart(error, language, figsize):
+    """Renderuje wykres z komunikatem błędu"""
+    return io.BytesIO(await render_chart(
+        render_message_chart, get_text("chart_generation_error", language, error=str(error)), figsize, 12, 'red'
+    ))
+
 async def generate_credit_usage_chart(user_id, days=30, language="pl"):
     """Generuje wykres użycia kredytów w czasie"""
     try:
-        # Dodane await przed wywołaniem funkcji asynchronicznej
-        transactions = await get_credit_transactions(user_id, days)
+        version, analysis = await get_usage_analysis(user_id, days)
+        key = ("usage", user_id, days, language) + version
+        png = chart_cache.get(key)
+        if png is not None:
+            return io.BytesIO(png)
         
-        if not transactions:
+        if not analysis.daily:
             logger.warning(f"Brak transakcji dla użytkownika {user_id} w okresie {days} dni")
             # Generujemy prosty wykres informacyjny zamiast zwracać None
-            plt.figure(figsize=(10, 6))
-            plt.text(0.5, 0.5, get_text("no_transaction_data", language), 
-                    horizontalalignment='center', verticalalignment='center', 
-                    fontsize=20, color='gray', transform=plt.gca().transAxes)
-            
-            # Zapisz wykres do bufora
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=100)
-            buf.seek(0)
-            plt.close()
-            return buf
-        
-        # Przygotuj dane do wykresu
-        dates = []
-        balances = []
-        usage_amounts = []
-        purchase_amounts = []
-        
-        logger.info(f"Znaleziono {len(transactions)} transakcji do analizy")
-        
-        for trans in transactions:
-            try:
-                # Konwersja formatu daty
-                created_at = trans.get('created_at')
-                if isinstance(created_at, str):
-                    dt = datetime.datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                else:
-                    dt = created_at
-                    
-                dates.append(dt)
-                balances.append(trans.get('credits_after', 0))
-                
-                amount = trans.get('amount', 0)
-                
-                if trans.get('transaction_type') == 'deduct':
-                    usage_amounts.append(amount)
-                    purchase_amounts.append(0)
-                elif trans.get('transaction_type') in ['add', 'purchase', 'subscription', 'subscription_renewal']:
-                    usage_amounts.append(0)
-                    purchase_amounts.append(amount)
-            except Exception as e:
-                logger.error(f"Błąd przy przetwarzaniu transakcji: {e}", exc_info=True)
-        
-        if not dates:
-            logger.warning(f"Nie udało się przetworzyć żadnej transakcji")
-            # Generujemy prosty wykres informacyjny
-            plt.figure(figsize=(10, 6))
-            plt.text(0.5, 0.5, get_text("transaction_processing_error", language), 
-                    horizontalalignment='center', verticalalignment='center', 
-                    fontsize=20, color='gray', transform=plt.gca().transAxes)
-            plt.gca().set_axis_off()
-            
-            # Zapisz wykres do bufora
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=100)
-            buf.seek(0)
-            plt.close()
-            return buf
-        
-        plt.figure(figsize=(10, 6))
-        
-        # Wykres salda
-        plt.subplot(2, 1, 1)
-        plt.plot(dates, balances, 'b-', label='Saldo kredytów')
-        plt.xlabel(get_text("date", language))
-        plt.ylabel(get_text("credits", language))
-        plt.title(get_text("credit_balance_history", language))
-        plt.grid(True, linestyle='--', alpha=0.7)
-        plt.gca().xaxis.set_major_formatter(DateFormatter('%d-%m-%Y'))
-        plt.gcf().autofmt_xdate()
-        plt.legend()
-        
-        # Wykres użycia/zakupów
-        plt.subplot(2, 1, 2)
-        
-        # Użyj matplotlib.dates zamiast timestamp
-        import matplotlib.dates as mdates
-        dates_num = mdates.date2num(dates)
-        
-        # Oblicz szerokość słupków (w jednostkach daty Matplotlib)
-        width = min(1.0, (max(dates_num) - min(dates_num)) / len(dates_num) * 0.4) if len(dates_num) > 1 else 1.0
-        
-        # Wykres słupkowy użycia
-        usage_bars = plt.bar([d - width/2 for d in dates_num], usage_amounts, width=width, color='r', alpha=0.6, label='Wydane kredyty')
-        
-        # Wykres słupkowy zakupów
-        purchase_bars = plt.bar([d + width/2 for d in dates_num], purchase_amounts, width=width, color='g', alpha=0.6, label='Dodane kredyty')
-        
-        # Formatowanie osi X
-        plt.gca().xaxis.set_major_formatter(DateFormatter('%d-%m-%Y'))
-        plt.gcf().autofmt_xdate()
-        
-        # Etykiety i legenda
-        plt.xlabel(get_text("date", language))
-        plt.ylabel(get_text("credits", language))
-        plt.title(get_text("transaction_details", language))
-        plt.grid(True, linestyle='--', alpha=0.7)
-        plt.legend()
-        
-        # Dopasowanie układu
-        plt.tight_layout()
-        
-        # Zapisz wykres do bufora
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        plt.close()
-        
-        return buf
+            return io.BytesIO(await render_chart(render_message_chart, get_text("no_transaction_data", language)))
+        
+        daily = analysis.daily
+        logger.info(f"Analiza {len(daily)} dni zużycia kredytów użytkownika {user_id}")
+        
+        texts = {
+            'date': get_text("date", language),
+            'credits': get_text("credits", language),
+            'balance_title': get_text("credit_balance_history", language),
+            'details_title': get_text("transaction_details", language),
+            'balance_label': 'Saldo kredytów',
+            'usage_label': 'Wydane kredyty',
+            'purchase_label': 'Dodane kredyty'
+        }
+        png = await render_chart(
+            render_usage_chart,
+            [entry.day.isoformat() for entry in daily],
+            [entry.balance for entry in daily],
+            [entry.usage for entry in daily],
+            [entry.purchase for entry in daily],
+            texts
+        )
+        chart_cache.set(key, png)
+        return io.BytesIO(png)
     
     except Exception as e:
         logger.error(f"Błąd przy generowaniu wykresu: {e}", exc_info=True)
-        # Generujemy wykres błędu
-        plt.figure(figsize=(10, 6))
-        plt.text(0.5, 0.5, get_text("chart_generation_error", language, error=str(e)), 
-                horizontalalignment='center', verticalalignment='center', 
-                fontsize=12, color='red', transform=plt.gca().transAxes)
-        plt.gca().set_axis_off()
-        
-        # Zapisz wykres do bufora
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        plt.close()
-        return buf
+        return await _render_error_chart(e, language, (10, 6))
+
+def _name_categories(by_category, language):
+    """Tłumaczy klucze kategorii (CREDIT_CATEGORIES) na nazwy wyświetlane"""
+    named_breakdown = {}
+    for category, amount in by_category.items():
+        if category in CREDIT_CATEGORIES:
+            text_key, default_name = CREDIT_CATEGORIES[category]
+            category = get_text(text_key, language, default=default_name)
+        named_breakdown[category] = named_breakdown.get(category, 0) + amount
+    return named_breakdown
 
 async def get_credit_usage_breakdown(user_id, days=30, language="pl"):
     """Pobiera rozkład zużycia kredytów według rodzaju operacji z dodatkową obsługą błędów"""
     try:
-        from database.supabase_client import get_credit_usage_by_type
-        # Dodane await przed wywołaniem funkcji asynchronicznej
-        breakdown = await get_credit_usage_by_type(user_id, days)
-        
-        # Jeśli brak kategorii, stwórz podstawowy rozkład
-        if not breakdown:
-            logger.warning(f"Brak danych rozkładu dla użytkownika {user_id} - wykorzystujemy dane transakcji")
-            # Dodane await przed wywołaniem funkcji asynchronicznej
-            transactions = await get_credit_transactions(user_id, days)
-            
-            # Nazwy kategorii w odpowiednim języku
-            messages_category = get_text("messages_category", language, default="Wiadomości")
-            images_category = get_text("images_category", language, default="Obrazy")
-            documents_category = get_text("documents_category", language, default="Dokumenty")
-            photos_category = get_text("photos_category", language, default="Zdjęcia")
-            other_category = get_text("other_category", language, default="Inne")
-            
-            # Ręczna kategoryzacja
-            breakdown = {other_category: 0}
-            for trans in transactions:
-                if trans.get('transaction_type') != 'deduct':
-                    continue
-                    
-                description = trans.get('description', '').lower()
-                amount = trans.get('amount', 0)
-                
-                if any(term in description for term in ['wiadomość', 'message', 'chat', 'gpt']):
-                    if messages_category not in breakdown:
-                        breakdown[messages_category] = 0
-                    breakdown[messages_category] += amount
-                elif any(term in description for term in ['obraz', 'dall-e', 'image', 'dall']):
-                    if images_category not in breakdown:
-                        breakdown[images_category] = 0
-                    breakdown[images_category] += amount
-                elif any(term in description for term in ['dokument', 'document', 'pdf', 'plik']):
-                    if documents_category not in breakdown:
-                        breakdown[documents_category] = 0
-                    breakdown[documents_category] += amount
-                elif any(term in description for term in ['zdjęci', 'zdjęc', 'photo', 'foto']):
-                    if photos_category not in breakdown:
-                        breakdown[photos_category] = 0
-                    breakdown[photos_category] += amount
-                else:
-                    breakdown[other_category] += amount
-        
-        return breakdown
+        _, analysis = await get_usage_analysis(user_id, days)
+        return _name_categories(analysis.by_category, language)
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu rozkładu zużycia: {e}", exc_info=True)
         # Zwracamy prosty słownik w przypadku błędu
@@ -208,93 +111,53 @@ async def get_credit_usage_breakdown(user_id, days=30, language="pl"):
 async def generate_usage_breakdown_chart(user_id, days=30, language="pl"):
     """Generuje wykres kołowy rozkładu zużycia kredytów z lepszą obsługą błędów"""
     try:
-        # Dodane await przed wywołaniem funkcji asynchronicznej
-        usage_breakdown = await get_credit_usage_breakdown(user_id, days, language)
+        version, analysis = await get_usage_analysis(user_id, days)
+        key = ("breakdown", user_id, days, language) + version
+        png = chart_cache.get(key)
+        if png is not None:
+            return io.BytesIO(png)
         
-        if not usage_breakdown:
+        if not analysis.daily:
             logger.warning(f"Brak danych rozkładu dla użytkownika {user_id}")
             # Generujemy prosty wykres informacyjny zamiast zwracać None
-            plt.figure(figsize=(8, 6))
-            plt.text(0.5, 0.5, get_text("no_analysis_data", language), 
-                    horizontalalignment='center', verticalalignment='center', 
-                    fontsize=20, color='gray', transform=plt.gca().transAxes)
-
-            plt.gca().set_axis_off()
-            
-            # Zapisz wykres do bufora
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=100)
-            buf.seek(0)
-            plt.close()
-            return buf
-        
-        plt.figure(figsize=(8, 6))
-        
-        labels = list(usage_breakdown.keys())
-        sizes = list(usage_breakdown.values())
-        
-        # Ustaw kolory dla wykresów
-        colors = ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99', '#c2c2f0', '#ffb366', '#ff6666']
-        
-        if sum(sizes) > 0:  # Sprawdź, czy są dane do wykreślenia
-            plt.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90, shadow=True)
-            plt.axis('equal')
-            plt.title(get_text("credit_usage_breakdown_days", language, days=days))
+            return io.BytesIO(await render_chart(
+                render_message_chart, get_text("no_analysis_data", language), (8, 6)
+            ))
+        
+        usage_breakdown = _name_categories(analysis.by_category, language)
+        if usage_breakdown:  # Sprawdź, czy są dane do wykreślenia
+            png = await render_chart(
+                render_breakdown_chart, list(usage_breakdown.keys()), list(usage_breakdown.values()),
+                get_text("credit_usage_breakdown_days", language, days=days)
+            )
         else:
-            plt.text(0.5, 0.5, get_text("no_credit_usage_transactions", language), 
-                    horizontalalignment='center', verticalalignment='center', 
-                    fontsize=16, color='gray', transform=plt.gca().transAxes)
-            plt.gca().set_axis_off()
-        
-        # Zapisz wykres do bufora
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        plt.close()
-        
-        return buf
+            png = await render_chart(
+                render_message_chart, get_text("no_credit_usage_transactions", language), (8, 6), 16
+            )
+        chart_cache.set(key, png)
+        return io.BytesIO(png)
     
     except Exception as e:
         logger.error(f"Błąd przy generowaniu wykresu rozkładu: {e}", exc_info=True)
-        # Generujemy wykres błędu
-        plt.figure(figsize=(8, 6))
-        plt.text(0.5, 0.5, get_text("chart_generation_error", language, error=str(e)), 
-                horizontalalignment='center', verticalalignment='center', 
-                fontsize=12, color='red', transform=plt.gca().transAxes)
-        plt.gca().set_axis_off()
-        
-        # Zapisz wykres do bufora
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        plt.close()
-        return buf
+        return await _render_error_chart(e, language, (8, 6))
+
+async def predict_credit_depletion(user_id, days=30, language="pl", model=None):
+    """
+    Przewiduje, kiedy skończą się kredyty użytkownika
 
-async def predict_credit_depletion(user_id, days=30, language="pl"):
-    """Przewiduje, kiedy skończą się kredyty użytkownika z ulepszoną logiką"""
+    Prognoza korzysta z przyrostowego stanu serwisu prognoz (średnie wykładnicze
+    dziennego zużycia, profil dni tygodnia, koszt bieżącego modelu), a nie
+    z okna days dni - parametr pozostaje dla kompatybilności wstecznej.
+    """
     try:
-        # Bezpośredni import, aby uniknąć problemów z importami cyklicznymi
-        from database.supabase_client import get_credit_transactions
+        from services.forecast_service import get_forecast_service, get_message_cost
+        state = await get_forecast_service().get_state(user_id)
+        current_balance = await get_user_credits(user_id)
         
-        # Używamy await!
-        transactions = await get_credit_transactions(user_id, days)
-        current_balance = get_user_credits(user_id)
-        
-        # Poprawiono logikę sprawdzania danych
-        if not transactions:
-            logger.warning(f"Brak transakcji dla użytkownika {user_id}")
-            return {
-                "days_left": None, 
-                "average_daily_usage": 0, 
-                "current_balance": current_balance,
-                "depletion_date": None
-            }
-        
-        # Wyfiltruj transakcje typu 'deduct'
-        deduct_transactions = [t for t in transactions if t.get('transaction_type') == 'deduct']
+        forecast = state.forecast(current_balance, message_cost=get_message_cost(model))
         
         # Jeśli brak transakcji wydatkowych, zwróć None dla days_left
-        if not deduct_transactions:
+        if forecast.daily_usage < MIN_DAILY_USAGE:
             logger.info(f"Brak transakcji wydatkowych dla użytkownika {user_id}")
             return {
                 "days_left": None, 
@@ -303,25 +166,11 @@ async def predict_credit_depletion(user_id, days=30, language="pl"):
                 "depletion_date": None
             }
         
-        # Oblicz całkowite zużycie w okresie
-        total_usage = sum(trans.get('amount', 0) for trans in deduct_transactions)
-        
-        # Średnie dzienne zużycie nie może być 0
-        average_daily_usage = max(total_usage / days, 0.01)
-        
-        # Oblicz dni do wyczerpania
-        days_left = int(current_balance / average_daily_usage) if average_daily_usage > 0 else None
-        
-        # Określ datę wyczerpania
-        depletion_date = None
-        if days_left is not None:
-            depletion_date = (datetime.datetime.now() + datetime.timedelta(days=days_left)).strftime("%d.%m.%Y")
-        
-        # Zwróć kompletne informacje
+        # Zwróć kompletne informacje (days_left = None, gdy kredyty wystarczą ponad horyzont prognozy)
         return {
-            "days_left": days_left,
-            "depletion_date": depletion_date,
-            "average_daily_usage": round(average_daily_usage, 2),
+            "days_left": forecast.days_left,
+            "depletion_date": forecast.depletion_date.strftime("%d.%m.%Y") if forecast.depletion_date else None,
+            "average_daily_usage": round(forecast.daily_usage, 2),
             "current_balance": current_balance
         }
         
@@ -332,5 +181,5 @@ async def predict_credit_depletion(user_id, days=30, language="pl"):
             "days_left": None,
             "depletion_date": None,
             "average_daily_usage": 0,
-            "current_balance": get_user_credits(user_id)
+            "current_balance": await get_user_credits(user_id)
         }
\ No newline at end of file
@@ -1,6 +1,5 @@
 from utils.translations import get_text
 from utils.user_utils import get_user_language
-from config import CREDIT_PACKAGES
 
 # utils/credit_warnings.py
 """
@@ -119,7 +118,10 @@ def format_credit_usage_report(operation, cost, credits_before, credits_after, l
 
 def get_credit_recommendation(user_id, context):
     """
-    Analyzes user's credit usage pattern and recommends a package
+    Returns the package recommended for the user's forecast credit usage
+    
+    Recommendations are precomputed in the background by the forecast service
+    (services/forecast_service.py), so this lookup makes no database queries.
     
     Args:
         user_id (int): User ID
@@ -128,50 +130,39 @@ def get_credit_recommendation(user_id, context):
     Returns:
         dict or None: Recommendation with package_id and reason, or None if no recommendation
     """
-    # Get language
-    language = get_user_language(context, user_id)
-    
-    # Get credit usage history from context or database
-    from database.credits_client import get_user_credit_stats
-    stats = get_user_credit_stats(user_id)
-    
-    if not stats or not stats.get('usage_history'):
+    from services.forecast_service import get_forecast_service
+    outlook = get_forecast_service().get_outlook(user_id)
+    if outlook is None or outlook.recommendation is None:
         return None
     
-    # Calculate average daily usage over the last week or available period
-    history = stats.get('usage_history', [])
-    total_usage = sum(transaction['amount'] for transaction in history 
-                     if transaction['type'] == 'deduct')
+    language = get_user_language(context, user_id)
+    recommendation = dict(outlook.recommendation)
+    recommendation['reason'] = get_text(
+        "package_recommendation_reason", language,
+        daily_usage=max(1, round(recommendation['daily_usage'])),
+        days_coverage=recommendation['days_coverage']
+    )
+    return recommendation
+
+def get_credit_nudge(user_id, credits, language="pl"):
+    """
+    Returns the precomputed low-balance nudge for the user, if any
     
-    if total_usage == 0:
+    Args:
+        user_id (int): User ID
+        credits (int): Current credits (a top-up since the last forecast cancels the nudge)
+        language (str): Language code
+        
+    Returns:
+        str or None: Nudge message or None
+    """
+    from services.forecast_service import get_forecast_service
+    outlook = get_forecast_service().get_outlook(user_id)
+    if outlook is None or not outlook.nudge:
+        return None
+    if outlook.balance is not None and credits > outlook.balance:
         return None
     
-    # Estimate days of data
-    if len(history) >= 7:
-        days = 7
-    else:
-        days = max(1, len(history) // 2)  # Rough estimate
-    
-    daily_usage = total_usage / days
-    
-    # Find the best package based on usage
-    monthly_usage = daily_usage * 30
-    
-    recommended_package = None
-    for package in CREDIT_PACKAGES:
-        if package['credits'] >= monthly_usage:
-            if recommended_package is None or package['credits'] < recommended_package['credits']:
-                recommended_package = package
-    
-    if recommended_package:
-        days_coverage = recommended_package['credits'] / daily_usage
-        return {
-            'package_id': recommended_package['id'],
-            'package_name': recommended_package['name'],
-            'credits': recommended_package['credits'],
-            'price': recommended_package['price'],
-            'days_coverage': int(days_coverage),
-            'reason': get_text("package_recommendation_reason", language, daily_usage=int(daily_usage), days_coverage=int(days_coverage))
-        }
-    
-    return None
\ No newline at end of file
+    if outlook.nudge == "critical":
+        return get_text("critically_low_credits", language)
+    return get_text("low_credits", language, credits=credits)
\ No newline at end of file
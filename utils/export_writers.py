@@ -0,0 +1,186 @@
+# utils/export_writers.py
+"""
+Strumieniowe zapisywanie eksportu konwersacji do pozycji archiwum ZIP
+
+Każdy format to klasa ExportWriter zarejestrowana w EXPORT_WRITERS - czyta
+kolejne strony wiadomości (np. MessageRepository.iter_messages) i zapisuje je
+od razu do swojej pozycji archiwum, więc cała konwersacja nigdy nie jest
+trzymana w pamięci. Nowy format wystarczy oznaczyć dekoratorem @register_writer.
+"""
+import asyncio
+import datetime
+import html
+import json
+import os
+import tempfile
+import zipfile
+from dataclasses import dataclass
+from io import TextIOWrapper
+from typing import Any, AsyncIterator, Dict, List, Optional, Type
+from utils.pdf_generator import write_spool_page, build_conversation_pdf
+
+@dataclass
+class ExportMeta:
+    """Dane nagłówka eksportu wspólne dla wszystkich formatów"""
+    conversation_id: int
+    bot_name: str
+    username: Optional[str]
+    exported_at: datetime.datetime
+
+class ExportWriter:
+    """Bazowy zapis jednego formatu eksportu do pozycji archiwum"""
+    format = ""
+    extension = ""
+    compress_type = zipfile.ZIP_DEFLATED
+
+    def __init__(self, meta: ExportMeta):
+        self.meta = meta
+
+    async def write(self, archive: zipfile.ZipFile, name: str,
+                    pages: AsyncIterator[List[Dict[str, Any]]]) -> int:
+        """Zapisuje strony wiadomości do pozycji name archiwum; zwraca liczbę wiadomości"""
+        raise NotImplementedError("Subclass must implement this method")
+
+class TextExportWriter(ExportWriter):
+    """
+    Format tekstowy - nagłówek, wiadomości i stopka zapisywane do pozycji archiwum
+
+    Formatowanie i kompresja każdej strony odbywają się w wątku, żeby duże
+    konwersacje nie blokowały pętli zdarzeń.
+    """
+
+    def header(self) -> str:
+        return ""
+
+    def format_message(self, msg: Dict[str, Any]) -> str:
+        raise NotImplementedError("Subclass must implement this method")
+
+    def footer(self) -> str:
+        return ""
+
+    def _write_page(self, stream, page: List[Dict[str, Any]]):
+        stream.write("".join(self.format_message(msg) for msg in page))
+
+    async def write(self, archive: zipfile.ZipFile, name: str,
+                    pages: AsyncIterator[List[Dict[str, Any]]]) -> int:
+        count = 0
+        info = zipfile.ZipInfo(name, date_time=self.meta.exported_at.timetuple()[:6])
+        info.compress_type = self.compress_type
+        with TextIOWrapper(archive.open(info, "w", force_zip64=True), encoding="utf-8", newline="\n") as stream:
+            stream.write(self.header())
+            async for page in pages:
+                await asyncio.to_thread(self._write_page, stream, page)
+                count += len(page)
+            stream.write(self.footer())
+        return count
+
+def _author(msg: Dict[str, Any], bot_name: str) -> str:
+    return "Ty" if msg.get('is_from_user') else bot_name
+
+def _format_time(created_at: Optional[str]) -> str:
+    """Data wiadomości w formacie dd-mm-rrrr gg:mm (pusta, gdy brak lub niepoprawna)"""
+    if not created_at:
+        return ""
+    try:
+        return datetime.datetime.fromisoformat(str(created_at).replace('Z', '+00:00')).strftime("%d-%m-%Y %H:%M")
+    except ValueError:
+        return ""
+
+EXPORT_WRITERS: Dict[str, Type[ExportWriter]] = {}
+
+def register_writer(writer: Type[ExportWriter]) -> Type[ExportWriter]:
+    """Rejestruje format eksportu pod kluczem writer.format"""
+    EXPORT_WRITERS[writer.format] = writer
+    return writer
+
+@register_writer
+class JsonlWriter(TextExportWriter):
+    """Jedna wiadomość w formacie JSON na linię (do dalszego przetwarzania)"""
+    format = "jsonl"
+    extension = "jsonl"
+
+    def format_message(self, msg: Dict[str, Any]) -> str:
+        return json.dumps({
+            'id': msg.get('id'),
+            'is_from_user': msg.get('is_from_user', False),
+            'content': msg.get('content') or "",
+            'model_used': msg.get('model_used'),
+            'created_at': msg.get('created_at')
+        }, ensure_ascii=False) + "\n"
+
+@register_writer
+class MarkdownWriter(TextExportWriter):
+    format = "md"
+    extension = "md"
+
+    def header(self) -> str:
+        lines = [f"# Konwersacja z {self.meta.bot_name}", "",
+                 f"*Eksportowano: {self.meta.exported_at.strftime('%d-%m-%Y %H:%M')}*"]
+        if self.meta.username:
+            lines.append(f"*Użytkownik: {self.meta.username}*")
+        return "\n".join(lines) + "\n\n"
+
+    def format_message(self, msg: Dict[str, Any]) -> str:
+        time_str = _format_time(msg.get('created_at'))
+        heading = f"### {_author(msg, self.meta.bot_name)}" + (f" · {time_str}" if time_str else "")
+        return f"{heading}\n\n{msg.get('content') or ''}\n\n"
+
+@register_writer
+class HtmlWriter(TextExportWriter):
+    format = "html"
+    extension = "html"
+
+    def header(self) -> str:
+        title = html.escape(f"Konwersacja z {self.meta.bot_name}")
+        meta = f"Eksportowano: {self.meta.exported_at.strftime('%d-%m-%Y %H:%M')}"
+        if self.meta.username:
+            meta += f" · Użytkownik: {self.meta.username}"
+        return (
+            "<!DOCTYPE html>\n<html lang=\"pl\">\n<head>\n<meta charset=\"utf-8\">\n"
+            f"<title>{title}</title>\n"
+            "<style>body{font-family:sans-serif;max-width:48em;margin:2em auto;padding:0 1em}"
+            ".msg{margin:1em 0;padding:.5em 1em;border-radius:6px;white-space:pre-wrap}"
+            ".user{background:#e8f0fe}.bot{background:#f1f3f4;margin-left:2em}"
+            ".meta{color:gray;font-size:.8em}</style>\n</head>\n<body>\n"
+            f"<h1>{title}</h1>\n<p class=\"meta\">{html.escape(meta)}</p>\n"
+        )
+
+    def format_message(self, msg: Dict[str, Any]) -> str:
+        css_class = "user" if msg.get('is_from_user') else "bot"
+        time_str = _format_time(msg.get('created_at'))
+        return (
+            f"<div class=\"msg {css_class}\"><strong>{html.escape(_author(msg, self.meta.bot_name))}</strong>"
+            + (f" <span class=\"meta\">{time_str}</span>" if time_str else "")
+            + f"\n{html.escape(msg.get('content') or '')}</div>\n"
+        )
+
+    def footer(self) -> str:
+        return "</body>\n</html>\n"
+
+@register_writer
+class PdfWriter(ExportWriter):
+    """
+    PDF - strony wiadomości trafiają do pliku tymczasowego, dokument jest
+    budowany w puli procesów (utils/pdf_generator.py) i dołączany bez kompresji
+    """
+    format = "pdf"
+    extension = "pdf"
+    compress_type = zipfile.ZIP_STORED
+
+    async def write(self, archive: zipfile.ZipFile, name: str,
+                    pages: AsyncIterator[List[Dict[str, Any]]]) -> int:
+        fd, spool_path = tempfile.mkstemp(prefix="export_", suffix=".jsonl")
+        fd_pdf, pdf_path = tempfile.mkstemp(prefix="export_", suffix=".pdf")
+        os.close(fd_pdf)
+        try:
+            count = 0
+            with os.fdopen(fd, 'w', encoding='utf-8') as spool:
+                async for page in pages:
+                    count += write_spool_page(spool, page)
+            if count:
+                await build_conversation_pdf(spool_path, pdf_path, self.meta.username, self.meta.bot_name)
+                await asyncio.to_thread(archive.write, pdf_path, name, self.compress_type)
+            return count
+        finally:
+            os.remove(spool_path)
+            os.remove(pdf_path)
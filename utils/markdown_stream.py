@@ -0,0 +1,232 @@
+# utils/markdown_stream.py
+"""
+Przyrostowe renderowanie strumieniowanych odpowiedzi do MarkdownV2 lub HTML Telegrama
+"""
+import html
+import re
+from typing import List, Tuple
+from telegram.constants import ParseMode
+from utils.message_formatter import MARKDOWN_V2_SPECIAL_CHARS
+
+_V2_SPECIAL_CHARS = frozenset(MARKDOWN_V2_SPECIAL_CHARS)
+
+# Znaki wymagające poprzedzenia ukośnikiem wewnątrz `code` i ```pre``` w MarkdownV2
+_V2_CODE_SPECIAL_CHARS = frozenset('`\\')
+
+# Dozwolone znaki nazwy języka w bloku kodu (```python)
+_LANGUAGE_RE = re.compile(r'[^A-Za-z0-9_+\-#]')
+
+BOLD = "bold"
+ITALIC = "italic"
+
+_MARKERS = {
+    ParseMode.MARKDOWN_V2: {BOLD: ("*", "*"), ITALIC: ("_", "_"), "code": ("`", "`")},
+    ParseMode.HTML: {BOLD: ("<b>", "</b>"), ITALIC: ("<i>", "</i>"), "code": ("<code>", "</code>")}
+}
+
+class MarkdownStreamRenderer:
+    """
+    Zamienia Markdown generowany przez model (*pogrubienie*, **pogrubienie**,
+    _kursywa_, `kod`, ```bloki kodu```) na MarkdownV2 lub HTML Telegrama
+
+    Tekst jest przetwarzany przyrostowo - feed() analizuje tylko nowy fragment
+    i pamięta otwarte znaczniki, a render() domyka je dla bieżącej klatki,
+    więc każda częściowa odpowiedź jest poprawna dla parsera Telegrama.
+    Niedomknięte na końcu znaczniki są wyświetlane jako zwykłe znaki.
+    """
+
+    def __init__(self, parse_mode: str = ParseMode.MARKDOWN_V2):
+        if parse_mode not in _MARKERS:
+            raise ValueError(f"Nieobsługiwany tryb formatowania: {parse_mode}")
+        self.parse_mode = parse_mode
+        self._markers = _MARKERS[parse_mode]
+
+        self._out: List[str] = []
+        # Otwarte znaczniki: (rodzaj, ogranicznik źródłowy, indeks znacznika w _out)
+        self._stack: List[Tuple[str, str, int]] = []
+        self._mode = "text"          # text | code | pre_header | pre
+        self._pre_header = ""        # Nazwa języka bloku kodu przed znakiem nowej linii
+        self._pre_closer = ""        # Znacznik zamykający bieżący blok kodu
+        self._pending = ""           # Niejednoznaczny koniec fragmentu (np. '*' albo '`')
+        self._prev = "\n"            # Ostatni przetworzony znak źródła
+
+    # Escapowanie
+
+    def _escape(self, text: str) -> str:
+        if self.parse_mode == ParseMode.HTML:
+            return html.escape(text, quote=False)
+        return "".join('\\' + c if c in _V2_SPECIAL_CHARS else c for c in text)
+
+    def _escape_code(self, text: str) -> str:
+        if self.parse_mode == ParseMode.HTML:
+            return html.escape(text, quote=False)
+        return "".join('\\' + c if c in _V2_CODE_SPECIAL_CHARS else c for c in text)
+
+    def _pre_markers(self, language: str) -> Tuple[str, str]:
+        if self.parse_mode == ParseMode.HTML:
+            if language:
+                return f'<pre><code class="language-{language}">', "</code></pre>"
+            return "<pre>", "</pre>"
+        return f"```{language}\n", "```"
+
+    # Przetwarzanie źródła
+
+    def feed(self, chunk: str):
+        """Przetwarza kolejny fragment odpowiedzi (koszt proporcjonalny do długości fragmentu)"""
+        if chunk:
+            self._process(self._pending + chunk, final=False)
+
+    def _process(self, src: str, final: bool):
+        self._pending = ""
+        i, n = 0, len(src)
+        while i < n:
+            c = src[i]
+
+            if self._mode == "pre_header":
+                if c == "\n":
+                    language = _LANGUAGE_RE.sub("", self._pre_header)[:32]
+                    opener, self._pre_closer = self._pre_markers(language)
+                    self._out.append(opener)
+                    self._pre_header = ""
+                    self._mode = "pre"
+                else:
+                    self._pre_header += c
+                self._prev = c
+                i += 1
+                continue
+
+            if c in "*_`":
+                run = self._run_length(src, i, c)
+                # Ogranicznik na końcu fragmentu - jego znaczenie zależy od kolejnego znaku
+                if i + run >= n and not final:
+                    self._pending = src[i:]
+                    return
+                next_char = src[i + run] if i + run < n else " "
+                self._delimiter(c, run, next_char)
+                self._prev = c
+                i += run
+                continue
+
+            if self._mode == "text":
+                self._out.append(self._escape(c))
+            else:
+                self._out.append(self._escape_code(c))
+            self._prev = c
+            i += 1
+
+    @staticmethod
+    def _run_length(src: str, i: int, c: str) -> int:
+        j = i
+        while j < len(src) and src[j] == c:
+            j += 1
+        return j - i
+
+    def _delimiter(self, c: str, run: int, next_char: str):
+        """Obsługuje ciąg znaków formatowania ('*', '_' lub '`') o długości run"""
+        if self._mode == "code":
+            if c == "`":
+                self._out.append(self._markers["code"][1])
+                self._out.extend(self._escape(c) for _ in range(run - 1))
+                self._mode = "text"
+            else:
+                self._out.append(self._escape_code(c * run))
+            return
+
+        if self._mode == "pre":
+            if c == "`" and run >= 3:
+                self._out.append(self._pre_closer)
+                self._out.append(self._escape(c * (run - 3)))
+                self._mode = "text"
+            else:
+                self._out.append(self._escape_code(c * run))
+            return
+
+        if c == "`":
+            if run >= 3:
+                self._mode = "pre_header"
+                self._pre_header = ""
+                # Dodatkowe znaki po ``` traktujemy jako część nazwy języka (zostaną odfiltrowane)
+            elif run == 2:
+                # `` - pusty kod, wyświetl dosłownie
+                self._out.append(self._escape("``"))
+            else:
+                self._out.append(self._markers["code"][0])
+                self._mode = "code"
+            return
+
+        # '*' / '**' = pogrubienie, '_' = kursywa, '__' = pogrubienie
+        if run > 2:
+            self._out.append(self._escape(c * run))
+            return
+        delimiter = c * run
+        kind = ITALIC if delimiter == "_" else BOLD
+
+        if self._can_close(delimiter, next_char):
+            _, _, opener = self._stack.pop()
+            if opener == len(self._out) - 1:
+                # Pusty znacznik - wyświetl oba ograniczniki dosłownie
+                self._out[opener] = self._escape(delimiter)
+                self._out.append(self._escape(delimiter))
+            else:
+                self._out.append(self._markers[kind][1])
+        elif self._can_open(kind, delimiter, next_char):
+            self._stack.append((kind, delimiter, len(self._out)))
+            self._out.append(self._markers[kind][0])
+        else:
+            self._out.append(self._escape(delimiter))
+
+    def _can_close(self, delimiter: str, next_char: str) -> bool:
+        if not self._stack or self._stack[-1][1] != delimiter or self._prev.isspace():
+            return False
+        # snake_case - podkreślenie wewnątrz słowa nie zamyka kursywy
+        return not (delimiter[0] == "_" and next_char.isalnum())
+
+    def _can_open(self, kind: str, delimiter: str, next_char: str) -> bool:
+        if next_char.isspace() or any(entry[0] == kind for entry in self._stack):
+            return False
+        if delimiter[0] == "_" and self._prev.isalnum():
+            return False
+        # '_a__b_' w MarkdownV2 byłoby podkreśleniem - nie otwieraj kursywy tuż po jej zamknięciu
+        if kind == ITALIC and self._out and self._out[-1] == self._markers[ITALIC][1]:
+            return False
+        return True
+
+    # Klatki
+
+    def render(self, cursor: str = "") -> str:
+        """Zwraca poprawnie sformatowaną bieżącą klatkę (z domkniętymi znacznikami)"""
+        closers = []
+        if self._mode == "code":
+            closers.append(self._markers["code"][1])
+        elif self._mode == "pre":
+            closers.append(self._pre_closer)
+        closers.extend(self._markers[kind][1] for kind, _, _ in reversed(self._stack))
+
+        escaped_cursor = self._escape_code(cursor) if self._mode in ("code", "pre") else self._escape(cursor)
+        return "".join(self._out) + escaped_cursor + "".join(closers)
+
+    def finish(self) -> str:
+        """Kończy strumień i zwraca ostateczny tekst"""
+        if self._pending:
+            self._process(self._pending, final=True)
+
+        if self._mode == "pre_header":
+            self._out.append(self._escape("```" + self._pre_header))
+        elif self._mode == "code":
+            self._out.append(self._markers["code"][1])
+        elif self._mode == "pre":
+            self._out.append(self._pre_closer)
+        self._mode = "text"
+
+        # Niedomknięte pogrubienia i kursywy wyświetlamy jako zwykłe znaki
+        while self._stack:
+            _, delimiter, opener = self._stack.pop()
+            self._out[opener] = self._escape(delimiter)
+
+        return "".join(self._out)
+
+def render_markdown(text: str, parse_mode: str = ParseMode.MARKDOWN_V2) -> str:
+    """Renderuje kompletny tekst w Markdown do MarkdownV2 lub HTML Telegrama"""
+    renderer = MarkdownStreamRenderer(parse_mode)
+    renderer.feed(text)
+    return renderer.finish()
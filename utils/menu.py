@@ -2,57 +2,120 @@
 """
 Unified module for menu management and UI handling
 """
+import time
 import logging
+from collections import OrderedDict
 from telegram import InlineKeyboardMarkup
 from telegram.constants import ParseMode
 from utils.translations import get_text
-from utils.user_utils import get_user_language
+from utils.user_utils import get_user_language, get_user_state
 
 logger = logging.getLogger(__name__)
 
+# Limits for the in-memory menu state - the persisted chat_data copy is the
+# source of truth, so evicted entries are reloaded from context when needed
+MENU_STATE_MAX_USERS = 50000
+MENU_STATE_IDLE_SECONDS = 3600
+
+class _MenuEntry:
+    """Menu state of a single user"""
+    __slots__ = ('state', 'message_id', 'last_seen')
+    
+    def __init__(self, state='main', message_id=None):
+        self.state = state
+        self.message_id = message_id
+        self.last_seen = time.monotonic()
+
 class MenuState:
-    """Class for managing menu state"""
+    """
+    Class for managing menu state
     
-    def __init__(self):
-        self.states = {}  # user_id -> menu state
-        self.message_ids = {}  # user_id -> menu message ID
+    Entries are kept in a bounded LRU (least recently used users are evicted
+    first, idle users expire) and spill to context.chat_data, which is stored
+    by the persistence layer.
+    """
+    
+    def __init__(self, maxsize=MENU_STATE_MAX_USERS, idle_ttl=MENU_STATE_IDLE_SECONDS):
+        self.maxsize = maxsize
+        self.idle_ttl = idle_ttl
+        self._entries = OrderedDict()  # user_id -> _MenuEntry
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def _get_entry(self, user_id, create=False):
+        """Returns the user's entry (refreshing its LRU position), optionally creating it"""
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry is not None and now - entry.last_seen > self.idle_ttl:
+            del self._entries[user_id]
+            entry = None
+        
+        if entry is None:
+            if not create:
+                return None
+            entry = _MenuEntry()
+            self._entries[user_id] = entry
+            self._evict(now)
+        else:
+            self._entries.move_to_end(user_id)
+        
+        entry.last_seen = now
+        return entry
+    
+    def _evict(self, now):
+        """Removes entries over the size limit and idle entries from the LRU end"""
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if now - oldest.last_seen <= self.idle_ttl:
+                break
+            self._entries.popitem(last=False)
     
     def set_state(self, user_id, state):
         """Sets the menu state for a user"""
-        self.states[user_id] = state
+        self._get_entry(user_id, create=True).state = state
     
     def get_state(self, user_id, default='main'):
         """Gets the menu state for a user"""
-        return self.states.get(user_id, default)
+        entry = self._get_entry(user_id)
+        return entry.state if entry is not None else default
     
     def set_message_id(self, user_id, message_id):
         """Saves the menu message ID for a user"""
-        self.message_ids[user_id] = message_id
+        self._get_entry(user_id, create=True).message_id = message_id
     
     def get_message_id(self, user_id):
         """Gets the menu message ID for a user"""
-        return self.message_ids.get(user_id)
+        entry = self._get_entry(user_id)
+        return entry.message_id if entry is not None else None
     
     def save_to_context(self, context, user_id):
-        """Saves the menu state to context"""
-        if 'user_data' not in context.chat_data:
-            context.chat_data['user_data'] = {}
-        
-        if user_id not in context.chat_data['user_data']:
-            context.chat_data['user_data'][user_id] = {}
+        """Saves the menu state to context (persisted by services.persistence) if it changed"""
+        entry = self._get_entry(user_id)
+        if entry is None:
+            return
         
-        context.chat_data['user_data'][user_id]['menu_state'] = self.get_state(user_id)
-        if self.get_message_id(user_id):
-            context.chat_data['user_data'][user_id]['menu_message_id'] = self.get_message_id(user_id)
+        user_data = get_user_state(context, user_id)
+        if user_data.get('menu_state') != entry.state:
+            user_data['menu_state'] = entry.state
+        if entry.message_id and user_data.get('menu_message_id') != entry.message_id:
+            user_data['menu_message_id'] = entry.message_id
     
     def load_from_context(self, context, user_id):
         """Loads the menu state from context"""
-        if 'user_data' in context.chat_data and user_id in context.chat_data['user_data']:
-            user_data = context.chat_data['user_data'][user_id]
-            if 'menu_state' in user_data:
-                self.set_state(user_id, user_data['menu_state'])
-            if 'menu_message_id' in user_data:
-                self.set_message_id(user_id, user_data['menu_message_id'])
+        if context.chat_data is None:
+            return
+        user_data = context.chat_data.get('user_data', {}).get(user_id)
+        if not user_data:
+            return
+        
+        if 'menu_state' in user_data or 'menu_message_id' in user_data:
+            entry = self._get_entry(user_id, create=True)
+            entry.state = user_data.get('menu_state', entry.state)
+            entry.message_id = user_data.get('menu_message_id', entry.message_id)
 
 # Create a global instance for tracking menu state
 menu_state = MenuState()
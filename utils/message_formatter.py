@@ -4,6 +4,10 @@ Moduł do formatowania wiadomości dla bota Telegram
 import re
 from telegram.constants import ParseMode
 
+# Znaki, które muszą być poprzedzone znakiem ucieczki w Markdown V2
+# (ukośnik jako pierwszy, aby nie escapować dodanych ukośników)
+MARKDOWN_V2_SPECIAL_CHARS = ['\\', '_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+
 def format_markdown_v2(text):
     """
     Formatuje tekst do zgodności z Markdown V2 w Telegramie
@@ -14,11 +18,8 @@ def format_markdown_v2(text):
     Returns:
         str: Sformatowany tekst
     """
-    # Znaki, które muszą być poprzedzone znakiem ucieczki w Markdown V2
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    
     # Dodaj znak ucieczki przed każdym specjalnym znakiem
-    for char in special_chars:
+    for char in MARKDOWN_V2_SPECIAL_CHARS:
         text = text.replace(char, f'\\{char}')
     
     return text
@@ -1,11 +1,11 @@
 # utils/openai_client.py
-from services.api_service import APIService
+from services.api_service import get_api_service
 import logging
 
 logger = logging.getLogger(__name__)
 
 # Utworzenie globalnej instancji
-api_service = APIService()
+api_service = get_api_service()
 
 # Funkcje kompatybilne ze starym kodem
 async def chat_completion(messages, model=None):
@@ -15,6 +15,8 @@ async def chat_completion(messages, model=None):
 async def chat_completion_stream(messages, model=None):
     """
     Funkcja dla kompatybilności wstecznej zwracająca asynchroniczny generator
+    
+    Błędy API są przekazywane do wywołującego, aby mógł zwolnić rezerwację kredytów
     """
     try:
         # Lista modeli Claude
@@ -43,21 +45,14 @@ async def chat_completion_stream(messages, model=None):
         
         if model in claude_models:
             logger.info(f"Używam API Anthropic dla modelu {model}")
-            # Użyj klienta Anthropic bezpośrednio dla modeli Claude
-            from api.anthropic_client import AnthropicClient
-            from config import ANTHROPIC_API_KEY
-            
-            anthropic_client = AnthropicClient(api_key=ANTHROPIC_API_KEY)
-            async_generator = anthropic_client.chat_completion_stream(messages, model)
+            # Użyj współdzielonego klienta Anthropic dla modeli Claude
+            async_generator = api_service.anthropic.chat_completion_stream(messages, model)
             async for chunk in async_generator:
                 yield chunk
         else:
-            # Bezpośrednie utworzenie klienta OpenAI dla modeli OpenAI
+            # Współdzielony klient OpenAI (pula połączeń utrzymywana między wiadomościami)
             logger.info(f"Używam bezpośrednio API OpenAI dla modelu {model or 'gpt-4o'}")
-            from openai import AsyncOpenAI
-            
-            from config import OPENAI_API_KEY
-            client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+            client = api_service.openai.client
             
             response = await client.chat.completions.create(
                 model=model or "gpt-4o",
@@ -70,7 +65,7 @@ async def chat_completion_stream(messages, model=None):
                     yield chunk.choices[0].delta.content
     except Exception as e:
         logger.error(f"Błąd w chat_completion_stream: {e}", exc_info=True)
-        yield f"Wystąpił błąd podczas generowania odpowiedzi: {str(e)}"
+        raise
 
 async def generate_image_dall_e(prompt):
     """Funkcja dla kompatybilności wstecznej"""
@@ -84,11 +79,22 @@ async def analyze_image(file_bytes, file_name, mode="analyze", target_language=N
     """Funkcja dla kompatybilności wstecznej"""
     return await api_service.document_service.analyze_image(file_bytes, file_name, mode, target_language)
 
+async def build_context_messages(conversation_id, user_message, system_prompt, model=None):
+    """
+    Buduje wiadomości dla API modelu z historii konwersacji
+    
+    Historia jest przycinana do budżetu tokenów modelu, a starsze tury są
+    zastępowane podsumowaniem (services.context_builder)
+    """
+    from services.context_builder import get_context_builder
+    return await get_context_builder().build(conversation_id, model, system_prompt, user_message)
+
 def prepare_messages_from_history(history, user_message, system_prompt):
     """
     Przygotowuje wiadomości dla API OpenAI na podstawie historii konwersacji
     
-    Wspiera zarówno obiekty Message jak i słowniki
+    Wspiera obiekty Message, słowniki z bazy danych oraz gotowe wiadomości
+    {"role": ..., "content": ...}
     """
     messages = [{"role": "system", "content": system_prompt}]
     
@@ -99,6 +105,10 @@ def prepare_messages_from_history(history, user_message, system_prompt):
             # Obiekt Message
             role = "user" if msg.is_from_user else "assistant"
             content = msg.content
+        elif "role" in msg:
+            # Gotowa wiadomość dla API (okno kontekstu)
+            role = msg["role"]
+            content = msg.get("content", "")
         else:
             # Słownik
             role = "user" if msg.get("is_from_user", False) else "assistant"
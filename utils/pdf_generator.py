@@ -1,67 +1,88 @@
 # utils/pdf_generator.py
+"""
+Generowanie PDF z historią konwersacji
+
+- fonty są rejestrowane raz na proces (register_fonts), a nie przy każdym eksporcie
+- wiadomości trafiają do dokumentu strumieniowo (_FlowableFeed), więc ReportLab
+  nie trzyma naraz akapitów całej konwersacji
+- export_conversation_pdf zapisuje strony wiadomości do pliku tymczasowego,
+  a PDF jest budowany w puli procesów prosto do pliku wynikowego
+"""
 from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.units import cm
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+import asyncio
 import io
+import json
+import logging
+import multiprocessing
 import os
 import datetime
 import re
+import tempfile
 import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+from config import PDF_EXPORT_WORKERS
 
-def generate_conversation_pdf(conversation, user_info, bot_name="AI Bot"):
+logger = logging.getLogger(__name__)
+
+FONT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "fonts")
+
+# Liczba akapitów przygotowywanych z wyprzedzeniem podczas budowania dokumentu
+FLOWABLE_BUFFER = 64
+
+# Znaczniki Markdown usuwane z treści wiadomości (kolejność ma znaczenie)
+MARKDOWN_PATTERNS = [
+    (re.compile(r'\*\*(.*?)\*\*'), r'\1'),            # Bold
+    (re.compile(r'\*(.*?)\*'), r'\1'),                # Italic
+    (re.compile(r'__(.*?)__'), r'\1'),                # Underline
+    (re.compile(r'_([^_]+)_'), r'\1'),                # Italic
+    (re.compile(r'~~(.*?)~~'), r'\1'),                # Strikethrough
+    (re.compile(r'`([^`]+)`'), r'\1'),                # Inline code
+    (re.compile(r'```(?:.|\n)*?```'), r'[Code block]'),  # Code block
+    (re.compile(r'\[(.*?)\]\((.*?)\)'), r'\1'),       # Links
+]
+
+# Fonty i style zarejestrowane w bieżącym procesie
+_fonts: Optional[Tuple[str, str]] = None
+_styles = None
+
+def register_fonts() -> Tuple[str, str]:
     """
-    Generuje plik PDF z historią konwersacji
-    
-    Args:
-        conversation (list): Lista wiadomości z konwersacji
-        user_info (dict): Informacje o użytkowniku
-        bot_name (str): Nazwa bota
-        
+    Rejestruje fonty z obsługą Unicode (DejaVu) - raz na proces
+
     Returns:
-        BytesIO: Bufor zawierający wygenerowany plik PDF
+        tuple: (font podstawowy, font pogrubiony) - Helvetica, gdy brak plików DejaVu
     """
-    buffer = io.BytesIO()
-    
-    # Rejestracja fontów z obsługą Unicode
+    global _fonts
+    if _fonts is not None:
+        return _fonts
+
+    _fonts = ('Helvetica', 'Helvetica-Bold')
     try:
-        # Sprawdź czy font DejaVu jest dostępny (ma obsługę polskich znaków)
-        font_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "fonts")
-        
-        if not os.path.exists(font_dir):
-            os.makedirs(font_dir)
-            
-        dejavu_regular = os.path.join(font_dir, "DejaVuSans.ttf")
-        dejavu_bold = os.path.join(font_dir, "DejaVuSans-Bold.ttf")
-        
+        dejavu_regular = os.path.join(FONT_DIR, "DejaVuSans.ttf")
+        dejavu_bold = os.path.join(FONT_DIR, "DejaVuSans-Bold.ttf")
+
         if os.path.exists(dejavu_regular) and os.path.exists(dejavu_bold):
             pdfmetrics.registerFont(TTFont('DejaVuSans', dejavu_regular))
             pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', dejavu_bold))
-            main_font = 'DejaVuSans'
-            bold_font = 'DejaVuSans-Bold'
-        else:
-            main_font = 'Helvetica'
-            bold_font = 'Helvetica-Bold'
-    except:
-        main_font = 'Helvetica'
-        bold_font = 'Helvetica-Bold'
-    
-    # Konfiguracja dokumentu
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=2*cm,
-        leftMargin=2*cm,
-        topMargin=2*cm,
-        bottomMargin=2*cm,
-        title=f"Konwersacja z {bot_name}",
-        encoding='utf-8'
-    )
-    
-    # Style
+            _fonts = ('DejaVuSans', 'DejaVuSans-Bold')
+    except Exception as e:
+        logger.error(f"Błąd rejestracji fontów DejaVu: {e}")
+    return _fonts
+
+def _get_styles():
+    """Zwraca arkusz stylów dokumentu (tworzony raz na proces)"""
+    global _styles
+    if _styles is not None:
+        return _styles
+
+    main_font, bold_font = register_fonts()
     styles = getSampleStyleSheet()
     styles.add(ParagraphStyle(
         name='UserMessage',
@@ -92,105 +113,245 @@ def generate_conversation_pdf(conversation, user_info, bot_name="AI Bot"):
         fontName=main_font,
         spaceAfter=6
     ))
-    
-    # Funkcja do przetwarzania tekstu - zamiana znaków diakrytycznych
-    def process_text(text):
-        if not text:
-            return ""
-        # Konwertuj do string
-        text = str(text)
-        
-        # Usuń znaczniki Markdown
-        text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)  # Bold
-        text = re.sub(r'\*(.*?)\*', r'\1', text)      # Italic
-        text = re.sub(r'__(.*?)__', r'\1', text)      # Underline
-        text = re.sub(r'_([^_]+)_', r'\1', text)      # Italic
-        text = re.sub(r'~~(.*?)~~', r'\1', text)      # Strikethrough
-        text = re.sub(r'`([^`]+)`', r'\1', text)      # Inline code
-        text = re.sub(r'```(?:.|\n)*?```', r'[Code block]', text)  # Code block
-        text = re.sub(r'\[(.*?)\]\((.*?)\)', r'\1', text)  # Links
-        
-        # Zamień polskie znaki na ASCII
-        nfkd_form = unicodedata.normalize('NFKD', text)
-        text = ''.join([c for c in nfkd_form if not unicodedata.combining(c)])
-        
-        # Escapuj znaki HTML
-        text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-        
-        return text
-    
-    # Elementy dokumentu
-    elements = []
-    
+    _styles = styles
+    return _styles
+
+def process_text(text):
+    """Przygotowuje tekst do akapitu - usuwa Markdown, znaki diakrytyczne i escapuje HTML"""
+    if not text:
+        return ""
+    # Konwertuj do string
+    text = str(text)
+
+    # Usuń znaczniki Markdown
+    for pattern, replacement in MARKDOWN_PATTERNS:
+        text = pattern.sub(replacement, text)
+
+    # Zamień polskie znaki na ASCII
+    nfkd_form = unicodedata.normalize('NFKD', text)
+    text = ''.join([c for c in nfkd_form if not unicodedata.combining(c)])
+
+    # Escapuj znaki HTML
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+    return text
+
+def _get_username(user_info) -> Optional[str]:
+    if isinstance(user_info, dict):
+        return user_info.get('username')
+    return getattr(user_info, 'username', None)
+
+def _message_paragraph(msg, styles, bot_name):
+    """Tworzy akapit jednej wiadomości (obiekt Message lub słownik)"""
+    try:
+        # Sprawdź czy mamy obiekt czy słownik
+        if hasattr(msg, 'is_from_user'):
+            # Obiekt Message
+            is_from_user = msg.is_from_user
+            content = msg.content
+            created_at = getattr(msg, 'created_at', None)
+        else:
+            # Słownik
+            is_from_user = msg.get('is_from_user', False)
+            content = msg.get('content', '')
+            created_at = msg.get('created_at', None)
+
+        if is_from_user:
+            icon = "👤 "  # Ikona użytkownika
+            style = styles['UserMessage']
+            content_text = f"{icon}{process_text('Ty')}: {process_text(content)}"
+        else:
+            icon = "🤖 "  # Ikona bota
+            style = styles['BotMessage']
+            content_text = f"{icon}{process_text(bot_name)}: {process_text(content)}"
+
+        # Dodaj datę i godzinę wiadomości, jeśli są dostępne
+        if created_at:
+            try:
+                # Konwersja formatu daty
+                if isinstance(created_at, str) and 'T' in created_at:
+                    dt = datetime.datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+                    time_str = dt.strftime("%d-%m-%Y %H:%M")
+                    content_text += f"<br/><font size=8 color=gray>{time_str}</font>"
+            except:
+                pass
+
+        return Paragraph(content_text, style)
+    except Exception as e:
+        # W przypadku błędu dodaj informację
+        return Paragraph(f"Blad formatowania wiadomosci: {str(e)}", styles['Normal'])
+
+def _document_flowables(conversation: Iterable, username: Optional[str], bot_name: str) -> Iterator:
+    """Generuje kolejne elementy dokumentu: nagłówek, wiadomości i stopkę"""
+    styles = _get_styles()
+
     # Nagłówek
     title = process_text(f"Konwersacja z {bot_name}")
-    elements.append(Paragraph(title, styles['CustomTitle']))
-    
+    yield Paragraph(title, styles['CustomTitle'])
+
     # Metadane
     current_time = datetime.datetime.now().strftime("%d-%m-%Y %H:%M")
     metadata_text = process_text(f"Eksportowano: {current_time}")
-    
-    # Dodaj informacje o użytkowniku jeśli są dostępne
-    username = None
-    if isinstance(user_info, dict):
-        username = user_info.get('username')
-    elif hasattr(user_info, 'username'):
-        username = user_info.username
-        
     if username:
         metadata_text += f"<br/>{process_text('Uzytkownik')}: {process_text(username)}"
-        
-    elements.append(Paragraph(metadata_text, styles['CustomItalic']))
-    elements.append(Spacer(1, 0.5*cm))
-    
+
+    yield Paragraph(metadata_text, styles['CustomItalic'])
+    yield Spacer(1, 0.5*cm)
+
     # Treść konwersacji
     for msg in conversation:
-        try:
-            # Sprawdź czy mamy obiekt czy słownik
-            if hasattr(msg, 'is_from_user'):
-                # Obiekt Message
-                is_from_user = msg.is_from_user
-                content = msg.content
-                created_at = getattr(msg, 'created_at', None)
-            else:
-                # Słownik
-                is_from_user = msg.get('is_from_user', False)
-                content = msg.get('content', '')
-                created_at = msg.get('created_at', None)
-            
-            if is_from_user:
-                icon = "👤 "  # Ikona użytkownika
-                style = styles['UserMessage']
-                content_text = f"{icon}{process_text('Ty')}: {process_text(content)}"
-            else:
-                icon = "🤖 "  # Ikona bota
-                style = styles['BotMessage']
-                content_text = f"{icon}{process_text(bot_name)}: {process_text(content)}"
-            
-            # Dodaj datę i godzinę wiadomości, jeśli są dostępne
-            if created_at:
-                try:
-                    # Konwersja formatu daty
-                    if isinstance(created_at, str) and 'T' in created_at:
-                        dt = datetime.datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                        time_str = dt.strftime("%d-%m-%Y %H:%M")
-                        content_text += f"<br/><font size=8 color=gray>{time_str}</font>"
-                except:
-                    pass
-            
-            elements.append(Paragraph(content_text, style))
-        except Exception as e:
-            # W przypadku błędu dodaj informację
-            elements.append(Paragraph(f"Blad formatowania wiadomosci: {str(e)}", styles['Normal']))
-    
+        yield _message_paragraph(msg, styles, bot_name)
+
     # Stopka
-    elements.append(Spacer(1, 1*cm))
+    yield Spacer(1, 1*cm)
     footer_text = process_text(f"Wygenerowano przez {bot_name} • {current_time}")
-    elements.append(Paragraph(footer_text, styles['CustomItalic']))
-    
-    # Wygeneruj dokument
-    doc.build(elements)
-    
+    yield Paragraph(footer_text, styles['CustomItalic'])
+
+class _FlowableFeed(list):
+    """
+    Lista elementów dokumentu uzupełniana z generatora w trakcie budowania
+
+    SimpleDocTemplate.build pobiera elementy z początku listy i sprawdza jej
+    długość w każdym kroku - przy tym sprawdzeniu lista jest dopełniana do
+    FLOWABLE_BUFFER elementów, więc w pamięci jest tylko bieżący fragment.
+    """
+
+    def __init__(self, flowables: Iterator):
+        super().__init__()
+        self._source = flowables
+        self._exhausted = False
+
+    def __len__(self):
+        while not self._exhausted and super().__len__() < FLOWABLE_BUFFER:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._exhausted = True
+        return super().__len__()
+
+def _build_pdf(output, conversation: Iterable, username: Optional[str], bot_name: str):
+    """Buduje dokument do pliku (ścieżka lub obiekt plikowy)"""
+    doc = SimpleDocTemplate(
+        output,
+        pagesize=A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=2*cm,
+        bottomMargin=2*cm,
+        title=f"Konwersacja z {bot_name}",
+        encoding='utf-8',
+        pageCompression=1
+    )
+    doc.build(_FlowableFeed(_document_flowables(conversation, username, bot_name)))
+
+def generate_conversation_pdf(conversation, user_info, bot_name="AI Bot"):
+    """
+    Generuje plik PDF z historią konwersacji
+
+    Args:
+        conversation (list): Lista wiadomości z konwersacji
+        user_info (dict): Informacje o użytkowniku
+        bot_name (str): Nazwa bota
+
+    Returns:
+        BytesIO: Bufor zawierający wygenerowany plik PDF
+    """
+    buffer = io.BytesIO()
+    _build_pdf(buffer, conversation, _get_username(user_info), bot_name)
+
     # Zresetuj pozycję w buforze i zwróć go
     buffer.seek(0)
-    return buffer
\ No newline at end of file
+    return buffer
+
+def _read_spool(spool_path: str) -> Iterator[Dict[str, Any]]:
+    """Czyta wiadomości z pliku tymczasowego (JSON w każdej linii)"""
+    with open(spool_path, encoding='utf-8') as spool:
+        for line in spool:
+            yield json.loads(line)
+
+def build_conversation_pdf_file(spool_path: str, output_path: str, username: Optional[str], bot_name: str):
+    """Buduje PDF z wiadomości zapisanych w pliku tymczasowym (uruchamiane w puli procesów)"""
+    _build_pdf(output_path, _read_spool(spool_path), username, bot_name)
+
+# Pula procesów budujących PDF (tworzona przy pierwszym eksporcie)
+_executor = None
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # "spawn" - procesy potomne nie dziedziczą pętli zdarzeń ani wątków bota;
+        # fonty są rejestrowane raz przy starcie każdego procesu
+        _executor = ProcessPoolExecutor(
+            max_workers=PDF_EXPORT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=register_fonts
+        )
+        logger.info(f"Utworzono pulę {PDF_EXPORT_WORKERS} procesów eksportu PDF")
+    return _executor
+
+def write_spool_page(spool, page: List[Dict[str, Any]]) -> int:
+    """Dopisuje stronę wiadomości do pliku tymczasowego (tylko pola potrzebne w PDF)"""
+    spool.writelines(
+        json.dumps({
+            'is_from_user': msg.get('is_from_user', False),
+            'content': msg.get('content', ''),
+            'created_at': msg.get('created_at')
+        }, ensure_ascii=False) + "\n"
+        for msg in page
+    )
+    return len(page)
+
+async def build_conversation_pdf(spool_path: str, output_path: str, username: Optional[str], bot_name: str):
+    """Buduje PDF w puli procesów (przy PDF_EXPORT_WORKERS = 0 lub awarii puli - w wątku)"""
+    global _executor
+    args = (spool_path, output_path, username, bot_name)
+    if PDF_EXPORT_WORKERS > 0:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_get_executor(), build_conversation_pdf_file, *args)
+        except BrokenProcessPool:
+            logger.error("Pula procesów eksportu PDF uległa awarii - zostanie utworzona ponownie")
+            _executor = None
+    return await asyncio.to_thread(build_conversation_pdf_file, *args)
+
+async def export_conversation_pdf(pages: AsyncIterator[List[Dict[str, Any]]], user_info,
+                                  bot_name: str = "AI Bot") -> Optional[str]:
+    """
+    Eksportuje konwersację do pliku PDF bez blokowania pętli zdarzeń
+
+    Strony wiadomości są dopisywane do pliku tymczasowego, a dokument jest
+    budowany w puli procesów do drugiego pliku tymczasowego.
+
+    Args:
+        pages: Kolejne strony wiadomości (np. MessageRepository.iter_messages)
+        user_info: Informacje o użytkowniku
+        bot_name: Nazwa bota
+
+    Returns:
+        str: Ścieżka pliku PDF (usuwa go wywołujący) lub None, gdy konwersacja jest pusta
+    """
+    fd, spool_path = tempfile.mkstemp(prefix="export_", suffix=".jsonl")
+    try:
+        count = 0
+        with os.fdopen(fd, 'w', encoding='utf-8') as spool:
+            async for page in pages:
+                count += write_spool_page(spool, page)
+        if not count:
+            return None
+
+        fd, output_path = tempfile.mkstemp(prefix="export_", suffix=".pdf")
+        os.close(fd)
+        try:
+            await build_conversation_pdf(spool_path, output_path, _get_username(user_info), bot_name)
+        except BaseException:
+            os.remove(output_path)
+            raise
+        return output_path
+    finally:
+        os.remove(spool_path)
+
+def shutdown_pdf_pool():
+    """Zamyka pulę procesów eksportu PDF"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
\ No newline at end of file
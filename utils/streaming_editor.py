@@ -0,0 +1,250 @@
+# utils/streaming_editor.py
+import asyncio
+import time
+import logging
+from typing import List, Optional
+from telegram import Message
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter, TelegramError
+from utils.markdown_stream import MarkdownStreamRenderer, render_markdown
+
+logger = logging.getLogger(__name__)
+
+# Limit długości wiadomości Telegram (po sformatowaniu) i zapas na znaki
+# escapowane dopiero przy zakończeniu (np. niedomknięte znaczniki)
+MAX_MESSAGE_LENGTH = 4096
+ROLLOVER_MARGIN = 96
+
+# Telegram pozwala na ok. 30 wywołań na sekundę dla całego bota - edycje
+# strumieniowane zostawiają zapas dla zwykłych odpowiedzi
+GLOBAL_EDITS_PER_SECOND = 20.0
+GLOBAL_EDITS_BURST = 20
+
+# Odstęp między edycjami jednej wiadomości (rośnie z długością tekstu i po RetryAfter)
+MIN_EDIT_INTERVAL = 1.0
+MAX_EDIT_INTERVAL = 5.0
+EDIT_INTERVAL_PER_1000_CHARS = 0.5
+
+CURSOR = "▌"
+
+class TokenBucket:
+    """Kubełek tokenów ograniczający liczbę edycji wiadomości w całym procesie"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """Pobiera token bez czekania (False, jeśli limit jest wyczerpany)"""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def acquire(self):
+        """Czeka na token - dla edycji, których nie można pominąć"""
+        while not self.try_acquire():
+            await asyncio.sleep(max((1 - self._tokens) / self.rate, 0.01))
+
+# Wspólny limit dla wszystkich czatów
+edit_bucket = TokenBucket(GLOBAL_EDITS_PER_SECOND, GLOBAL_EDITS_BURST)
+
+class StreamingEditor:
+    """
+    Wyświetla strumieniowaną odpowiedź, edytując wiadomość Telegram
+
+    Edycje są łączone (co najwyżej jedna na odstęp, który rośnie z długością
+    tekstu i po RetryAfter), pomijane, gdy tekst się nie zmienił lub globalny
+    limit jest wyczerpany, a zanim sformatowana treść (po escapowaniu MarkdownV2
+    lub HTML) przekroczy 4096 znaków, odpowiedź jest kontynuowana w nowej wiadomości. Markdown z modelu jest renderowany
+    przyrostowo (MarkdownStreamRenderer), więc każda klatka jest poprawna.
+
+    Użycie:
+        editor = StreamingEditor(message, header=...)
+        async for chunk in stream:
+            await editor.append(chunk)
+        full_text = await editor.finish()
+    """
+
+    def __init__(self, message: Message, header: str = "", parse_mode: Optional[str] = ParseMode.MARKDOWN_V2,
+                 bucket: TokenBucket = edit_bucket):
+        """
+        Args:
+            message: Wiadomość bota, którą będziemy edytować
+            header: Nagłówek (w Markdown) wyświetlany nad treścią pierwszej wiadomości
+            parse_mode: ParseMode.MARKDOWN_V2, ParseMode.HTML lub None (zwykły tekst)
+            bucket: Globalny limit edycji
+        """
+        self.message = message
+        self.messages: List[Message] = [message]
+        self.header = header
+        self.parse_mode = parse_mode
+        self.bucket = bucket
+
+        self._header_rendered = render_markdown(header, parse_mode) if parse_mode else header
+        self._renderer = self._new_renderer()
+        self._parts: List[str] = []  # Treść zamkniętych (pełnych) wiadomości
+        self._body = ""              # Treść bieżącej wiadomości (źródłowy Markdown)
+        self._last_sent: Optional[str] = None
+        self._last_edit = 0.0
+        self._backoff = 1.0
+        self._retry_until = 0.0
+
+    @property
+    def text(self) -> str:
+        """Pełny dotychczasowy tekst odpowiedzi (bez nagłówka)"""
+        return "".join(self._parts) + self._body
+
+    def _new_renderer(self) -> Optional[MarkdownStreamRenderer]:
+        return MarkdownStreamRenderer(self.parse_mode) if self.parse_mode else None
+
+    def _header(self, rendered: bool = True) -> str:
+        # Kolejne wiadomości nie mają nagłówka
+        if len(self.messages) > 1:
+            return ""
+        return self._header_rendered if rendered else self.header
+
+    def _frame(self) -> str:
+        """Bieżąca klatka z kursorem"""
+        body = self._renderer.render(CURSOR) if self._renderer else self._body + CURSOR
+        return self._header() + body
+
+    def _interval(self) -> float:
+        interval = MIN_EDIT_INTERVAL + len(self._body) / 1000 * EDIT_INTERVAL_PER_1000_CHARS
+        return min(MAX_EDIT_INTERVAL, interval * self._backoff)
+
+    def _render(self, text: str) -> str:
+        return render_markdown(text, self.parse_mode) if self.parse_mode else text
+
+    def _too_long(self) -> bool:
+        """Czy bieżąca klatka (sformatowana, z kursorem) przekracza limit Telegrama"""
+        return len(self._frame()) > MAX_MESSAGE_LENGTH - ROLLOVER_MARGIN
+
+    def _fitting_prefix(self, limit: int) -> int:
+        """Najdłuższy początek treści (w znakach źródła), który po sformatowaniu mieści się w limicie"""
+        low, high = 1, len(self._body)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if len(self._render(self._body[:middle])) <= limit:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    async def append(self, chunk: str):
+        """Dopisuje fragment odpowiedzi i w razie potrzeby aktualizuje wiadomość"""
+        if not chunk:
+            return
+        self._body += chunk
+        if self._renderer:
+            self._renderer.feed(chunk)
+
+        # Przenieś nadmiar do nowej wiadomości, zanim przekroczymy limit Telegrama
+        while self._too_long():
+            await self._rollover()
+
+        now = time.monotonic()
+        if now < self._retry_until or now - self._last_edit < self._interval():
+            return
+        if not self.bucket.try_acquire():
+            return
+        await self._edit(self._frame(), self._header(rendered=False) + self._body, wait=False)
+
+    async def finish(self) -> str:
+        """Wyświetla kompletną odpowiedź bez kursora i zwraca jej pełny tekst"""
+        body = self._renderer.finish() if self._renderer else self._body
+        await self._edit(self._header() + body, self._header(rendered=False) + self._body, wait=True)
+        return self.text
+
+    async def _rollover(self):
+        """Zamyka bieżącą wiadomość na granicy linii lub słowa i kontynuuje w nowej"""
+        available = self._fitting_prefix(MAX_MESSAGE_LENGTH - ROLLOVER_MARGIN - len(self._header()))
+        split_at = max(self._body.rfind("\n", 0, available), self._body.rfind(" ", 0, available))
+        if split_at < available // 2:
+            split_at = available
+
+        head, self._body = self._body[:split_at], self._body[split_at:]
+        await self._edit(self._header() + self._render(head), self._header(rendered=False) + head, wait=True)
+        self._parts.append(head)
+
+        await self.bucket.acquire()
+        self.message = await self._send_new(self._body[:MAX_MESSAGE_LENGTH - ROLLOVER_MARGIN] + CURSOR)
+        self.messages.append(self.message)
+
+        self._renderer = self._new_renderer()
+        if self._renderer:
+            self._renderer.feed(self._body)
+
+    async def _send_new(self, text: str) -> Message:
+        """Wysyła kolejną wiadomość w tym samym czacie (pierwsza klatka jako zwykły tekst)"""
+        bot = self.message.get_bot()
+        while True:
+            try:
+                message = await bot.send_message(chat_id=self.message.chat_id, text=text)
+                self._last_sent = text
+                self._last_edit = time.monotonic()
+                return message
+            except RetryAfter as e:
+                self._handle_retry_after(e)
+                await asyncio.sleep(self._retry_until - time.monotonic())
+
+    def _handle_retry_after(self, error: RetryAfter):
+        """Wstrzymuje edycje tej wiadomości na czas wskazany przez Telegram i wydłuża odstęp"""
+        # retry_after to liczba sekund lub timedelta (zależnie od wersji python-telegram-bot)
+        retry_after = error.retry_after
+        retry_after = float(retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else retry_after)
+        logger.warning(f"Limit edycji Telegram - ponowienie za {retry_after}s")
+        self._retry_until = time.monotonic() + retry_after
+        self._backoff = min(self._backoff * 2, MAX_EDIT_INTERVAL)
+
+    async def _edit(self, text: str, plain_text: str, wait: bool):
+        """
+        Edytuje bieżącą wiadomość
+
+        Args:
+            text: Nowa treść wiadomości w trybie parse_mode
+            plain_text: Ta sama treść bez formatowania - gdy Telegram odrzuci formatowanie
+            wait: Czy czekać na limit (końcowa treść musi zostać wyświetlona)
+        """
+        if text == self._last_sent:
+            return
+
+        parse_mode = self.parse_mode
+        while True:
+            if wait:
+                delay = self._retry_until - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await self.bucket.acquire()
+            try:
+                await self.message.edit_text(text, parse_mode=parse_mode)
+                self._last_sent = text
+                self._last_edit = time.monotonic()
+                self._backoff = max(1.0, self._backoff * 0.9)
+                return
+            except RetryAfter as e:
+                self._handle_retry_after(e)
+                if not wait:
+                    return
+            except BadRequest as e:
+                if "not modified" in str(e).lower():
+                    self._last_sent = text
+                    return
+                if parse_mode is None:
+                    logger.warning(f"Nie udało się zaktualizować wiadomości: {e}")
+                    return
+                logger.warning(f"Telegram odrzucił formatowanie - wysyłam zwykły tekst: {e}")
+                text, parse_mode = plain_text, None
+                if not wait and not self.bucket.try_acquire():
+                    return
+            except TelegramError as e:
+                logger.warning(f"Nie udało się zaktualizować wiadomości: {e}")
+                return
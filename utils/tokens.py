@@ -0,0 +1,68 @@
+# utils/tokens.py
+import logging
+from typing import Dict, Optional
+from config import HISTORY_TOKEN_BUDGETS
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    tiktoken = None
+    TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Przybliżona liczba znaków na token dla tekstu mieszanego (polski/angielski)
+CHARS_PER_TOKEN = 4
+
+# Narzut formatu wiadomości czatu (rola, separatory) w tokenach
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Kodowanie dla modeli bez własnego tokenizera w tiktoken (np. Claude) - przybliżenie
+DEFAULT_ENCODING = "o200k_base"
+
+# model -> kodowanie tiktoken (None = tokenizer niedostępny, liczymy przybliżenie)
+_encodings: Dict[Optional[str], object] = {}
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Szacuje liczbę tokenów tekstu wiadomości (wraz z narzutem formatu czatu)"""
+    if not text:
+        return MESSAGE_OVERHEAD_TOKENS
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+def _get_encoding(model: Optional[str]):
+    """Zwraca kodowanie tiktoken dla modelu (wczytywane raz na proces)"""
+    if model in _encodings:
+        return _encodings[model]
+
+    encoding = None
+    if TIKTOKEN_AVAILABLE:
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(DEFAULT_ENCODING)
+            except KeyError:
+                encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+        except Exception as e:
+            # np. brak dostępu do plików kodowania - zostajemy przy przybliżeniu
+            logger.warning(f"Nie udało się wczytać tokenizera dla {model}: {e}")
+
+    _encodings[model] = encoding
+    return encoding
+
+def count_tokens(text: Optional[str], model: Optional[str] = None) -> int:
+    """
+    Liczy tokeny tekstu wiadomości (wraz z narzutem formatu czatu)
+
+    Używa tokenizera modelu (tiktoken), a gdy jest niedostępny - przybliżenia
+    na podstawie liczby znaków.
+    """
+    if not text:
+        return MESSAGE_OVERHEAD_TOKENS
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=())) + MESSAGE_OVERHEAD_TOKENS
+
+def get_history_token_budget(model: Optional[str]) -> int:
+    """Zwraca budżet tokenów historii konwersacji dla modelu"""
+    return HISTORY_TOKEN_BUDGETS.get(model, HISTORY_TOKEN_BUDGETS["default"])
@@ -185,7 +185,7 @@ translations = {
         "onboarding_images": "🖼️ *Generowanie obrazów*\n\nMożesz tworzyć unikalne obrazy na podstawie Twoich opisów za pomocą modelu DALL-E 3.\n\nDostępne komendy:\n/image [opis] - Wygeneruj obraz na podstawie opisu",
         "onboarding_analysis": "🔍 *Analiza dokumentów i zdjęć*\n\nBot może analizować przesłane przez Ciebie dokumenty i zdjęcia. Dodatkowo oferuje funkcję tłumaczenia!\n\nWystarczy przesłać plik lub zdjęcie, a bot dokona ich analizy. W opisie do wysyłanego zdjęcia możesz również napisać np. \"Przetłumacz na angielski\", aby bot dokonał pożądanego działania.\n\n⚠️ Analiza zdjęcia / dokumentu może pobierać więcej kredytów.",
         "onboarding_credits": "💰 *System kredytów*\n\nKorzystanie z bota wymaga kredytów. Różne operacje kosztują różną liczbę kredytów.\n\nMożesz kupić kredyty na kilka sposobów:\n• Komendą /buy - zakup za PLN\n• Komendą /buy stars - zakup za gwiazdki Telegram\n\nKredyty możesz również uzyskać za darmo zapraszając znajomych!\n\nDostępne komendy:\n/credits - Sprawdź stan kredytów\n/buy - Kup pakiet kredytów\n/creditstats - Analiza wykorzystania kredytów",
-        "onboarding_export": "📤 *Eksport rozmów*\n\nMożesz wyeksportować historię Twoich rozmów do pliku PDF.\n\nDostępne komendy:\n/export - Eksportuj bieżącą rozmowę do PDF",
+        "onboarding_export": "📤 *Eksport rozmów*\n\nMożesz wyeksportować historię Twoich rozmów do pliku PDF.\n\nDostępne komendy:\n/export - Eksportuj bieżącą rozmowę do PDF\n/export all - Archiwum ZIP w formatach PDF, Markdown, HTML i JSONL",
         "onboarding_settings": "⚙️ *Ustawienia i personalizacja*\n\nDostosuj bota do swoich preferencji.\n\nDostępne komendy:\n/start - Otwórz menu główne\n/language - Zmień język\n/setname - Ustaw swoją nazwę\n/restart - Zrestartuj bota",
         "onboarding_finish": "🎉 *Gratulacje!*\n\nZakończyłeś przewodnik po funkcjach bota {bot_name}. Teraz znasz już wszystkie możliwości!\n\nWpisz /freecredits, aby otrzymać swoje pierwsze kredyty za darmo.\n\nJeśli masz pytania, użyj /start lub po prostu zapytaj bota.\n\nMiłego korzystania! 🚀",
         "onboarding_next": "Dalej ➡️",
@@ -252,6 +252,7 @@ translations = {
         "total_spent": "Łącznie wydano",
         "last_purchase": "Ostatni zakup",
         "no_transactions": "Brak historii transakcji.",
+        "credit_refund": "zwrot",
 
         # Polski
         "export_info": "Aby wyeksportować konwersację do pliku PDF, użyj komendy /export",
@@ -259,6 +260,9 @@ translations = {
         "export_empty": "Historia konwersacji jest pusta.",
         "export_error": "Wystąpił błąd podczas generowania pliku PDF. Spróbuj ponownie później.",
         "export_file_caption": "📄 Historia konwersacji w formacie PDF",
+        "export_archive_generating": "⏳ Przygotowywanie archiwum z historią konwersacji...",
+        "export_archive_caption": "🗂 Historia konwersacji ({formats})",
+        "export_formats_usage": "Dostępne formaty eksportu: pdf, md, html, jsonl.\nPrzykład: /export md html lub /export all (wszystkie formaty w archiwum ZIP).",
 
         # Polski (pl)
         "translate_instruction": "📄 *Tłumaczenie tekstu*\n\nDostępne opcje:\n\n1️⃣ Prześlij zdjęcie z tekstem do tłumaczenia i dodaj /translate w opisie lub odpowiedz na zdjęcie komendą /translate\n\n2️⃣ Wyślij dokument i odpowiedz na niego komendą /translate\n\n3️⃣ Użyj komendy /translate [język_docelowy] [tekst]\nNa przykład: /translate en Witaj świecie!\n\nDostępne języki docelowe: en (angielski), pl (polski), ru (rosyjski), fr (francuski), de (niemiecki), es (hiszpański), it (włoski), zh (chiński)",
@@ -870,7 +874,7 @@ translations = {
         "onboarding_images": "🖼️ *Image Generation*\n\nYou can create unique images based on your descriptions using the DALL-E 3 model.\n\nAvailable commands:\n/image [description] - Generate an image based on description",
         "onboarding_analysis": "🔍 *Document and Photo Analysis*\n\nThe bot can analyze documents and photos you send. It also offers translation functionality!\n\nJust upload a file or photo, and the bot will analyze it. In the photo description, you can also write, for example, \"Translate to English\" for the desired action.\n\n⚠️ Image / document analysis may consume more credits.",
         "onboarding_credits": "💰 *Credit System*\n\nUsing the bot requires credits. Different operations cost different amounts of credits.\n\nYou can buy credits in several ways:\n• Using /buy command - purchase with PLN\n• Using /buy stars command - purchase with Telegram stars\n\nYou can also get credits for free by inviting friends!\n\nAvailable commands:\n/credits - Check credit balance\n/buy - Buy credit package\n/creditstats - Credit usage analysis",
-        "onboarding_export": "📤 *Conversation Export*\n\nYou can export your conversation history to a PDF file.\n\nAvailable commands:\n/export - Export current conversation to PDF",
+        "onboarding_export": "📤 *Conversation Export*\n\nYou can export your conversation history to a PDF file.\n\nAvailable commands:\n/export - Export current conversation to PDF\n/export all - ZIP archive in PDF, Markdown, HTML and JSONL formats",
         "onboarding_settings": "⚙️ *Settings and Personalization*\n\nCustomize the bot to your preferences.\n\nAvailable commands:\n/start - Open main menu\n/language - Change language\n/setname - Set your name\n/restart - Restart the bot",
         "onboarding_finish": "🎉 *Congratulations!*\n\nYou've completed the {bot_name} bot feature guide. Now you know all the possibilities!\n\nType /freecredits to receive your first free credits.\n\nIf you have questions, use /start or simply ask the bot.\n\nEnjoy using it! 🚀",
         "onboarding_next": "Next ➡️",
@@ -937,6 +941,7 @@ translations = {
         "total_spent": "Total spent",
         "last_purchase": "Last purchase",
         "no_transactions": "No transaction history.",
+        "credit_refund": "refund",
 
         # Angielski (en)
         "export_info": "To export your conversation to a PDF file, use the /export command",
@@ -944,6 +949,9 @@ translations = {
         "export_empty": "Conversation history is empty.",
         "export_error": "An error occurred while generating the PDF file. Please try again later.",
         "export_file_caption": "📄 Conversation history in PDF format",
+        "export_archive_generating": "⏳ Preparing an archive with conversation history...",
+        "export_archive_caption": "🗂 Conversation history ({formats})",
+        "export_formats_usage": "Available export formats: pdf, md, html, jsonl.\nExample: /export md html or /export all (all formats in a ZIP archive).",
 
         # Angielski (en)
         "translate_instruction": "📄 *Text Translation*\n\nAvailable options:\n\n1️⃣ Send a photo with text to translate and add /translate in the caption or reply to the photo with the /translate command\n\n2️⃣ Send a document and reply to it with the /translate command\n\n3️⃣ Use the command /translate [target_language] [text]\nFor example: /translate pl Hello world!\n\nAvailable target languages: en (English), pl (Polish), ru (Russian), fr (French), de (German), es (Spanish), it (Italian), zh (Chinese)",
@@ -1554,7 +1562,7 @@ translations = {
         "onboarding_images": "🖼️ *Генерация изображений*\n\nВы можете создавать уникальные изображения на основе ваших описаний с помощью модели DALL-E 3.\n\nДоступные команды:\n/image [описание] - Сгенерировать изображение на основе описания",
         "onboarding_analysis": "🔍 *Анализ документов и фото*\n\nБот может анализировать отправленные вами документы и фотографии. Также предлагает функцию перевода!\n\nПросто загрузите файл или фото, и бот проведет их анализ. В описании фото вы также можете написать, например, \"Перевести на английский\" для желаемого действия.\n\n⚠️ Анализ изображения / документа может потреблять больше кредитов.",
         "onboarding_credits": "💰 *Система кредитов*\n\nИспользование бота требует кредитов. Разные операции стоят разное количество кредитов.\n\nВы можете приобрести кредиты несколькими способами:\n• Командой /buy - покупка за PLN\n• Командой /buy stars - покупка за звезды Telegram\n\nВы также можете получить кредиты бесплатно, приглашая друзей!\n\nДоступные команды:\n/credits - Проверить баланс кредитов\n/buy - Купить пакет кредитов\n/creditstats - Анализ использования кредитов",
-        "onboarding_export": "📤 *Экспорт разговоров*\n\nВы можете экспортировать историю ваших разговоров в файл PDF.\n\nДоступные команды:\n/export - Экспортировать текущий разговор в PDF",
+        "onboarding_export": "📤 *Экспорт разговоров*\n\nВы можете экспортировать историю ваших разговоров в файл PDF.\n\nДоступные команды:\n/export - Экспортировать текущий разговор в PDF\n/export all - ZIP-архив в форматах PDF, Markdown, HTML и JSONL",
         "onboarding_settings": "⚙️ *Настройки и персонализация*\n\nНастройте бота под свои предпочтения.\n\nДоступные команды:\n/start - Открыть главное меню\n/language - Изменить язык\n/setname - Установить свое имя\n/restart - Перезапустить бота",
         "onboarding_finish": "🎉 *Поздравляем!*\n\nВы завершили руководство по функциям бота {bot_name}. Теперь вы знаете все возможности!\n\nВведите /freecredits, чтобы получить свои первые бесплатные кредиты.\n\nЕсли у вас есть вопросы, используйте /start или просто спросите бота.\n\nПриятного использования! 🚀",       
         "onboarding_next": "Далее ➡️",
@@ -1622,6 +1630,7 @@ translations = {
         "total_spent": "Всего потрачено",
         "last_purchase": "Последняя покупка",
         "no_transactions": "Нет истории транзакций.",
+        "credit_refund": "возврат",
 
         # Rosyjski (ru)
         "export_info": "Чтобы экспортировать разговор в файл PDF, используйте команду /export",
@@ -1629,6 +1638,9 @@ translations = {
         "export_empty": "История разговора пуста.",
         "export_error": "Произошла ошибка при создании файла PDF. Пожалуйста, повторите попытку позже.",
         "export_file_caption": "📄 История разговора в формате PDF",
+        "export_archive_generating": "⏳ Подготовка архива с историей разговора...",
+        "export_archive_caption": "🗂 История разговора ({formats})",
+        "export_formats_usage": "Доступные форматы экспорта: pdf, md, html, jsonl.\nПример: /export md html или /export all (все форматы в ZIP-архиве).",
 
         # Rosyjski (ru)
         "translate_instruction": "📄 *Перевод текста*\n\nДоступные опции:\n\n1️⃣ Отправьте фото с текстом для перевода и добавьте /translate в описание или ответьте на фото командой /translate\n\n2️⃣ Отправьте документ и ответьте на него командой /translate\n\n3️⃣ Используйте команду /translate [целевой_язык] [текст]\nНапример: /translate en Привет мир!\n\nДоступные целевые языки: en (английский), pl (польский), ru (русский), fr (французский), de (немецкий), es (испанский), it (итальянский), zh (китайский)",
@@ -0,0 +1,129 @@
+# utils/usage_analytics.py
+"""
+Analiza zużycia kredytów na dziennych agregatach (credit_usage_daily)
+
+Agregaty mają najwyżej kilka wierszy na dzień (jeden na kategorię), więc
+analiza to jedno przejście po wierszach i jedno po dniach okna - dla kilkuset
+wierszy zwykłe pętle są od kilku do kilkudziesięciu razy szybsze od ramek
+pandas i nie blokują pętli zdarzeń na dłużej niż kilka milisekund (porównanie:
+pytest --run-benchmarks tests/test_usage_analytics.py). Prognoza wyczerpania kredytów - patrz
+utils/usage_forecast.py.
+"""
+import datetime
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+from utils.usage_forecast import utc_today
+from config import CREDIT_CATEGORY_PURCHASE
+
+# Okno średniej kroczącej dziennego zużycia (dni)
+ROLLING_WINDOW_DAYS = 7
+
+@dataclass
+class DailyUsage:
+    """Jeden dzień analizy: wydatki, doładowania, saldo na koniec dnia i średnia krocząca wydatków"""
+    day: datetime.date
+    usage: int = 0
+    purchase: int = 0
+    balance: float = 0.0
+    rolling_usage: float = 0.0
+
+@dataclass
+class UsageAnalysis:
+    """
+    Wynik analizy zużycia kredytów w oknie days dni
+
+    daily - kolejne dni od pierwszego dnia aktywności do dziś (także dni bez transakcji)
+    """
+    daily: List[DailyUsage]
+    by_category: Dict[str, int]
+    total_usage: int
+    operations: int
+    days_analyzed: int
+    avg_daily_usage: float
+
+def _as_date(value: Any) -> Optional[datetime.date]:
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+def _as_int(value: Any) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def analyze_usage(rows: Iterable[Dict[str, Any]], days: int,
+                  today: Optional[datetime.date] = None) -> UsageAnalysis:
+    """
+    Analizuje dzienne agregaty zużycia kredytów z ostatnich days dni
+
+    Średnie dzienne zużycie to suma wydatków podzielona przez liczbę dni
+    od pierwszej aktywności w oknie do dziś (najwyżej days), a nie przez
+    liczbę transakcji. Dni są liczone w UTC, tak jak agregaty.
+    """
+    end = today or utc_today()
+    by_day: Dict[datetime.date, DailyUsage] = {}
+    last_at: Dict[datetime.date, str] = {}
+    by_category: Dict[str, int] = {}
+    operations = 0
+
+    for row in rows:
+        day = _as_date(row.get('day'))
+        if day is None:
+            continue
+        entry = by_day.get(day)
+        if entry is None:
+            entry = by_day[day] = DailyUsage(day)
+        amount = _as_int(row.get('amount'))
+        category = str(row.get('category') or "")
+        if category == CREDIT_CATEGORY_PURCHASE:
+            entry.purchase += amount
+        else:
+            entry.usage += amount
+            operations += _as_int(row.get('operations'))
+            by_category[category] = by_category.get(category, 0) + amount
+
+        # Saldo na koniec dnia - z ostatniej transakcji dnia
+        row_last_at = str(row.get('last_at') or "")
+        if row.get('credits_after') is not None and row_last_at >= last_at.get(day, ""):
+            last_at[day] = row_last_at
+            entry.balance = float(row['credits_after'])
+
+    if not by_day:
+        return UsageAnalysis([], {}, 0, 0, 0, 0.0)
+
+    # Kolejne dni od pierwszej aktywności, saldo przenoszone z poprzedniego dnia
+    daily = []
+    window = deque(maxlen=ROLLING_WINDOW_DAYS)
+    balance = 0.0
+    day = min(by_day)
+    last_day = max(end, max(by_day))
+    while day <= last_day:
+        entry = by_day.get(day)
+        if entry is None:
+            entry = DailyUsage(day, balance=balance)
+        elif day not in last_at:
+            entry.balance = balance
+        balance = entry.balance
+        window.append(entry.usage)
+        entry.rolling_usage = sum(window) / len(window)
+        daily.append(entry)
+        day += datetime.timedelta(days=1)
+
+    total_usage = sum(entry.usage for entry in daily)
+    days_analyzed = min(days, len(daily))
+    avg_daily_usage = total_usage / days_analyzed if operations and days_analyzed else 0.0
+
+    return UsageAnalysis(
+        daily=daily,
+        by_category={category: amount for category, amount in
+                     sorted(by_category.items(), key=lambda item: item[1], reverse=True) if amount > 0},
+        total_usage=total_usage,
+        operations=operations,
+        days_analyzed=days_analyzed,
+        avg_daily_usage=avg_daily_usage
+    )
@@ -0,0 +1,177 @@
+# utils/usage_forecast.py
+"""
+Prognoza zużycia kredytów liczona przyrostowo z dziennych agregatów (credit_usage_daily)
+
+Stan prognozy użytkownika to kilka liczb na kategorię i dzień tygodnia - kolejne
+zakończone dni są do niego dokładane, więc odświeżenie wymaga tylko nowych
+wierszy agregatów, a nie całej historii.
+
+- tempo operacji i wydatków w każdej kategorii to średnie wykładnicze dziennych
+  wartości (okres półtrwania FORECAST_HALFLIFE_DAYS)
+- koszt operacji kategorii (np. wiadomości) wynika z modeli, których użytkownik
+  używał; gdy znany jest bieżący model, koszt wiadomości jest brany z CREDIT_COSTS
+- profil dni tygodnia koryguje prognozę na kolejne dni (z wagą rosnącą
+  z liczbą obserwowanych tygodni)
+"""
+import datetime
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+from config import (
+    CREDIT_CATEGORY_PURCHASE, FORECAST_HALFLIFE_DAYS, FORECAST_SEASON_HALFLIFE_WEEKS,
+    FORECAST_HORIZON_DAYS
+)
+
+# Waga nowego dnia w średniej wykładniczej dziennego zużycia
+DAILY_ALPHA = 1 - 0.5 ** (1 / FORECAST_HALFLIFE_DAYS)
+
+# Waga nowej obserwacji dnia tygodnia w profilu tygodniowym
+SEASON_ALPHA = 1 - 0.5 ** (1 / FORECAST_SEASON_HALFLIFE_WEEKS)
+
+# Dzienne zużycie poniżej tej wartości traktujemy jako brak zużycia
+MIN_DAILY_USAGE = 0.01
+
+# Kategoria wiadomości - jej koszt zależy od wybranego modelu
+MESSAGE_CATEGORY = "message"
+
+def utc_today() -> datetime.date:
+    """Bieżący dzień UTC - agregaty dzienne są liczone w dniach UTC"""
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+def _as_date(value: Any) -> datetime.date:
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+@dataclass
+class CreditForecast:
+    """Prognoza zużycia kredytów użytkownika"""
+    daily_usage: float
+    days_left: Optional[int]
+    depletion_date: Optional[datetime.date]
+
+class UsageForecastState:
+    """Przyrostowy stan prognozy zużycia kredytów jednego użytkownika"""
+    __slots__ = ("last_day", "weight", "operations", "spend", "season_usage", "season_weight",
+                 "balance", "balance_at", "last_activity")
+
+    def __init__(self):
+        self.last_day: Optional[datetime.date] = None   # Ostatni dzień dołożony do średnich
+        self.weight = 0.0                               # Suma wag średniej (korekta obciążenia startowego)
+        self.operations: Dict[str, float] = {}          # kategoria -> średnia dzienna liczba operacji
+        self.spend: Dict[str, float] = {}               # kategoria -> średnie dzienne wydatki
+        self.season_usage = [0.0] * 7                   # dzień tygodnia -> średnie zużycie
+        self.season_weight = [0.0] * 7
+        self.balance: Optional[int] = None              # Saldo po ostatniej transakcji
+        self.balance_at = ""
+        self.last_activity: Optional[datetime.date] = None
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]], today: datetime.date) -> 'UsageForecastState':
+        """Buduje stan z wierszy agregatów (np. ostatnich FORECAST_HISTORY_DAYS dni)"""
+        state = cls()
+        state.update(rows, today)
+        state.advance_to(today)
+        return state
+
+    def _fold_day(self, day: datetime.date, totals: Dict[str, List[int]]):
+        """Dokłada zakończony dzień: {kategoria: [kwota, operacje]}"""
+        keep = 1 - DAILY_ALPHA
+        self.weight = self.weight * keep + DAILY_ALPHA
+        for category in set(self.spend) | set(totals):
+            amount, operations = totals.get(category, (0, 0))
+            self.spend[category] = self.spend.get(category, 0.0) * keep + amount * DAILY_ALPHA
+            self.operations[category] = self.operations.get(category, 0.0) * keep + operations * DAILY_ALPHA
+
+        weekday = day.weekday()
+        day_usage = sum(amount for amount, _ in totals.values())
+        self.season_usage[weekday] = self.season_usage[weekday] * (1 - SEASON_ALPHA) + day_usage * SEASON_ALPHA
+        self.season_weight[weekday] = self.season_weight[weekday] * (1 - SEASON_ALPHA) + SEASON_ALPHA
+        self.last_day = day
+
+    def advance_to(self, today: datetime.date):
+        """Dokłada dni bez zużycia aż do wczoraj (dzisiejszy dzień nie jest jeszcze zakończony)"""
+        if self.last_day is None:
+            return
+        day = self.last_day + datetime.timedelta(days=1)
+        while day < today:
+            self._fold_day(day, {})
+            day += datetime.timedelta(days=1)
+
+    def update(self, rows: Iterable[Dict[str, Any]], today: datetime.date):
+        """
+        Dokłada nowe wiersze agregatów dziennych
+
+        Zakończone dni (przed today), które nie zostały jeszcze dołożone, trafiają
+        do średnich; wiersze dzisiejsze aktualizują tylko saldo.
+        """
+        days: Dict[datetime.date, Dict[str, List[int]]] = defaultdict(dict)
+        for row in rows:
+            day = _as_date(row.get('day'))
+            last_at = row.get('last_at') or ""
+            if last_at >= self.balance_at and row.get('credits_after') is not None:
+                self.balance_at = last_at
+                self.balance = row['credits_after']
+            if self.last_activity is None or day > self.last_activity:
+                self.last_activity = day
+
+            category = row.get('category')
+            if category == CREDIT_CATEGORY_PURCHASE or day >= today:
+                continue
+            if self.last_day is not None and day <= self.last_day:
+                continue
+            totals = days[day].setdefault(category, [0, 0])
+            totals[0] += row.get('amount') or 0
+            totals[1] += row.get('operations') or 0
+
+        for day in sorted(days):
+            if self.last_day is None:
+                self.last_day = day - datetime.timedelta(days=1)
+            self.advance_to(day)
+            self._fold_day(day, days[day])
+
+    def _season_factor(self, weekday: int) -> float:
+        """Korekta dnia tygodnia - odchylenie od średniej, z wagą liczby obserwacji"""
+        observed = [self.season_usage[w] / self.season_weight[w] for w in range(7) if self.season_weight[w] > 0]
+        if not observed or self.season_weight[weekday] == 0:
+            return 1.0
+        overall = sum(observed) / len(observed)
+        if overall <= 0:
+            return 1.0
+        raw = (self.season_usage[weekday] / self.season_weight[weekday]) / overall
+        return 1 + (raw - 1) * self.season_weight[weekday]
+
+    def daily_usage(self, message_cost: Optional[float] = None) -> float:
+        """
+        Prognozowane średnie dzienne zużycie kredytów
+
+        Args:
+            message_cost: Koszt wiadomości w bieżącym modelu użytkownika - zastępuje
+                średni koszt wiadomości z historii (None = mieszanka modeli z historii)
+        """
+        if not self.weight:
+            return 0.0
+        usage = 0.0
+        for category, spend in self.spend.items():
+            if category == MESSAGE_CATEGORY and message_cost is not None and self.operations.get(category, 0) > 0:
+                usage += self.operations[category] * message_cost
+            else:
+                usage += spend
+        return max(0.0, usage / self.weight)
+
+    def forecast(self, balance: Optional[int] = None, today: Optional[datetime.date] = None,
+                 message_cost: Optional[float] = None) -> CreditForecast:
+        """Prognozuje dzień wyczerpania kredytów (saldo domyślnie z ostatniej transakcji)"""
+        today = today or utc_today()
+        balance = self.balance if balance is None else balance
+        base = self.daily_usage(message_cost)
+        if base < MIN_DAILY_USAGE or balance is None:
+            return CreditForecast(base, None, None)
+
+        remaining = float(balance)
+        for offset in range(FORECAST_HORIZON_DAYS):
+            day = today + datetime.timedelta(days=offset)
+            remaining -= base * self._season_factor(day.weekday())
+            if remaining < 0:
+                return CreditForecast(base, offset, day)
+        return CreditForecast(base, None, None)
@@ -1,9 +1,33 @@
 # utils/user_utils.py
-from database.supabase_client import supabase
+from database.supabase_client import supabase_api
+from utils.cache import language_cache
+
+def get_user_state(context, user_id):
+    """
+    Zwraca słownik stanu użytkownika w kontekście czatu (tworzy go, jeśli nie istnieje)
+    
+    context.chat_data jest zapisywany w trwałym magazynie (services.persistence),
+    więc tryb, model, język i stan menu przetrwają restart bota.
+    
+    Args:
+        context: Kontekst bota
+        user_id: ID użytkownika
+        
+    Returns:
+        dict: Stan użytkownika (context.chat_data['user_data'][user_id])
+    """
+    return context.chat_data.setdefault('user_data', {}).setdefault(user_id, {})
+
+def _store_language(context, user_id, language):
+    """Zapisuje język użytkownika w kontekście czatu"""
+    get_user_state(context, user_id)['language'] = language
 
 def get_user_language(context, user_id):
     """
-    Pobiera język użytkownika z kontekstu lub bazy danych
+    Pobiera język użytkownika z kontekstu
+    
+    Język z bazy danych jest wczytywany wcześniej, asynchronicznie, przez
+    preload_user_language - ta funkcja nie wykonuje już zapytań sieciowych.
     
     Args:
         context: Kontekst bota
@@ -13,49 +37,65 @@ def get_user_language(context, user_id):
         str: Kod języka (pl, en, ru)
     """
     # Sprawdź, czy język jest zapisany w kontekście
-    if 'user_data' in context.chat_data and user_id in context.chat_data['user_data'] and 'language' in context.chat_data['user_data'][user_id]:
+    if context.chat_data is not None and 'user_data' in context.chat_data and user_id in context.chat_data['user_data'] and 'language' in context.chat_data['user_data'][user_id]:
         return context.chat_data['user_data'][user_id]['language']
     
-    # Jeśli nie, pobierz z bazy danych
+    # Domyślny język, jeśli język nie został jeszcze wczytany
+    return "pl"
+
+async def load_user_language(context, user_id):
+    """
+    Pobiera język użytkownika z bazy danych (bez blokowania pętli zdarzeń)
+    i zapisuje go w kontekście
+    
+    Args:
+        context: Kontekst bota
+        user_id: ID użytkownika
+        
+    Returns:
+        str: Kod języka (pl, en, ru)
+    """
+    cached = language_cache.get(user_id)
+    if cached is not None:
+        _store_language(context, user_id, cached)
+        return cached
+    
     try:
-        response = supabase.table('users').select('language, language_code').eq('id', user_id).execute()
+        result = await supabase_api.query(
+            'users',
+            query_type="select",
+            columns="language,language_code",
+            filters={'id': user_id}
+        )
         
-        if response.data:
-            user_data = response.data[0]
+        if result:
+            user_data = result[0]
             
-            # Najpierw sprawdź pole language
-            if user_data.get('language'):
-                language = user_data.get('language')
-                
-                # Zapisz w kontekście na przyszłość
-                if 'user_data' not in context.chat_data:
-                    context.chat_data['user_data'] = {}
-                
-                if user_id not in context.chat_data['user_data']:
-                    context.chat_data['user_data'][user_id] = {}
-                
-                context.chat_data['user_data'][user_id]['language'] = language
+            # Najpierw sprawdź pole language, potem language_code
+            language = user_data.get('language') or user_data.get('language_code')
+            if language:
+                language_cache.set(user_id, language)
+                _store_language(context, user_id, language)
                 return language
-                
-            # Jeśli language nie znaleziono, sprawdź language_code
-            if user_data.get('language_code'):
-                language_code = user_data.get('language_code')
-                
-                # Zapisz w kontekście na przyszłość
-                if 'user_data' not in context.chat_data:
-                    context.chat_data['user_data'] = {}
-                
-                if user_id not in context.chat_data['user_data']:
-                    context.chat_data['user_data'][user_id] = {}
-                
-                context.chat_data['user_data'][user_id]['language'] = language_code
-                return language_code
     except Exception as e:
         print(f"Błąd pobierania języka z bazy: {e}")
     
     # Domyślny język, jeśli wszystkie metody zawiodły
     return "pl"
 
+async def preload_user_language(update, context):
+    """
+    Handler uruchamiany przed pozostałymi handlerami (grupa -1), który
+    wczytuje język użytkownika do kontekstu, jeśli go tam jeszcze nie ma
+    """
+    user = update.effective_user
+    if user is None or context.chat_data is None:
+        return
+    
+    user_data = context.chat_data.get('user_data', {}).get(user.id, {})
+    if 'language' not in user_data:
+        await load_user_language(context, user.id)
+
 def mark_chat_initialized(context, user_id):
     """
     Oznacza czat jako zainicjowany przez użytkownika.
@@ -68,14 +108,8 @@ def mark_chat_initialized(context, user_id):
         context: Kontekst bota
         user_id: ID użytkownika
     """
-    if 'user_data' not in context.chat_data:
-        context.chat_data['user_data'] = {}
-    
-    if user_id not in context.chat_data['user_data']:
-        context.chat_data['user_data'][user_id] = {}
-    
     # Ustaw flagę inicjalizacji
-    context.chat_data['user_data'][user_id]['chat_initialized'] = True
+    get_user_state(context, user_id)['chat_initialized'] = True
     print(f"Czat został oznaczony jako zainicjowany dla użytkownika {user_id}")
 
 def is_chat_initialized(context, user_id):